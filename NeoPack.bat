@@ -12,7 +12,7 @@ if exist "%VENV%\Scripts\python.exe" (
 	set "PYTHON_EXE=python"
 )
 
-start "Backend" cmd /k "cd /d "%BACKEND%" && "%PYTHON_EXE%" -m uvicorn index:app --reload"
+start "Backend" cmd /k "cd /d "%BACKEND%" && "%PYTHON_EXE%" -m uvicorn server:app --reload"
 start "Frontend" cmd /k "cd /d "%FRONTEND%" && npm run dev"
 timeout /t 3 /nobreak >nul
 start "" "http://localhost:5173/"
@@ -0,0 +1,294 @@
+"""
+Admission control: per-endpoint-class concurrency limits, a shared memory
+budget and bounded wait queues in front of the conversion handlers.
+
+Endpoint classes:
+- image - /compress_image/, /convert-ico/, static stickers
+- pdf   - /convert-to-pdf/, /edit-pdf/, /pdf-password/, /pdf/pipeline
+- media - video stickers and audio previews
+
+Each handler estimates the working memory of its request (from the upload
+size and, for images, the pixel count read from the header) and awaits
+admit(). A request runs once its class has a free slot and its estimate fits
+in what is left of the memory budget; a request larger than the whole budget
+runs only when nothing else holds memory. Otherwise it waits in its class's
+FIFO queue. When the queue is full, or the wait exceeds ADMISSION_QUEUE_TIMEOUT,
+it is rejected with 429 and a Retry-After derived from the class's recent
+service times.
+
+Queue waits, rejections, slots in use, queue lengths and reserved memory are
+exported on /metrics (admission_*) and summarised by GET /admission/stats.
+
+Background jobs are not admitted here; JOB_WORKERS already bounds them (see jobs.py).
+
+Environment variables:
+- ADMISSION_ENABLED                 - '0' admits everything immediately (default: 1)
+- ADMISSION_MEMORY_BUDGET           - bytes of estimated working memory across all classes
+                                      (default: 60% of the cgroup limit or physical memory)
+- ADMISSION_<CLASS>_CONCURRENCY     - requests of a class processed at once
+                                      (defaults: image and pdf 2 x CPU_POOL_SIZE, media CPU_POOL_SIZE)
+- ADMISSION_<CLASS>_QUEUE           - requests of a class allowed to wait (defaults: 32, 16, 4)
+- ADMISSION_QUEUE_TIMEOUT           - seconds a request may wait before 429 (default: 30)
+"""
+
+from collections import deque
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
+from typing import AsyncIterator, Deque, Dict, Optional
+import asyncio
+import logging
+import math
+import time
+import os
+
+from executor import CPU_POOL_SIZE
+from image_loader import peek_image_size, size_within
+from metrics import ADMISSION_ACTIVE, ADMISSION_MEMORY, ADMISSION_QUEUED, ADMISSION_REJECTIONS, ADMISSION_WAIT
+from uploads import SpooledFile
+
+logger = logging.getLogger(__name__)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Configuration & Constants
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _default_memory_budget() -> int:
+    """60% of the container's memory limit, or of physical memory outside a cgroup limit."""
+    try:
+        with open("/sys/fs/cgroup/memory.max") as handle:
+            limit = handle.read().strip()
+        if limit != "max":
+            return int(int(limit) * 0.6)
+    except (OSError, ValueError):
+        pass
+    try:
+        return int(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") * 0.6)
+    except (AttributeError, ValueError, OSError):
+        return 2 * 1024 ** 3
+
+
+_WORKERS = max(CPU_POOL_SIZE, 1)
+# class -> (default concurrency, default queue length)
+_CLASS_DEFAULTS = {
+    "image": (2 * _WORKERS, 32),
+    "pdf": (2 * _WORKERS, 16),
+    "media": (_WORKERS, 4),
+}
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+ADMISSION_MEMORY_BUDGET = int(os.getenv("ADMISSION_MEMORY_BUDGET", "0")) or _default_memory_budget()
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+ADMISSION_LIMITS = {
+    name: (
+        int(os.getenv(f"ADMISSION_{name.upper()}_CONCURRENCY", str(concurrency))),
+        int(os.getenv(f"ADMISSION_{name.upper()}_QUEUE", str(queue))),
+    )
+    for name, (concurrency, queue) in _CLASS_DEFAULTS.items()
+}
+
+# Bounds for the Retry-After hint, in seconds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 120
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Admission Controller
+# ─────────────────────────────────────────────────────────────────────────────
+
+class _Waiter:
+    __slots__ = ("future", "cost")
+
+    def __init__(self, future: asyncio.Future, cost: int):
+        self.future = future
+        self.cost = cost
+
+
+class _EndpointClass:
+    """Limits, queue and running statistics for one endpoint class."""
+
+    def __init__(self, name: str, concurrency: int, max_queue: int):
+        self.name = name
+        self.concurrency = max(concurrency, 1)
+        self.max_queue = max(max_queue, 0)
+        self.active = 0
+        self.waiters: Deque[_Waiter] = deque()
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+        self.wait_seconds = 0.0
+        # Moving average of how long an admitted request holds its slot (seeds Retry-After)
+        self.service_seconds = 1.0
+
+
+class AdmissionController:
+    """Concurrency slots per endpoint class plus one memory budget shared by all classes."""
+
+    def __init__(
+        self,
+        limits: Dict[str, tuple] = ADMISSION_LIMITS,
+        memory_budget: int = ADMISSION_MEMORY_BUDGET,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+        enabled: bool = ADMISSION_ENABLED,
+    ):
+        self.classes = {name: _EndpointClass(name, *limit) for name, limit in limits.items()}
+        self.memory_budget = memory_budget
+        self.queue_timeout = queue_timeout
+        self.enabled = enabled
+        self.memory_reserved = 0
+        for name in self.classes:
+            ADMISSION_ACTIVE.inc(0, endpoint_class=name)
+            ADMISSION_QUEUED.inc(0, endpoint_class=name)
+
+    def reject_if_full(self, endpoint_class: str) -> None:
+        """Fail fast with 429 before reading an upload that could only be queued past the limit."""
+        if not self.enabled:
+            return
+        state = self.classes[endpoint_class]
+        if state.active >= state.concurrency and len(state.waiters) >= state.max_queue:
+            raise self._reject(state, "queue_full")
+
+    @asynccontextmanager
+    async def admit(self, endpoint_class: str, memory_bytes: int = 0) -> AsyncIterator[None]:
+        """Hold a slot of endpoint_class and memory_bytes of the budget for the duration of the block."""
+        if not self.enabled:
+            yield
+            return
+        state = self.classes[endpoint_class]
+        # A request over the whole budget still runs, just never alongside anything else
+        cost = min(max(int(memory_bytes), 0), self.memory_budget)
+
+        if not state.waiters and self._fits(state, cost):
+            self._acquire(state, cost)
+            ADMISSION_WAIT.observe(0.0, endpoint_class=endpoint_class)
+        else:
+            await self._wait(state, cost)
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            held = time.perf_counter() - started
+            state.service_seconds = 0.8 * state.service_seconds + 0.2 * held
+            self._release(state, cost)
+
+    async def _wait(self, state: _EndpointClass, cost: int) -> None:
+        if len(state.waiters) >= state.max_queue:
+            raise self._reject(state, "queue_full")
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), cost)
+        state.waiters.append(waiter)
+        ADMISSION_QUEUED.inc(endpoint_class=state.name)
+        # Waiters that already gave up may be all that stood in the way
+        self._wake()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout)
+        except BaseException as exc:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted just as the wait ended (timeout or client gone); give the slot back
+                self._release(state, cost)
+            elif waiter in state.waiters:
+                state.waiters.remove(waiter)
+                # The head of the queue may have been blocking smaller requests behind it
+                self._wake()
+            if isinstance(exc, asyncio.TimeoutError):
+                raise self._reject(state, "timeout")
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            state.wait_seconds += waited
+            ADMISSION_QUEUED.dec(endpoint_class=state.name)
+            ADMISSION_WAIT.observe(waited, endpoint_class=state.name)
+
+    def _fits(self, state: _EndpointClass, cost: int) -> bool:
+        if state.active >= state.concurrency:
+            return False
+        return self.memory_reserved == 0 or self.memory_reserved + cost <= self.memory_budget
+
+    def _acquire(self, state: _EndpointClass, cost: int) -> None:
+        state.active += 1
+        state.admitted += 1
+        self.memory_reserved += cost
+        ADMISSION_ACTIVE.inc(endpoint_class=state.name)
+        ADMISSION_MEMORY.inc(cost)
+
+    def _release(self, state: _EndpointClass, cost: int) -> None:
+        state.active -= 1
+        self.memory_reserved -= cost
+        ADMISSION_ACTIVE.dec(endpoint_class=state.name)
+        ADMISSION_MEMORY.dec(cost)
+        self._wake()
+
+    def _wake(self) -> None:
+        """Admit queued requests, in order within each class, while they fit."""
+        for state in self.classes.values():
+            while state.waiters:
+                waiter = state.waiters[0]
+                if waiter.future.done():
+                    # Timed out or cancelled; its own handler cleans up
+                    state.waiters.popleft()
+                    continue
+                if not self._fits(state, waiter.cost):
+                    break
+                state.waiters.popleft()
+                self._acquire(state, waiter.cost)
+                waiter.future.set_result(None)
+
+    def _reject(self, state: _EndpointClass, reason: str) -> HTTPException:
+        state.rejected[reason] = state.rejected.get(reason, 0) + 1
+        ADMISSION_REJECTIONS.inc(endpoint_class=state.name, reason=reason)
+        retry_after = self.retry_after(state.name)
+        logger.warning(
+            "Rejected %s request (%s): %d active, %d queued; retry after %ss",
+            state.name, reason, state.active, len(state.waiters), retry_after,
+        )
+        return HTTPException(
+            status_code=429,
+            detail="Server is busy with similar requests, please retry shortly.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    def retry_after(self, endpoint_class: str) -> int:
+        """Seconds until the current queue of a class should have drained."""
+        state = self.classes[endpoint_class]
+        rounds = (len(state.waiters) + 1) / state.concurrency
+        return min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, math.ceil(state.service_seconds * rounds)))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "memory_budget_bytes": self.memory_budget,
+            "memory_reserved_bytes": self.memory_reserved,
+            "queue_timeout_seconds": self.queue_timeout,
+            "classes": {
+                name: {
+                    "concurrency": state.concurrency,
+                    "max_queue": state.max_queue,
+                    "active": state.active,
+                    "queued": len(state.waiters),
+                    "admitted": state.admitted,
+                    "rejected": dict(state.rejected),
+                    "mean_wait_seconds": round(state.wait_seconds / state.admitted, 4) if state.admitted else 0.0,
+                    "mean_service_seconds": round(state.service_seconds, 4),
+                    "retry_after_seconds": self.retry_after(name),
+                }
+                for name, state in self.classes.items()
+            },
+        }
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Memory Estimates
+# ─────────────────────────────────────────────────────────────────────────────
+
+def image_pixels(upload: SpooledFile, max_dimension: Optional[int] = None) -> int:
+    """Pixels the handler will decode, read from the header (0 if unreadable; the handler rejects those)."""
+    with upload.open() as stream:
+        size = peek_image_size(stream)
+    if size is None:
+        return 0
+    if max_dimension:
+        size = size_within(size, max_dimension)
+    return size[0] * size[1]
+
+
+def image_memory(upload: SpooledFile, bytes_per_pixel: int, max_dimension: Optional[int] = None) -> int:
+    """Upload size plus bytes_per_pixel of working memory per decoded pixel (reads the header; use run_io)."""
+    return upload.size + image_pixels(upload, max_dimension) * bytes_per_pixel
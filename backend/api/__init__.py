@@ -0,0 +1,5 @@
+"""Tool-Kit API package: per-feature routers assembled by create_app() (see api/app.py)."""
+
+from api.app import create_app
+
+__all__ = ["create_app"]
@@ -0,0 +1,128 @@
+"""
+App factory: builds the Tool-Kit API from per-feature routers.
+
+Feature routers (API_FEATURES selects which are mounted):
+- images   - POST /compress_image/, POST /convert-ico/, /convert-ico/batch (api/images.py)
+- pdf      - POST /convert-to-pdf/, /edit-pdf/, /pdf-password/, /pdf/pipeline (api/pdf.py)
+- stickers - POST /stickers/whatsapp, /stickers/whatsapp/pack (api/stickers.py; the only one that
+             needs moviepy/ffmpeg)
+
+Always mounted:
+- /jobs/* - background jobs for the enabled features' job kinds (api/background.py)
+- GET /cache/stats, GET /admission/stats, GET /metrics (api/ops.py)
+- /uploads/* - resumable chunked uploads (api/resumable.py); every processing endpoint and
+  POST /jobs/{kind} take a completed session's upload_id in place of a file
+
+Feature modules are imported only when enabled, so e.g. a media-worker
+deployment with API_FEATURES=stickers never loads the PDF or palette code
+and can be scaled on its own.
+
+Note: Some frontend features reference endpoints not implemented here:
+- /convert/webp-to-png (ConvertCardWtP.tsx)
+- /download_pinterest_video/ (PinDownload.tsx)
+- /download_reel/ (ReelCard.tsx)
+- /download_youtube_short/ (YoutubeCard.tsx) - requires pytube
+- /companies, /analyze_stock, /watchlist/* (StockAnalysis.tsx) - requires yfinance + Gemini
+
+Environment:
+- API_FEATURES - comma-separated feature routers to mount, or "all" (default: all)
+- API_HOST, API_PORT - bind address when run directly (see server.py)
+- ADMISSION_* - per-class concurrency, wait queues, queue timeout and memory budget; overflow
+  gets 429 with Retry-After (see admission.py)
+- CPU_POOL_SIZE, IO_POOL_SIZE, CPU_POOL_MAX_QUEUE, CPU_TASK_TIMEOUT - worker pools (see executor.py)
+- REDIS_URL, RESULT_CACHE_* - result cache tiers and per-endpoint TTLs (see cache_handler.py)
+- SPOOL_MEMORY_THRESHOLD - upload/output size kept in memory before spilling to disk (see uploads.py)
+- UPLOAD_SESSION_DIR, UPLOAD_SESSION_TTL, UPLOAD_MAX_BYTES, UPLOAD_CHUNK_SIZE - resumable upload
+  sessions (see upload_sessions.py)
+- JOB_* - background job backend, workers, priorities and result expiry (see jobs.py)
+- MAX_PDF_IMAGES, PDF_JPEG_PASSTHROUGH - /convert-to-pdf/ image cap and JPEG passthrough (see image_pdf.py)
+- PALETTE_MODE, PALETTE_SAMPLE_SIZE, PALETTE_LUT_BITS - /compress_image/ palette fit and lookup table
+  (see palette.py)
+- MAX_ICO_BATCH - images accepted by /convert-ico/batch (see api/images.py)
+- MAX_IMAGE_PIXELS - largest accepted image (width x height) before decoding (see image_loader.py)
+- DECODED_CACHE_BYTES, DECODED_CACHE_TTL, DECODED_CACHE_DIR - decoded pixels shared by the image
+  endpoints and pool workers (see image_cache.py)
+- VIDEO_DECODER, VIDEO_DECODE_THREADS, FFMPEG_BINARY - video sticker frame source (see video_decoder.py)
+- MEDIA_PROBE_BYTES - sticker upload prefix probed for its container header while spooling
+  (see media_probe.py)
+- WARMUP - features whose heavy imports (sklearn, PyPDF2, moviepy) load at start-up instead of
+  on first use (see warmup.py)
+"""
+
+from fastapi import Depends, FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from typing import List, Optional, Sequence
+import importlib
+import os
+
+from api import background, ops, resumable
+from api.common import result_cache
+from executor import prestart_cpu_pool, run_io, shutdown_executors
+from image_cache import decoded_images
+from jobs import JobQueue, create_job_store
+from metrics import MetricsMiddleware, track_route
+from warmup import WARMUP_FEATURES, warm_up
+
+FEATURE_ROUTERS = {
+    "images": "api.images",
+    "pdf": "api.pdf",
+    "stickers": "api.stickers",
+}
+
+
+def parse_features(spec: str) -> List[str]:
+    """Turn an API_FEATURES value into feature names; "all" (or empty) selects every feature."""
+    features = [feature.strip() for feature in spec.split(",") if feature.strip()]
+    if not features or "all" in features:
+        return list(FEATURE_ROUTERS)
+    unknown = [feature for feature in features if feature not in FEATURE_ROUTERS]
+    if unknown:
+        raise ValueError(
+            f"Unknown API_FEATURES value(s) {', '.join(unknown)}; expected: all, {', '.join(FEATURE_ROUTERS)}"
+        )
+    return features
+
+
+API_FEATURES = parse_features(os.getenv("API_FEATURES", "all"))
+
+
+def create_app(features: Optional[Sequence[str]] = None) -> FastAPI:
+    """Build the API with the given feature routers (default: API_FEATURES)."""
+    features = API_FEATURES if features is None else parse_features(",".join(features))
+    job_queue = JobQueue(create_job_store(result_cache.redis_client))
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        """Warm up if configured and start the job workers; on shutdown stop them and release the pools and caches."""
+        if WARMUP_FEATURES:
+            await run_io(warm_up, WARMUP_FEATURES)
+            await prestart_cpu_pool()
+        job_queue.start()
+        yield
+        await job_queue.stop()
+        shutdown_executors()
+        # Entries live in shared memory (tmpfs), which outlives the process
+        await run_io(decoded_images.clear)
+
+    app = FastAPI(title="Tool-Kit API", version="1.0.0", lifespan=lifespan, dependencies=[Depends(track_route)])
+    app.state.features = features
+    app.state.job_queue = job_queue
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:5173", "http://127.0.0.1:5173", "http://localhost:3000"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    app.add_middleware(MetricsMiddleware)
+
+    for feature in features:
+        module = importlib.import_module(FEATURE_ROUTERS[feature])
+        app.include_router(module.router)
+        module.register_jobs(job_queue)
+    app.include_router(background.router)
+    app.include_router(resumable.router)
+    app.include_router(ops.router)
+    return app
@@ -0,0 +1,89 @@
+"""
+Background job endpoints.
+
+- POST /jobs/{kind} - Queue compress_image, convert_ico, convert_to_pdf, edit_pdf, pdf_pipeline or sticker work
+- GET /jobs/{id}, GET /jobs/{id}/result, DELETE /jobs/{id} - Job status (with progress for sticker
+  and convert_to_pdf jobs), download and cancellation
+- GET /jobs/stats - Job queue depth per priority class
+
+Job kinds are registered by the enabled feature routers; the queue itself
+lives on app.state.job_queue (see api/app.py).
+"""
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+from typing import Dict, List
+import io
+
+from jobs import JobQueue
+from upload_sessions import receive_upload, upload_source
+from uploads import SpooledFile, spool_upload
+
+router = APIRouter(tags=["jobs"])
+
+
+@router.post("/jobs/{kind}", status_code=202)
+async def submit_job(kind: str, request: Request):
+    """
+    Queue a conversion and return its job record (poll GET /jobs/{id}).
+
+    Takes the same multipart fields as the matching synchronous endpoint;
+    upload_id fields name completed upload sessions and stand in for files,
+    in the order they are sent.
+    """
+    job_queue: JobQueue = request.app.state.job_queue
+    if kind not in job_queue.kinds:
+        raise HTTPException(404, f"Unknown job kind '{kind}'. Expected one of: {', '.join(job_queue.kinds)}")
+    
+    form = await request.form()
+    files: List[SpooledFile] = []
+    fields: Dict[str, str] = {}
+    try:
+        for name, value in form.multi_items():
+            if name == "upload_id":
+                files.append(await receive_upload(await upload_source(None, value)))
+            elif isinstance(value, str):
+                fields[name] = value
+            else:
+                files.append(await spool_upload(value))
+    except BaseException:
+        for upload in files:
+            upload.cleanup()
+        raise
+    finally:
+        await form.close()
+    
+    job = await job_queue.submit(kind, files, fields)
+    return JSONResponse(status_code=202, content=job, headers={"Location": f"/jobs/{job['id']}"})
+
+
+@router.get("/jobs/stats")
+async def job_stats(request: Request):
+    """Queue depth per priority class and worker usage."""
+    return JSONResponse(content=request.app.state.job_queue.stats())
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, request: Request):
+    """Job status: queued (with queue_position), running, done, failed or cancelled."""
+    return JSONResponse(content=await request.app.state.job_queue.status(job_id))
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, request: Request):
+    """Download the output of a finished job."""
+    job, data = await request.app.state.job_queue.result(job_id)
+    return StreamingResponse(
+        io.BytesIO(data),
+        media_type=job["media_type"],
+        headers={
+            "Content-Disposition": f'attachment; filename="{job["filename"]}"',
+            "Content-Length": str(len(data)),
+        },
+    )
+
+
+@router.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, request: Request):
+    """Cancel a queued or running job."""
+    return JSONResponse(content=await request.app.state.job_queue.cancel(job_id))
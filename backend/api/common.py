@@ -0,0 +1,64 @@
+"""
+State and helpers shared by the feature routers.
+
+- result_cache - result cache shared by all conversion endpoints
+- admission - concurrency/memory admission control for the conversion handlers
+- sanitize_filename() - safe download names derived from upload names
+- single_file(), form_int(), form_bool() - background job form parsing
+"""
+
+from fastapi import HTTPException
+from typing import List, Optional
+from pathlib import Path
+from dotenv import load_dotenv
+import logging
+import re
+
+from admission import AdmissionController
+from cache_handler import REDIS_URL, ResultCache, create_redis_client
+from uploads import SpooledFile
+
+load_dotenv()
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+# Result cache shared by all conversion endpoints (in-process LRU in front of Redis)
+result_cache = ResultCache(redis_client=create_redis_client() if REDIS_URL else None)
+
+# Per-class slots, queues and memory budget shared by all conversion endpoints (see admission.py)
+admission = AdmissionController()
+
+
+def sanitize_filename(original_name: Optional[str], extension: str) -> str:
+    """Create a safe filename from original name."""
+    base_name = Path(original_name or "sticker").stem
+    safe_base = re.sub(r"[^A-Za-z0-9._-]", "_", base_name) or "sticker"
+    return f"{safe_base}{extension}"
+
+
+def single_file(files: List[SpooledFile]) -> SpooledFile:
+    """The only file of a single-file job (400 if it has more or none)."""
+    if len(files) != 1:
+        raise HTTPException(400, "Exactly one file is required for this job.")
+    return files[0]
+
+
+def form_int(value: Optional[str], name: str) -> Optional[int]:
+    """Form field as an int, or None when empty (400 if not an integer)."""
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPException(400, f"{name} must be an integer")
+
+
+def form_bool(value: Optional[str], default: bool) -> bool:
+    """Form field as a bool ("1", "true", "yes" or "on"), or default when empty."""
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
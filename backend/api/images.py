@@ -0,0 +1,342 @@
+"""
+Image endpoints.
+
+- POST /compress_image/ - Image compression using KMeans clustering (exact, sampled or minibatch palette fit)
+- POST /convert-ico/ - Convert PNG/JPG to a multi-size ICO (sizes built from one downscale pyramid)
+- POST /convert-ico/batch - Convert many PNG/JPGs to ICOs, returned as one zip
+
+Environment variables:
+- MAX_ICO_BATCH - most images per /convert-ico/batch request (default: 50)
+"""
+
+from collections import deque
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from PIL import Image
+from typing import Any, Deque, Dict, List, Optional, Sequence, Set, Tuple, Union
+import zipfile
+import asyncio
+import os
+
+from admission import image_memory, image_pixels
+from api.common import admission, form_int, result_cache, sanitize_filename, single_file
+from executor import CPU_POOL_SIZE, run_cpu, run_io
+from image_loader import downscale_pyramid, load_image
+from jobs import JobOutput, JobQueue
+from metrics import stage
+from palette import DEFAULT_PALETTE_MODE, PALETTE_MODES, quantize_image
+from upload_sessions import (
+    UPLOAD_ID_DESCRIPTION, UPLOAD_IDS_DESCRIPTION, UploadSession, receive_upload, upload_source, upload_sources,
+)
+from uploads import SpillingBuffer, SpooledFile, spooled_response
+
+# ICO configuration
+ICO_MAX_DIMENSION = 256
+DEFAULT_ICO_SIZES = (16, 24, 32, 48, 64, 128, 256)  # Pillow's default ICO size set
+MAX_ICO_BATCH = int(os.getenv("MAX_ICO_BATCH", "50"))
+# Batch conversions in flight on the CPU pool at once
+ICO_BATCH_WINDOW = max(CPU_POOL_SIZE, 1) * 2
+
+# Admission memory estimates per palette mode: the decoded image and its array copy, then either
+# KMeans' float64 copy, distances and int32 labels (exact) or uint16 LUT indices and uint8 labels
+COMPRESS_BYTES_PER_PIXEL = {"exact": 48, "sampled": 12, "minibatch": 12}
+# Decoded frame (ICO frames are small; non-JPEG sources are decoded at full size)
+ICO_BYTES_PER_PIXEL = 4
+
+# Largest palette that still gives an indexed (P mode) image
+MAX_COMPRESS_COLORS = 256
+
+router = APIRouter(tags=["images"])
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Image Compression
+# ─────────────────────────────────────────────────────────────────────────────
+
+def compress_image(image: Image.Image, n_colors: int, mode: str = DEFAULT_PALETTE_MODE) -> Image.Image:
+    """Compress image by fitting an n_colors palette and mapping every pixel onto it (see palette.quantize_image)."""
+    return quantize_image(image, n_colors, mode)
+
+
+def _compress_image_file(
+    upload: SpooledFile,
+    n_colors: int,
+    mode: str,
+    max_dimension: Optional[int] = None,
+) -> SpooledFile:
+    """Decode, quantize and PNG-encode an uploaded image (runs in a CPU worker)."""
+    with upload.open() as stream, stage("compress_image", "decode"):
+        image = load_image(stream, max_dimension=max_dimension)
+        if max_dimension:
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    compressed_image = compress_image(image, n_colors, mode)
+    
+    img_byte_arr = SpillingBuffer(suffix=".png")
+    with stage("compress_image", "encode"):
+        compressed_image.save(img_byte_arr, format='PNG')
+    return img_byte_arr.to_spooled()
+
+
+def _check_compress_options(n_colors, mode: str, max_dimension: Optional[int]) -> int:
+    """Validate /compress_image/ options and return n_colors as an int."""
+    try:
+        n_colors = int(n_colors)
+    except (TypeError, ValueError):
+        raise HTTPException(400, "n_colors must be an integer")
+    if not 1 <= n_colors <= MAX_COMPRESS_COLORS:
+        raise HTTPException(400, f"n_colors must be between 1 and {MAX_COMPRESS_COLORS}")
+    if max_dimension is not None and max_dimension < 1:
+        raise HTTPException(400, "max_dimension must be at least 1")
+    if mode not in PALETTE_MODES:
+        raise HTTPException(400, f"Invalid mode. Expected one of: {', '.join(PALETTE_MODES)}")
+    return n_colors
+
+
+async def _compress_image_cached(upload: SpooledFile, n_colors: int, mode: str, max_dimension: Optional[int]):
+    """Palette-compress a spooled upload through the result cache."""
+    cache_key = await run_io(
+        result_cache.make_key, "compress_image", upload,
+        n_colors=n_colors, mode=mode, max_dimension=max_dimension,
+    )
+    return await result_cache.get_or_compute(
+        "compress_image", cache_key, lambda: run_cpu(_compress_image_file, upload, n_colors, mode, max_dimension)
+    )
+
+
+@router.post("/compress_image/")
+async def compress_image_api(
+    n_colors: str = Form(..., description=f"Palette size, 1 to {MAX_COMPRESS_COLORS}"),
+    file: Optional[UploadFile] = File(None),
+    mode: str = Form(DEFAULT_PALETTE_MODE, description="Palette fitting: 'exact', 'sampled' or 'minibatch'"),
+    max_dimension: Optional[int] = Form(None, description="Downscale so the longer edge is at most this many pixels"),
+    upload_id: Optional[str] = Form(None, description=UPLOAD_ID_DESCRIPTION),
+):
+    """Compress image by reducing color palette using KMeans clustering."""
+    n_colors = _check_compress_options(n_colors, mode, max_dimension)
+    source = await upload_source(file, upload_id)
+    admission.reject_if_full("image")
+    
+    upload = await receive_upload(source)
+    try:
+        memory = await run_io(image_memory, upload, COMPRESS_BYTES_PER_PIXEL[mode], max_dimension)
+        async with admission.admit("image", memory):
+            compressed = await _compress_image_cached(upload, n_colors, mode, max_dimension)
+    finally:
+        upload.cleanup()
+    
+    return spooled_response(
+        compressed,
+        media_type="image/png",
+        headers={"Content-Disposition": "attachment; filename=compressed_image.png"}
+    )
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Image to ICO Conversion
+# ─────────────────────────────────────────────────────────────────────────────
+
+def parse_ico_sizes(spec: Optional[str]) -> Tuple[int, ...]:
+    """Parse a comma-separated list of icon sizes (e.g. "16,32,48"); empty means DEFAULT_ICO_SIZES."""
+    if spec is None or not spec.strip():
+        return DEFAULT_ICO_SIZES
+    try:
+        sizes = {int(part) for part in spec.split(",") if part.strip()}
+    except ValueError:
+        raise HTTPException(400, "sizes must be comma-separated integers, e.g. 16,32,48")
+    if not sizes or min(sizes) < 1 or max(sizes) > ICO_MAX_DIMENSION:
+        raise HTTPException(400, f"Icon sizes must be between 1 and {ICO_MAX_DIMENSION}")
+    return tuple(sorted(sizes))
+
+
+def _convert_to_ico_file(upload: SpooledFile, sizes: Sequence[int] = DEFAULT_ICO_SIZES) -> SpooledFile:
+    """Encode an uploaded image as a multi-size ICO, one frame per requested size."""
+    with upload.open() as stream, stage("convert_ico", "decode"):
+        # Never decode more than the largest icon needs
+        image = load_image(stream, max_dimension=max(sizes))
+        if image.mode not in ("RGB", "RGBA", "L", "LA"):
+            # P/1/CMYK would be resampled with NEAREST or not be writable as PNG frames
+            image = image.convert("RGBA")
+    with stage("convert_ico", "resample"):
+        # Frames keep the image's aspect ratio within each size, as Pillow's own ICO writer does
+        levels = downscale_pyramid(image, sizes)
+    ico_buffer = SpillingBuffer(suffix=".ico")
+    with stage("convert_ico", "encode"):
+        # Pillow embeds provided images whose size matches instead of resampling the source again
+        levels[0].save(
+            ico_buffer, format="ICO", sizes=[level.size for level in levels], append_images=levels[1:],
+        )
+    return ico_buffer.to_spooled()
+
+
+def _check_ico_upload(upload: Union[UploadFile, UploadSession, SpooledFile]) -> None:
+    """Reject anything but PNG/JPG uploads."""
+    allowed_types = ['image/jpeg', 'image/png', 'image/jpg']
+    content_type = (upload.content_type or "").lower()
+    filename = upload.filename or ""
+    valid_extension = filename.lower().endswith(('.png', '.jpg', '.jpeg'))
+    
+    if content_type not in allowed_types and not valid_extension:
+        raise HTTPException(status_code=400, detail=f"Only PNG/JPG files are allowed. Received: {content_type}")
+
+
+async def _convert_to_ico_cached(upload: SpooledFile, sizes: Sequence[int] = DEFAULT_ICO_SIZES):
+    """Convert a spooled upload to ICO through the result cache, decoding and encoding in a CPU worker."""
+    cache_key = await run_io(result_cache.make_key, "convert_ico", upload, sizes=list(sizes))
+    return await result_cache.get_or_compute(
+        "convert_ico", cache_key, lambda: run_cpu(_convert_to_ico_file, upload, sizes)
+    )
+
+
+@router.post("/convert-ico/")
+async def convert_to_ico(
+    file: Optional[UploadFile] = File(None),
+    sizes: Optional[str] = Form(None, description="Comma-separated icon sizes, e.g. 16,32,48 (default: 16-256)"),
+    upload_id: Optional[str] = Form(None, description=UPLOAD_ID_DESCRIPTION),
+):
+    """Convert PNG/JPG image to ICO format."""
+    source = await upload_source(file, upload_id)
+    _check_ico_upload(source)
+    ico_sizes = parse_ico_sizes(sizes)
+    admission.reject_if_full("image")
+    
+    try:
+        upload = await receive_upload(source)
+        try:
+            memory = await run_io(image_memory, upload, ICO_BYTES_PER_PIXEL)
+            async with admission.admit("image", memory):
+                ico = await _convert_to_ico_cached(upload, ico_sizes)
+        finally:
+            upload.cleanup()
+        
+        return spooled_response(
+            ico,
+            media_type="image/x-icon",
+            headers={"Content-Disposition": "attachment; filename=converted.ico"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to convert image: {str(e)}")
+
+
+def _ico_batch_names(uploads: List[SpooledFile]) -> List[str]:
+    """Archive entry names derived from the upload names, made unique."""
+    names: List[str] = []
+    seen: Set[str] = set()
+    for index, upload in enumerate(uploads, start=1):
+        name = sanitize_filename(upload.filename or f"icon_{index}", ".ico")
+        stem, counter = name[:-len(".ico")], 1
+        while name in seen:
+            counter += 1
+            name = f"{stem}_{counter}.ico"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def _ico_batch_memory_estimate(uploads: List[SpooledFile]) -> int:
+    """All uploads plus the largest decode for every slot of the conversion window (reads headers; use run_io)."""
+    largest = max((image_pixels(upload) for upload in uploads), default=0)
+    window = min(len(uploads), ICO_BATCH_WINDOW)
+    return sum(upload.size for upload in uploads) + largest * ICO_BYTES_PER_PIXEL * window
+
+
+def _write_zip_entry(archive: zipfile.ZipFile, name: str, ico: Union[bytes, SpooledFile]) -> None:
+    if isinstance(ico, SpooledFile):
+        archive.writestr(name, ico.read_bytes())
+        ico.cleanup()
+    else:
+        archive.writestr(name, ico)
+
+
+async def convert_to_ico_zip(uploads: List[SpooledFile], sizes: Sequence[int] = DEFAULT_ICO_SIZES) -> SpooledFile:
+    """Convert uploads to ICOs on the CPU pool (a sliding window at a time) and store them in one zip, in order."""
+    buffer = SpillingBuffer(suffix=".zip")
+    pending: Deque[Tuple[str, asyncio.Future]] = deque()
+    # ICO frames are PNG-compressed already, so entries are stored rather than deflated again
+    archive = zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED)
+    try:
+        for upload, name in zip(uploads, _ico_batch_names(uploads)):
+            pending.append((name, asyncio.ensure_future(_convert_to_ico_cached(upload, sizes))))
+            if len(pending) >= ICO_BATCH_WINDOW:
+                name, future = pending.popleft()
+                await run_io(_write_zip_entry, archive, name, await future)
+        while pending:
+            name, future = pending.popleft()
+            await run_io(_write_zip_entry, archive, name, await future)
+        await run_io(archive.close)
+    except BaseException:
+        futures = [future for _, future in pending]
+        for future in futures:
+            future.cancel()
+        await asyncio.gather(*futures, return_exceptions=True)
+        buffer.to_spooled().cleanup()
+        raise
+    return buffer.to_spooled()
+
+
+@router.post("/convert-ico/batch")
+async def convert_to_ico_batch(
+    files: Optional[List[UploadFile]] = File(None),
+    sizes: Optional[str] = Form(None, description="Comma-separated icon sizes, e.g. 16,32,48 (default: 16-256)"),
+    upload_id: Optional[List[str]] = Form(None, description=UPLOAD_IDS_DESCRIPTION),
+):
+    """Convert several PNG/JPG images to ICO and return them as one zip."""
+    files = await upload_sources(files, upload_id)
+    if not files:
+        raise HTTPException(status_code=400, detail="No images uploaded")
+    if len(files) > MAX_ICO_BATCH:
+        raise HTTPException(status_code=400, detail=f"Maximum {MAX_ICO_BATCH} images allowed")
+    for file in files:
+        _check_ico_upload(file)
+    ico_sizes = parse_ico_sizes(sizes)
+    admission.reject_if_full("image")
+    
+    uploads: List[SpooledFile] = []
+    try:
+        for file in files:
+            uploads.append(await receive_upload(file))
+        memory = await run_io(_ico_batch_memory_estimate, uploads)
+        async with admission.admit("image", memory):
+            archive = await convert_to_ico_zip(uploads, ico_sizes)
+        
+        return spooled_response(
+            archive,
+            media_type="application/zip",
+            headers={"Content-Disposition": "attachment; filename=icons.zip"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to convert images: {str(e)}")
+    finally:
+        for upload in uploads:
+            upload.cleanup()
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Background Jobs
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _prepare_compress_job(files: List[SpooledFile], fields: Dict[str, str]) -> Dict[str, Any]:
+    single_file(files)
+    mode = fields.get("mode", DEFAULT_PALETTE_MODE)
+    max_dimension = form_int(fields.get("max_dimension"), "max_dimension")
+    n_colors = _check_compress_options(fields.get("n_colors"), mode, max_dimension)
+    return {"n_colors": n_colors, "mode": mode, "max_dimension": max_dimension}
+
+
+async def _run_compress_job(files: List[SpooledFile], n_colors: int, mode: str, max_dimension: Optional[int]) -> JobOutput:
+    data = await _compress_image_cached(files[0], n_colors, mode, max_dimension)
+    return JobOutput(data, "image/png", "compressed_image.png")
+
+
+def _prepare_ico_job(files: List[SpooledFile], fields: Dict[str, str]) -> Dict[str, Any]:
+    _check_ico_upload(single_file(files))
+    return {"sizes": parse_ico_sizes(fields.get("sizes"))}
+
+
+async def _run_ico_job(files: List[SpooledFile], sizes: Sequence[int]) -> JobOutput:
+    return JobOutput(await _convert_to_ico_cached(files[0], sizes), "image/x-icon", "converted.ico")
+
+
+def register_jobs(queue: JobQueue) -> None:
+    """Register the image job kinds; ICO conversions are quick, so they get the reserved workers."""
+    queue.register("compress_image", _run_compress_job, _prepare_compress_job)
+    queue.register("convert_ico", _run_ico_job, _prepare_ico_job, priority="high")
@@ -0,0 +1,38 @@
+"""
+Operational endpoints.
+
+- GET /cache/stats - Result cache and decoded-image cache hit/miss counters and memory use
+- GET /admission/stats - Admission slots, queues, rejections and memory budget per endpoint class
+- GET /metrics - Prometheus metrics: per-route requests, latency, in-flight, body sizes and stage timings
+"""
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from api.common import admission, result_cache
+from executor import run_io
+from image_cache import decoded_images
+from metrics import render_metrics
+
+router = APIRouter(tags=["ops"])
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters and memory use of the result cache and the decoded-image cache."""
+    # The decoded-image cache's size is read from its directory, which other processes write to
+    decoded = await run_io(decoded_images.stats)
+    return JSONResponse(content={**result_cache.stats(), "decoded_images": decoded})
+
+
+@router.get("/admission/stats")
+async def admission_stats():
+    """Limits, current load, waits and rejections of each admission class."""
+    return JSONResponse(content=admission.stats())
+
+
+@router.get("/metrics")
+async def metrics():
+    """Request and stage metrics in the Prometheus text format."""
+    await run_io(decoded_images.stats)  # refreshes the decoded_image_cache_* gauges
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
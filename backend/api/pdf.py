@@ -0,0 +1,393 @@
+"""
+PDF endpoints.
+
+- POST /convert-to-pdf/ - Convert images to PDF (parallel decode, pages written incrementally)
+- POST /edit-pdf/ - Remove pages from PDF
+- POST /pdf-password/ - Add or remove password protection from PDFs
+- POST /pdf/pipeline - Remove/decrypt/encrypt/merge/reorder/rotate PDFs in one parse and one write
+"""
+
+from fastapi import APIRouter, File, Form, HTTPException, Query, UploadFile
+from typing import Any, Callable, Dict, List, Optional
+import logging
+import os
+
+from admission import image_pixels
+from api.common import admission, form_int, result_cache, sanitize_filename, single_file
+from executor import run_cpu, run_io
+from image_pdf import DEFAULT_PAGE_SIZE, PAGE_SIZES, PDF_DECODE_WINDOW, images_to_pdf
+from jobs import JobOutput, JobProgress, JobQueue
+from metrics import stage
+from pdf_pipeline import parse_operations, parse_page_ranges, run_pdf_pipeline
+from upload_sessions import UPLOAD_ID_DESCRIPTION, UPLOAD_IDS_DESCRIPTION, receive_upload, upload_source, upload_sources
+from uploads import SpillingBuffer, SpooledFile, spooled_response
+
+logger = logging.getLogger(__name__)
+
+# PDF configuration
+MAX_PDF_IMAGES = int(os.getenv("MAX_PDF_IMAGES", "200"))
+
+# Admission memory estimates
+PDF_PAGE_BYTES_PER_PIXEL = 8  # decoded page plus its flattened RGB copy, per page in the decode window
+PDF_PARSE_FACTOR = 4  # PyPDF2 object tree and output buffer, relative to the input size
+
+router = APIRouter(tags=["pdf"])
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Images to PDF Conversion
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _check_pdf_options(image_count: int, page_size: str, dpi: Optional[int]) -> None:
+    """Validate /convert-to-pdf/ options."""
+    if not image_count:
+        raise HTTPException(status_code=400, detail="No images uploaded")
+    if image_count > MAX_PDF_IMAGES:
+        raise HTTPException(status_code=400, detail=f"Maximum {MAX_PDF_IMAGES} images allowed")
+    if page_size not in PAGE_SIZES:
+        raise HTTPException(status_code=400, detail=f"Invalid page_size. Expected one of: {', '.join(PAGE_SIZES)}")
+    if dpi is not None and not 1 <= dpi <= 1200:
+        raise HTTPException(status_code=400, detail="dpi must be between 1 and 1200")
+
+
+def _images_pdf_memory_estimate(uploads: List[SpooledFile]) -> int:
+    """Inputs plus the largest page decoded for every slot of the decode window (reads headers; use run_io)."""
+    largest = max((image_pixels(upload) for upload in uploads), default=0)
+    window = min(len(uploads), PDF_DECODE_WINDOW)
+    return sum(upload.size for upload in uploads) + largest * PDF_PAGE_BYTES_PER_PIXEL * window
+
+
+def _pdf_memory_estimate(uploads: List[SpooledFile]) -> int:
+    """Working memory of parsing and re-serializing PDFs."""
+    return sum(upload.size for upload in uploads) * PDF_PARSE_FACTOR
+
+
+async def _images_to_pdf_cached(
+    uploads: List[SpooledFile],
+    page_size: str = DEFAULT_PAGE_SIZE,
+    dpi: Optional[int] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+):
+    """Combine spooled images into a PDF through the result cache."""
+    cache_key = await run_io(result_cache.make_key, "convert_to_pdf", uploads, page_size=page_size, dpi=dpi)
+    return await result_cache.get_or_compute(
+        "convert_to_pdf", cache_key, lambda: images_to_pdf(uploads, page_size, dpi, progress=progress)
+    )
+
+
+@router.post("/convert-to-pdf/")
+async def convert_images_to_pdf(
+    images: Optional[List[UploadFile]] = File(None),
+    page_size: str = Form(DEFAULT_PAGE_SIZE, description="'image' (page per image size), 'a4' or 'letter'"),
+    dpi: Optional[int] = Form(None, description="Output resolution; downscales images placed on a4/letter pages"),
+    upload_id: Optional[List[str]] = Form(None, description=UPLOAD_IDS_DESCRIPTION),
+):
+    """Convert multiple images to a single PDF file."""
+    images = await upload_sources(images, upload_id)
+    _check_pdf_options(len(images), page_size, dpi)
+    admission.reject_if_full("pdf")
+    
+    uploads: List[SpooledFile] = []
+    try:
+        for img_file in images:
+            uploads.append(await receive_upload(img_file))
+        memory = await run_io(_images_pdf_memory_estimate, uploads)
+        async with admission.admit("pdf", memory):
+            pdf = await _images_to_pdf_cached(uploads, page_size, dpi)
+        
+        return spooled_response(
+            pdf,
+            media_type="application/pdf",
+            headers={"Content-Disposition": "attachment; filename=converted_images.pdf"}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating PDF: {str(e)}")
+    finally:
+        for upload in uploads:
+            upload.cleanup()
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PDF Editing (Page Removal)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _remove_pdf_pages(upload: SpooledFile, page_numbers: str) -> SpooledFile:
+    """Drop the requested pages and re-serialize the PDF (runs in a CPU worker)."""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    with upload.open() as stream:
+        with stage("edit_pdf", "parse"):
+            reader = PdfReader(stream)
+            total = len(reader.pages)
+        
+        pages_to_remove = parse_page_ranges(page_numbers, total)
+        
+        writer = PdfWriter()
+        for i in range(total):
+            if (i + 1) not in pages_to_remove:
+                writer.add_page(reader.pages[i])
+        
+        buffer = SpillingBuffer(suffix=".pdf")
+        with stage("edit_pdf", "serialize"):
+            writer.write(buffer)
+    return buffer.to_spooled()
+
+
+async def _remove_pdf_pages_cached(upload: SpooledFile, page_numbers: str):
+    """Remove pages from a spooled PDF through the result cache."""
+    cache_key = await run_io(result_cache.make_key, "edit_pdf", upload, page_numbers=page_numbers)
+    return await result_cache.get_or_compute(
+        "edit_pdf", cache_key, lambda: run_cpu(_remove_pdf_pages, upload, page_numbers)
+    )
+
+
+@router.post("/edit-pdf/")
+async def edit_pdf(
+    file: Optional[UploadFile] = File(None),
+    page_numbers: str = Query(..., description="Pages/ranges to remove (e.g., 1,3-5,7)"),
+    upload_id: Optional[str] = Form(None, description=UPLOAD_ID_DESCRIPTION),
+):
+    """Remove specified pages from a PDF file."""
+    try:
+        file = await upload_source(file, upload_id)
+        if file.content_type != "application/pdf":
+            raise HTTPException(400, "Only PDF files allowed")
+        admission.reject_if_full("pdf")
+        
+        upload = await receive_upload(file)
+        try:
+            async with admission.admit("pdf", _pdf_memory_estimate([upload])):
+                pdf = await _remove_pdf_pages_cached(upload, page_numbers)
+        finally:
+            upload.cleanup()
+        
+        return spooled_response(
+            pdf,
+            media_type="application/pdf",
+            headers={"Content-Disposition": f'attachment; filename="modified_{file.filename}"'}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Processing error: {str(e)}")
+
+
+def _apply_pdf_password(upload: SpooledFile, action: str, password: str, new_password: Optional[str]) -> SpooledFile:
+    """Encrypt or decrypt a PDF and re-serialize it (runs in a CPU worker)."""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    with upload.open() as stream:
+        with stage("pdf_password", "parse"):
+            reader = PdfReader(stream)
+        writer = PdfWriter()
+
+        if action == "remove":
+            # Check if PDF is encrypted
+            if reader.is_encrypted:
+                try:
+                    # Try to decrypt with provided password
+                    if not reader.decrypt(password):
+                        raise HTTPException(400, "Incorrect password")
+                except Exception as decrypt_error:
+                    raise HTTPException(400, f"Failed to decrypt PDF: {str(decrypt_error)}")
+            else:
+                raise HTTPException(400, "PDF is not password protected")
+
+            # Copy all pages to writer (unencrypted)
+            for page in reader.pages:
+                writer.add_page(page)
+
+        elif action == "add":
+            # If PDF is encrypted, decrypt it first
+            if reader.is_encrypted:
+                try:
+                    if not reader.decrypt(password if new_password else ""):
+                        raise HTTPException(400, "PDF is already encrypted. Provide current password.")
+                except:
+                    raise HTTPException(400, "PDF is already encrypted and could not be decrypted")
+
+            # Copy all pages
+            for page in reader.pages:
+                writer.add_page(page)
+
+            # Encrypt with the provided password
+            encrypt_password = new_password if new_password else password
+            with stage("pdf_password", "encrypt"):
+                writer.encrypt(encrypt_password)
+
+        # Write to buffer
+        buffer = SpillingBuffer(suffix=".pdf")
+        with stage("pdf_password", "serialize"):
+            writer.write(buffer)
+    return buffer.to_spooled()
+
+
+@router.post("/pdf-password/")
+async def pdf_password(
+    file: Optional[UploadFile] = File(None),
+    action: str = Form(..., description="Action: 'add' or 'remove'"),
+    password: str = Form(..., description="Password to add or existing password to remove"),
+    new_password: str = Form(None, description="New password (only for 'add' action)"),
+    upload_id: Optional[str] = Form(None, description=UPLOAD_ID_DESCRIPTION),
+):
+    """
+    Add or remove password protection from a PDF file.
+    - action='add': Encrypts PDF with the provided password
+    - action='remove': Decrypts PDF using the provided password
+    """
+    try:
+        file = await upload_source(file, upload_id)
+        logger.info(f"PDF password request: action={action}, file={file.filename}")
+        if file.content_type != "application/pdf":
+            raise HTTPException(400, "Only PDF files allowed")
+
+        if action not in ["add", "remove"]:
+            raise HTTPException(400, "Action must be 'add' or 'remove'")
+        admission.reject_if_full("pdf")
+        
+        upload = await receive_upload(file)
+        try:
+            async with admission.admit("pdf", _pdf_memory_estimate([upload])):
+                if action == "remove":
+                    # The output is the decrypted document: never stored in the shared cache
+                    pdf = await run_cpu(_apply_pdf_password, upload, action, password, new_password)
+                else:
+                    # Passwords only feed the key hash; the cached output is encrypted
+                    cache_key = await run_io(
+                        result_cache.make_key, "pdf_password", upload,
+                        action=action, password=password, new_password=new_password,
+                    )
+                    pdf = await result_cache.get_or_compute(
+                        "pdf_password", cache_key,
+                        lambda: run_cpu(_apply_pdf_password, upload, action, password, new_password),
+                    )
+        finally:
+            upload.cleanup()
+        
+        action_prefix = "protected" if action == "add" else "unprotected"
+        filename = f"{action_prefix}_{file.filename}"
+        
+        return spooled_response(
+            pdf,
+            media_type="application/pdf",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Processing error: {str(e)}")
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# PDF Pipeline (multi-step edits in one pass)
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _pipeline_removes_encryption(operations: List[Dict[str, Any]]) -> bool:
+    """Whether the pipeline opens an input with a password and writes the result unencrypted."""
+    opens_encrypted = any(
+        operation["op"] == "decrypt" or (operation["op"] == "merge" and operation.get("password"))
+        for operation in operations
+    )
+    return opens_encrypted and not any(operation["op"] == "encrypt" for operation in operations)
+
+
+async def _pdf_pipeline_cached(uploads: List[SpooledFile], operations: List[Dict[str, Any]]):
+    """Run a PDF pipeline through the result cache, unless its output is a decrypted document."""
+    if _pipeline_removes_encryption(operations):
+        # Decrypted documents are never stored in the shared cache
+        return await run_cpu(run_pdf_pipeline, uploads, operations)
+    # Passwords only feed the key hash; the output is either unencrypted input or encrypted again
+    cache_key = await run_io(result_cache.make_key, "pdf_pipeline", uploads, operations=operations)
+    return await result_cache.get_or_compute(
+        "pdf_pipeline", cache_key, lambda: run_cpu(run_pdf_pipeline, uploads, operations)
+    )
+
+
+@router.post("/pdf/pipeline")
+async def pdf_pipeline(
+    files: Optional[List[UploadFile]] = File(None, description="Base PDF first, then any PDFs to merge"),
+    operations: str = Form(..., description='JSON list, e.g. [{"op": "remove", "pages": "2"}, {"op": "encrypt", "password": "x"}]'),
+    upload_id: Optional[List[str]] = Form(None, description=UPLOAD_IDS_DESCRIPTION),
+):
+    """
+    Apply remove/decrypt/encrypt/merge/reorder/rotate operations in order,
+    parsing each PDF once and writing the result once.
+    """
+    files = await upload_sources(files, upload_id)
+    if not files:
+        raise HTTPException(400, "At least one PDF is required")
+    for file in files:
+        if file.content_type != "application/pdf":
+            raise HTTPException(400, "Only PDF files allowed")
+    steps = parse_operations(operations, len(files))
+    admission.reject_if_full("pdf")
+    
+    uploads: List[SpooledFile] = []
+    try:
+        for file in files:
+            uploads.append(await receive_upload(file))
+        async with admission.admit("pdf", _pdf_memory_estimate(uploads)):
+            pdf = await _pdf_pipeline_cached(uploads, steps)
+        
+        return spooled_response(
+            pdf,
+            media_type="application/pdf",
+            headers={"Content-Disposition": f'attachment; filename="{sanitize_filename(files[0].filename, ".pdf")}"'}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, f"Processing error: {str(e)}")
+    finally:
+        for upload in uploads:
+            upload.cleanup()
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Background Jobs
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _prepare_pdf_job(files: List[SpooledFile], fields: Dict[str, str]) -> Dict[str, Any]:
+    page_size = fields.get("page_size", DEFAULT_PAGE_SIZE)
+    dpi = form_int(fields.get("dpi"), "dpi")
+    _check_pdf_options(len(files), page_size, dpi)
+    return {"page_size": page_size, "dpi": dpi}
+
+
+async def _run_pdf_job(files: List[SpooledFile], page_size: str, dpi: Optional[int], progress: JobProgress) -> JobOutput:
+    data = await _images_to_pdf_cached(files, page_size, dpi, progress)
+    return JobOutput(data, "application/pdf", "converted_images.pdf")
+
+
+def _prepare_edit_pdf_job(files: List[SpooledFile], fields: Dict[str, str]) -> Dict[str, Any]:
+    if single_file(files).content_type != "application/pdf":
+        raise HTTPException(400, "Only PDF files allowed")
+    if not fields.get("page_numbers"):
+        raise HTTPException(400, "page_numbers is required (e.g., 1,3-5,7)")
+    return {"page_numbers": fields["page_numbers"]}
+
+
+def _prepare_pdf_pipeline_job(files: List[SpooledFile], fields: Dict[str, str]) -> Dict[str, Any]:
+    if not files:
+        raise HTTPException(400, "At least one PDF is required")
+    if any(upload.content_type != "application/pdf" for upload in files):
+        raise HTTPException(400, "Only PDF files allowed")
+    return {"operations": parse_operations(fields.get("operations"), len(files))}
+
+
+async def _run_pdf_pipeline_job(files: List[SpooledFile], operations: List[Dict[str, Any]]) -> JobOutput:
+    data = await _pdf_pipeline_cached(files, operations)
+    return JobOutput(data, "application/pdf", sanitize_filename(files[0].filename, ".pdf"))
+
+
+async def _run_edit_pdf_job(files: List[SpooledFile], page_numbers: str) -> JobOutput:
+    data = await _remove_pdf_pages_cached(files[0], page_numbers)
+    return JobOutput(data, "application/pdf", sanitize_filename(f"modified_{files[0].filename}", ".pdf"))
+
+
+def register_jobs(queue: JobQueue) -> None:
+    """Register the PDF job kinds; image-to-PDF conversions report pages written."""
+    queue.register("convert_to_pdf", _run_pdf_job, _prepare_pdf_job, reports_progress=True)
+    queue.register("edit_pdf", _run_edit_pdf_job, _prepare_edit_pdf_job)
+    queue.register("pdf_pipeline", _run_pdf_pipeline_job, _prepare_pdf_pipeline_job)
@@ -0,0 +1,89 @@
+"""
+Resumable upload endpoints.
+
+- POST /uploads - Start an upload session for a file of known size
+- PUT /uploads/{id}/chunks/{n} - Send chunk n (raw body, optional X-Chunk-SHA256 header)
+- GET /uploads/{id} - Session status, including the chunks still missing
+- POST /uploads/{id}/complete - Seal the session (optionally checking the whole file's sha256)
+- DELETE /uploads/{id} - Drop the session and its staging file
+
+A completed session's upload_id is accepted by every processing endpoint in
+place of the file (see upload_sessions.py).
+"""
+
+from fastapi import APIRouter, Form, Header, HTTPException, Request
+from fastapi.responses import JSONResponse
+from starlette.requests import ClientDisconnect
+from typing import Optional
+
+from executor import run_io
+from upload_sessions import upload_sessions
+from uploads import SPOOL_CHUNK_SIZE
+
+router = APIRouter(tags=["uploads"])
+
+
+@router.post("/uploads", status_code=201)
+async def create_upload(
+    filename: str = Form(..., description="Name of the file, as a multipart upload would send it"),
+    size: int = Form(..., description="Total size of the file in bytes"),
+    content_type: Optional[str] = Form(None, description="MIME type, e.g. application/pdf"),
+    chunk_size: Optional[int] = Form(None, description="Bytes per chunk (default: UPLOAD_CHUNK_SIZE); every chunk but the last has this size"),
+):
+    """Start an upload session; send its chunks with PUT /uploads/{id}/chunks/{n}."""
+    session = await run_io(upload_sessions.create, filename, content_type, size, chunk_size)
+    return JSONResponse(
+        status_code=201,
+        content={**session._asdict(), "expires_in": upload_sessions.ttl},
+        headers={"Location": f"/uploads/{session.upload_id}"},
+    )
+
+
+@router.put("/uploads/{upload_id}/chunks/{index}")
+async def put_upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    x_chunk_sha256: Optional[str] = Header(None, description="Hex sha256 of the chunk, checked before it counts as received"),
+):
+    """Write one chunk straight to its place in the staging file; chunks may be sent in any order or again."""
+    writer = await run_io(upload_sessions.begin_chunk, upload_id, index)
+    try:
+        pending = bytearray()
+        async for data in request.stream():
+            pending += data
+            if len(pending) >= SPOOL_CHUNK_SIZE:
+                await run_io(writer.write, bytes(pending))
+                pending = bytearray()
+        if pending:
+            await run_io(writer.write, bytes(pending))
+        await run_io(writer.commit, x_chunk_sha256)
+    except ClientDisconnect:
+        # Left unmarked; GET /uploads/{id} lists it as missing
+        raise HTTPException(400, f"Chunk {index} was cut off; send it again.")
+    finally:
+        writer.close()
+    return JSONResponse(content={"upload_id": upload_id, "index": index, "size": writer.written})
+
+
+@router.get("/uploads/{upload_id}")
+async def get_upload(upload_id: str):
+    """Session status: chunks received and missing, and whether it is complete."""
+    return JSONResponse(content=await run_io(upload_sessions.status, upload_id))
+
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    sha256: Optional[str] = Form(None, description="Hex sha256 of the whole file, checked before sealing"),
+):
+    """Seal the session once every chunk is in; its upload_id can then be sent to any processing endpoint."""
+    session = await run_io(upload_sessions.complete, upload_id, sha256)
+    return JSONResponse(content={**session._asdict(), "expires_in": upload_sessions.ttl})
+
+
+@router.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    """Drop the session; requests already using it keep their file."""
+    await run_io(upload_sessions.delete, upload_id)
+    return JSONResponse(content={"upload_id": upload_id, "deleted": True})
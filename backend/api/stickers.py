@@ -0,0 +1,612 @@
+"""
+WhatsApp sticker endpoint.
+
+- POST /stickers/whatsapp - Create WhatsApp stickers from images/videos/audio
+- POST /stickers/whatsapp/pack - Create a sticker pack (stickers plus tray icon) from many images/videos
+
+This is the only router that needs moviepy/ffmpeg, so media workers can be
+deployed with API_FEATURES=stickers (see api/app.py).
+
+Video frames come from video_decoder.py: ffmpeg trims, crops, scales and
+caps the frame rate itself, and moviepy is used only if that fails. Audio
+previews come from one ffmpeg process (audio_preview.py) whose output is
+streamed to the client as it is produced.
+
+Uploads are identified by their container header (media_probe.py), not by
+the declared MIME type alone: media that is unsupported, or video longer
+than MAX_VIDEO_DURATION_SECONDS, is rejected while the upload is still
+being spooled, as soon as its header has been read.
+
+A pack's stickers are generated a window at a time on the CPU pool, and the
+zip is streamed in the order they finish (entries are numbered by upload
+position), so the client receives the first sticker long before the last
+one is done.
+"""
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+from PIL import Image, ImageOps
+from contextlib import AsyncExitStack, aclosing
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+from collections import deque
+from pathlib import Path
+import asyncio
+import anyio
+import logging
+import time
+import io
+
+from admission import image_memory
+from audio_preview import AudioPreview, render_audio_preview
+from api.common import admission, form_bool, result_cache, sanitize_filename, single_file
+from cache_handler import RESULT_CACHE_ENABLED
+from executor import CPU_POOL_SIZE, run_cpu, run_io
+from image_loader import MAX_IMAGE_PIXELS, downscale_pyramid, load_image
+from jobs import JobOutput, JobProgress, JobQueue
+from media_probe import MediaInfo, MediaProbe, probe_upload
+from metrics import observe_stage, stage
+from sticker_encoding import (
+    DEFAULT_STICKER_PRESET, HAVE_STREAMING_WEBP, PROBE_FRAMES, STICKER_PRESETS, AnimatedWebPWriter,
+    choose_animated_settings, encode_static_webp,
+)
+from upload_sessions import (
+    UPLOAD_ID_DESCRIPTION, UPLOAD_IDS_DESCRIPTION, UploadSession, UploadSource, receive_upload, upload_source,
+    upload_sources,
+)
+from uploads import SpooledFile, StreamingZip, spooled_response
+from video_decoder import VIDEO_DECODER, MoviepyVideoSource, VideoDecodeError, open_video_source
+
+logger = logging.getLogger(__name__)
+
+# Sticker configuration
+MAX_STICKER_DIMENSION = 512
+MAX_VIDEO_DURATION_SECONDS = 6
+MAX_AUDIO_DURATION_SECONDS = 15
+MAX_STICKER_FPS = 15
+
+# Sticker pack configuration (WhatsApp's limits)
+MIN_PACK_STICKERS = 3
+MAX_PACK_STICKERS = 30
+TRAY_ICON_DIMENSION = 96
+# Pack stickers in flight on the CPU pool at once
+PACK_WINDOW = max(CPU_POOL_SIZE, 1) * 2
+
+# Admission memory estimates
+STICKER_BYTES_PER_PIXEL = 8  # decoded image plus its RGBA copy
+STICKER_FRAME_BYTES = MAX_STICKER_DIMENSION * MAX_STICKER_DIMENSION * 4
+# Without the incremental encoder every frame is buffered until the end of the clip
+VIDEO_FRAMES_HELD = PROBE_FRAMES if HAVE_STREAMING_WEBP else MAX_VIDEO_DURATION_SECONDS * MAX_STICKER_FPS
+VIDEO_DECODE_FRAMES = 4  # full-resolution source frames held inside the ffmpeg decoder
+VIDEO_DECODE_SIZE = (1920, 1080)  # assumed when the container header does not give the dimensions
+AUDIO_TRANSCODE_BYTES = 32 * 1024 * 1024
+
+IMAGE_MIME_TYPES = {"image/jpeg", "image/png", "image/webp", "image/jpg"}
+VIDEO_MIME_TYPES = {"video/mp4", "video/quicktime", "video/webm", "video/x-matroska"}
+AUDIO_MIME_TYPES = {"audio/mpeg", "audio/mp3", "audio/wav", "audio/x-wav", "audio/ogg", "audio/x-m4a", "audio/mp4"}
+
+router = APIRouter(tags=["stickers"])
+
+# ─────────────────────────────────────────────────────────────────────────────
+# WhatsApp Sticker Generation
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _resolve_media_kind(upload: Union[UploadFile, UploadSession, SpooledFile]) -> str:
+    """Determine if upload is image, video, or audio."""
+    content_type = (upload.content_type or "").split(";")[0].lower()
+    suffix = (Path(upload.filename or "").suffix or "").lower()
+    
+    if content_type in IMAGE_MIME_TYPES or suffix in {".png", ".jpg", ".jpeg", ".webp"}:
+        return "image"
+    if content_type in VIDEO_MIME_TYPES or suffix in {".mp4", ".mov", ".mkv", ".webm"}:
+        return "video"
+    if content_type in AUDIO_MIME_TYPES or suffix in {".mp3", ".wav", ".m4a", ".ogg"}:
+        return "audio"
+    
+    raise HTTPException(
+        status_code=400,
+        detail="Unsupported media type. Please upload an image, video, or audio file.",
+    )
+
+
+def _generate_static_sticker(image_bytes: bytes, preset: str = DEFAULT_STICKER_PRESET) -> io.BytesIO:
+    """Generate static WebP sticker from image, sized to WhatsApp's static limit."""
+    with stage("sticker_image", "decode"):
+        image = load_image(image_bytes, min_size=(MAX_STICKER_DIMENSION, MAX_STICKER_DIMENSION)).convert("RGBA")
+        sticker = ImageOps.fit(image, (MAX_STICKER_DIMENSION, MAX_STICKER_DIMENSION), Image.LANCZOS)
+    with stage("sticker_image", "encode"):
+        buffer = io.BytesIO(encode_static_webp(sticker, preset).data)
+    buffer.seek(0)
+    return buffer
+
+
+def _generate_tray_icon(sticker: bytes) -> bytes:
+    """96x96 PNG tray icon from a finished sticker (the first frame of an animated one)."""
+    with Image.open(io.BytesIO(sticker)) as image:
+        frame = image.convert("RGBA")
+    icon = downscale_pyramid(frame, [TRAY_ICON_DIMENSION])[0]
+    buffer = io.BytesIO()
+    icon.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def _generate_video_sticker(
+    temp_path: str,
+    skip_duplicate_frames: bool = True,
+    preset: str = DEFAULT_STICKER_PRESET,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> io.BytesIO:
+    """Generate animated WebP sticker from video, encoding frames as they are decoded; progress(frames, expected frames)."""
+    try:
+        with stage("sticker_video", "open"):
+            source = open_video_source(
+                temp_path, MAX_STICKER_DIMENSION, MAX_STICKER_FPS, MAX_VIDEO_DURATION_SECONDS
+            )
+        with source:
+            return _encode_video_sticker(source, skip_duplicate_frames, preset, progress)
+    except VideoDecodeError as exc:
+        if VIDEO_DECODER == "moviepy":
+            raise
+        logger.warning("ffmpeg decoder failed (%s); retrying with moviepy", exc)
+    with MoviepyVideoSource(temp_path, MAX_STICKER_DIMENSION, MAX_STICKER_FPS, MAX_VIDEO_DURATION_SECONDS) as source:
+        return _encode_video_sticker(source, skip_duplicate_frames, preset, progress)
+
+
+def _encode_video_sticker(
+    source,
+    skip_duplicate_frames: bool,
+    preset: str,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> io.BytesIO:
+    """Stream a frame source (see video_decoder.py) into an animated WebP."""
+    if source.duration <= 0:
+        raise HTTPException(status_code=400, detail="Video duration is too short to convert.")
+    if source.duration > MAX_VIDEO_DURATION_SECONDS:
+        raise HTTPException(status_code=400, detail="Video must be 6 seconds or shorter.")
+
+    fps = source.fps
+    frame_duration = max(int(1000 / fps), 1)
+    frames = source.frames()
+    expected_frames = int(source.end_time * fps) + 1
+    
+    # Pick lossy/lossless and quality on a short probe, then stream the whole clip
+    with stage("sticker_video", "probe"):
+        # The ffmpeg source reuses its frame buffer, so held frames are copies
+        probe_frames = [frame.copy() for _, frame in zip(range(PROBE_FRAMES), frames)]
+        settings = choose_animated_settings(probe_frames, frame_duration, expected_frames, preset)
+    writer = AnimatedWebPWriter(
+        (MAX_STICKER_DIMENSION, MAX_STICKER_DIMENSION),
+        frame_duration=frame_duration,
+        lossless=settings.lossless,
+        quality=settings.quality,
+        method=settings.method,
+        skip_duplicate_frames=skip_duplicate_frames,
+    )
+    with stage("sticker_video", "encode"):
+        for frame in probe_frames:
+            writer.add_frame(frame)
+    frames_done = len(probe_frames)
+    del probe_frames
+    # Decoding and encoding interleave per frame, so split the loop's time between the two stages
+    decode_seconds = encode_seconds = 0.0
+    while True:
+        started = time.perf_counter()
+        frame = next(frames, None)
+        decoded = time.perf_counter()
+        if frame is None:
+            break
+        writer.add_frame(frame)
+        decode_seconds += decoded - started
+        encode_seconds += time.perf_counter() - decoded
+        frames_done += 1
+        if progress is not None:
+            progress(frames_done, expected_frames)
+    observe_stage("sticker_video", "decode", decode_seconds)
+    observe_stage("sticker_video", "encode", encode_seconds)
+    
+    if not writer.frames_added:
+        raise HTTPException(status_code=400, detail="Unable to read frames from video.")
+    
+    with stage("sticker_video", "serialize"):
+        buffer = io.BytesIO(writer.finish())
+    buffer.seek(0)
+    return buffer
+
+
+def _check_sticker_media(info: MediaInfo) -> None:
+    """Reject media the sticker pipeline cannot use, going by its container header."""
+    if info.kind is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Unsupported media type. Please upload an image, video, or audio file.",
+        )
+    if info.kind == "image" and info.width and info.width * info.height > MAX_IMAGE_PIXELS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image is too large ({info.width}x{info.height}). Maximum is {MAX_IMAGE_PIXELS} pixels.",
+        )
+    if info.kind == "video" and info.duration is not None:
+        if info.duration <= 0:
+            raise HTTPException(status_code=400, detail="Video duration is too short to convert.")
+        if info.duration > MAX_VIDEO_DURATION_SECONDS:
+            raise HTTPException(status_code=400, detail="Video must be 6 seconds or shorter.")
+
+
+def _sticker_memory_estimate(upload: SpooledFile, media_kind: str, info: Optional[MediaInfo] = None) -> int:
+    """Working memory of a sticker request for admission control (reads image headers; use run_io)."""
+    if media_kind == "image":
+        return image_memory(upload, STICKER_BYTES_PER_PIXEL)
+    if media_kind == "video":
+        width, height = (info.width, info.height) if info and info.width else VIDEO_DECODE_SIZE
+        decode_bytes = VIDEO_DECODE_FRAMES * width * height * 3
+        return upload.size + decode_bytes + VIDEO_FRAMES_HELD * STICKER_FRAME_BYTES
+    return upload.size + AUDIO_TRANSCODE_BYTES
+
+
+async def _make_sticker(
+    upload: SpooledFile,
+    media_kind: str,
+    skip_duplicate_frames: bool = True,
+    preset: str = DEFAULT_STICKER_PRESET,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Tuple[bytes, str, str]:
+    """Produce a sticker (or audio preview) from a spooled upload; returns (data, media type, extension)."""
+    if media_kind == "image":
+        image_bytes = await run_io(upload.read_bytes)
+        if not image_bytes:
+            raise HTTPException(status_code=400, detail="Uploaded image is empty.")
+        cache_key = await run_io(
+            result_cache.make_key, "sticker_image", image_bytes, size=MAX_STICKER_DIMENSION, preset=preset
+        )
+        
+        async def compute_image_sticker() -> bytes:
+            return (await run_cpu(_generate_static_sticker, image_bytes, preset)).getvalue()
+        
+        data = await result_cache.get_or_compute("sticker_image", cache_key, compute_image_sticker)
+        return data, "image/webp", ".webp"
+    
+    if upload.size == 0:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+    
+    if media_kind == "video":
+        # ffmpeg (or moviepy) reads the clip from a path
+        temp_path = await run_io(upload.spill)
+        cache_key = await run_io(
+            result_cache.make_key, "sticker_video", upload,
+            size=MAX_STICKER_DIMENSION, max_duration=MAX_VIDEO_DURATION_SECONDS,
+            skip_duplicate_frames=skip_duplicate_frames, preset=preset,
+        )
+        
+        async def compute_video_sticker() -> bytes:
+            return (await run_cpu(_generate_video_sticker, temp_path, skip_duplicate_frames, preset, progress)).getvalue()
+        
+        data = await result_cache.get_or_compute("sticker_video", cache_key, compute_video_sticker)
+        return data, "image/webp", ".webp"
+    
+    if media_kind == "audio":
+        cache_key = await run_io(
+            result_cache.make_key, "sticker_audio", upload, max_duration=MAX_AUDIO_DURATION_SECONDS,
+        )
+        # ffmpeg does the work in its own process; this only waits on its pipes
+        data = await result_cache.get_or_compute(
+            "sticker_audio", cache_key, lambda: run_io(render_audio_preview, upload, MAX_AUDIO_DURATION_SECONDS)
+        )
+        return data, "audio/mpeg", ".mp3"
+    
+    raise HTTPException(status_code=400, detail="Unable to determine media type for processing.")
+
+
+async def _audio_preview_response(upload: SpooledFile, original_name: str) -> StreamingResponse:
+    """
+    Stream an audio preview to the client while ffmpeg is still producing it.
+
+    The media slot, the ffmpeg process and the upload are held until the
+    body has been sent (or the client goes away), not just until the
+    handler returns. The first chunk is read before responding so that a
+    failed conversion still gets a proper error status.
+    """
+    resources = AsyncExitStack()
+    resources.callback(upload.cleanup)
+    try:
+        if upload.size == 0:
+            raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+        memory = await run_io(_sticker_memory_estimate, upload, "audio")
+        await resources.enter_async_context(admission.admit("media", memory))
+        cache_key = await run_io(
+            result_cache.make_key, "sticker_audio", upload, max_duration=MAX_AUDIO_DURATION_SECONDS,
+        )
+        headers = {"Content-Disposition": f'attachment; filename="{sanitize_filename(original_name, ".mp3")}"'}
+        cached = await run_io(result_cache.get, "sticker_audio", cache_key) if RESULT_CACHE_ENABLED else None
+        if cached is not None:
+            await resources.aclose()
+            return spooled_response(cached, "audio/mpeg", headers)
+
+        started = time.perf_counter()
+        preview = await run_io(AudioPreview, upload, MAX_AUDIO_DURATION_SECONDS)
+        resources.push_async_callback(run_io, preview.close)
+        first_chunk = await run_io(preview.read)
+        if not first_chunk:
+            await run_io(preview.finish)
+        observe_stage("sticker_audio", "first_byte", time.perf_counter() - started)
+    except BaseException:
+        await resources.aclose()
+        raise
+
+    async def body() -> AsyncIterator[bytes]:
+        chunks = [first_chunk]
+        try:
+            yield first_chunk
+            while True:
+                chunk = await run_io(preview.read)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                yield chunk
+            await run_io(preview.finish)
+            observe_stage("sticker_audio", "transcode", time.perf_counter() - started)
+            if RESULT_CACHE_ENABLED:
+                await run_io(result_cache.set, "sticker_audio", cache_key, b"".join(chunks))
+        except Exception as exc:
+            # Headers are already sent; all that is left is to cut the response short
+            logger.error("Audio preview failed mid-stream: %s", exc)
+            raise
+        finally:
+            await resources.aclose()
+
+    return StreamingResponse(body(), media_type="audio/mpeg", headers=headers)
+
+
+@router.post("/stickers/whatsapp")
+async def create_whatsapp_sticker(
+    media: Optional[UploadFile] = File(None),
+    skip_duplicate_frames: bool = Form(True, description="Merge identical consecutive video frames"),
+    preset: str = Form(DEFAULT_STICKER_PRESET, description="WebP encode preset: 'fast', 'balanced' or 'max'"),
+    upload_id: Optional[str] = Form(None, description=UPLOAD_ID_DESCRIPTION),
+):
+    """Create WhatsApp-compatible sticker from image, video, or audio."""
+    media = await upload_source(media, upload_id)
+    if preset not in STICKER_PRESETS:
+        raise HTTPException(status_code=400, detail=f"Invalid preset. Expected one of: {', '.join(STICKER_PRESETS)}")
+    
+    # The declared type only screens out obvious mismatches; the probed header decides
+    media_kind = _resolve_media_kind(media)
+    original_name = media.filename or media.content_type or "sticker"
+    # Video and audio hold decoders and many frames; keep them in their own, smaller class
+    endpoint_class = "image" if media_kind == "image" else "media"
+    admission.reject_if_full(endpoint_class)
+    
+    try:
+        probe = MediaProbe(on_probed=_check_sticker_media)
+        upload = await receive_upload(media, on_chunk=probe.feed)
+        info = None
+        if upload.size:
+            try:
+                info = await run_io(probe.finish, upload)
+            except BaseException:
+                upload.cleanup()
+                raise
+            media_kind = info.kind
+            endpoint_class = "image" if media_kind == "image" else "media"
+        if media_kind == "audio":
+            return await _audio_preview_response(upload, original_name)
+        try:
+            memory = await run_io(_sticker_memory_estimate, upload, media_kind, info)
+            async with admission.admit(endpoint_class, memory):
+                data, media_type, extension = await _make_sticker(upload, media_kind, skip_duplicate_frames, preset)
+        finally:
+            upload.cleanup()
+        
+        download_name = sanitize_filename(original_name, extension)
+        return StreamingResponse(
+            io.BytesIO(data),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{download_name}"'},
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as exc:
+        logger.error("Error generating WhatsApp sticker: %s", exc, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to create WhatsApp sticker.")
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Sticker Packs
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _check_pack_media(info: MediaInfo) -> None:
+    _check_sticker_media(info)
+    if info.kind == "audio":
+        raise HTTPException(status_code=400, detail="Sticker packs take images and videos only.")
+
+
+def _pack_entry_name(index: int, upload: SpooledFile) -> str:
+    # Numbered by upload position: entries arrive in the order they finish
+    return f"{index + 1:02d}_{sanitize_filename(upload.filename, '.webp')}"
+
+
+async def _spool_pack_media(files: List[UploadSource], resources: AsyncExitStack) -> Tuple[List[SpooledFile], List[MediaInfo]]:
+    """Spool and probe every upload, rejecting the pack on the first unusable one."""
+    uploads: List[SpooledFile] = []
+    infos: List[MediaInfo] = []
+    for position, file in enumerate(files, start=1):
+        name = file.filename or f"file {position}"
+        probe = MediaProbe(on_probed=_check_pack_media)
+        try:
+            upload = await receive_upload(file, on_chunk=probe.feed)
+            resources.callback(upload.cleanup)
+            if upload.size == 0:
+                raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+            info = await run_io(probe.finish, upload)
+        except HTTPException as exc:
+            raise HTTPException(status_code=exc.status_code, detail=f"{name}: {exc.detail}")
+        uploads.append(upload)
+        infos.append(info)
+    return uploads, infos
+
+
+def _sticker_pack_memory_estimate(uploads: List[SpooledFile], infos: List[MediaInfo]) -> int:
+    """All uploads plus the largest sticker's working memory for every slot of the window (use run_io)."""
+    largest = max(
+        _sticker_memory_estimate(upload, info.kind, info) - upload.size for upload, info in zip(uploads, infos)
+    )
+    return sum(upload.size for upload in uploads) + largest * min(len(uploads), PACK_WINDOW)
+
+
+async def _generate_pack_stickers(
+    uploads: List[SpooledFile],
+    infos: List[MediaInfo],
+    skip_duplicate_frames: bool,
+    preset: str,
+) -> AsyncIterator[Tuple[int, bytes]]:
+    """Yield (upload index, sticker) as each one finishes, keeping PACK_WINDOW of them on the CPU pool."""
+    queued = deque(range(len(uploads)))
+    running: Dict[asyncio.Future, int] = {}
+    try:
+        while queued or running:
+            while queued and len(running) < PACK_WINDOW:
+                index = queued.popleft()
+                future = asyncio.ensure_future(
+                    _make_sticker(uploads[index], infos[index].kind, skip_duplicate_frames, preset)
+                )
+                running[future] = index
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in sorted(done, key=running.get):
+                index = running.pop(future)
+                yield index, future.result()[0]
+    finally:
+        # Pool work cannot be called off once a worker has it, and it reads the uploads'
+        # temp files; let the stickers in flight (one window at most) finish first. Shielded,
+        # as Starlette cancels the body on disconnect and would cancel this wait too.
+        with anyio.CancelScope(shield=True):
+            await asyncio.gather(*running, return_exceptions=True)
+
+
+async def _sticker_pack_response(
+    files: List[UploadSource],
+    tray_index: int,
+    skip_duplicate_frames: bool,
+    preset: str,
+) -> StreamingResponse:
+    """
+    Stream a zip of stickers, plus tray.png, in the order the stickers finish.
+
+    As for audio previews, the uploads and the admission slot are held
+    until the body has been sent, and the first sticker is produced before
+    responding so that a pack failing outright still gets an error status.
+    A sticker failing after that cuts the archive short.
+    """
+    resources = AsyncExitStack()
+    try:
+        uploads, infos = await _spool_pack_media(files, resources)
+        endpoint_class = "media" if any(info.kind == "video" for info in infos) else "image"
+        memory = await run_io(_sticker_pack_memory_estimate, uploads, infos)
+        await resources.enter_async_context(admission.admit(endpoint_class, memory))
+
+        started = time.perf_counter()
+        stickers = await resources.enter_async_context(
+            aclosing(_generate_pack_stickers(uploads, infos, skip_duplicate_frames, preset))
+        )
+        first = await anext(stickers)
+        observe_stage("sticker_pack", "first_sticker", time.perf_counter() - started)
+    except BaseException:
+        await resources.aclose()
+        raise
+
+    async def entries() -> AsyncIterator[Tuple[str, bytes]]:
+        yield _pack_entry_name(first[0], uploads[first[0]]), first[1]
+        if first[0] == tray_index:
+            yield "tray.png", await run_cpu(_generate_tray_icon, first[1])
+        async for index, sticker in stickers:
+            yield _pack_entry_name(index, uploads[index]), sticker
+            if index == tray_index:
+                yield "tray.png", await run_cpu(_generate_tray_icon, sticker)
+
+    async def body() -> AsyncIterator[bytes]:
+        archive = StreamingZip()
+        try:
+            async with aclosing(entries()) as items:
+                async for name, data in items:
+                    yield await run_io(archive.add, name, data)
+            yield archive.finish()
+            observe_stage("sticker_pack", "pack", time.perf_counter() - started)
+        except Exception as exc:
+            # Headers are already sent; all that is left is to cut the response short
+            logger.error("Sticker pack failed mid-stream: %s", exc)
+            raise
+        finally:
+            await resources.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="sticker_pack.zip"'},
+    )
+
+
+@router.post("/stickers/whatsapp/pack")
+async def create_whatsapp_sticker_pack(
+    media: Optional[List[UploadFile]] = File(None),
+    tray_index: int = Form(0, description="Upload (0-based) whose sticker becomes the 96x96 tray icon"),
+    skip_duplicate_frames: bool = Form(True, description="Merge identical consecutive video frames"),
+    preset: str = Form(DEFAULT_STICKER_PRESET, description="WebP encode preset: 'fast', 'balanced' or 'max'"),
+    upload_id: Optional[List[str]] = Form(None, description=UPLOAD_IDS_DESCRIPTION),
+):
+    """Create a WhatsApp sticker pack from 3-30 images/videos, streamed as a zip while the stickers are made."""
+    media = await upload_sources(media, upload_id)
+    if not MIN_PACK_STICKERS <= len(media) <= MAX_PACK_STICKERS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A sticker pack needs {MIN_PACK_STICKERS} to {MAX_PACK_STICKERS} files, got {len(media)}.",
+        )
+    if preset not in STICKER_PRESETS:
+        raise HTTPException(status_code=400, detail=f"Invalid preset. Expected one of: {', '.join(STICKER_PRESETS)}")
+    if not 0 <= tray_index < len(media):
+        raise HTTPException(status_code=400, detail=f"tray_index must be between 0 and {len(media) - 1}.")
+    
+    kinds = [_resolve_media_kind(file) for file in media]
+    if "audio" in kinds:
+        raise HTTPException(status_code=400, detail="Sticker packs take images and videos only.")
+    admission.reject_if_full("media" if "video" in kinds else "image")
+    
+    try:
+        return await _sticker_pack_response(media, tray_index, skip_duplicate_frames, preset)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        logger.error("Error generating WhatsApp sticker pack: %s", exc, exc_info=True)
+        raise HTTPException(status_code=500, detail="Failed to create WhatsApp sticker pack.")
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Background Jobs
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _prepare_sticker_job(files: List[SpooledFile], fields: Dict[str, str]) -> Dict[str, Any]:
+    upload = single_file(files)
+    media_kind = _resolve_media_kind(upload)
+    if upload.size:
+        info = probe_upload(upload)
+        _check_sticker_media(info)
+        media_kind = info.kind
+    preset = fields.get("preset", DEFAULT_STICKER_PRESET)
+    if preset not in STICKER_PRESETS:
+        raise HTTPException(400, f"Invalid preset. Expected one of: {', '.join(STICKER_PRESETS)}")
+    return {
+        "media_kind": media_kind,
+        "skip_duplicate_frames": form_bool(fields.get("skip_duplicate_frames"), True),
+        "preset": preset,
+    }
+
+
+async def _run_sticker_job(
+    files: List[SpooledFile], media_kind: str, skip_duplicate_frames: bool, preset: str, progress: JobProgress,
+) -> JobOutput:
+    data, media_type, extension = await _make_sticker(files[0], media_kind, skip_duplicate_frames, preset, progress)
+    return JobOutput(data, media_type, sanitize_filename(files[0].filename, extension))
+
+
+def register_jobs(queue: JobQueue) -> None:
+    """Register the sticker job kind; video/audio stickers take seconds of CPU each, static images are quick."""
+    queue.register(
+        "sticker", _run_sticker_job, _prepare_sticker_job,
+        priority=lambda files, kwargs: "normal" if kwargs["media_kind"] == "image" else "low",
+        reports_progress=True,
+    )
@@ -0,0 +1,162 @@
+"""
+MP3 previews for audio stickers, produced by a single ffmpeg process.
+
+The upload is piped into ffmpeg's stdin and the trimmed MP3 is read from its
+stdout as ffmpeg produces it, so a preview can be streamed to the client
+while it is still being made and nothing is written to disk:
+- MP3 sources are stream-copied: frames up to the trim point are cut out,
+  not decoded and re-encoded
+- anything else is transcoded to 128 kb/s, 44.1 kHz MP3
+
+Uploads that already spilled to disk are read from their path instead of
+the pipe. So are MP4/M4A uploads, which ffmpeg can only demux from a
+seekable file (their index may sit at the end).
+
+ffmpeg is located as for video (FFMPEG_BINARY, see video_decoder.py).
+"""
+
+from fastapi import HTTPException
+from pathlib import Path
+from typing import Iterator, Optional
+import subprocess
+import threading
+import tempfile
+import logging
+
+from media_probe import probe_upload
+from uploads import SPOOL_CHUNK_SIZE, SpooledFile
+from video_decoder import ffmpeg_binary
+
+logger = logging.getLogger(__name__)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Configuration & Constants
+# ─────────────────────────────────────────────────────────────────────────────
+
+PREVIEW_BITRATE = "128k"
+PREVIEW_SAMPLE_RATE = 44100
+# Bytes per read from ffmpeg's stdout; small, so the first bytes reach the client early
+PREVIEW_CHUNK_SIZE = 64 * 1024
+
+# Containers ffmpeg has to seek in, so they are never piped
+SEEKABLE_SUFFIXES = {".m4a", ".mp4", ".m4b", ".mov", ".3gp"}
+SEEKABLE_MIME_TYPES = {"audio/mp4", "audio/x-m4a", "audio/m4a", "video/mp4", "video/quicktime"}
+
+
+class AudioPreviewError(Exception):
+    """ffmpeg could not be run or failed to produce the preview."""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Source Inspection
+# ─────────────────────────────────────────────────────────────────────────────
+
+def is_mp3(upload: SpooledFile) -> bool:
+    """Whether the upload is an MPEG Layer III stream, going by its headers (see media_probe.py)."""
+    return probe_upload(upload).codec == "mp3"
+
+
+def needs_seekable_input(upload: SpooledFile) -> bool:
+    content_type = (upload.content_type or "").split(";")[0].lower()
+    suffix = Path(upload.filename or "").suffix.lower() or upload.suffix.lower()
+    return content_type in SEEKABLE_MIME_TYPES or suffix in SEEKABLE_SUFFIXES
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Preview Process
+# ─────────────────────────────────────────────────────────────────────────────
+
+class AudioPreview:
+    """One ffmpeg process turning an upload into an MP3 preview of at most max_duration seconds."""
+
+    def __init__(self, upload: SpooledFile, max_duration: float):
+        self.stream_copy = is_mp3(upload)
+        if upload.in_memory and needs_seekable_input(upload):
+            upload.spill()
+        piped = upload.in_memory
+        self.bytes_read = 0
+        self._errors = tempfile.TemporaryFile()
+        command = [
+            ffmpeg_binary(), "-v", "error", "-nostdin",
+            # As an input option -t stops reading the source at the trim point
+            "-t", str(max_duration), "-i", "pipe:0" if piped else upload.path,
+            "-map", "0:a:0", "-map_metadata", "-1",
+            *(["-c:a", "copy"] if self.stream_copy else
+              ["-c:a", "libmp3lame", "-b:a", PREVIEW_BITRATE, "-ar", str(PREVIEW_SAMPLE_RATE)]),
+            "-f", "mp3", "pipe:1",
+        ]
+        try:
+            self._process = subprocess.Popen(
+                command,
+                stdin=subprocess.PIPE if piped else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=self._errors,
+                bufsize=0,
+            )
+        except OSError as exc:
+            self._errors.close()
+            raise AudioPreviewError(f"Could not run ffmpeg: {exc}") from exc
+        self._feeder: Optional[threading.Thread] = None
+        if piped:
+            self._feeder = threading.Thread(target=self._feed, args=(upload,), name="audio-preview-feed", daemon=True)
+            self._feeder.start()
+
+    def _feed(self, upload: SpooledFile) -> None:
+        try:
+            for chunk in upload.iter_chunks(SPOOL_CHUNK_SIZE):
+                self._process.stdin.write(chunk)
+        except (BrokenPipeError, ValueError, OSError):
+            # ffmpeg stops reading once it reaches the trim point (or fails, or was killed)
+            pass
+        finally:
+            try:
+                self._process.stdin.close()
+            except OSError:
+                pass
+
+    def read(self) -> bytes:
+        """Next chunk of MP3 as soon as ffmpeg writes it; b"" once the preview is complete (see finish())."""
+        chunk = self._process.stdout.read(PREVIEW_CHUNK_SIZE)
+        self.bytes_read += len(chunk)
+        return chunk
+
+    def finish(self) -> None:
+        """Wait for ffmpeg after stdout is drained; raises if it failed or produced no audio."""
+        returncode = self._process.wait()
+        if returncode != 0:
+            self._errors.seek(0)
+            message = self._errors.read().decode("utf-8", "replace").strip()[-500:]
+            raise AudioPreviewError(f"ffmpeg exited with {returncode}: {message}")
+        if not self.bytes_read:
+            raise HTTPException(status_code=400, detail="Audio duration is too short to convert.")
+
+    def chunks(self) -> Iterator[bytes]:
+        try:
+            while True:
+                chunk = self.read()
+                if not chunk:
+                    break
+                yield chunk
+            self.finish()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Stop ffmpeg if it is still running and release its pipes; safe to call more than once."""
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.stdout.close()
+        self._process.wait()
+        if self._feeder is not None:
+            self._feeder.join()
+        self._errors.close()
+
+    def __enter__(self) -> "AudioPreview":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def render_audio_preview(upload: SpooledFile, max_duration: float) -> bytes:
+    """The whole preview at once, for callers that do not stream it (background jobs)."""
+    with AudioPreview(upload, max_duration) as preview:
+        return b"".join(preview.chunks())
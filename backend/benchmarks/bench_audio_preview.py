@@ -0,0 +1,112 @@
+"""
+Audio preview latency: the old moviepy temp-file path vs. the ffmpeg pipe.
+
+For WAV, MP3 and M4A versions of a synthetic tone sweep, times:
+- legacy - spill the upload to a temp file, decode it with moviepy's
+           AudioFileClip, write the MP3 to a second temp file, read it back
+- pipe   - audio_preview.AudioPreview: the upload piped into one ffmpeg
+           process (stream copy for MP3), output read from its stdout
+
+and reports p50 time to first byte (for legacy the whole preview has to
+exist before anything can be sent), p50 total time, and the bytes that go
+through temp files per request (upload spill + MP3 written and read back
+for legacy; only M4A, which ffmpeg must seek in, is spilled by the pipe).
+
+Usage (from backend/):
+    python -m benchmarks.bench_audio_preview
+    python -m benchmarks.bench_audio_preview --seconds 180 --repeat 10
+"""
+
+from pathlib import Path
+import numpy as np
+import subprocess
+import argparse
+import tempfile
+import time
+import os
+
+import imageio_ffmpeg
+
+from api.stickers import MAX_AUDIO_DURATION_SECONDS
+from audio_preview import AudioPreview, needs_seekable_input
+from benchmarks.fixtures import write_audio
+from uploads import SpooledFile
+
+FORMATS = {
+    "wav": ("audio/wav", []),
+    "mp3": ("audio/mpeg", ["-c:a", "libmp3lame", "-b:a", "192k"]),
+    "m4a": ("audio/x-m4a", ["-c:a", "aac", "-b:a", "160k"]),
+}
+
+
+def legacy_preview(upload: SpooledFile) -> bytes:
+    """The pre-pipe implementation: moviepy between two temp files."""
+    from moviepy.editor import AudioFileClip
+
+    temp_path = upload.spill()
+    output_file = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
+    output_file.close()
+    try:
+        with AudioFileClip(temp_path) as audio_clip:
+            trimmed_clip = audio_clip.subclip(0, min(audio_clip.duration, MAX_AUDIO_DURATION_SECONDS))
+            trimmed_clip.write_audiofile(output_file.name, codec="libmp3lame", fps=44100, bitrate="128k", logger=None)
+            trimmed_clip.close()
+        return Path(output_file.name).read_bytes()
+    finally:
+        os.remove(output_file.name)
+
+
+def run_legacy(data: bytes, suffix: str, media_type: str):
+    upload = SpooledFile(data=data, suffix=suffix, content_type=media_type)
+    started = time.perf_counter()
+    try:
+        output = legacy_preview(upload)
+    finally:
+        upload.cleanup()
+    total = time.perf_counter() - started
+    return total, total, len(output), len(data) + 2 * len(output)
+
+
+def run_pipe(data: bytes, suffix: str, media_type: str):
+    upload = SpooledFile(data=data, suffix=suffix, content_type=media_type)
+    spilled = len(data) if needs_seekable_input(upload) else 0
+    started = time.perf_counter()
+    try:
+        with AudioPreview(upload, MAX_AUDIO_DURATION_SECONDS) as preview:
+            first = preview.read()
+            first_byte = time.perf_counter() - started
+            size = len(first) + sum(len(chunk) for chunk in preview.chunks())
+    finally:
+        upload.cleanup()
+    return first_byte, time.perf_counter() - started, size, spilled
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=60, help="length of the source audio")
+    parser.add_argument("--formats", nargs="+", default=list(FORMATS), choices=list(FORMATS))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'source':<8} {'path':<7} {'first byte (s)':>15} {'total (s)':>10} {'output KB':>10} {'temp I/O KB':>12}")
+    with tempfile.TemporaryDirectory() as workdir:
+        wav = os.path.join(workdir, "source.wav")
+        write_audio(wav, args.seconds)
+        for name in args.formats:
+            media_type, codec = FORMATS[name]
+            path = wav if name == "wav" else os.path.join(workdir, f"source.{name}")
+            if name != "wav":
+                subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error", "-y", "-i", wav, *codec, path], check=True)
+            data = Path(path).read_bytes()
+            for label, run in (("legacy", run_legacy), ("pipe", run_pipe)):
+                runs = [run(data, f".{name}", media_type) for _ in range(args.repeat)]
+                first_byte, total = (float(np.percentile([result[i] for result in runs], 50)) for i in (0, 1))
+                size, temp_bytes = runs[-1][2], runs[-1][3]
+                print(
+                    f"{name:<8} {label:<7} {first_byte:>15.3f} {total:>10.3f} "
+                    f"{size / 1024:>10.0f} {temp_bytes / 1024:>12.0f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Cold-start cost of the API: import time and time to first response.
+
+For each configuration, reports:
+- import     - `python -X importtime -c "import server"`: total import time
+               and the heaviest third-party packages
+- first ico  - seconds from launching uvicorn until the first /convert-ico/
+               request succeeds (process start + imports + lifespan start-up)
+- compress   - latency of the first and second /compress_image/ requests,
+               i.e. the first-use penalty of lazily imported dependencies
+
+Configurations:
+- lazy    - default settings; heavy imports load on first use
+- warmup  - WARMUP=all; heavy imports load during start-up
+
+--app-dir points at another checkout's backend/ to measure it the same way
+(e.g. a `git worktree` of the commit before a change).
+
+Usage (from backend/):
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --runs 5 --app-dir /tmp/before/backend
+"""
+
+from PIL import Image
+import subprocess
+import statistics
+import argparse
+import socket
+import httpx
+import time
+import sys
+import io
+import os
+
+CONFIGURATIONS = {
+    "lazy": {},
+    "warmup": {"WARMUP": "all"},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def image_bytes(format: str, size: int = 256) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), (40, 120, 200)).save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def import_profile(app_dir: str, env: dict, top: int) -> tuple:
+    """Total `import server` time in seconds and the slowest third-party packages."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=app_dir, env=env, capture_output=True, text=True, check=True,
+    )
+    # server only imports the api package, so report the heaviest top-level
+    # packages wherever they are first imported rather than server's direct imports
+    local = {os.path.splitext(entry)[0] for entry in os.listdir(app_dir)}
+    packages = {}
+    total = 0.0
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        seconds = int(cumulative) / 1e6
+        name = name.strip()
+        if name == "server":
+            total = seconds
+        elif "." not in name and name not in local and name not in sys.stdlib_module_names:
+            packages[name] = max(seconds, packages.get(name, 0.0))
+    return total, sorted(packages.items(), key=lambda item: -item[1])[:top]
+
+
+def first_responses(app_dir: str, env: dict, timeout: float) -> dict:
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    png, jpeg = image_bytes("PNG"), image_bytes("JPEG")
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            while True:
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError("server did not answer in time")
+                try:
+                    response = client.post("/convert-ico/", files={"file": ("icon.png", png, "image/png")})
+                except httpx.TransportError:
+                    time.sleep(0.02)
+                    continue
+                response.raise_for_status()
+                first_ico = time.perf_counter() - started
+                break
+
+            compress = []
+            for _ in range(2):
+                start = time.perf_counter()
+                response = client.post(
+                    "/compress_image/", data={"n_colors": "8"}, files={"file": ("photo.jpg", jpeg, "image/jpeg")},
+                )
+                response.raise_for_status()
+                compress.append(time.perf_counter() - start)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    return {"first_ico": first_ico, "first_compress": compress[0], "second_compress": compress[1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app-dir", default=os.getcwd(), help="backend/ directory to measure")
+    parser.add_argument("--configurations", nargs="+", default=list(CONFIGURATIONS), choices=list(CONFIGURATIONS))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=6, help="heaviest third-party packages to list")
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    # No Redis round trips and no result cache, so every request does the work
+    base_env = {**os.environ, "RESULT_CACHE_ENABLED": "0", "REDIS_URL": ""}
+    for name in args.configurations:
+        env = {**base_env, **CONFIGURATIONS[name]}
+        imports = [import_profile(args.app_dir, env, args.top) for _ in range(args.runs)]
+        responses = [first_responses(args.app_dir, env, args.timeout) for _ in range(args.runs)]
+
+        median = lambda key: statistics.median(run[key] for run in responses)
+        print(f"[{name}] {args.app_dir}")
+        print(f"  import server     {statistics.median(total for total, _ in imports):>7.2f}s")
+        for module, seconds in imports[-1][1]:
+            print(f"    {module:<22}{seconds:>6.2f}s")
+        print(f"  first /convert-ico/   {median('first_ico'):>7.2f}s after launch")
+        print(f"  /compress_image/      {median('first_compress'):>7.2f}s first, {median('second_compress'):.2f}s second")
+
+
+if __name__ == "__main__":
+    main()
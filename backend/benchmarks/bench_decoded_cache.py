@@ -0,0 +1,106 @@
+"""
+Decoded-image cache: one photo sent to several image endpoints in turn.
+
+Replays the ImgHub sequence /compress_image/ -> /convert-ico/ ->
+/stickers/whatsapp on the same upload by calling each endpoint's worker
+function (_compress_image_file, _convert_to_ico_file,
+_generate_static_sticker). Every step runs in a fresh pool worker process,
+so a cache hit is always one process reading pixels another one decoded.
+
+For JPEG and PNG photos of each size, reports per step, with the cache off
+and on:
+- decode ms - the endpoint's decode stage (hash + map on a hit)
+- total ms  - the whole worker function
+and, with the cache on, the hit/miss result and the cache's size afterwards.
+
+Usage (from backend/):
+    python -m benchmarks.bench_decoded_cache
+    python -m benchmarks.bench_decoded_cache --megapixels 1 12 24 --repeat 5
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import argparse
+import tempfile
+import time
+import os
+
+from benchmarks.fixtures import make_photo
+from image_cache import DecodedImageCache, decoded_images
+from metrics import collect_stage_samples
+from uploads import SpooledFile
+
+STEPS = ("compress_image", "convert_ico", "sticker_image")
+
+
+def configure_worker(directory: str, max_bytes: int) -> None:
+    decoded_images.directory = directory
+    decoded_images.max_bytes = max_bytes
+
+
+def run_step(step: str, path: str, data: bytes):
+    """Returns (decode seconds, total seconds, cache result) for one endpoint call in this worker."""
+    from api.images import _compress_image_file, _convert_to_ico_file
+    from api.stickers import _generate_static_sticker
+
+    started = time.perf_counter()
+    with collect_stage_samples() as samples:
+        if step == "compress_image":
+            _compress_image_file(SpooledFile(path=path), 16, "minibatch").cleanup()
+        elif step == "convert_ico":
+            _convert_to_ico_file(SpooledFile(path=path)).cleanup()
+        else:
+            _generate_static_sticker(data)
+    total = time.perf_counter() - started
+    decode = sum(seconds for operation, name, seconds in samples if operation == step and name == "decode")
+    lookups = [name for operation, name, _ in samples if operation == "decoded_image_cache" and name != "store"]
+    return decode, total, lookups[0] if lookups else "-"
+
+
+def run_session(path: str, data: bytes, directory: str, max_bytes: int):
+    results = []
+    for step in STEPS:
+        # One task per worker process: nothing carries over in memory between steps
+        with ProcessPoolExecutor(max_workers=1, initializer=configure_worker, initargs=(directory, max_bytes)) as pool:
+            results.append(pool.submit(run_step, step, path, data).result())
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[1.0, 12.0])
+    parser.add_argument("--formats", nargs="+", default=["jpeg", "png"], choices=["jpeg", "png"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'source':<12} {'step':<15} {'decode off':>11} {'decode on':>10} "
+        f"{'total off':>10} {'total on':>9} {'cache':>6} {'cache MB':>9}"
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        for megapixels in args.megapixels:
+            photo = make_photo(megapixels)
+            for image_format in args.formats:
+                path = os.path.join(workdir, f"photo.{image_format}")
+                photo.save(path, image_format.upper(), **({"quality": 90} if image_format == "jpeg" else {}))
+                data = open(path, "rb").read()
+                runs = {"off": [], "on": []}
+                for _ in range(args.repeat):
+                    for mode, max_bytes in (("off", 0), ("on", DecodedImageCache().max_bytes or 256 * 1024 * 1024)):
+                        directory = tempfile.mkdtemp(dir=workdir)
+                        runs[mode].append(run_session(path, data, directory, max_bytes))
+                        cache = DecodedImageCache(directory=directory, max_bytes=max_bytes)
+                        cached_bytes = cache.stats()["bytes"]
+                        cache.clear()
+                for index, step in enumerate(STEPS):
+                    off = np.median([[run[index][0], run[index][1]] for run in runs["off"]], axis=0)
+                    on = np.median([[run[index][0], run[index][1]] for run in runs["on"]], axis=0)
+                    print(
+                        f"{f'{megapixels:g}MP {image_format}':<12} {step:<15} {off[0] * 1000:>11.1f} {on[0] * 1000:>10.1f} "
+                        f"{off[1] * 1000:>10.1f} {on[1] * 1000:>9.1f} {runs['on'][-1][index][2]:>6} "
+                        f"{cached_bytes / 1e6:>9.1f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
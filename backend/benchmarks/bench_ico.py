@@ -0,0 +1,92 @@
+"""
+ICO encode time per size set for /convert-ico/.
+
+For each source photo (PNG, --megapixels) and icon size set, times:
+- independent - the old path: decode at full resolution and let Pillow's ICO
+                writer resample every size from the source
+- pyramid     - _convert_to_ico_file(): reduced-resolution decode, then one
+                downscale pyramid where each level comes from the previous
+
+and reports p50/p95 latency, the speedup and the ICO size.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ico
+    python -m benchmarks.bench_ico --megapixels 1 12 --size-sets 16,32,48 256 16,24,32,48,64,128,256
+"""
+
+from PIL import Image
+import numpy as np
+import argparse
+import tempfile
+import time
+import io
+import os
+
+from api.images import DEFAULT_ICO_SIZES, _convert_to_ico_file, parse_ico_sizes
+from benchmarks.fixtures import make_photo
+from image_cache import decoded_images
+from uploads import SpooledFile
+
+
+def independent_ico(path: str, sizes) -> int:
+    """The pre-pyramid encoder, with the requested sizes passed straight to Pillow."""
+    image = Image.open(path)
+    if image.mode not in ("RGB", "RGBA", "L", "LA"):
+        image = image.convert("RGBA")
+    buffer = io.BytesIO()
+    image.save(buffer, format="ICO", sizes=[(size, size) for size in sizes])
+    return len(buffer.getvalue())
+
+
+def pyramid_ico(path: str, sizes) -> int:
+    output = _convert_to_ico_file(SpooledFile(path=path, suffix=".png"), sizes)
+    try:
+        return output.size
+    finally:
+        output.cleanup()
+
+
+def time_runs(fn, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return np.percentile(timings, 50), np.percentile(timings, 95), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[1.0, 12.0])
+    parser.add_argument("--size-sets", nargs="+",
+                        default=["16,32,48", "256", ",".join(map(str, DEFAULT_ICO_SIZES))],
+                        help="comma-separated icon sizes, one set per argument")
+    parser.add_argument("--repeat", type=int, default=5)
+    # Every pass decodes, as a first request for the image would
+    decoded_images.max_bytes = 0
+    args = parser.parse_args()
+
+    size_sets = [parse_ico_sizes(spec) for spec in args.size_sets]
+    print(
+        f"{'source':<16} {'sizes':<28} {'path':<12} {'p50 (s)':>9} {'p95 (s)':>9} {'speedup':>8} {'ICO KB':>8}"
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        for mp in args.megapixels:
+            photo = make_photo(mp)
+            path = os.path.join(workdir, f"photo_{mp:g}mp.png")
+            photo.save(path, format="PNG")
+            source = f"{photo.width}x{photo.height}"
+            for sizes in size_sets:
+                label = ",".join(map(str, sizes))
+                baseline = None
+                for name, encode in (("independent", independent_ico), ("pyramid", pyramid_ico)):
+                    p50, p95, size = time_runs(lambda: encode(path, sizes), args.repeat)
+                    baseline = baseline or p50
+                    print(
+                        f"{source:<16} {label:<28} {name:<12} {p50:>9.3f} {p95:>9.3f} "
+                        f"{baseline / p50:>7.1f}x {size / 1024:>8.1f}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Full decode vs. reduced-resolution decode for oversized JPEG uploads.
+
+Generates 4K (3840x2160) and 12 MP (4000x3000) JPEGs and times the old
+path (Image.open + convert + resize/fit at full resolution) against
+image_loader.load_image() with the sticker (512x512) and ICO (256x256)
+targets, reporting p50 latency and the speedup.
+
+Usage (from backend/):
+    python -m benchmarks.bench_image_loading
+    python -m benchmarks.bench_image_loading --repeat 20
+"""
+
+from PIL import Image, ImageOps
+import numpy as np
+import argparse
+import statistics
+import time
+import io
+
+from image_loader import load_image
+
+SOURCES = {"4K": (3840, 2160), "12MP": (4000, 3000)}
+TARGETS = {"sticker": (512, 512), "ico": (256, 256)}
+
+
+def make_jpeg(width: int, height: int) -> bytes:
+    """Photo-like JPEG: smooth gradients plus sensor noise."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    pixels = np.stack([
+        128 + 100 * np.sin(x / 150),
+        128 + 100 * np.cos(y / 110),
+        (x + y) / (width + height) * 255,
+    ], axis=-1) + rng.normal(0, 6, size=(height, width, 3))
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def full_decode(data: bytes, target) -> Image.Image:
+    image = Image.open(io.BytesIO(data)).convert("RGBA")
+    return ImageOps.fit(image, target, Image.LANCZOS)
+
+
+def reduced_decode(data: bytes, target) -> Image.Image:
+    image = load_image(data, min_size=target, cache=False).convert("RGBA")
+    return ImageOps.fit(image, target, Image.LANCZOS)
+
+
+def p50(func, data: bytes, target, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data, target)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'source':<6} {'target':<8} {'full p50':>10} {'reduced p50':>12} {'speedup':>8}")
+    for source, (width, height) in SOURCES.items():
+        data = make_jpeg(width, height)
+        for target_name, target in TARGETS.items():
+            full = p50(full_decode, data, target, args.repeat)
+            reduced = p50(reduced_decode, data, target, args.repeat)
+            print(f"{source:<6} {target_name:<8} {full * 1000:>8.1f}ms {reduced * 1000:>10.1f}ms {full / reduced:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Time and peak memory of /convert-to-pdf/ implementations on a photo batch.
+
+Writes --count synthetic photo JPEGs to a temp directory and converts them
+with each implementation in a fresh subprocess, reporting wall time and
+the subprocess's peak RSS (VmHWM from /proc, so Linux only):
+- legacy          - the original path: decode every image with Pillow, keep
+                    them all open and save one PDF with append_images
+- reencode        - image_pdf.images_to_pdf() with JPEG passthrough off
+                    (PDF_JPEG_PASSTHROUGH=0): decode and re-encode every page
+- pipeline        - images_to_pdf() with JPEG passthrough; both run on the
+                    thread pool (CPU_POOL_SIZE=0, so all work is in the
+                    measured process)
+- pipeline-pool   - images_to_pdf() on the process pool (time only; peak
+                    RSS excludes the workers)
+
+Usage (from backend/):
+    python -m benchmarks.bench_images_to_pdf
+    python -m benchmarks.bench_images_to_pdf --count 200 --width 3000 --height 2000
+"""
+
+from PIL import Image
+import numpy as np
+import subprocess
+import argparse
+import tempfile
+import asyncio
+import shutil
+import time
+import json
+import sys
+import os
+
+IMPLEMENTATIONS = {
+    "legacy": {"CPU_POOL_SIZE": "0"},
+    "reencode": {"CPU_POOL_SIZE": "0", "PDF_JPEG_PASSTHROUGH": "0"},
+    "pipeline": {"CPU_POOL_SIZE": "0"},
+    "pipeline-pool": {},
+}
+
+
+def make_photos(directory: str, count: int, width: int, height: int) -> list:
+    """Photo-like JPEGs: smooth gradients plus sensor noise, quality 90."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([128 + 100 * np.sin(x / 150), 128 + 100 * np.cos(y / 110), (x + y) / (width + height) * 255], axis=-1)
+    paths = []
+    for index in range(count):
+        pixels = np.clip(base + index * 3 + rng.normal(0, 6, size=base.shape), 0, 255).astype(np.uint8)
+        path = os.path.join(directory, f"photo_{index:03d}.jpg")
+        Image.fromarray(pixels).save(path, format="JPEG", quality=90)
+        paths.append(path)
+    return paths
+
+
+def legacy_images_to_pdf(paths: list, output: str) -> None:
+    pil_images = []
+    for path in paths:
+        img = Image.open(path)
+        if img.mode == 'RGBA':
+            img = img.convert('RGB')
+        pil_images.append(img)
+    pil_images[0].save(output, "PDF", save_all=True, append_images=pil_images[1:])
+
+
+def peak_rss_mb() -> float:
+    # VmHWM, unlike ru_maxrss, is not inherited from the parent across exec (Linux only)
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_one(implementation: str, paths: list, output: str) -> dict:
+    start = time.perf_counter()
+    if implementation == "legacy":
+        legacy_images_to_pdf(paths, output)
+    else:
+        from image_pdf import images_to_pdf
+        from uploads import SpooledFile
+        result = asyncio.run(images_to_pdf([SpooledFile(path=path, suffix=".jpg") for path in paths]))
+        with open(output, "wb") as handle:
+            for chunk in result.iter_chunks():
+                handle.write(chunk)
+        result.cleanup()
+    return {
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": peak_rss_mb(),
+        "output_mb": os.path.getsize(output) / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20)
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--implementations", nargs="+", default=list(IMPLEMENTATIONS), choices=list(IMPLEMENTATIONS))
+    parser.add_argument("--run", help=argparse.SUPPRESS)
+    parser.add_argument("--paths", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_one(args.run, args.paths, os.path.join(os.path.dirname(args.paths[0]), "out.pdf"))))
+        return
+
+    directory = tempfile.mkdtemp(prefix="bench_pdf_")
+    try:
+        paths = make_photos(directory, args.count, args.width, args.height)
+        input_mb = sum(os.path.getsize(path) for path in paths) / 1024 / 1024
+        print(f"{args.count} photos, {args.width}x{args.height}, {input_mb:.1f} MB of JPEG")
+        print(f"{'implementation':<15} {'time':>9} {'peak RSS':>10} {'output':>9}")
+        for implementation in args.implementations:
+            env = {**os.environ, **IMPLEMENTATIONS[implementation]}
+            completed = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_images_to_pdf", "--run", implementation, "--paths", *paths],
+                env=env, capture_output=True, text=True, check=True,
+            )
+            result = json.loads(completed.stdout.strip().splitlines()[-1])
+            print(
+                f"{implementation:<15} {result['seconds']:>8.2f}s {result['peak_rss_mb']:>8.0f}MB "
+                f"{result['output_mb']:>7.1f}MB"
+            )
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Cost of rejecting a sticker upload: header probe while spooling vs. the old path.
+
+For each rejected input, times what the sticker handler does between
+receiving the parsed upload and answering with an error:
+- legacy - spool the whole upload, spill it to a temp file, hash it for the
+           result cache key, then open it with the video decoder, which
+           probes the clip and rejects it (or fails and falls back to moviepy)
+- probe  - media_probe.MediaProbe fed by spool_upload(on_chunk=...): the
+           upload is rejected as soon as its container header has arrived
+
+Inputs (all declared as video/mp4):
+- long_faststart - over-length H.264 clip with its moov box up front
+- long_moov_end  - the same clip as most encoders write it, moov box last;
+                   the probe then has to read the header from the spooled file
+- unsupported    - random bytes
+
+Reports p50 milliseconds per rejected request, the upload bytes copied and
+the bytes written to temp files. Multipart parsing happens before either
+path and is the same for both, so it is not included.
+
+Usage (from backend/):
+    python -m benchmarks.bench_media_probe
+    python -m benchmarks.bench_media_probe --seconds 60 --resolution 1920x1080 --repeat 10
+"""
+
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+from pathlib import Path
+import numpy as np
+import subprocess
+import argparse
+import tempfile
+import asyncio
+import time
+import io
+import os
+
+import imageio_ffmpeg
+
+from api.common import result_cache
+from api.stickers import MAX_STICKER_DIMENSION, MAX_VIDEO_DURATION_SECONDS, _check_sticker_media, _generate_video_sticker
+from benchmarks.fixtures import write_video
+from executor import run_io
+from media_probe import MediaProbe
+from uploads import spool_upload
+
+
+def make_upload(data: bytes) -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename="clip.mp4", headers=Headers({"content-type": "video/mp4"}))
+
+
+async def reject_legacy(data: bytes):
+    """Returns (status, bytes copied, temp bytes written)."""
+    upload = await spool_upload(make_upload(data))
+    try:
+        temp_path = await run_io(upload.spill)
+        await run_io(
+            result_cache.make_key, "sticker_video", upload,
+            size=MAX_STICKER_DIMENSION, max_duration=MAX_VIDEO_DURATION_SECONDS,
+            skip_duplicate_frames=True, preset="fast",
+        )
+        try:
+            await run_io(_generate_video_sticker, temp_path, True, "fast")
+            status = 200
+        except HTTPException as exc:
+            status = exc.status_code
+        except Exception:
+            status = 500
+        # Spooled to disk one way or the other
+        return status, upload.size, upload.size
+    finally:
+        upload.cleanup()
+
+
+async def reject_probe(data: bytes):
+    probe = MediaProbe(on_probed=_check_sticker_media)
+    copied = [0]
+
+    def on_chunk(chunk: bytes) -> None:
+        copied[0] += len(chunk)
+        probe.feed(chunk)
+
+    try:
+        upload = await spool_upload(make_upload(data), on_chunk=on_chunk)
+    except HTTPException as exc:
+        return exc.status_code, copied[0], 0
+    try:
+        await run_io(probe.finish, upload)
+        return 200, copied[0], upload.size if upload.path else 0
+    except HTTPException as exc:
+        return exc.status_code, copied[0], upload.size if upload.path else 0
+    finally:
+        upload.cleanup()
+
+
+def measure(reject, data: bytes, repeat: int):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        status, copied, temp_bytes = asyncio.run(reject(data))
+        times.append(time.perf_counter() - started)
+    return float(np.percentile(times, 50)), status, copied, temp_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=60, help="length of the over-length clip")
+    parser.add_argument("--resolution", default="1920x1080")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    width, height = (int(part) for part in args.resolution.split("x"))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        moov_end = os.path.join(workdir, "long.mp4")
+        faststart = os.path.join(workdir, "long_faststart.mp4")
+        write_video(moov_end, args.seconds, width, height)
+        subprocess.run(
+            [imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error", "-y", "-i", moov_end, "-c", "copy",
+             "-movflags", "+faststart", faststart],
+            check=True,
+        )
+        inputs = {
+            "long_faststart": Path(faststart).read_bytes(),
+            "long_moov_end": Path(moov_end).read_bytes(),
+        }
+        inputs["unsupported"] = np.random.default_rng(0).bytes(len(inputs["long_moov_end"]))
+
+        print(f"{'input':<16} {'MB':>6} {'path':<7} {'status':>6} {'ms':>9} {'copied MB':>10} {'temp MB':>8} {'speedup':>8}")
+        for name, data in inputs.items():
+            baseline = None
+            for label, reject in (("legacy", reject_legacy), ("probe", reject_probe)):
+                seconds, status, copied, temp_bytes = measure(reject, data, args.repeat)
+                baseline = baseline or seconds
+                print(
+                    f"{name:<16} {len(data) / 1e6:>6.1f} {label:<7} {status:>6} {seconds * 1000:>9.1f} "
+                    f"{copied / 1e6:>10.1f} {temp_bytes / 1e6:>8.1f} {baseline / seconds:>7.1f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
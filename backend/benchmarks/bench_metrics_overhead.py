@@ -0,0 +1,106 @@
+"""
+Overhead of the /metrics instrumentation.
+
+Measures:
+- stage(): cost of one timed block, as a context manager and as a decorator,
+  against an empty function call
+- MetricsMiddleware: per-request latency of a trivial route with and without
+  the middleware, driven in-process through httpx's ASGI transport (no
+  sockets, so the difference is the middleware itself)
+- render_metrics(): time to render /metrics once the registry holds the
+  label sets from the request run
+
+Usage (from backend/):
+    python -m benchmarks.bench_metrics_overhead
+    python -m benchmarks.bench_metrics_overhead --calls 500000 --requests 5000
+"""
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from metrics import MetricsMiddleware, render_metrics, stage
+
+
+def per_call(func, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls
+
+
+def make_app(instrumented: bool) -> FastAPI:
+    app = FastAPI()
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+
+    @app.post("/echo/{name}")
+    async def echo(name: str):
+        return PlainTextResponse(name)
+
+    return app
+
+
+async def request_latencies(app: FastAPI, requests: int, body: bytes) -> list:
+    transport = httpx.ASGITransport(app=app)
+    timings = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for index in range(requests):
+            start = time.perf_counter()
+            response = await client.post(f"/echo/{index % 16}", content=body)
+            timings.append(time.perf_counter() - start)
+            response.raise_for_status()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--body-kb", type=int, default=64)
+    args = parser.parse_args()
+
+    def empty():
+        pass
+
+    @stage("bench", "decorated")
+    def decorated():
+        pass
+
+    def context_manager():
+        with stage("bench", "block"):
+            pass
+
+    baseline = per_call(empty, args.calls)
+    print(f"{'stage timer':<24} {'per call':>10} {'overhead':>10}")
+    for name, func in (("context manager", context_manager), ("decorator", decorated)):
+        elapsed = per_call(func, args.calls)
+        print(f"{name:<24} {elapsed * 1e6:>8.2f}us {(elapsed - baseline) * 1e6:>8.2f}us")
+
+    body = b"x" * (args.body_kb * 1024)
+    results = {}
+    for name, instrumented in (("without middleware", False), ("with middleware", True)):
+        # Warm up routing and the client before timing
+        asyncio.run(request_latencies(make_app(instrumented), 50, body))
+        timings = asyncio.run(request_latencies(make_app(instrumented), args.requests, body))
+        results[name] = timings
+
+    print(f"\n{'requests':<24} {'p50':>10} {'p95':>10}")
+    for name, timings in results.items():
+        p95 = statistics.quantiles(timings, n=20)[-1]
+        print(f"{name:<24} {statistics.median(timings) * 1e6:>8.1f}us {p95 * 1e6:>8.1f}us")
+    overhead = statistics.median(results["with middleware"]) - statistics.median(results["without middleware"])
+    print(f"{'middleware overhead':<24} {overhead * 1e6:>8.1f}us per request (p50)")
+
+    start = time.perf_counter()
+    text = render_metrics()
+    print(f"\nrender_metrics: {(time.perf_counter() - start) * 1000:.2f}ms for {len(text.splitlines())} lines")
+
+
+if __name__ == "__main__":
+    main()
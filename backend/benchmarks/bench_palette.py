@@ -0,0 +1,131 @@
+"""
+Palette engine benchmark for /compress_image/.
+
+Times compress_image() for each palette mode on a synthetic photo and
+reports p50/p95 latency, peak memory and PNG size per colour count. Peak
+memory is measured in a fresh process per configuration, as the RSS growth
+of one call after a warm-up on a tiny image (VmHWM reset via
+/proc/self/clear_refs, so Pillow's C allocations count too); without
+clear_refs it falls back to tracemalloc, which only sees numpy/Python
+allocations. --lut-bits compares palette application through
+the colour lookup table (bits per channel) against 0, the exact
+nearest-centroid pass. --image-modes runs the same photo converted to other
+Pillow modes (L, LA, RGBA with an alpha gradient, P with 256 colours) to
+compare the quantizer's per-mode paths.
+
+Usage (from backend/):
+    python -m benchmarks.bench_palette --megapixels 12 --colors 16 32 64
+    python -m benchmarks.bench_palette --megapixels 1 --modes exact sampled minibatch
+    python -m benchmarks.bench_palette --lut-bits 0 4 5 6
+    python -m benchmarks.bench_palette --megapixels 12 --image-modes L LA RGB RGBA P
+"""
+
+from PIL import Image
+import multiprocessing
+import ctypes
+import numpy as np
+import tracemalloc
+import argparse
+import time
+import io
+
+import palette
+from palette import DEFAULT_PALETTE_MODE, PALETTE_LUT_BITS, PALETTE_MODES
+from api.images import compress_image
+from benchmarks.suite import _proc_status_mb, _reset_peak_rss
+
+
+def make_photo(megapixels: float, seed: int = 0) -> Image.Image:
+    """Build a photo-like RGB image: smooth gradients plus sensor noise."""
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    r = 128 + 127 * np.sin(x / width * 6.0)
+    g = 128 + 127 * np.cos(y / height * 5.0)
+    b = 128 + 127 * np.sin((x + y) / (width + height) * 9.0)
+    img = np.stack([r, g, b], axis=-1) + rng.normal(0, 12, size=(height, width, 3))
+    return Image.fromarray(np.clip(img, 0, 255).astype(np.uint8))
+
+
+def convert_photo(image: Image.Image, mode: str) -> Image.Image:
+    """The photo in another Pillow mode; alpha modes get a left-to-right transparency gradient."""
+    if mode == "P":
+        return image.quantize(256)
+    converted = image.convert(mode)
+    if "A" in mode:
+        gradient = np.linspace(0, 255, image.width, dtype=np.float32).astype(np.uint8)
+        converted.putalpha(Image.fromarray(np.broadcast_to(gradient, (image.height, image.width)).copy()))
+    return converted
+
+
+def peak_memory_mb(megapixels: float, image_mode: str, mode: str, lut_bits: int, n_colors: int) -> float:
+    """Peak memory of one compress_image() call, run in a fresh process (see module docstring)."""
+    palette.PALETTE_LUT_BITS = lut_bits
+    image = convert_photo(make_photo(megapixels), image_mode)
+    compress_image(convert_photo(make_photo(0.01), image_mode), n_colors, mode)
+    try:
+        # Hand memory freed by the set-up back to the OS so the call cannot reuse it unseen
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+    if _reset_peak_rss():
+        before = _proc_status_mb("VmRSS")
+        compress_image(image, n_colors, mode)
+        return _proc_status_mb("VmHWM") - before
+    tracemalloc.start()
+    compress_image(image, n_colors, mode)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+def percentile(samples, pct: float) -> float:
+    return float(np.percentile(np.asarray(samples), pct))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megapixels", type=float, default=12.0)
+    parser.add_argument("--colors", type=int, nargs="+", default=[16, 32, 64])
+    parser.add_argument("--modes", nargs="+", default=[DEFAULT_PALETTE_MODE, "minibatch"], choices=PALETTE_MODES)
+    parser.add_argument("--lut-bits", type=int, nargs="+", default=[0, PALETTE_LUT_BITS],
+                        help="bits per channel of the lookup table; 0 = exact nearest-centroid assignment")
+    parser.add_argument("--image-modes", nargs="+", default=["RGB"], choices=["L", "LA", "RGB", "RGBA", "P"])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    photo = make_photo(args.megapixels)
+    print(f"Synthetic photo: {photo.width}x{photo.height} ({photo.width * photo.height / 1e6:.1f} MP)")
+    print(
+        f"{'image':<6} {'mode':<10} {'lut':>4} {'colors':>6} {'p50 (s)':>9} {'p95 (s)':>9} "
+        f"{'peak MB':>8} {'PNG KB':>8}  output"
+    )
+
+    for image_mode in args.image_modes:
+        image = convert_photo(photo, image_mode)
+        for mode in args.modes:
+            for bits in args.lut_bits if mode != "exact" else [0]:
+                palette.PALETTE_LUT_BITS = bits
+                for n_colors in args.colors:
+                    timings = []
+                    for _ in range(args.repeat):
+                        start = time.perf_counter()
+                        compress_image(image, n_colors, mode)
+                        timings.append(time.perf_counter() - start)
+
+                    with multiprocessing.get_context("spawn").Pool(1) as pool:
+                        peak = pool.apply(peak_memory_mb, (args.megapixels, image_mode, mode, bits, n_colors))
+                    compressed = compress_image(image, n_colors, mode)
+                    png = io.BytesIO()
+                    compressed.save(png, format="PNG")
+
+                    print(
+                        f"{image_mode:<6} {mode:<10} {bits or '-':>4} {n_colors:>6} {percentile(timings, 50):>9.3f} "
+                        f"{percentile(timings, 95):>9.3f} {peak:>8.1f} {len(png.getvalue()) / 1024:>8.0f}"
+                        f"  {compressed.mode}"
+                    )
+
+
+if __name__ == "__main__":
+    main()
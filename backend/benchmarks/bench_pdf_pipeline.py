@@ -0,0 +1,114 @@
+"""
+Chained PDF endpoints vs. /pdf/pipeline on the same multi-step edits.
+
+Builds a synthetic PDF (one scanned-page-like image per page) and times:
+- 2 steps: remove pages, then encrypt
+  (/edit-pdf/ + /pdf-password/ vs. one pipeline run)
+- 2 steps: decrypt, then remove pages
+  (/pdf-password/ remove + /edit-pdf/ vs. one pipeline run)
+- 3 steps: decrypt, remove pages, re-encrypt
+  (/pdf-password/ remove + /edit-pdf/ + /pdf-password/ add vs. one pipeline run)
+
+Only the CPU worker functions are timed; the chained numbers leave out the
+extra upload/download round trips the client also pays.
+
+Usage (from backend/):
+    python -m benchmarks.bench_pdf_pipeline
+    python -m benchmarks.bench_pdf_pipeline --pages 200 --repeat 5
+"""
+
+from PIL import Image
+import numpy as np
+import argparse
+import statistics
+import time
+
+from pdf_pipeline import run_pdf_pipeline
+from api.pdf import _apply_pdf_password, _remove_pdf_pages
+from uploads import SpillingBuffer, SpooledFile
+
+
+def make_pdf(pages: int) -> SpooledFile:
+    rng = np.random.default_rng(0)
+    images = [
+        Image.fromarray(rng.integers(200, 255, size=(400, 300, 3), dtype=np.uint8)).convert("RGB")
+        for _ in range(pages)
+    ]
+    buffer = SpillingBuffer(suffix=".pdf")
+    images[0].save(buffer, "PDF", save_all=True, append_images=images[1:])
+    return buffer.to_spooled()
+
+
+def chain(upload: SpooledFile, steps) -> SpooledFile:
+    """Run worker functions back to back, feeding each output into the next like a client would."""
+    current = upload
+    for func, args in steps:
+        result = func(current, *args)
+        if current is not upload:
+            current.cleanup()
+        current = result
+    return current
+
+
+def p50(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func().cleanup()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    document = make_pdf(args.pages)
+    encrypted = _apply_pdf_password(document, "add", "secret", None)
+    remove = f"2-{args.pages // 2}"
+
+    cases = {
+        "remove+encrypt": (
+            lambda: chain(document, [(_remove_pdf_pages, (remove,)), (_apply_pdf_password, ("add", "new", None))]),
+            lambda: run_pdf_pipeline([document], [
+                {"op": "remove", "pages": remove}, {"op": "encrypt", "password": "new"},
+            ]),
+        ),
+        "decrypt+remove": (
+            lambda: chain(encrypted, [
+                (_apply_pdf_password, ("remove", "secret", None)),
+                (_remove_pdf_pages, (remove,)),
+            ]),
+            lambda: run_pdf_pipeline([encrypted], [
+                {"op": "decrypt", "password": "secret"}, {"op": "remove", "pages": remove},
+            ]),
+        ),
+        "decrypt+remove+encrypt": (
+            lambda: chain(encrypted, [
+                (_apply_pdf_password, ("remove", "secret", None)),
+                (_remove_pdf_pages, (remove,)),
+                (_apply_pdf_password, ("add", "new", None)),
+            ]),
+            lambda: run_pdf_pipeline([encrypted], [
+                {"op": "decrypt", "password": "secret"},
+                {"op": "remove", "pages": remove},
+                {"op": "encrypt", "password": "new"},
+            ]),
+        ),
+    }
+
+    print(f"{document.size / 1024 / 1024:.1f} MB, {args.pages} pages")
+    print(f"{'case':<24} {'chained p50':>12} {'pipeline p50':>13} {'speedup':>8}")
+    for name, (chained, pipeline) in cases.items():
+        chained_time = p50(chained, args.repeat)
+        pipeline_time = p50(pipeline, args.repeat)
+        print(f"{name:<24} {chained_time * 1000:>10.1f}ms {pipeline_time * 1000:>11.1f}ms {chained_time / pipeline_time:>7.1f}x")
+
+    document.cleanup()
+    encrypted.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+/edit-pdf/ on a large PDF: one multipart request vs. an upload session, with a dropped connection.
+
+Each input size gets a fresh uvicorn server (CPU_POOL_SIZE=0, so the PDF
+work happens in the measured process). Both paths send the PDF from disk;
+the connection is cut once DROP_AT of the file has been sent and the client
+then recovers:
+- multipart - POST /edit-pdf/ with the file; after the drop the whole
+              request is sent again
+- session   - POST /uploads, PUT each chunk, POST .../complete, then
+              POST /edit-pdf/ with upload_id; after the drop the client asks
+              GET /uploads/{id} for the missing chunks and sends only those
+
+Reports the bytes sent in total (the file plus what the drop wasted), the
+time from the first byte to the finished response, the time of the
+processing request alone (after the last byte of the file), and the
+server's peak RSS growth over a warm-up request (VmHWM, so Linux only).
+
+Usage (from backend/):
+    python -m benchmarks.bench_resumable_upload --sizes 50 200
+    python -m benchmarks.bench_resumable_upload --sizes 200 --chunk-mb 16 --drop-at 0.5
+"""
+
+from typing import Iterator, Optional
+import subprocess
+import argparse
+import tempfile
+import httpx
+import time
+import sys
+import os
+
+from benchmarks.bench_upload_memory import free_port, make_pdf, peak_rss_mb
+
+READ_SIZE = 256 * 1024
+
+
+class Dropped(Exception):
+    """The simulated connection drop."""
+
+
+def file_body(path: str, start: int, length: int, sent: list, drop_after: int = -1) -> Iterator[bytes]:
+    """Stream length bytes of the file from start, failing once drop_after bytes have been sent overall."""
+    with open(path, "rb") as handle:
+        handle.seek(start)
+        remaining = length
+        while remaining:
+            data = handle.read(min(READ_SIZE, remaining))
+            remaining -= len(data)
+            sent[0] += len(data)
+            if 0 <= drop_after <= sent[0]:
+                raise Dropped()
+            yield data
+
+
+def multipart_body(path: str, boundary: str, sent: list, drop_after: int) -> Iterator[bytes]:
+    yield (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="bench.pdf"\r\n'
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode()
+    yield from file_body(path, 0, os.path.getsize(path), sent, drop_after)
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+def send_multipart(client: httpx.Client, path: str, sent: list, drop_after: int = -1) -> None:
+    boundary = "benchboundary"
+    response = client.post(
+        "/edit-pdf/", params={"page_numbers": "1"},
+        content=multipart_body(path, boundary, sent, drop_after),
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    response.raise_for_status()
+
+
+def drop_point(path: str, drop_at: Optional[float]) -> int:
+    return -1 if drop_at is None else int(os.path.getsize(path) * drop_at)
+
+
+def run_multipart(client: httpx.Client, path: str, drop_at: Optional[float]) -> dict:
+    sent = [0]
+    started = time.perf_counter()
+    if drop_at is not None:
+        try:
+            send_multipart(client, path, sent, drop_point(path, drop_at))
+        except (Dropped, httpx.TransportError):
+            pass
+    # The file is part of the processing request, so that request is the whole (retried) upload
+    processing_started = time.perf_counter()
+    retry_sent = [0]
+    send_multipart(client, path, retry_sent)
+    finished = time.perf_counter()
+    return {
+        "sent": sent[0] + retry_sent[0],
+        "total": finished - started,
+        "processing": finished - processing_started,
+    }
+
+
+def put_chunk(client: httpx.Client, path: str, upload_id: str, index: int, chunk_size: int, sent: list, drop_after: int = -1) -> None:
+    start = index * chunk_size
+    length = min(chunk_size, os.path.getsize(path) - start)
+    response = client.put(
+        f"/uploads/{upload_id}/chunks/{index}",
+        content=file_body(path, start, length, sent, drop_after),
+        headers={"Content-Length": str(length)},
+    )
+    response.raise_for_status()
+
+
+def run_session(client: httpx.Client, path: str, drop_at: Optional[float], chunk_size: int) -> dict:
+    size = os.path.getsize(path)
+    sent = [0]
+    started = time.perf_counter()
+    session = client.post(
+        "/uploads", data={"filename": "bench.pdf", "size": str(size), "content_type": "application/pdf", "chunk_size": str(chunk_size)},
+    ).json()
+    upload_id = session["upload_id"]
+    drop_after = drop_point(path, drop_at)
+    try:
+        for index in range(session["chunks"]):
+            put_chunk(client, path, upload_id, index, chunk_size, sent, drop_after)
+    except (Dropped, httpx.TransportError):
+        pass
+    for index in client.get(f"/uploads/{upload_id}").json()["missing"]:
+        put_chunk(client, path, upload_id, index, chunk_size, sent)
+    client.post(f"/uploads/{upload_id}/complete").raise_for_status()
+
+    processing_started = time.perf_counter()
+    response = client.post("/edit-pdf/", params={"page_numbers": "1"}, data={"upload_id": upload_id})
+    response.raise_for_status()
+    finished = time.perf_counter()
+    client.delete(f"/uploads/{upload_id}")
+    return {"sent": sent[0], "total": finished - started, "processing": finished - processing_started}
+
+
+def measure(pdf_path: str, warmup_path: str, env: dict, path_name: str, drop_at: float, chunk_size: int) -> dict:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=600) as client:
+            for _ in range(600):
+                try:
+                    client.get("/cache/stats", timeout=1)
+                    break
+                except httpx.TransportError:
+                    time.sleep(0.1)
+            # Warm up the same path, so imports and pools are not counted
+            if path_name == "multipart":
+                run_multipart(client, warmup_path, drop_at=None)
+            else:
+                run_session(client, warmup_path, drop_at=None, chunk_size=chunk_size)
+            baseline = peak_rss_mb(server.pid)
+            if path_name == "multipart":
+                row = run_multipart(client, pdf_path, drop_at)
+            else:
+                row = run_session(client, pdf_path, drop_at, chunk_size)
+            row["peak_rss_delta_mb"] = peak_rss_mb(server.pid) - baseline
+            return row
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200], help="input PDF sizes in MB")
+    parser.add_argument("--chunk-mb", type=int, default=8, help="upload session chunk size")
+    parser.add_argument("--drop-at", type=float, default=0.9, help="share of the file sent before the connection drops")
+    args = parser.parse_args()
+
+    env = dict(os.environ, CPU_POOL_SIZE="0", RESULT_CACHE_ENABLED="0")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env["UPLOAD_SESSION_DIR"] = os.path.join(tmp_dir, "sessions")
+        warmup_path = os.path.join(tmp_dir, "warmup.pdf")
+        make_pdf(warmup_path, 1)
+        print(
+            f"{'input (MB)':>10} {'path':<10} {'sent (MB)':>10} {'total (s)':>10} "
+            f"{'processing (s)':>15} {'peak RSS delta (MB)':>20}"
+        )
+        for size in args.sizes:
+            pdf_path = os.path.join(tmp_dir, f"input_{size}.pdf")
+            make_pdf(pdf_path, size)
+            input_mb = os.path.getsize(pdf_path) / 1024 / 1024
+            for path_name in ("multipart", "session"):
+                row = measure(pdf_path, warmup_path, env, path_name, args.drop_at, args.chunk_mb * 1024 * 1024)
+                print(
+                    f"{input_mb:>10.1f} {path_name:<10} {row['sent'] / 1024 / 1024:>10.1f} {row['total']:>10.2f} "
+                    f"{row['processing']:>15.2f} {row['peak_rss_delta_mb']:>20.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Encode time and output size per WebP sticker preset.
+
+Encodes a synthetic 512x512 photo as a static sticker and a synthetic clip
+as an animated sticker with every preset, and reports the chosen settings,
+encode time, output size and whether it fits WhatsApp's limit. The
+pre-preset behaviour (lossless, quality 100, method 6) is included as
+"legacy" unless --skip-legacy is given.
+
+Usage (from backend/):
+    python -m benchmarks.bench_sticker_presets
+    python -m benchmarks.bench_sticker_presets --frames 90 --skip-legacy
+"""
+
+from PIL import Image
+import numpy as np
+import argparse
+import time
+import io
+
+from sticker_encoding import (
+    ANIMATED_STICKER_MAX_BYTES, PROBE_FRAMES, STATIC_STICKER_MAX_BYTES, STICKER_PRESETS,
+    AnimatedWebPWriter, EncodeSettings, choose_animated_settings, encode_static_webp,
+)
+
+SIZE = 512
+FRAME_DURATION = 66
+
+
+def make_frame(index: int, rng: np.random.Generator) -> np.ndarray:
+    """Photo-like frame: drifting gradients plus sensor noise."""
+    y, x = np.mgrid[0:SIZE, 0:SIZE].astype(np.float32)
+    shift = index * 3.0
+    frame = np.stack([
+        128 + 100 * np.sin((x + shift) / 40),
+        128 + 100 * np.cos((y - shift) / 30),
+        (x + y + shift) % 256,
+    ], axis=-1) + rng.normal(0, 6, size=(SIZE, SIZE, 3))
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def encode_animation(frames, settings: EncodeSettings) -> bytes:
+    writer = AnimatedWebPWriter((SIZE, SIZE), FRAME_DURATION, *settings)
+    for frame in frames:
+        writer.add_frame(frame)
+    return writer.finish()
+
+
+def report(kind: str, preset: str, settings: EncodeSettings, seconds: float, size: int, limit: int) -> None:
+    mode = "lossless" if settings.lossless else f"q={settings.quality}"
+    fits = "yes" if size <= limit else "NO"
+    print(f"{kind:<9} {preset:<9} {mode:<9} m={settings.method} {seconds:>8.2f}s {size / 1024:>9.1f} KB  fits={fits}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=45, help="frames in the animated clip")
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    photo = Image.fromarray(make_frame(0, rng)).convert("RGBA")
+    frames = [make_frame(index, rng) for index in range(args.frames)]
+    presets = list(STICKER_PRESETS) + ([] if args.skip_legacy else ["legacy"])
+
+    print(f"{'kind':<9} {'preset':<9} {'mode':<9} {'':<3} {'time':>9} {'size':>12}")
+    for preset in presets:
+        start = time.perf_counter()
+        if preset == "legacy":
+            settings = EncodeSettings(True, 100, 6)
+            buffer = io.BytesIO()
+            photo.save(buffer, format="WEBP", lossless=True, quality=100, method=6)
+            data = buffer.getvalue()
+        else:
+            result = encode_static_webp(photo, preset)
+            settings, data = result.settings, result.data
+        report("static", preset, settings, time.perf_counter() - start, len(data), STATIC_STICKER_MAX_BYTES)
+
+    for preset in presets:
+        start = time.perf_counter()
+        if preset == "legacy":
+            settings = EncodeSettings(True, 100, 6)
+        else:
+            settings = choose_animated_settings(frames[:PROBE_FRAMES], FRAME_DURATION, len(frames), preset)
+        data = encode_animation(frames, settings)
+        report("animated", preset, settings, time.perf_counter() - start, len(data), ANIMATED_STICKER_MAX_BYTES)
+
+
+if __name__ == "__main__":
+    main()
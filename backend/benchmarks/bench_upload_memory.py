@@ -0,0 +1,114 @@
+"""
+Peak RSS per request against input size for the spooled upload pipeline.
+
+Each input size gets a fresh uvicorn server (CPU_POOL_SIZE=0, so the PDF
+work happens in the measured process). The request body is streamed from
+disk and the response drained without being kept; the server's peak RSS
+(VmHWM from /proc, so Linux only) is sampled after a warm-up request and
+after the measured one.
+
+Usage (from backend/):
+    python -m benchmarks.bench_upload_memory --sizes 10 50 200
+    python -m benchmarks.bench_upload_memory --sizes 50 --in-memory   # never spill, for comparison
+"""
+
+from PIL import Image
+import numpy as np
+import subprocess
+import argparse
+import tempfile
+import socket
+import httpx
+import time
+import sys
+import os
+
+JPEG_PAGE_BYTES = 1_100_000  # approximate size of one noise page at quality 95
+
+
+def make_pdf(path: str, megabytes: int) -> None:
+    """Write a PDF of roughly the requested size from incompressible JPEG pages."""
+    rng = np.random.default_rng(0)
+    page_count = max(1, megabytes * 1024 * 1024 // JPEG_PAGE_BYTES)
+    pages = (
+        Image.fromarray(rng.integers(0, 256, size=(1000, 1000, 3), dtype=np.uint8))
+        for _ in range(page_count)
+    )
+    first = next(pages)
+    first.save(path, "PDF", save_all=True, append_images=pages, quality=95)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def peak_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def post_pdf(base_url: str, path: str) -> int:
+    with open(path, "rb") as handle:
+        with httpx.stream(
+            "POST", f"{base_url}/edit-pdf/", params={"page_numbers": "1"},
+            files={"file": ("bench.pdf", handle, "application/pdf")}, timeout=600,
+        ) as response:
+            response.raise_for_status()
+            return sum(len(chunk) for chunk in response.iter_bytes())
+
+
+def measure(pdf_path: str, warmup_path: str, env: dict) -> dict:
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(600):
+            try:
+                httpx.get(f"{base_url}/cache/stats", timeout=1)
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        post_pdf(base_url, warmup_path)
+        baseline = peak_rss_mb(server.pid)
+        output_bytes = post_pdf(base_url, pdf_path)
+        return {
+            "input_mb": os.path.getsize(pdf_path) / 1024 / 1024,
+            "output_mb": output_bytes / 1024 / 1024,
+            "peak_rss_delta_mb": peak_rss_mb(server.pid) - baseline,
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200], help="input PDF sizes in MB")
+    parser.add_argument("--in-memory", action="store_true", help="disable spilling to disk")
+    args = parser.parse_args()
+
+    env = dict(os.environ, CPU_POOL_SIZE="0", RESULT_CACHE_ENABLED="0")
+    if args.in_memory:
+        env["SPOOL_MEMORY_THRESHOLD"] = str(1 << 62)
+
+    print(f"{'input (MB)':>10} {'output (MB)':>11} {'peak RSS delta (MB)':>20}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        warmup_path = os.path.join(tmp_dir, "warmup.pdf")
+        make_pdf(warmup_path, 1)
+        for size in args.sizes:
+            pdf_path = os.path.join(tmp_dir, f"input_{size}.pdf")
+            make_pdf(pdf_path, size)
+            row = measure(pdf_path, warmup_path, env)
+            print(f"{row['input_mb']:>10.1f} {row['output_mb']:>11.1f} {row['peak_rss_delta_mb']:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
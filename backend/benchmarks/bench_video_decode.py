@@ -0,0 +1,85 @@
+"""
+Video sticker decoding: ffmpeg filter-graph pipe vs. moviepy.
+
+Generates synthetic clips (1080p by default) and, for each frame source in
+video_decoder.py, decodes the sticker's frames (trim, centre crop, scale to
+512x512, fps cap) and reports per second of video:
+- wall        - elapsed time
+- worker CPU  - CPU used by this (the pool worker's) process
+- ffmpeg CPU  - CPU used by ffmpeg child processes
+
+With --encode the whole sticker (decode plus WebP encode) is timed as well.
+
+Usage (from backend/):
+    python -m benchmarks.bench_video_decode
+    python -m benchmarks.bench_video_decode --resolutions 1920x1080 1280x720 --seconds 6 --encode
+"""
+
+import argparse
+import resource
+import tempfile
+import time
+import os
+
+from api.stickers import MAX_STICKER_DIMENSION, MAX_STICKER_FPS, MAX_VIDEO_DURATION_SECONDS, _encode_video_sticker
+from benchmarks.fixtures import write_video
+from video_decoder import FfmpegVideoSource, MoviepyVideoSource
+
+# The first source listed is the baseline for the speedup column
+SOURCES = {"moviepy": MoviepyVideoSource, "ffmpeg": FfmpegVideoSource}
+
+
+def child_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(source_cls, path: str, encode: bool):
+    """Returns (wall, worker CPU, child CPU, frames) for one pass."""
+    started, cpu, children = time.perf_counter(), time.process_time(), child_cpu()
+    with source_cls(path, MAX_STICKER_DIMENSION, MAX_STICKER_FPS, MAX_VIDEO_DURATION_SECONDS) as source:
+        if encode:
+            _encode_video_sticker(source, True, "fast")
+            frames = int(source.end_time * source.fps)
+        else:
+            frames = sum(1 for _ in source.frames())
+    return time.perf_counter() - started, time.process_time() - cpu, child_cpu() - children, frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--resolutions", nargs="+", default=["1920x1080"])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--sources", nargs="+", default=list(SOURCES), choices=list(SOURCES))
+    parser.add_argument("--encode", action="store_true", help="also time decode plus WebP encode")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(
+        f"{'clip':<16} {'task':<14} {'source':<8} {'frames':>6} {'wall s/s':>9} "
+        f"{'worker CPU':>11} {'ffmpeg CPU':>11} {'speedup':>8}"
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        for resolution in args.resolutions:
+            width, height = (int(part) for part in resolution.split("x"))
+            path = os.path.join(workdir, f"clip_{resolution}.mp4")
+            write_video(path, args.seconds, width, height, args.fps)
+            clip = f"{resolution}@{args.fps}"
+            for task in ["decode"] + (["decode+encode"] if args.encode else []):
+                baseline = None
+                for name in args.sources:
+                    runs = sorted(
+                        (run(SOURCES[name], path, task != "decode") for _ in range(args.repeat)),
+                        key=lambda result: result[0],
+                    )
+                    wall, cpu, children, frames = runs[len(runs) // 2]
+                    baseline = baseline or wall
+                    print(
+                        f"{clip:<16} {task:<14} {name:<8} {frames:>6} {wall / args.seconds:>9.3f} "
+                        f"{cpu / args.seconds:>11.3f} {children / args.seconds:>11.3f} {baseline / wall:>7.1f}x"
+                    )
+
+
+if __name__ == "__main__":
+    main()
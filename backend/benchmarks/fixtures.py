@@ -0,0 +1,139 @@
+"""
+Deterministic input files for the benchmark suite.
+
+write_fixtures() generates everything the suite needs into one directory and
+returns a name -> path map:
+- photo_<N>mp.jpg / photo_<N>mp.png - photo-like images (gradients + noise)
+- document.pdf                       - N pages, one scanned-page-like image each
+- document_encrypted.pdf             - the same document, password "secret"
+- clip.mp4                           - short H.264 clip with moving gradients
+- audio.wav                          - 16-bit mono tone sweep
+- audio.mp3                          - the same sweep as 128 kb/s MP3
+
+The same arguments always produce the same bytes, so results from different
+commits are comparable. File names on disk include the sizes, so existing
+files are reused and differently sized runs can share a directory.
+"""
+
+from PyPDF2 import PdfReader, PdfWriter
+from PIL import Image
+from typing import Dict, Sequence
+import numpy as np
+import subprocess
+import wave
+import os
+
+import imageio_ffmpeg
+
+PDF_PASSWORD = "secret"
+
+
+def make_photo(megapixels: float, seed: int = 0) -> Image.Image:
+    """Photo-like 4:3 RGB image: smooth gradients plus sensor noise."""
+    width = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    pixels = np.stack([
+        128 + 127 * np.sin(x / width * 6.0),
+        128 + 127 * np.cos(y / height * 5.0),
+        128 + 127 * np.sin((x + y) / (width + height) * 9.0),
+    ], axis=-1)
+    pixels += rng.normal(0, 12, size=pixels.shape)
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+
+def write_pdf(path: str, pages: int) -> None:
+    rng = np.random.default_rng(0)
+    images = [
+        Image.fromarray(rng.integers(200, 255, size=(400, 300, 3), dtype=np.uint8))
+        for _ in range(pages)
+    ]
+    images[0].save(path, "PDF", save_all=True, append_images=images[1:])
+
+
+def write_encrypted_pdf(source: str, path: str, password: str = PDF_PASSWORD) -> None:
+    writer = PdfWriter()
+    for page in PdfReader(source).pages:
+        writer.add_page(page)
+    writer.encrypt(password)
+    with open(path, "wb") as handle:
+        writer.write(handle)
+
+
+def write_video(path: str, seconds: float, width: int = 640, height: int = 360, fps: int = 30) -> None:
+    writer = imageio_ffmpeg.write_frames(path, (width, height), fps=fps, macro_block_size=8)
+    writer.send(None)
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    for index in range(int(seconds * fps)):
+        shift = index * 4
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[..., 0] = (x + shift) % 256
+        frame[..., 1] = (y + shift) % 256
+        frame[..., 2] = (x + y + shift) % 256
+        writer.send(frame)
+    writer.close()
+
+
+def write_audio(path: str, seconds: float, rate: int = 44100) -> None:
+    t = np.arange(int(seconds * rate), dtype=np.float64) / rate
+    # 220 Hz -> 880 Hz sweep
+    samples = 0.5 * np.sin(2 * np.pi * (220 * t + 330 * t * t / seconds))
+    with wave.open(path, "wb") as handle:
+        handle.setnchannels(1)
+        handle.setsampwidth(2)
+        handle.setframerate(rate)
+        handle.writeframes((samples * 32767).astype("<i2").tobytes())
+
+
+def write_mp3(source: str, path: str) -> None:
+    subprocess.run(
+        [imageio_ffmpeg.get_ffmpeg_exe(), "-v", "error", "-y", "-i", source,
+         "-c:a", "libmp3lame", "-b:a", "128k", "-f", "mp3", path],
+        check=True,
+    )
+
+
+def write_fixtures(
+    directory: str,
+    megapixels: Sequence[float] = (1, 4, 12),
+    pdf_pages: int = 50,
+    video_seconds: float = 3,
+    audio_seconds: float = 20,
+) -> Dict[str, str]:
+    """Generate (or reuse) every fixture in `directory` and return name -> path."""
+    os.makedirs(directory, exist_ok=True)
+    fixtures: Dict[str, str] = {}
+
+    def fixture(name: str, filename: str, build) -> None:
+        # File names carry the generation parameters so different sizes never collide
+        path = os.path.join(directory, filename)
+        if not os.path.exists(path):
+            stem, extension = os.path.splitext(path)
+            partial = f"{stem}.partial{extension}"
+            build(partial)
+            os.replace(partial, path)
+        fixtures[name] = path
+
+    for mp in megapixels:
+        photo = None
+
+        def photo_file(path: str, format: str, **options) -> None:
+            nonlocal photo
+            photo = photo or make_photo(mp)
+            photo.save(path, format=format, **options)
+
+        for extension, format, options in (("jpg", "JPEG", {"quality": 90}), ("png", "PNG", {})):
+            name = f"photo_{mp:g}mp.{extension}"
+            fixture(name, name, lambda path: photo_file(path, format, **options))
+
+    fixture("document.pdf", f"document_{pdf_pages}p.pdf", lambda path: write_pdf(path, pdf_pages))
+    fixture(
+        "document_encrypted.pdf", f"document_{pdf_pages}p_encrypted.pdf",
+        lambda path: write_encrypted_pdf(fixtures["document.pdf"], path),
+    )
+    fixture("clip.mp4", f"clip_{video_seconds:g}s.mp4", lambda path: write_video(path, video_seconds))
+    fixture("audio.wav", f"audio_{audio_seconds:g}s.wav", lambda path: write_audio(path, audio_seconds))
+    fixture("audio.mp3", f"audio_{audio_seconds:g}s.mp3", lambda path: write_mp3(fixtures["audio.wav"], path))
+    return fixtures
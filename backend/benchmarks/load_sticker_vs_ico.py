@@ -0,0 +1,109 @@
+"""
+Load test: a slow video sticker job must not raise /convert-ico/ latency.
+
+Measures /convert-ico/ latency on an idle server, then again while a 1080p
+video sticker is being generated, and fails if the loaded p95 exceeds
+--max-slowdown x the idle p95 (plus a small absolute allowance).
+
+Usage (from backend/):
+    python -m benchmarks.load_sticker_vs_ico
+    CPU_POOL_SIZE=2 python -m benchmarks.load_sticker_vs_ico --requests 50
+"""
+
+from PIL import Image
+import numpy as np
+import argparse
+import asyncio
+import tempfile
+import httpx
+import time
+import sys
+import io
+import os
+
+import imageio_ffmpeg
+
+from server import app
+
+
+def make_video(path: str, width: int, height: int, seconds: int, fps: int = 30) -> None:
+    """Write a synthetic H.264 clip with moving gradients."""
+    writer = imageio_ffmpeg.write_frames(path, (width, height), fps=fps, macro_block_size=8)
+    writer.send(None)
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    for index in range(seconds * fps):
+        shift = index * 4
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[..., 0] = (x + shift) % 256
+        frame[..., 1] = (y + shift) % 256
+        frame[..., 2] = (x + y + shift) % 256
+        writer.send(frame)
+    writer.close()
+
+
+def make_png(size: int = 256) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), (40, 120, 200)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def time_ico_requests(client: httpx.AsyncClient, png_bytes: bytes, count: int) -> list:
+    latencies = []
+    for _ in range(count):
+        start = time.perf_counter()
+        response = await client.post("/convert-ico/", files={"file": ("icon.png", png_bytes, "image/png")})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def run(args) -> int:
+    png_bytes = make_png()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video_path = os.path.join(tmp_dir, "clip.mp4")
+        make_video(video_path, args.width, args.height, args.seconds)
+        with open(video_path, "rb") as video_file:
+            video_bytes = video_file.read()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        idle = await time_ico_requests(client, png_bytes, args.requests)
+
+        sticker_start = time.perf_counter()
+        sticker_task = asyncio.create_task(
+            client.post("/stickers/whatsapp", files={"media": ("clip.mp4", video_bytes, "video/mp4")})
+        )
+        await asyncio.sleep(0.2)
+        loaded = await time_ico_requests(client, png_bytes, args.requests)
+        sticker_still_running = not sticker_task.done()
+        sticker_response = await sticker_task
+        sticker_seconds = time.perf_counter() - sticker_start
+
+    idle_p95 = float(np.percentile(idle, 95))
+    loaded_p95 = float(np.percentile(loaded, 95))
+    print(f"sticker job: {sticker_seconds:.2f}s (status {sticker_response.status_code})")
+    print(f"/convert-ico/ idle   p50={np.percentile(idle, 50) * 1000:.1f}ms p95={idle_p95 * 1000:.1f}ms")
+    print(f"/convert-ico/ loaded p50={np.percentile(loaded, 50) * 1000:.1f}ms p95={loaded_p95 * 1000:.1f}ms")
+
+    if not sticker_still_running:
+        print("WARNING: sticker job finished before the ICO requests did; increase --requests")
+    if loaded_p95 > idle_p95 * args.max_slowdown + 0.05:
+        print("FAIL: /convert-ico/ latency rose while the sticker job was running")
+        return 1
+    print("PASS")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--max-slowdown", type=float, default=3.0)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--seconds", type=int, default=2)
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,524 @@
+"""
+Benchmark suite covering every backend endpoint.
+
+Two levels of cases, all on generated fixtures (see benchmarks/fixtures.py):
+- fn/...  - the worker functions behind each endpoint (compress_image,
+            parse_page_ranges, _generate_static_sticker, ...) called directly
+- api/... - the FastAPI app driven in-process through TestClient, including
+            multipart parsing, spooling and response streaming
+
+Photo cases run once per --megapixels size. Each case runs in a fresh
+subprocess with the result and decoded-image caches off (RESULT_CACHE_ENABLED=0,
+DECODED_CACHE_BYTES=0) and, unless --pool is given, CPU work on the thread
+pool (CPU_POOL_SIZE=0), so peak RSS covers all of the work. Peak RSS is VmHWM after the case's setup, reset via
+/proc/self/clear_refs (Linux only; falls back to the process-lifetime peak).
+
+Each case reports throughput (runs/s and input MB/s), p50/p95/p99/mean
+latency and peak RSS. Results are written as JSON; --baseline compares them
+against a saved run and exits with status 1 when a case's p50 or peak RSS
+regressed by more than --threshold.
+
+Usage (from backend/):
+    python -m benchmarks.suite --output bench-results.json
+    python -m benchmarks.suite --cases 'fn/*' --megapixels 1 4 --iterations 10
+    API_FEATURES=stickers python -m benchmarks.suite --cases 'api/*'
+    python -m benchmarks.suite --output new.json --baseline bench-results.json
+    python -m benchmarks.suite --input new.json --baseline bench-results.json   # compare only
+"""
+
+from collections import namedtuple
+from typing import Any, Callable, Dict, List, Optional
+import subprocess
+import argparse
+import datetime
+import platform
+import tempfile
+import fnmatch
+import json
+import math
+import time
+import sys
+import os
+
+from benchmarks.fixtures import PDF_PASSWORD, write_fixtures
+
+# A case's setup returns (run, input bytes per run); run() does one timed iteration
+Case = namedtuple("Case", ["name", "setup"])
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Cases
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _discard(result: Any) -> None:
+    """Release whatever a worker function returned (spooled temp files, buffers)."""
+    if hasattr(result, "cleanup"):
+        result.cleanup()
+
+
+def _size(*paths: str) -> int:
+    return sum(os.path.getsize(path) for path in paths)
+
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as handle:
+        return handle.read()
+
+
+def function_cases(fixtures: Dict[str, str], megapixels: List[float]) -> List[Case]:
+    """Worker functions called directly; imports are deferred to the case subprocess."""
+    cases: List[Case] = []
+
+    for mp in megapixels:
+        jpg, png = fixtures[f"photo_{mp:g}mp.jpg"], fixtures[f"photo_{mp:g}mp.png"]
+
+        def compress(jpg=jpg):
+            from PIL import Image
+            from api.images import compress_image
+            image = Image.open(jpg).convert("RGB")
+            return lambda: compress_image(image, 16), image.width * image.height * 3
+
+        def ico(png=png):
+            from api.images import _convert_to_ico_file
+            from uploads import SpooledFile
+            upload = SpooledFile(path=png, suffix=".png")
+            return lambda: _discard(_convert_to_ico_file(upload)), _size(png)
+
+        def static_sticker(jpg=jpg):
+            from api.stickers import _generate_static_sticker
+            data = _read(jpg)
+            return lambda: _generate_static_sticker(data), len(data)
+
+        def pdf_page(path):
+            from image_pdf import prepare_pdf_page
+            from uploads import SpooledFile
+            upload = SpooledFile(path=path, suffix=os.path.splitext(path)[1])
+            return lambda: prepare_pdf_page(upload), _size(path)
+
+        cases += [
+            Case(f"fn/compress_image[{mp:g}MP]", compress),
+            Case(f"fn/convert_ico[{mp:g}MP]", ico),
+            Case(f"fn/static_sticker[{mp:g}MP]", static_sticker),
+            Case(f"fn/prepare_pdf_page[{mp:g}MP jpg]", lambda jpg=jpg: pdf_page(jpg)),
+            Case(f"fn/prepare_pdf_page[{mp:g}MP png]", lambda png=png: pdf_page(png)),
+        ]
+
+    pdf, encrypted = fixtures["document.pdf"], fixtures["document_encrypted.pdf"]
+
+    def page_ranges():
+        from pdf_pipeline import parse_page_ranges
+        spec = ",".join(f"{start}-{start + 3}" for start in range(1, 997, 5))
+        return lambda: parse_page_ranges(spec, 1000), len(spec)
+
+    def remove_pages():
+        from api.pdf import _remove_pdf_pages
+        from uploads import SpooledFile
+        upload = SpooledFile(path=pdf, suffix=".pdf")
+        return lambda: _discard(_remove_pdf_pages(upload, "2-10")), _size(pdf)
+
+    def password(action: str):
+        from api.pdf import _apply_pdf_password
+        from uploads import SpooledFile
+        source = encrypted if action == "remove" else pdf
+        upload = SpooledFile(path=source, suffix=".pdf")
+        return lambda: _discard(_apply_pdf_password(upload, action, PDF_PASSWORD, None)), _size(source)
+
+    def pipeline():
+        from pdf_pipeline import run_pdf_pipeline
+        from uploads import SpooledFile
+        uploads = [SpooledFile(path=encrypted, suffix=".pdf"), SpooledFile(path=pdf, suffix=".pdf")]
+        operations = [
+            {"op": "decrypt", "password": PDF_PASSWORD},
+            {"op": "merge", "files": [1]},
+            {"op": "remove", "pages": "2-10"},
+            {"op": "rotate", "degrees": 90, "pages": "1"},
+        ]
+        return lambda: _discard(run_pdf_pipeline(uploads, operations)), _size(encrypted, pdf)
+
+    def video_sticker():
+        from api.stickers import _generate_video_sticker
+        video = fixtures["clip.mp4"]
+        return lambda: _generate_video_sticker(video), _size(video)
+
+    def audio_preview(name: str, media_type: str):
+        from audio_preview import render_audio_preview
+        from api.stickers import MAX_AUDIO_DURATION_SECONDS
+        from uploads import SpooledFile
+        audio = fixtures[name]
+        upload = SpooledFile(data=_read(audio), suffix=os.path.splitext(audio)[1], content_type=media_type)
+        return lambda: render_audio_preview(upload, MAX_AUDIO_DURATION_SECONDS), _size(audio)
+
+    cases += [
+        Case("fn/parse_page_ranges", page_ranges),
+        Case("fn/remove_pdf_pages", remove_pages),
+        Case("fn/pdf_password[add]", lambda: password("add")),
+        Case("fn/pdf_password[remove]", lambda: password("remove")),
+        Case("fn/pdf_pipeline", pipeline),
+        Case("fn/video_sticker", video_sticker),
+        Case("fn/audio_preview[wav]", lambda: audio_preview("audio.wav", "audio/wav")),
+        Case("fn/audio_preview[mp3]", lambda: audio_preview("audio.mp3", "audio/mpeg")),
+    ]
+    return cases
+
+
+class _ApiClient:
+    """TestClient over server.app, entered once per case subprocess."""
+
+    client = None
+
+    @classmethod
+    def get(cls):
+        if cls.client is None:
+            from fastapi.testclient import TestClient
+            from server import app
+            cls.client = TestClient(app)
+            cls.client.__enter__()
+        return cls.client
+
+
+def api_cases(fixtures: Dict[str, str], megapixels: List[float]) -> List[Case]:
+    """Endpoints driven in-process; each request must succeed or the case fails."""
+    pdf, encrypted = fixtures["document.pdf"], fixtures["document_encrypted.pdf"]
+    smallest = min(megapixels)
+    pdf_images = [fixtures[f"photo_{smallest:g}mp.jpg"], fixtures[f"photo_{smallest:g}mp.png"]] * 3
+
+    def request(method: str, url: str, inputs: List[str], build: Callable[[Dict[str, bytes]], dict]):
+        def setup():
+            client = _ApiClient.get()
+            contents = {path: _read(path) for path in inputs}
+
+            def run():
+                response = client.request(method, url, **build(contents))
+                if response.status_code >= 400:
+                    raise RuntimeError(f"{method} {url} -> {response.status_code}: {response.text[:200]}")
+
+            return run, sum(len(contents[path]) for path in inputs)
+        return setup
+
+    def upload(field: str, path: str, media_type: str, **data):
+        return lambda contents: {
+            "files": {field: (os.path.basename(path), contents[path], media_type)}, "data": data,
+        }
+
+    cases: List[Case] = []
+    for mp in megapixels:
+        jpg, png = fixtures[f"photo_{mp:g}mp.jpg"], fixtures[f"photo_{mp:g}mp.png"]
+        cases += [
+            Case(f"api/compress_image[{mp:g}MP]", request(
+                "POST", "/compress_image/", [jpg], upload("file", jpg, "image/jpeg", n_colors="16"))),
+            Case(f"api/convert_ico[{mp:g}MP]", request(
+                "POST", "/convert-ico/", [png], upload("file", png, "image/png"))),
+            Case(f"api/sticker_image[{mp:g}MP]", request(
+                "POST", "/stickers/whatsapp", [jpg], upload("media", jpg, "image/jpeg"))),
+        ]
+
+    def pdf_batch(contents):
+        return {"files": [
+            ("images", (os.path.basename(path), contents[path], "image/jpeg" if path.endswith(".jpg") else "image/png"))
+            for path in pdf_images
+        ]}
+
+    def pipeline_request(contents):
+        operations = [
+            {"op": "decrypt", "password": PDF_PASSWORD},
+            {"op": "merge", "files": [1]},
+            {"op": "remove", "pages": "2-10"},
+        ]
+        return {
+            "files": [("files", ("a.pdf", contents[encrypted], "application/pdf")),
+                      ("files", ("b.pdf", contents[pdf], "application/pdf"))],
+            "data": {"operations": json.dumps(operations)},
+        }
+
+    pack_inputs = pdf_images[:2] + [fixtures["clip.mp4"]]
+
+    def sticker_pack(contents):
+        media_types = {".jpg": "image/jpeg", ".png": "image/png", ".mp4": "video/mp4"}
+        return {"files": [
+            ("media", (os.path.basename(path), contents[path], media_types[os.path.splitext(path)[1]]))
+            for path in pack_inputs
+        ]}
+
+    def ico_batch(contents):
+        return {"files": [
+            ("files", (os.path.basename(path), contents[path], "image/jpeg" if path.endswith(".jpg") else "image/png"))
+            for path in pdf_images
+        ]}
+
+    cases += [
+        Case(f"api/convert_ico_batch[{len(pdf_images)} images]", request(
+            "POST", "/convert-ico/batch", pdf_images, ico_batch)),
+        Case(f"api/convert_to_pdf[{len(pdf_images)} images]", request(
+            "POST", "/convert-to-pdf/", pdf_images, pdf_batch)),
+        Case("api/edit_pdf", request(
+            "POST", "/edit-pdf/?page_numbers=2-10", [pdf], upload("file", pdf, "application/pdf"))),
+        Case("api/pdf_password[add]", request(
+            "POST", "/pdf-password/", [pdf], upload("file", pdf, "application/pdf", action="add", password="new"))),
+        Case("api/pdf_password[remove]", request(
+            "POST", "/pdf-password/", [encrypted],
+            upload("file", encrypted, "application/pdf", action="remove", password=PDF_PASSWORD))),
+        Case("api/pdf_pipeline", request("POST", "/pdf/pipeline", [encrypted, pdf], pipeline_request)),
+        Case("api/sticker_video", request(
+            "POST", "/stickers/whatsapp", [fixtures["clip.mp4"]], upload("media", fixtures["clip.mp4"], "video/mp4"))),
+        Case("api/sticker_audio[wav]", request(
+            "POST", "/stickers/whatsapp", [fixtures["audio.wav"]], upload("media", fixtures["audio.wav"], "audio/wav"))),
+        Case("api/sticker_audio[mp3]", request(
+            "POST", "/stickers/whatsapp", [fixtures["audio.mp3"]], upload("media", fixtures["audio.mp3"], "audio/mpeg"))),
+        Case(f"api/sticker_pack[{len(pack_inputs)} files]", request(
+            "POST", "/stickers/whatsapp/pack", pack_inputs, sticker_pack)),
+    ]
+    return cases
+
+
+def route_exists(case: Case) -> bool:
+    """API_FEATURES may leave routers unmounted; skip api cases whose route the app lacks."""
+    paths = {
+        "compress_image": "/compress_image/", "convert_ico": "/convert-ico/",
+        "convert_ico_batch": "/convert-ico/batch", "sticker": "/stickers/whatsapp",
+        "sticker_pack": "/stickers/whatsapp/pack",
+        "convert_to_pdf": "/convert-to-pdf/", "edit_pdf": "/edit-pdf/", "pdf_password": "/pdf-password/",
+        "pdf_pipeline": "/pdf/pipeline",
+    }
+    if not case.name.startswith("api/"):
+        return True
+    endpoint = case.name[len("api/"):].split("[")[0]
+    path = paths.get(endpoint) or paths["sticker" if endpoint.startswith("sticker") else endpoint]
+    from server import app
+    return path in app.openapi()["paths"]
+
+
+def all_cases(fixtures: Dict[str, str], megapixels: List[float]) -> List[Case]:
+    return function_cases(fixtures, megapixels) + api_cases(fixtures, megapixels)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Measurement
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _proc_status_mb(field: str) -> Optional[float]:
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    # Writing 5 resets VmHWM to the current RSS (Linux >= 4.0)
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linear-interpolated percentile (q in 0..100) of an already sorted list."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * q / 100
+    lower = math.floor(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def measure(case: Case, iterations: int, warmup: int) -> Dict[str, Any]:
+    """Set up a case, run it warmup + iterations times and summarize the timed runs."""
+    run, input_bytes = case.setup()
+    for _ in range(warmup):
+        run()
+
+    baseline_rss = _proc_status_mb("VmRSS")
+    peak_reset = _reset_peak_rss()
+    timings: List[float] = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    peak_rss = _proc_status_mb("VmHWM")
+
+    timings.sort()
+    total = sum(timings)
+    return {
+        "iterations": iterations,
+        "input_mb": input_bytes / 1024 / 1024,
+        "runs_per_s": iterations / total,
+        "mb_per_s": input_bytes * iterations / total / 1024 / 1024,
+        "p50_ms": percentile(timings, 50) * 1000,
+        "p95_ms": percentile(timings, 95) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "mean_ms": total / iterations * 1000,
+        "peak_rss_mb": peak_rss,
+        "peak_rss_growth_mb": peak_rss - baseline_rss if peak_reset and peak_rss and baseline_rss else None,
+    }
+
+
+def run_case_subprocess(name: str, config_path: str, pool: bool, timeout: float) -> Dict[str, Any]:
+    env = {**os.environ, "RESULT_CACHE_ENABLED": "0", "DECODED_CACHE_BYTES": "0"}
+    if not pool:
+        env["CPU_POOL_SIZE"] = "0"
+    try:
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.suite", "--run-case", name, "--config", config_path],
+            env=env, capture_output=True, text=True, timeout=timeout,
+        )
+    except subprocess.TimeoutExpired:
+        return {"error": f"timed out after {timeout:g}s"}
+    if completed.returncode != 0:
+        return {"error": (completed.stderr.strip().splitlines() or ["failed"])[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Reporting
+# ─────────────────────────────────────────────────────────────────────────────
+
+def print_header() -> None:
+    print(f"{'case':<36} {'runs/s':>8} {'MB/s':>8} {'p50':>10} {'p95':>10} {'p99':>10} {'peak RSS':>9}")
+
+
+def print_results(results: Dict[str, Dict[str, Any]]) -> None:
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<36} ERROR {result['error']}")
+            continue
+        peak = result["peak_rss_mb"]
+        print(
+            f"{name:<36} {result['runs_per_s']:>8.2f} {result['mb_per_s']:>8.1f} "
+            f"{result['p50_ms']:>8.1f}ms {result['p95_ms']:>8.1f}ms {result['p99_ms']:>8.1f}ms "
+            f"{(f'{peak:.0f}MB' if peak is not None else '-'):>9}"
+        )
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print current vs. baseline per case and return the names of regressed cases."""
+    regressions = []
+    print(f"\n{'case':<36} {'p50 base':>10} {'p50 now':>10} {'change':>8} {'RSS base':>9} {'RSS now':>8} {'change':>8}")
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or "error" in base or "error" in result:
+            print(f"{name:<36} {'(no comparable baseline)':>40}")
+            continue
+        time_change = result["p50_ms"] / base["p50_ms"] - 1
+        rss_change = (
+            result["peak_rss_mb"] / base["peak_rss_mb"] - 1
+            if result["peak_rss_mb"] and base["peak_rss_mb"] else 0.0
+        )
+        regressed = time_change > threshold or rss_change > threshold
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<36} {base['p50_ms']:>8.1f}ms {result['p50_ms']:>8.1f}ms {time_change:>+7.0%} "
+            f"{base['peak_rss_mb'] or 0:>7.0f}MB {result['peak_rss_mb'] or 0:>6.0f}MB {rss_change:>+7.0%}"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", nargs="+", default=["*"], help="glob patterns over case names")
+    parser.add_argument("--list", action="store_true", help="list case names and exit")
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[1, 4, 12])
+    parser.add_argument("--pdf-pages", type=int, default=50)
+    parser.add_argument("--video-seconds", type=float, default=3)
+    parser.add_argument("--audio-seconds", type=float, default=20)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--pool", action="store_true", help="keep the CPU process pool (peak RSS then excludes workers)")
+    parser.add_argument("--timeout", type=float, default=900, help="seconds per case")
+    parser.add_argument("--fixtures-dir", default=os.path.join(tempfile.gettempdir(), "toolkit-bench-fixtures"))
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--input", help="compare an existing results JSON instead of running")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed p50/peak RSS growth before failing")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        with open(args.config) as handle:
+            config = json.load(handle)
+        case = next(
+            case for case in all_cases(config["fixtures"], config["megapixels"])
+            if case.name == args.run_case
+        )
+        print(json.dumps(measure(case, config["iterations"], config["warmup"])))
+        return
+
+    if args.input:
+        with open(args.input) as handle:
+            current = json.load(handle)
+        print_header()
+        print_results(current["results"])
+    else:
+        fixtures = write_fixtures(
+            args.fixtures_dir, args.megapixels, args.pdf_pages, args.video_seconds, args.audio_seconds,
+        )
+        cases = [
+            case for case in all_cases(fixtures, args.megapixels)
+            if any(fnmatch.fnmatch(case.name, pattern) for pattern in args.cases)
+        ]
+        cases = [case for case in cases if route_exists(case)]
+        if args.list:
+            print("\n".join(case.name for case in cases))
+            return
+
+        config = {
+            "fixtures": fixtures, "megapixels": args.megapixels,
+            "iterations": args.iterations, "warmup": args.warmup,
+        }
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as config_file:
+            json.dump(config, config_file)
+        try:
+            results: Dict[str, Dict[str, Any]] = {}
+            print_header()
+            for case in cases:
+                results[case.name] = run_case_subprocess(case.name, config_file.name, args.pool, args.timeout)
+                print_results({case.name: results[case.name]})
+        finally:
+            os.remove(config_file.name)
+
+        current = {
+            "meta": {
+                "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+                "commit": _git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpu_count": os.cpu_count(),
+                "api_features": os.getenv("API_FEATURES", "all"),
+                "pool": args.pool,
+                "megapixels": args.megapixels,
+                "pdf_pages": args.pdf_pages,
+                "iterations": args.iterations,
+            },
+            "results": results,
+        }
+        if args.output:
+            with open(args.output, "w") as handle:
+                json.dump(current, handle, indent=2)
+            print(f"\nwrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        regressions = compare(current, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+    if any("error" in result for result in current["results"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,71 @@
 import redis
 import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
 from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
 import logging
+import os
+
+from executor import run_io
 
 logger = logging.getLogger(__name__)
 
-class StockCache:
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Result cache configuration
+RESULT_CACHE_MEMORY_BYTES = int(os.getenv("RESULT_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_MAX_ITEM_BYTES = int(os.getenv("RESULT_CACHE_MAX_ITEM_BYTES", str(16 * 1024 * 1024)))
+RESULT_CACHE_DEFAULT_TTL = int(os.getenv("RESULT_CACHE_DEFAULT_TTL", "3600"))
+# Per-endpoint overrides, e.g. "compress_image=86400,pdf_password=300"
+RESULT_CACHE_TTLS = os.getenv("RESULT_CACHE_TTLS", "pdf_password=300,pdf_pipeline=300")
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "1") not in ("0", "false", "False")
+
+# After a Redis failure, skip Redis for this many seconds instead of timing out on every request
+REDIS_RETRY_AFTER_SECONDS = 30
+
+
+def create_redis_client(url: str = REDIS_URL) -> redis.Redis:
+    """Build a Redis client that fails fast when the server is unreachable."""
+    return redis.Redis.from_url(url, socket_connect_timeout=0.5, socket_timeout=1.0)
+
+
+class FakeRedis:
+    """In-process stand-in for the subset of the Redis API used by the caches."""
+
     def __init__(self):
-        self.redis_client = redis.Redis(host='localhost', port=6379, db=0)
+        self._data: Dict[str, tuple] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def setex(self, key: str, ttl: Union[int, timedelta], value: Union[bytes, str]):
+        seconds = ttl.total_seconds() if isinstance(ttl, timedelta) else ttl
+        if isinstance(value, str):
+            value = value.encode()
+        self._data[key] = (value, time.monotonic() + seconds)
+        return True
+
+    def delete(self, *keys: str) -> int:
+        return sum(1 for key in keys if self._data.pop(key, None) is not None)
+
+    def flushdb(self):
+        self._data.clear()
+        return True
+
+
+class StockCache:
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client or redis.Redis(host='localhost', port=6379, db=0)
         self.cache_timeout = timedelta(minutes=15)  # Cache for 15 minutes
 
     def get_stock_info(self, symbol: str) -> dict:
@@ -27,4 +85,194 @@ class StockCache:
                 json.dumps(data)
             )
         except Exception as e:
-            logger.error(f"Redis error: {str(e)}")
\ No newline at end of file
+            logger.error(f"Redis error: {str(e)}")
+
+
+class ResultCache:
+    """
+    Content-addressed cache for endpoint outputs.
+
+    Keys are a hash of the input bytes, the endpoint name and its parameters.
+    Lookups go to a byte-size bounded in-process LRU first, then to Redis;
+    Redis hits are promoted into the LRU. Redis errors are logged and treated
+    as misses so a missing Redis never fails a request.
+    """
+
+    def __init__(
+        self,
+        redis_client=None,
+        max_memory_bytes: int = RESULT_CACHE_MEMORY_BYTES,
+        max_item_bytes: int = RESULT_CACHE_MAX_ITEM_BYTES,
+        default_ttl: int = RESULT_CACHE_DEFAULT_TTL,
+        ttls: Optional[Dict[str, int]] = None,
+    ):
+        self.redis_client = redis_client
+        self.max_memory_bytes = max_memory_bytes
+        self.max_item_bytes = max_item_bytes
+        self.default_ttl = default_ttl
+        self.ttls = ttls if ttls is not None else _parse_ttls(RESULT_CACHE_TTLS)
+        self._lru: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lru_bytes = 0
+        self._redis_retry_at = 0.0
+        self._stats: Dict[str, Dict[str, int]] = {}
+        # get()/set() run on the I/O thread pool
+        self._lock = threading.Lock()
+
+    # Keys ────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def make_key(endpoint: str, content, **params) -> str:
+        """
+        Hash the input with the endpoint and its parameters.
+
+        content is bytes, a SpooledFile (hashed chunk by chunk from memory or
+        disk), or a list of either for multi-file uploads.
+        """
+        digest = hashlib.sha256()
+        digest.update(endpoint.encode())
+        digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+        parts = content if isinstance(content, (list, tuple)) else [content]
+        for part in parts:
+            # Length-prefix each part so ["ab", "c"] and ["a", "bc"] hash differently
+            if hasattr(part, "iter_chunks"):
+                digest.update(part.size.to_bytes(8, "big"))
+                for chunk in part.iter_chunks():
+                    digest.update(chunk)
+            else:
+                digest.update(len(part).to_bytes(8, "big"))
+                digest.update(part)
+        return f"result:{endpoint}:{digest.hexdigest()}"
+
+    def ttl_for(self, endpoint: str) -> int:
+        return self.ttls.get(endpoint, self.default_ttl)
+
+    # Lookups ─────────────────────────────────────────────────────────────────
+
+    def get(self, endpoint: str, key: str) -> Optional[bytes]:
+        value = self._lru_get(key)
+        if value is not None:
+            self._count(endpoint, "memory_hits")
+            return value
+
+        value = self._redis_get(key)
+        if value is not None:
+            self._count(endpoint, "redis_hits")
+            self._lru_put(key, value, self.ttl_for(endpoint))
+            return value
+
+        self._count(endpoint, "misses")
+        return None
+
+    def set(self, endpoint: str, key: str, value: bytes) -> None:
+        if len(value) > self.max_item_bytes:
+            return
+        ttl = self.ttl_for(endpoint)
+        if ttl <= 0:
+            return
+        self._lru_put(key, value, ttl)
+        self._redis_set(key, value, ttl)
+        self._count(endpoint, "stores")
+
+    async def get_or_compute(self, endpoint: str, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached bytes for key, or await compute() and cache what it returns.
+
+        compute() may return bytes or a SpooledFile; spooled results that spilled
+        to disk are passed through without being cached.
+        """
+        if not RESULT_CACHE_ENABLED:
+            return await compute()
+
+        cached = await run_io(self.get, endpoint, key)
+        if cached is not None:
+            return cached
+
+        result = await compute()
+        payload = getattr(result, "data", result)
+        if isinstance(payload, bytes):
+            await run_io(self.set, endpoint, key, payload)
+        return result
+
+    def stats(self) -> dict:
+        hits = sum(s.get("memory_hits", 0) + s.get("redis_hits", 0) for s in self._stats.values())
+        misses = sum(s.get("misses", 0) for s in self._stats.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "memory_entries": len(self._lru),
+            "memory_bytes": self._lru_bytes,
+            "memory_limit_bytes": self.max_memory_bytes,
+            "endpoints": {name: dict(counts) for name, counts in self._stats.items()},
+        }
+
+    # In-process LRU ──────────────────────────────────────────────────────────
+
+    def _lru_get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._lru_evict(key)
+                return None
+            self._lru.move_to_end(key)
+            return value
+
+    def _lru_put(self, key: str, value: bytes, ttl: int) -> None:
+        # Large results only go to Redis so one upload cannot flush the whole tier
+        if len(value) > self.max_memory_bytes // 8:
+            return
+        with self._lock:
+            if key in self._lru:
+                self._lru_evict(key)
+            self._lru[key] = (value, time.monotonic() + ttl)
+            self._lru_bytes += len(value)
+            while self._lru_bytes > self.max_memory_bytes and self._lru:
+                self._lru_evict(next(iter(self._lru)))
+
+    def _lru_evict(self, key: str) -> None:
+        value, _ = self._lru.pop(key)
+        self._lru_bytes -= len(value)
+
+    # Redis ───────────────────────────────────────────────────────────────────
+
+    def _redis_available(self) -> bool:
+        return self.redis_client is not None and time.monotonic() >= self._redis_retry_at
+
+    def _redis_get(self, key: str) -> Optional[bytes]:
+        if not self._redis_available():
+            return None
+        try:
+            return self.redis_client.get(key)
+        except Exception as e:
+            self._redis_failed(e)
+        return None
+
+    def _redis_set(self, key: str, value: bytes, ttl: int) -> None:
+        if not self._redis_available():
+            return
+        try:
+            self.redis_client.setex(key, ttl, value)
+        except Exception as e:
+            self._redis_failed(e)
+
+    def _redis_failed(self, error: Exception) -> None:
+        logger.error(f"Redis error: {str(error)}")
+        self._redis_retry_at = time.monotonic() + REDIS_RETRY_AFTER_SECONDS
+
+    def _count(self, endpoint: str, counter: str) -> None:
+        with self._lock:
+            counts = self._stats.setdefault(endpoint, {"memory_hits": 0, "redis_hits": 0, "misses": 0, "stores": 0})
+            counts[counter] += 1
+
+
+def _parse_ttls(spec: str) -> Dict[str, int]:
+    """Parse 'endpoint=seconds,...' into a dict, ignoring malformed entries."""
+    ttls = {}
+    for item in spec.split(","):
+        name, _, seconds = item.strip().partition("=")
+        if name and seconds.strip().lstrip("-").isdigit():
+            ttls[name.strip()] = int(seconds)
+    return ttls
@@ -0,0 +1,160 @@
+"""
+Executor layer that keeps CPU-bound and blocking work off the asyncio event loop.
+
+- run_cpu() dispatches to a process pool (KMeans, PyPDF2, Pillow, moviepy work)
+- run_io()  dispatches to a thread pool (temp-file writes and other blocking I/O)
+
+Environment variables:
+- CPU_POOL_SIZE      - worker processes (default: CPU count; 0 runs CPU work on the thread pool)
+- IO_POOL_SIZE       - worker threads (default: 8)
+- CPU_POOL_MAX_QUEUE - CPU tasks allowed in flight before new ones are rejected with 503
+                       (default: 4 x CPU_POOL_SIZE); a task abandoned after its timeout
+                       still counts until its worker has finished it
+- CPU_TASK_TIMEOUT   - seconds before a CPU task is abandoned with 504 (default: 120)
+
+Pool workers run warmup.warm_up() as their initializer, so WARMUP features are
+loaded once per worker rather than on each worker's first task.
+"""
+
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
+from typing import Any, Callable, Optional
+import functools
+import asyncio
+import logging
+import os
+
+from metrics import collect_stage_samples, record_stage_samples
+from warmup import WARMUP_FEATURES, warm_up
+
+logger = logging.getLogger(__name__)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Configuration & Constants
+# ─────────────────────────────────────────────────────────────────────────────
+
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", str(os.cpu_count() or 1)))
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "8"))
+CPU_POOL_MAX_QUEUE = int(os.getenv("CPU_POOL_MAX_QUEUE", str(max(CPU_POOL_SIZE, 1) * 4)))
+CPU_TASK_TIMEOUT = float(os.getenv("CPU_TASK_TIMEOUT", "120"))
+
+_cpu_pool: Optional[Executor] = None
+_io_pool: Optional[ThreadPoolExecutor] = None
+_cpu_in_flight = 0
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Pool Management
+# ─────────────────────────────────────────────────────────────────────────────
+
+def get_io_pool() -> ThreadPoolExecutor:
+    """Return the shared thread pool, creating it on first use."""
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=IO_POOL_SIZE, thread_name_prefix="io-worker")
+    return _io_pool
+
+
+def get_cpu_pool() -> Executor:
+    """Return the shared process pool, creating it on first use."""
+    global _cpu_pool
+    if CPU_POOL_SIZE <= 0:
+        return get_io_pool()
+    if _cpu_pool is None:
+        _cpu_pool = ProcessPoolExecutor(max_workers=CPU_POOL_SIZE, initializer=warm_up, initargs=(WARMUP_FEATURES,))
+    return _cpu_pool
+
+
+async def prestart_cpu_pool() -> None:
+    """Start every pool worker now (running the warm-up) instead of on the first requests."""
+    if CPU_POOL_SIZE <= 0:
+        return
+    loop = asyncio.get_running_loop()
+    pool = get_cpu_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, os.getpid) for _ in range(CPU_POOL_SIZE)))
+
+
+def shutdown_executors() -> None:
+    """Shut down both pools; they are recreated lazily if used again."""
+    global _cpu_pool, _io_pool
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(wait=False, cancel_futures=True)
+        _cpu_pool = None
+    if _io_pool is not None:
+        _io_pool.shutdown(wait=False, cancel_futures=True)
+        _io_pool = None
+
+
+def cpu_tasks_in_flight() -> int:
+    """Number of CPU tasks currently queued or running."""
+    return _cpu_in_flight
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Dispatch
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _call_in_worker(func: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+    """
+    Run func in a worker, re-raising HTTPException in a form that survives pickling.
+
+    Returns (result, stage samples) so stage timings recorded in the worker
+    reach the API process's metrics registry.
+    """
+    with collect_stage_samples() as samples:
+        try:
+            return func(*args, **kwargs), samples
+        except HTTPException as exc:
+            raise HTTPException(exc.status_code, exc.detail)
+
+
+def _cpu_task_finished() -> None:
+    global _cpu_in_flight
+    _cpu_in_flight -= 1
+
+
+def _on_worker_done(loop: asyncio.AbstractEventLoop, future: Future) -> None:
+    """Release a task's in-flight slot on the loop once its worker is done (runs in the pool's thread)."""
+    try:
+        loop.call_soon_threadsafe(_cpu_task_finished)
+    except RuntimeError:
+        # The loop has been closed; so has the counter's only reader
+        pass
+
+
+async def run_cpu(func: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """Run a CPU-bound callable on the process pool and await its result."""
+    global _cpu_pool, _cpu_in_flight
+    if _cpu_in_flight >= CPU_POOL_MAX_QUEUE:
+        raise HTTPException(503, "Server is busy, please retry shortly.")
+
+    _cpu_in_flight += 1
+    loop = asyncio.get_running_loop()
+    pool = get_cpu_pool()
+    future: Optional[Future] = None
+    try:
+        future = pool.submit(_call_in_worker, func, args, kwargs)
+        # A timed-out task keeps its worker busy, so it stays counted until the worker is done with it
+        future.add_done_callback(functools.partial(_on_worker_done, loop))
+        result, samples = await asyncio.wait_for(asyncio.wrap_future(future), timeout or CPU_TASK_TIMEOUT)
+        record_stage_samples(samples)
+        return result
+    except asyncio.TimeoutError:
+        # A queued task is cancelled; a running one finishes in the background and its result is dropped
+        logger.warning("CPU task %s timed out after %ss", getattr(func, "__name__", func), timeout or CPU_TASK_TIMEOUT)
+        raise HTTPException(504, "Processing took too long and was cancelled.")
+    except BrokenProcessPool:
+        logger.error("CPU worker pool crashed; it will be recreated on the next request")
+        if _cpu_pool is pool:
+            # Release the broken pool's management thread and pipes
+            pool.shutdown(wait=False, cancel_futures=True)
+            _cpu_pool = None
+        raise HTTPException(500, "Processing worker crashed.")
+    finally:
+        if future is None:
+            _cpu_in_flight -= 1
+
+
+async def run_io(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking I/O callable on the thread pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_pool(), functools.partial(func, *args, **kwargs))
@@ -0,0 +1,224 @@
+"""
+Decoded-image cache shared by the image endpoints and the CPU pool workers.
+
+Users often send the same photo to /compress_image/, /convert-ico/ and
+/stickers/whatsapp one after another. load_image() keeps the pixels it
+decodes here, keyed by a hash of the encoded file, so the next endpoint maps
+them instead of decoding the file again:
+- each entry is one .npy file in DECODED_CACHE_DIR (tmpfs /dev/shm where it
+  exists, so entries live in RAM), written atomically; the API process and
+  every pool worker open it with np.load(mmap_mode="r"), so pixels are shared
+  through the page cache instead of being pickled between processes.
+  L and RGBA images map straight onto those pages; RGB and LA are unpacked
+  into Pillow's 4-byte layout in one pass.
+- an entry holds the image at the resolution it was decoded at (JPEGs are
+  often decoded at reduced scale, see image_loader.py). It serves every
+  request that needs no more than that; a request that needs more decodes
+  again and replaces it.
+- entries expire DECODED_CACHE_TTL seconds after their last use, and the
+  least recently used are evicted to keep the directory within
+  DECODED_CACHE_BYTES
+- only L, LA, RGB and RGBA images without a transparency key are cached;
+  palette and other images whose meaning depends on metadata are decoded
+  as before
+
+Lookups are recorded as stage("decoded_image_cache", "hit"/"miss") timings,
+which reach the API process from pool workers like any other stage, so the
+hit rate covers every process; stats() also reports the directory's size.
+
+Environment variables:
+- DECODED_CACHE_BYTES - total size of cached pixel data, 0 disables the cache (default: 256 MiB)
+- DECODED_CACHE_TTL   - seconds an unused entry is kept (default: 300)
+- DECODED_CACHE_DIR   - where entries are stored (default: /dev/shm/toolkit-decoded-images,
+                        or the temp directory where /dev/shm does not exist)
+"""
+
+from PIL import Image
+from typing import BinaryIO, List, Optional, Tuple
+import numpy as np
+import tempfile
+import hashlib
+import logging
+import time
+import os
+
+from metrics import DECODED_CACHE_ENTRIES, DECODED_CACHE_SIZE, STAGES, observe_stage, stage
+
+logger = logging.getLogger(__name__)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Configuration & Constants
+# ─────────────────────────────────────────────────────────────────────────────
+
+DECODED_CACHE_BYTES = int(os.getenv("DECODED_CACHE_BYTES", str(256 * 1024 * 1024)))
+DECODED_CACHE_TTL = float(os.getenv("DECODED_CACHE_TTL", "300"))
+DECODED_CACHE_DIR = os.getenv("DECODED_CACHE_DIR") or os.path.join(
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "toolkit-decoded-images"
+)
+
+# Channels per cached mode; Image.fromarray() infers the mode back from the array shape
+CACHEABLE_MODES = {"L": 1, "LA": 2, "RGB": 3, "RGBA": 4}
+# One entry may take at most this share of the budget, so a single huge image cannot flush the rest
+MAX_ENTRY_SHARE = 4
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class DecodedImageCache:
+    """Content-addressed store of decoded pixels in a directory shared by all processes."""
+
+    def __init__(self, directory: str = DECODED_CACHE_DIR, max_bytes: int = DECODED_CACHE_BYTES, ttl: float = DECODED_CACHE_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def digest(source: BinaryIO) -> str:
+        """Hash of the stream's remaining contents; the stream is left where it was."""
+        position = source.tell()
+        digest = hashlib.blake2b(digest_size=20)
+        for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        source.seek(position)
+        return digest.hexdigest()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.npy")
+
+    # Lookups ─────────────────────────────────────────────────────────────────
+
+    def get(self, digest: str, full_size: Tuple[int, int], min_size: Optional[Tuple[int, int]]) -> Optional[Image.Image]:
+        """
+        The cached image if it has at least min_size pixels each way (the full size if min_size is None).
+
+        The returned image is read-only shared memory; Pillow copies it on the
+        first in-place change.
+        """
+        started = time.perf_counter()
+        image = self._load(digest, full_size, min_size)
+        observe_stage("decoded_image_cache", "miss" if image is None else "hit", time.perf_counter() - started)
+        return image
+
+    def _load(self, digest: str, full_size: Tuple[int, int], min_size: Optional[Tuple[int, int]]) -> Optional[Image.Image]:
+        path = self._path(digest)
+        try:
+            if os.stat(path).st_mtime + self.ttl <= time.time():
+                self._remove(path)
+                return None
+            pixels = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        height, width = pixels.shape[:2]
+        needed = full_size if min_size is None else min_size
+        if width < needed[0] or height < needed[1]:
+            return None
+        # mtime is the entry's last use, for expiry and LRU eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return Image.fromarray(pixels)
+
+    # Stores ──────────────────────────────────────────────────────────────────
+
+    def put(self, digest: str, image: Image.Image) -> None:
+        """Cache a decoded image unless it is not cacheable or a larger one is already cached."""
+        if image.mode not in CACHEABLE_MODES or "transparency" in image.info:
+            return
+        size = image.width * image.height * CACHEABLE_MODES[image.mode]
+        if size > self.max_bytes // MAX_ENTRY_SHARE:
+            return
+        path = self._path(digest)
+        try:
+            existing = np.load(path, mmap_mode="r")
+            if existing.shape[1] >= image.width and existing.shape[0] >= image.height:
+                return
+        except (OSError, ValueError):
+            pass
+
+        with stage("decoded_image_cache", "store"):
+            os.makedirs(self.directory, exist_ok=True)
+            pixels = np.asarray(image)
+            # Written under a temporary name and renamed, so readers never see a partial file
+            handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(handle, "wb") as target:
+                    np.save(target, pixels)
+                os.replace(temporary, path)
+            except OSError as exc:
+                self._remove(temporary)
+                logger.warning("Could not cache decoded image: %s", exc)
+                return
+        self.evict()
+
+    # Eviction ────────────────────────────────────────────────────────────────
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        """(last use, size, path) of every entry."""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith(".npy"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((info.st_mtime, info.st_size, path))
+        return entries
+
+    def evict(self) -> None:
+        """Remove expired entries, then the least recently used until the cache is within its budget."""
+        now = time.time()
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for last_use, size, path in entries:
+            if last_use + self.ttl > now and total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self) -> None:
+        for _, _, path in self._entries():
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        # Processes that have the entry mapped keep their pages until they drop the image
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # Statistics ──────────────────────────────────────────────────────────────
+
+    def stats(self) -> dict:
+        """Hit/miss counts across all processes, plus the entries and bytes currently cached."""
+        entries = self._entries()
+        size = sum(size for _, size, _ in entries)
+        DECODED_CACHE_ENTRIES.set(len(entries))
+        DECODED_CACHE_SIZE.set(size)
+        hits = STAGES.count(operation="decoded_image_cache", stage="hit")
+        misses = STAGES.count(operation="decoded_image_cache", stage="miss")
+        return {
+            "enabled": self.enabled,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "entries": len(entries),
+            "bytes": size,
+            "limit_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "directory": self.directory,
+        }
+
+
+decoded_images = DecodedImageCache()
@@ -0,0 +1,157 @@
+"""
+Shared image loading with reduced-resolution decoding.
+
+load_image() opens an upload and, when the caller only needs a smaller
+image, decodes at reduced resolution:
+- JPEG uses Image.draft(), which lets libjpeg decode straight to 1/2, 1/4 or
+  1/8 scale (a fraction of the full decode cost)
+- other formats are decoded fully and shrunk with Image.reduce(), a cheap box
+  filter, to no less than twice the needed size (like Image.thumbnail's
+  reducing_gap), so the caller's final LANCZOS resample works on a small image
+The result is never smaller than min_size in either dimension, so callers
+still do their own final resize/crop at full quality. Decoded pixels are
+shared between endpoints and pool workers through image_cache.py, so a file
+sent to several endpoints in turn is only decoded once.
+
+peek_image_size() reads only the header, for callers that need the pixel
+count up front (e.g. admission memory estimates).
+
+downscale_pyramid() builds several fitted sizes of one image, largest first,
+each resampled from the previous level instead of from the full source.
+
+Images over MAX_IMAGE_PIXELS are rejected with 413 before any pixel data is
+decoded (decompression-bomb guard).
+
+Environment variables:
+- MAX_IMAGE_PIXELS - largest accepted width x height (default: 64 MP)
+"""
+
+from fastapi import HTTPException
+from PIL import Image
+from typing import BinaryIO, Iterable, List, Optional, Tuple, Union
+import io
+import os
+
+from image_cache import decoded_images
+
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(64_000_000)))
+
+# Modes where Image.reduce() averages real colour values (not palette indices)
+REDUCIBLE_MODES = {"L", "LA", "RGB", "RGBA", "RGBX", "I", "F"}
+
+# Pillow's own guard warns above this and raises above twice this
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+
+def size_within(size: Tuple[int, int], max_size: Union[int, Tuple[int, int]]) -> Tuple[int, int]:
+    """
+    Size of `size` scaled down (never up) to fit max_size, keeping aspect ratio.
+
+    max_size is a (width, height) box or a single limit for the longer edge.
+    """
+    width, height = size
+    max_width, max_height = (max_size, max_size) if isinstance(max_size, int) else max_size
+    scale = min(1.0, max_width / width, max_height / height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def peek_image_size(source: Union[bytes, BinaryIO]) -> Optional[Tuple[int, int]]:
+    """(width, height) from the image header without decoding pixels, or None if unreadable."""
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    try:
+        with Image.open(stream) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+def load_image(
+    source: Union[bytes, BinaryIO],
+    min_size: Optional[Tuple[int, int]] = None,
+    max_pixels: int = MAX_IMAGE_PIXELS,
+    max_dimension: Optional[Union[int, Tuple[int, int]]] = None,
+    cache: bool = True,
+) -> Image.Image:
+    """
+    Open and decode an image, reducing resolution while staying >= min_size.
+
+    max_dimension (a longer-edge limit or a (width, height) box) is a
+    shortcut for min_size=size_within(image size, max_dimension) when the
+    caller does not know the input size up front.
+
+    With cache=True the pixels come from the shared decoded-image cache when
+    the same file was decoded recently at a large enough size, and are
+    stored there otherwise (see image_cache.py); JPEGs that draft() can
+    decode at reduced scale bypass the cache. A cached image is read-only
+    until modified and has no format or info metadata.
+
+    Raises HTTPException(413) for images over max_pixels and
+    HTTPException(400) for data Pillow cannot identify.
+    """
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    start = stream.tell()
+    try:
+        image = Image.open(stream)
+    except Image.DecompressionBombError:
+        raise HTTPException(413, f"Image is too large. Maximum is {max_pixels} pixels.")
+    except Exception as exc:
+        raise HTTPException(400, f"Invalid image supplied: {exc}")
+
+    width, height = image.size
+    if width * height > max_pixels:
+        raise HTTPException(413, f"Image is too large ({width}x{height}). Maximum is {max_pixels} pixels.")
+
+    if max_dimension is not None:
+        min_size = size_within(image.size, max_dimension)
+    target = None if min_size is None else (max(1, min_size[0]), max(1, min_size[1]))
+    # A JPEG draft decode at 1/2 scale or less is cheaper than mapping and reducing a full-size entry
+    drafted = target is not None and image.format == "JPEG" and image.width >= 2 * target[0] and image.height >= 2 * target[1]
+    digest = None
+    if cache and decoded_images.enabled and not drafted:
+        position = stream.tell()
+        stream.seek(start)
+        digest = decoded_images.digest(stream)
+        stream.seek(position)
+    if digest is not None:
+        cached = decoded_images.get(digest, image.size, target)
+        if cached is not None:
+            return cached if target is None else _reduce_to(cached, target)
+
+    if target is not None and image.format == "JPEG":
+        # draft() only ever picks a scale that keeps both edges >= the requested size
+        image.draft(image.mode if image.mode in ("RGB", "L", "CMYK") else None, target)
+    image.load()
+    if digest is not None:
+        # Before reduce(): the largest decode is the one that can serve the most later requests
+        decoded_images.put(digest, image)
+    return image if target is None else _reduce_to(image, target)
+
+
+def _reduce_to(image: Image.Image, target: Tuple[int, int]) -> Image.Image:
+    """Box-filter an image down to no less than twice target (see the module docstring)."""
+    target_width, target_height = target
+    factor = min(image.width // (2 * target_width), image.height // (2 * target_height))
+    if factor >= 2 and image.mode in REDUCIBLE_MODES:
+        image = image.reduce(factor)
+    return image
+
+
+def downscale_pyramid(image: Image.Image, max_dimensions: Iterable[int]) -> List[Image.Image]:
+    """
+    The image fitted within each longer-edge limit, largest first (never upscaled).
+
+    Only the largest level is resampled from the source; every smaller one
+    is resampled from the level above it, so a large source is filtered
+    once rather than once per size. Limits that fit to the same size share
+    a level.
+    """
+    levels: List[Image.Image] = []
+    current = image
+    for limit in sorted(set(max_dimensions), reverse=True):
+        size = size_within(image.size, limit)
+        if levels and levels[-1].size == size:
+            continue
+        if size != current.size:
+            current = current.resize(size, Image.LANCZOS)
+        levels.append(current)
+    return levels
@@ -0,0 +1,340 @@
+"""
+Image-to-PDF conversion as a page-at-a-time pipeline.
+
+- prepare_pdf_page() turns one upload into a PdfPage in a CPU worker.
+  Baseline JPEGs that need no downscaling are passed through: only the
+  header is parsed and the original DCT stream (minus EXIF/comment
+  segments) is embedded as-is, with no decode and no generation loss.
+  Anything else (PNG/WebP/RGBA, progressive JPEG, downscaled pages) is
+  decoded with Pillow, flattened to RGB/L and JPEG-encoded.
+- ImagePdfWriter appends pages to a seekable output one at a time and
+  writes the page tree and xref table at the end
+- images_to_pdf() runs prepare_pdf_page() for a sliding window of uploads
+  on the process pool and appends finished pages in upload order, so only
+  the pages in the window are ever held in memory
+
+Page layout:
+- page_size 'image' (default) - one page per image, sized to the image at
+  72 DPI, or at `dpi` when given
+- page_size 'a4' / 'letter'   - image fitted and centred on the page; with
+  `dpi`, pixels beyond that resolution at the placed size are dropped
+"""
+
+from collections import deque, namedtuple
+from fastapi import HTTPException
+from PIL import Image
+from typing import BinaryIO, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import io
+import os
+
+from executor import CPU_POOL_SIZE, run_cpu, run_io
+from image_loader import MAX_IMAGE_PIXELS, load_image, size_within
+from metrics import stage
+from uploads import SpillingBuffer, SpooledFile
+
+# Page sizes in PDF points (1/72 inch)
+PAGE_SIZES: Dict[str, Optional[Tuple[float, float]]] = {
+    "image": None,
+    "a4": (595.28, 841.89),
+    "letter": (612.0, 792.0),
+}
+DEFAULT_PAGE_SIZE = "image"
+
+# Pages decoded ahead of the writer; bounds memory to this many encoded pages
+PDF_DECODE_WINDOW = max(CPU_POOL_SIZE, 1) * 2
+
+# Pillow's PDF writer re-encodes RGB pages as JPEG at its default quality
+PDF_JPEG_QUALITY = 75
+
+# Embed original JPEG data when possible (PDF_JPEG_PASSTHROUGH=0 always re-encodes)
+PDF_JPEG_PASSTHROUGH = os.getenv("PDF_JPEG_PASSTHROUGH", "1") not in ("0", "false", "False")
+
+# width/height in pixels; data is the encoded stream for `filter`; decode is an optional /Decode array
+PdfImage = namedtuple("PdfImage", ["width", "height", "color_space", "filter", "data", "decode"], defaults=(None,))
+# page_size in points; placement is (x, y, width, height) of the image on the page in points
+PdfPage = namedtuple("PdfPage", ["image", "page_size", "placement"])
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Page Preparation
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _layout(pixel_size: Tuple[int, int], page_size: str, dpi: Optional[int]):
+    """Return (page size, placement box, pixel target or None) in points/pixels."""
+    width, height = pixel_size
+    page = PAGE_SIZES[page_size]
+    if page is None:
+        scale = 72.0 / (dpi or 72)
+        page = (width * scale, height * scale)
+        return page, (0.0, 0.0, page[0], page[1]), None
+
+    fit = min(page[0] / width, page[1] / height)
+    placed = (width * fit, height * fit)
+    placement = ((page[0] - placed[0]) / 2, (page[1] - placed[1]) / 2, placed[0], placed[1])
+    target = None
+    if dpi:
+        target = (max(1, round(placed[0] / 72 * dpi)), max(1, round(placed[1] / 72 * dpi)))
+    return page, placement, target
+
+
+def prepare_pdf_page(
+    upload: SpooledFile,
+    page_size: str = DEFAULT_PAGE_SIZE,
+    dpi: Optional[int] = None,
+    passthrough: bool = PDF_JPEG_PASSTHROUGH,
+) -> PdfPage:
+    """Turn one uploaded image into a PDF page (runs in a CPU worker)."""
+    if passthrough:
+        with stage("convert_to_pdf", "passthrough"):
+            page = _jpeg_passthrough_page(upload, page_size, dpi)
+        if page is not None:
+            return page
+
+    with upload.open() as stream, stage("convert_to_pdf", "decode"):
+        try:
+            with Image.open(stream) as probe:
+                pixel_size = probe.size
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid image format: {str(e)}")
+        page, placement, target = _layout(pixel_size, page_size, dpi)
+
+        stream.seek(0)
+        # Pages of a PDF batch are decoded once; caching them would only evict other users' images
+        image = load_image(stream, max_dimension=target, cache=False)
+        if target is not None:
+            image.thumbnail(size_within(image.size, target), Image.LANCZOS)
+
+    color_space = "DeviceGray" if image.mode in ("1", "L") else "DeviceRGB"
+    target_mode = "L" if color_space == "DeviceGray" else "RGB"
+    if image.mode != target_mode:
+        image = image.convert(target_mode)
+
+    buffer = io.BytesIO()
+    with stage("convert_to_pdf", "encode"):
+        image.save(buffer, format="JPEG", quality=PDF_JPEG_QUALITY)
+    return PdfPage(PdfImage(image.width, image.height, color_space, "DCTDecode", buffer.getvalue()), page, placement)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# JPEG Passthrough
+# ─────────────────────────────────────────────────────────────────────────────
+
+JpegInfo = namedtuple("JpegInfo", ["width", "height", "components", "precision", "frame_marker", "adobe_transform"])
+
+# Start-of-frame markers (C4 = DHT, C8 = JPG, CC = DAC are not frames)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# Baseline and extended sequential Huffman: safe for every PDF reader's DCTDecode
+PASSTHROUGH_SOF_MARKERS = {0xC0, 0xC1}
+JPEG_COLOR_SPACES = {1: "DeviceGray", 3: "DeviceRGB", 4: "DeviceCMYK"}
+# Only this much is read to find the frame header before committing to a passthrough
+JPEG_HEADER_PROBE_BYTES = 64 * 1024
+
+
+def _jpeg_segments(data: bytes) -> Iterator[Tuple[int, int, int]]:
+    """Yield (marker, start, end) for each header segment up to the start of scan."""
+    if data[:2] != b"\xff\xd8":
+        return
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            return
+        marker = data[position + 1]
+        if marker == 0xFF:  # fill byte
+            position += 1
+            continue
+        if marker == 0xDA:
+            yield marker, position, len(data)
+            return
+        end = position + 2 + int.from_bytes(data[position + 2:position + 4], "big")
+        yield marker, position, end
+        position = end
+
+
+def parse_jpeg_header(data: bytes) -> Optional[JpegInfo]:
+    """Read dimensions and colour layout from a JPEG's frame header without decoding it."""
+    adobe_transform = None
+    for marker, start, end in _jpeg_segments(data):
+        segment = data[start + 4:end]
+        if marker == 0xEE and segment[:5] == b"Adobe" and len(segment) >= 12:
+            adobe_transform = segment[11]
+        elif marker in SOF_MARKERS and len(segment) >= 6:
+            return JpegInfo(
+                width=int.from_bytes(segment[3:5], "big"),
+                height=int.from_bytes(segment[1:3], "big"),
+                components=segment[5],
+                precision=segment[0],
+                frame_marker=marker,
+                adobe_transform=adobe_transform,
+            )
+    return None
+
+
+def strip_jpeg_metadata(data: bytes) -> bytes:
+    """Drop EXIF/XMP/ICC/comment segments (keeping JFIF and Adobe markers the decoder needs)."""
+    parts = [data[:2]]
+    for marker, start, end in _jpeg_segments(data):
+        if (0xE1 <= marker <= 0xEF and marker != 0xEE) or marker == 0xFE:
+            continue
+        parts.append(data[start:end])
+    return b"".join(parts)
+
+
+def _jpeg_passthrough_page(upload: SpooledFile, page_size: str, dpi: Optional[int]) -> Optional[PdfPage]:
+    """Build a page that embeds the upload's JPEG stream unchanged, or None if it needs re-encoding."""
+    with upload.open() as stream:
+        header = stream.read(JPEG_HEADER_PROBE_BYTES)
+    if header[:2] != b"\xff\xd8":
+        return None
+    info = parse_jpeg_header(header)
+    data = None
+    if info is None and len(header) == JPEG_HEADER_PROBE_BYTES:
+        # Large EXIF/ICC segments can push the frame header past the probe
+        data = upload.read_bytes()
+        info = parse_jpeg_header(data)
+    if (
+        info is None
+        or info.frame_marker not in PASSTHROUGH_SOF_MARKERS
+        or info.precision != 8
+        or info.components not in JPEG_COLOR_SPACES
+        or not info.width
+        or not info.height
+    ):
+        return None
+    if info.width * info.height > MAX_IMAGE_PIXELS:
+        raise HTTPException(413, f"Image is too large ({info.width}x{info.height}). Maximum is {MAX_IMAGE_PIXELS} pixels.")
+
+    page, placement, target = _layout((info.width, info.height), page_size, dpi)
+    if target is not None and size_within((info.width, info.height), target) != (info.width, info.height):
+        return None
+
+    data = strip_jpeg_metadata(data if data is not None else upload.read_bytes())
+    # Adobe-tagged CMYK JPEGs store inverted ink values
+    decode = (1, 0) * 4 if info.components == 4 and info.adobe_transform is not None else None
+    image = PdfImage(info.width, info.height, JPEG_COLOR_SPACES[info.components], "DCTDecode", data, decode)
+    return PdfPage(image, page, placement)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Incremental PDF Writer
+# ─────────────────────────────────────────────────────────────────────────────
+
+def _num(value: float) -> str:
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+class ImagePdfWriter:
+    """Write one image per page to a binary stream without keeping earlier pages in memory."""
+
+    CATALOG, PAGES = 1, 2
+
+    def __init__(self, stream: BinaryIO):
+        self.stream = stream
+        self._offsets: Dict[int, int] = {}
+        self._page_refs: List[int] = []
+        self._next_object = 3
+        self.stream.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    @property
+    def page_count(self) -> int:
+        return len(self._page_refs)
+
+    def _write_object(self, number: int, body: bytes, stream: Optional[bytes] = None) -> None:
+        self._offsets[number] = self.stream.tell()
+        self.stream.write(f"{number} 0 obj\n".encode())
+        self.stream.write(body)
+        if stream is not None:
+            self.stream.write(b"\nstream\n")
+            self.stream.write(stream)
+            self.stream.write(b"\nendstream")
+        self.stream.write(b"\nendobj\n")
+
+    def _allocate(self) -> int:
+        number = self._next_object
+        self._next_object += 1
+        return number
+
+    @stage("convert_to_pdf", "serialize")
+    def add_page(self, page: PdfPage) -> None:
+        image_ref, content_ref, page_ref = self._allocate(), self._allocate(), self._allocate()
+        image = page.image
+        self._write_object(
+            image_ref,
+            (
+                f"<< /Type /XObject /Subtype /Image /Width {image.width} /Height {image.height} "
+                f"/ColorSpace /{image.color_space} /BitsPerComponent 8 /Filter /{image.filter} "
+                + (f"/Decode [{' '.join(map(str, image.decode))}] " if image.decode else "")
+                + f"/Length {len(image.data)} >>"
+            ).encode(),
+            image.data,
+        )
+
+        x, y, width, height = page.placement
+        content = f"q {_num(width)} 0 0 {_num(height)} {_num(x)} {_num(y)} cm /Im0 Do Q".encode()
+        self._write_object(content_ref, f"<< /Length {len(content)} >>".encode(), content)
+
+        procset = "/ImageB" if image.color_space == "DeviceGray" else "/ImageC"
+        self._write_object(
+            page_ref,
+            (
+                f"<< /Type /Page /Parent {self.PAGES} 0 R "
+                f"/MediaBox [0 0 {_num(page.page_size[0])} {_num(page.page_size[1])}] "
+                f"/Resources << /XObject << /Im0 {image_ref} 0 R >> /ProcSet [/PDF {procset}] >> "
+                f"/Contents {content_ref} 0 R >>"
+            ).encode(),
+        )
+        self._page_refs.append(page_ref)
+
+    @stage("convert_to_pdf", "serialize")
+    def close(self) -> None:
+        """Write the page tree, catalog, xref table and trailer."""
+        if not self._page_refs:
+            raise HTTPException(status_code=400, detail="No valid images found")
+        kids = " ".join(f"{ref} 0 R" for ref in self._page_refs)
+        self._write_object(self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self._page_refs)} >>".encode())
+        self._write_object(self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>".encode())
+
+        xref_offset = self.stream.tell()
+        lines = [f"xref\n0 {self._next_object}\n", "0000000000 65535 f \n"]
+        lines.extend(f"{self._offsets[number]:010d} 00000 n \n" for number in range(1, self._next_object))
+        lines.append(f"trailer\n<< /Size {self._next_object} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n")
+        self.stream.write("".join(lines).encode())
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Pipeline
+# ─────────────────────────────────────────────────────────────────────────────
+
+async def images_to_pdf(
+    uploads: List[SpooledFile],
+    page_size: str = DEFAULT_PAGE_SIZE,
+    dpi: Optional[int] = None,
+    window: int = PDF_DECODE_WINDOW,
+    passthrough: bool = PDF_JPEG_PASSTHROUGH,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> SpooledFile:
+    """
+    Decode uploads in parallel and append them as pages in order, spilling large output to disk.
+
+    progress(pages written, total pages) is called after each page is appended.
+    """
+    buffer = SpillingBuffer(suffix=".pdf")
+    writer = ImagePdfWriter(buffer)
+    pending: Deque[asyncio.Future] = deque()
+
+    async def write_next() -> None:
+        await run_io(writer.add_page, await pending.popleft())
+        if progress is not None:
+            await run_io(progress, writer.page_count, len(uploads))
+
+    try:
+        for upload in uploads:
+            pending.append(asyncio.ensure_future(run_cpu(prepare_pdf_page, upload, page_size, dpi, passthrough)))
+            if len(pending) >= window:
+                await write_next()
+        while pending:
+            await write_next()
+        await run_io(writer.close)
+    except BaseException:
+        for future in pending:
+            future.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        buffer.to_spooled().cleanup()
+        raise
+    return buffer.to_spooled()
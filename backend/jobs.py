@@ -0,0 +1,424 @@
+"""
+Background job queue for conversions that outlive a proxy timeout.
+
+Clients submit work with POST /jobs/{kind}, poll GET /jobs/{id} and download
+GET /jobs/{id}/result. Each job kind registers a prepare() step that
+validates the request up front (so bad input still fails with 400 at submit
+time) and a run() coroutine that does the work, usually via run_cpu() on the
+process pool.
+
+- priority classes - high (e.g. ICO), normal, low (e.g. video stickers);
+  workers always take the highest class first, and JOB_RESERVED_WORKERS
+  workers only ever take high-priority jobs so quick conversions never wait
+  behind a queue of heavy ones
+- cancellation - queued jobs are dropped; running jobs are marked cancelled
+  and their result is discarded when the worker returns
+- expiry - job records and results are stored with a TTL (JOB_RESULT_TTL)
+  in Redis, or in an in-process FakeRedis when Redis is not available
+- progress - kinds registered with reports_progress=True get a JobProgress
+  callback, progress(done, total), that works from pool workers too (e.g.
+  frames encoded / expected frames); GET /jobs/{id} reports it while the
+  job runs. Other kinds report 0.0 until they finish with 1.0
+
+The queue itself lives in the process that accepted the job (inputs are
+spooled locally); records and results go through the store so any API
+process sharing the Redis instance can report status and serve results.
+Live progress is only seen by the process running the job.
+
+Environment variables:
+- JOB_BACKEND          - 'redis', 'memory' or 'auto' (Redis if it answers a ping; default)
+- JOB_WORKERS          - concurrent jobs (default: CPU_POOL_SIZE, at least 2)
+- JOB_RESERVED_WORKERS - workers that only run high-priority jobs (default: 1)
+- JOB_MAX_QUEUED       - queued jobs before submissions are rejected with 503 (default: 100)
+- JOB_RESULT_TTL       - seconds records and results are kept after finishing (default: 3600)
+- JOB_MAX_RESULT_BYTES - largest result kept for download (default: 64 MiB)
+"""
+
+from collections import deque, namedtuple
+from fastapi import HTTPException
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Union
+import tempfile
+import asyncio
+import logging
+import shutil
+import json
+import time
+import uuid
+import os
+
+from cache_handler import FakeRedis
+from executor import CPU_POOL_SIZE, run_io
+from uploads import SpooledFile
+
+logger = logging.getLogger(__name__)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Configuration & Constants
+# ─────────────────────────────────────────────────────────────────────────────
+
+JOB_BACKEND = os.getenv("JOB_BACKEND", "auto")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(max(CPU_POOL_SIZE, 2))))
+JOB_RESERVED_WORKERS = int(os.getenv("JOB_RESERVED_WORKERS", "1"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "100"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+JOB_MAX_RESULT_BYTES = int(os.getenv("JOB_MAX_RESULT_BYTES", str(64 * 1024 * 1024)))
+
+# Queued/running records outlive any realistic job; finished ones switch to JOB_RESULT_TTL
+JOB_ACTIVE_TTL = 24 * 3600
+
+PRIORITIES = ("high", "normal", "low")
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+JobKind = namedtuple("JobKind", ["prepare", "run", "priority", "reports_progress"])
+JobOutput = namedtuple("JobOutput", ["data", "media_type", "filename"])
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Job Store
+# ─────────────────────────────────────────────────────────────────────────────
+
+class JobStore:
+    """Job records (JSON) and results (bytes) kept with a TTL in Redis or FakeRedis."""
+
+    def __init__(self, redis_client=None):
+        self.redis_client = redis_client if redis_client is not None else FakeRedis()
+
+    @property
+    def backend(self) -> str:
+        return "memory" if isinstance(self.redis_client, FakeRedis) else "redis"
+
+    def save(self, job: Dict[str, Any], ttl: int) -> None:
+        self.redis_client.setex(f"job:{job['id']}", ttl, json.dumps(job))
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.redis_client.get(f"job:{job_id}")
+        return json.loads(raw) if raw else None
+
+    def save_result(self, job_id: str, data: bytes, ttl: int) -> None:
+        self.redis_client.setex(f"job:{job_id}:result", ttl, data)
+
+    def load_result(self, job_id: str) -> Optional[bytes]:
+        return self.redis_client.get(f"job:{job_id}:result")
+
+
+def create_job_store(redis_client=None, backend: str = JOB_BACKEND) -> JobStore:
+    """Pick the job store backend, falling back to memory when Redis is unreachable in 'auto' mode."""
+    if backend == "memory" or redis_client is None:
+        return JobStore()
+    if backend == "auto":
+        try:
+            redis_client.ping()
+        except Exception as e:
+            logger.warning(f"Redis unavailable for jobs ({e}); using the in-memory job store")
+            return JobStore()
+    return JobStore(redis_client)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Progress
+# ─────────────────────────────────────────────────────────────────────────────
+
+class JobProgress:
+    """
+    Progress callback for one job: progress(done, total).
+
+    The fraction goes to a small file rather than to memory so the callback
+    can be pickled into a process-pool worker and still be read by the API
+    process. Writes are skipped until the fraction has moved by at least 1%.
+    """
+
+    STEP = 0.01
+
+    def __init__(self, path: str):
+        self.path = path
+        self._reported = 0.0
+
+    def __call__(self, done: int, total: int) -> None:
+        fraction = min(done / total, 1.0) if total > 0 else 0.0
+        if fraction - self._reported < self.STEP:
+            return
+        self._reported = fraction
+        temp_path = f"{self.path}.{os.getpid()}"
+        with open(temp_path, "w") as handle:
+            handle.write(f"{fraction:.4f}")
+        os.replace(temp_path, self.path)
+
+    def read(self) -> float:
+        try:
+            with open(self.path) as handle:
+                return float(handle.read())
+        except (OSError, ValueError):
+            return 0.0
+
+    def close(self) -> None:
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Job Queue
+# ─────────────────────────────────────────────────────────────────────────────
+
+class JobQueue:
+    """Priority queue of jobs run by a fixed set of asyncio workers."""
+
+    def __init__(
+        self,
+        store: Optional[JobStore] = None,
+        workers: int = JOB_WORKERS,
+        reserved_workers: int = JOB_RESERVED_WORKERS,
+        max_queued: int = JOB_MAX_QUEUED,
+        result_ttl: int = JOB_RESULT_TTL,
+        max_result_bytes: int = JOB_MAX_RESULT_BYTES,
+    ):
+        self.store = store or JobStore()
+        self.workers = max(workers, 1)
+        # Keep at least one worker for normal/low jobs
+        self.reserved_workers = min(max(reserved_workers, 0), self.workers - 1)
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self.max_result_bytes = max_result_bytes
+        self.kinds: Dict[str, JobKind] = {}
+        self._queues: Dict[str, Deque[str]] = {priority: deque() for priority in PRIORITIES}
+        self._pending: Dict[str, tuple] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._progress: Dict[str, JobProgress] = {}
+        self._progress_dir: Optional[str] = None
+        self._wakeup: Optional[asyncio.Condition] = None
+        self._worker_tasks: List[asyncio.Task] = []
+
+    def register(
+        self,
+        kind: str,
+        run: Callable[..., Awaitable[JobOutput]],
+        prepare: Optional[Callable[[List[SpooledFile], Dict[str, str]], Dict[str, Any]]] = None,
+        priority: Union[str, Callable[[List[SpooledFile], Dict[str, Any]], str]] = "normal",
+        reports_progress: bool = False,
+    ) -> None:
+        """
+        Add a job kind.
+
+        prepare(files, form_fields) validates the submission and returns the
+        keyword arguments for run(files, **kwargs). priority is a class name or
+        a callable taking the same (files, kwargs) and returning one. With
+        reports_progress, run() also gets a progress=JobProgress keyword.
+        """
+        self.kinds[kind] = JobKind(prepare or (lambda files, fields: {}), run, priority, reports_progress)
+
+    # Lifecycle ───────────────────────────────────────────────────────────────
+
+    def start(self) -> None:
+        """Start the workers on the running loop (idempotent)."""
+        if self._worker_tasks:
+            return
+        self._wakeup = asyncio.Condition()
+        self._progress_dir = tempfile.mkdtemp(prefix="job-progress-")
+        for index in range(self.workers):
+            allowed = PRIORITIES[:1] if index < self.reserved_workers else PRIORITIES
+            self._worker_tasks.append(asyncio.create_task(self._worker(allowed), name=f"job-worker-{index}"))
+
+    async def stop(self) -> None:
+        """Cancel the workers and running jobs, and drop queued inputs."""
+        tasks = self._worker_tasks + list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._running.clear()
+        for queue in self._queues.values():
+            queue.clear()
+        for files, _ in self._pending.values():
+            _cleanup(files)
+        self._pending.clear()
+        self._progress.clear()
+        if self._progress_dir:
+            shutil.rmtree(self._progress_dir, ignore_errors=True)
+            self._progress_dir = None
+
+    # Client API ──────────────────────────────────────────────────────────────
+
+    async def submit(self, kind: str, files: List[SpooledFile], fields: Dict[str, str]) -> Dict[str, Any]:
+        """
+        Validate and queue a job, returning its record.
+
+        Takes ownership of files: they are cleaned up once the job finishes
+        (or straight away if the submission is rejected).
+        """
+        try:
+            spec = self.kinds.get(kind)
+            if spec is None:
+                raise HTTPException(404, f"Unknown job kind '{kind}'. Expected one of: {', '.join(self.kinds)}")
+            if len(self._pending) >= self.max_queued:
+                raise HTTPException(503, "Job queue is full, please retry shortly.")
+
+            kwargs = spec.prepare(files, fields)
+            priority = spec.priority(files, kwargs) if callable(spec.priority) else spec.priority
+            if priority not in PRIORITIES:
+                raise ValueError(f"Job kind {kind} returned unknown priority {priority!r}")
+
+            job = {
+                "id": uuid.uuid4().hex,
+                "kind": kind,
+                "priority": priority,
+                "status": "queued",
+                "progress": 0.0,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "error": None,
+                "media_type": None,
+                "filename": None,
+                "size": None,
+            }
+            await run_io(self.store.save, job, JOB_ACTIVE_TTL)
+        except BaseException:
+            _cleanup(files)
+            raise
+
+        self.start()
+        self._pending[job["id"]] = (files, kwargs)
+        self._queues[priority].append(job["id"])
+        async with self._wakeup:
+            # Wake every worker: one that only takes high-priority jobs must not swallow the wake-up
+            self._wakeup.notify_all()
+        return job
+
+    async def status(self, job_id: str) -> Dict[str, Any]:
+        job = await run_io(self.store.load, job_id)
+        if job is None:
+            raise HTTPException(404, "Job not found or expired.")
+        if job["status"] == "queued" and job_id in self._pending:
+            job["queue_position"] = self._queue_position(job_id, job["priority"])
+        elif job["status"] == "running" and job_id in self._progress:
+            job["progress"] = await run_io(self._progress[job_id].read)
+        return job
+
+    async def result(self, job_id: str) -> tuple:
+        """Return (record, result bytes) for a finished job."""
+        job = await self.status(job_id)
+        if job["status"] == "failed":
+            raise HTTPException(409, f"Job failed: {job['error']}")
+        if job["status"] != "done":
+            raise HTTPException(409, f"Job is {job['status']}.")
+        data = await run_io(self.store.load_result, job_id)
+        if data is None:
+            raise HTTPException(404, "Job result has expired.")
+        return job, data
+
+    async def cancel(self, job_id: str) -> Dict[str, Any]:
+        """Cancel a queued or running job."""
+        job = await self.status(job_id)
+        if job["status"] in FINISHED_STATUSES:
+            raise HTTPException(409, f"Job is already {job['status']}.")
+
+        if job_id in self._pending:
+            files, _ = self._pending.pop(job_id)
+            self._queues[job["priority"]].remove(job_id)
+            _cleanup(files)
+        task = self._running.get(job_id)
+        if task is not None:
+            # A process-pool worker cannot be interrupted; its result is dropped when it returns
+            task.cancel()
+
+        # Also covers jobs queued by another API process: its worker checks the record before running
+        job.pop("queue_position", None)
+        job.update(status="cancelled", finished_at=time.time())
+        await run_io(self.store.save, job, self.result_ttl)
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.store.backend,
+            "workers": self.workers,
+            "reserved_workers": self.reserved_workers,
+            "running": len(self._running),
+            "queued": {priority: len(queue) for priority, queue in self._queues.items()},
+        }
+
+    # Workers ─────────────────────────────────────────────────────────────────
+
+    def _queue_position(self, job_id: str, priority: str) -> int:
+        ahead = sum(len(self._queues[p]) for p in PRIORITIES[:PRIORITIES.index(priority)])
+        return ahead + self._queues[priority].index(job_id)
+
+    def _next_job(self, allowed: tuple) -> Optional[str]:
+        for priority in allowed:
+            if self._queues[priority]:
+                return self._queues[priority].popleft()
+        return None
+
+    async def _worker(self, allowed: tuple) -> None:
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(lambda: any(self._queues[p] for p in allowed))
+                job_id = self._next_job(allowed)
+            files, kwargs = self._pending.pop(job_id)
+            task = asyncio.create_task(self._execute(job_id, files, kwargs))
+            self._running[job_id] = task
+            try:
+                await asyncio.shield(task)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    # The worker itself is being stopped
+                    task.cancel()
+                    raise
+            finally:
+                self._running.pop(job_id, None)
+                _cleanup(files)
+
+    async def _execute(self, job_id: str, files: List[SpooledFile], kwargs: Dict[str, Any]) -> None:
+        job = await run_io(self.store.load, job_id)
+        if job is None or job["status"] != "queued":
+            return
+        job.update(status="running", started_at=time.time())
+        await run_io(self.store.save, job, JOB_ACTIVE_TTL)
+
+        spec = self.kinds[job["kind"]]
+        if spec.reports_progress:
+            progress = JobProgress(os.path.join(self._progress_dir, job_id))
+            self._progress[job_id] = progress
+            kwargs = dict(kwargs, progress=progress)
+
+        output: Optional[JobOutput] = None
+        try:
+            output = await spec.run(files, **kwargs)
+            data = await run_io(_output_bytes, output.data, self.max_result_bytes)
+        except asyncio.CancelledError:
+            raise
+        except HTTPException as e:
+            job.update(status="failed", error=str(e.detail))
+        except Exception as e:
+            logger.error("Job %s (%s) failed: %s", job_id, job["kind"], e, exc_info=True)
+            job.update(status="failed", error="Internal error while processing the job.")
+        else:
+            current = await run_io(self.store.load, job_id)
+            if current is not None and current["status"] == "cancelled":
+                return
+            await run_io(self.store.save_result, job_id, data, self.result_ttl)
+            job.update(
+                status="done",
+                progress=1.0,
+                media_type=output.media_type,
+                filename=output.filename,
+                size=len(data),
+            )
+        finally:
+            if output is not None and isinstance(output.data, SpooledFile):
+                output.data.cleanup()
+            progress = self._progress.pop(job_id, None)
+            if progress is not None:
+                progress.close()
+
+        job["finished_at"] = time.time()
+        await run_io(self.store.save, job, self.result_ttl)
+
+
+def _output_bytes(data: Union[bytes, SpooledFile], max_bytes: int) -> bytes:
+    size = data.size if isinstance(data, SpooledFile) else len(data)
+    if size > max_bytes:
+        raise HTTPException(413, f"Result is too large to keep for download ({size} bytes).")
+    return data.read_bytes() if isinstance(data, SpooledFile) else data
+
+
+def _cleanup(files: List[SpooledFile]) -> None:
+    for spooled in files:
+        spooled.cleanup()
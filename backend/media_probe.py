@@ -0,0 +1,466 @@
+"""
+Container probing from the first bytes of an upload.
+
+probe_media() identifies an upload by its magic bytes, not its MIME type or
+file name, and reads what the container header says about it:
+- JPEG, PNG, WebP      - image; dimensions from the header
+- MP4/MOV (ISO BMFF)   - duration (mvhd), dimensions (tkhd), codec (stsd) and whether
+                         there is a video track (hdlr); audio-only files (M4A) are audio
+- Matroska/WebM (EBML) - duration (Info), dimensions and codec (Tracks)
+- Ogg                  - codec of the first stream (Theora is video, the rest audio)
+- MP3, AAC, FLAC       - an MPEG Layer III frame header, ADTS header or FLAC marker,
+                         after any ID3v2 tag
+- WAV                  - codec and duration from the fmt/data chunks
+Anything else has kind None.
+
+MediaProbe applies it while an upload is being spooled (see
+spool_upload(on_chunk=...)), so a handler can reject over-length or
+unsupported media as soon as the header has arrived instead of after
+reading, hashing and decoding all of it. If the header is not within the
+first MEDIA_PROBE_BYTES (e.g. an MP4 whose moov box follows the media data),
+MediaProbe.finish() probes the spooled file, seeking over the media data.
+
+Environment variables:
+- MEDIA_PROBE_BYTES - upload prefix buffered for the incremental probe (default: 1 MiB)
+"""
+
+from collections import namedtuple
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+import struct
+import io
+import os
+
+from image_loader import peek_image_size
+from uploads import SpooledFile
+
+MEDIA_PROBE_BYTES = int(os.getenv("MEDIA_PROBE_BYTES", str(1024 * 1024)))
+
+# Zero padding after an ID3v2 tag skipped when looking for the first MP3 frame
+MP3_PADDING_BYTES = 4096
+
+# Largest header structure (moov box, EBML Info/Tracks) read into memory; real ones are kilobytes
+MAX_HEADER_BYTES = 16 * 1024 * 1024
+
+# kind is "image", "video", "audio" or None (unrecognised); unknown fields are None
+MediaInfo = namedtuple("MediaInfo", ["kind", "container", "codec", "duration", "width", "height"])
+UNKNOWN_MEDIA = MediaInfo(None, None, None, None, None, None)
+
+
+class _Truncated(Exception):
+    """The header continues past the bytes available so far."""
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Probing
+# ─────────────────────────────────────────────────────────────────────────────
+
+def probe_media(stream: BinaryIO, partial: bool = False) -> Optional[MediaInfo]:
+    """
+    Identify the media in a seekable stream from its headers.
+
+    With partial=True the stream holds only a prefix of the upload, and None
+    means more bytes are needed before the header can be read.
+    """
+    stream.seek(0)
+    head = stream.read(16)
+    stream.seek(0)
+    try:
+        for matches, probe in _PROBES:
+            if matches(head):
+                return probe(stream, partial)
+        if partial and len(head) < 16:
+            raise _Truncated()
+        return UNKNOWN_MEDIA
+    except _Truncated:
+        return None if partial else UNKNOWN_MEDIA
+    except (struct.error, ValueError, IndexError, UnicodeDecodeError):
+        # Recognised magic bytes but a malformed header
+        return UNKNOWN_MEDIA
+
+
+def _read(stream: BinaryIO, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) < size:
+        raise _Truncated()
+    return data
+
+
+def _stream_size(stream: BinaryIO) -> int:
+    position = stream.tell()
+    size = stream.seek(0, io.SEEK_END)
+    stream.seek(position)
+    return size
+
+
+def _skip(stream: BinaryIO, offset: int) -> None:
+    """Seek to offset, which must lie within the bytes available."""
+    if offset > _stream_size(stream):
+        raise _Truncated()
+    stream.seek(offset)
+
+# Images ──────────────────────────────────────────────────────────────────────
+
+_IMAGE_MAGIC = {b"\xff\xd8\xff": "jpeg", b"\x89PNG\r\n\x1a\n": "png"}
+
+
+def _is_image(head: bytes) -> bool:
+    return any(head.startswith(magic) for magic in _IMAGE_MAGIC) or (head[:4] == b"RIFF" and head[8:12] == b"WEBP")
+
+
+def _probe_image(stream: BinaryIO, partial: bool) -> MediaInfo:
+    head = stream.read(16)
+    container = next((name for magic, name in _IMAGE_MAGIC.items() if head.startswith(magic)), "webp")
+    stream.seek(0)
+    size = peek_image_size(stream)
+    if size is None:
+        if partial:
+            raise _Truncated()
+        # Let the decoder report what is wrong with it
+        return MediaInfo("image", container, container, None, None, None)
+    return MediaInfo("image", container, container, None, size[0], size[1])
+
+# ISO BMFF (MP4, MOV, M4A) ────────────────────────────────────────────────────
+
+_ISO_TOP_LEVEL = {b"ftyp", b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot"}
+_AUDIO_BRANDS = {b"M4A ", b"M4B ", b"M4P ", b"F4A ", b"F4B "}
+
+
+def _is_iso_bmff(head: bytes) -> bool:
+    return head[4:8] in _ISO_TOP_LEVEL
+
+
+def _iter_boxes(data: bytes, start: int, end: int):
+    """(type, payload start, box end) of each box in data[start:end]."""
+    while start + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, start)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, start + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - start
+        if size < header or start + size > end:
+            return
+        yield box_type, start + header, start + size
+        start += size
+
+
+def _probe_iso_bmff(stream: BinaryIO, partial: bool) -> MediaInfo:
+    brand = None
+    while True:
+        box_start = stream.tell()
+        header = stream.read(8)
+        if not header and not partial:
+            # No moov box at all: only the brand says what this is
+            return MediaInfo("audio" if brand in _AUDIO_BRANDS else "video", "mp4", None, None, None, None)
+        if len(header) < 8:
+            raise _Truncated()
+        size, box_type = struct.unpack(">I4s", header)
+        if size == 1:
+            size = struct.unpack(">Q", _read(stream, 8))[0]
+        elif size == 0:
+            size = _stream_size(stream) - box_start
+        if size < 8:
+            raise ValueError("Invalid box size")
+        if box_type == b"ftyp":
+            brand = _read(stream, 4)
+        elif box_type == b"moov":
+            if size > MAX_HEADER_BYTES:
+                raise ValueError("moov box too large")
+            stream.seek(box_start)
+            return _parse_moov(_read(stream, size), brand)
+        # Everything else, mdat included, is skipped by its size
+        _skip(stream, box_start + size)
+
+
+def _parse_moov(moov: bytes, brand: Optional[bytes]) -> MediaInfo:
+    duration = None
+    tracks = []
+    for box_type, start, end in _iter_boxes(moov, 8, len(moov)):
+        if box_type == b"mvhd":
+            if moov[start] == 1:
+                timescale, length = struct.unpack_from(">IQ", moov, start + 20)
+            else:
+                timescale, length = struct.unpack_from(">II", moov, start + 12)
+            if timescale:
+                duration = length / timescale
+        elif box_type == b"trak":
+            tracks.append(_parse_trak(moov, start, end))
+
+    video = next((track for track in tracks if track[0] == b"vide"), None)
+    audio = next((track for track in tracks if track[0] == b"soun"), None)
+    if video is not None:
+        return MediaInfo("video", "mp4", video[1], duration, video[2], video[3])
+    if audio is not None or brand in _AUDIO_BRANDS:
+        return MediaInfo("audio", "mp4", audio[1] if audio else None, duration, None, None)
+    return MediaInfo(None, "mp4", None, duration, None, None)
+
+
+def _parse_trak(data: bytes, start: int, end: int) -> Tuple[Optional[bytes], Optional[str], Optional[int], Optional[int]]:
+    """(handler type, codec, width, height) of one track."""
+    handler = codec = width = height = None
+    for box_type, box_start, box_end in _iter_boxes(data, start, end):
+        if box_type == b"tkhd":
+            # Width and height close the box, as 16.16 fixed point
+            width, height = (value >> 16 for value in struct.unpack_from(">II", data, box_end - 8))
+        elif box_type == b"mdia":
+            for inner_type, inner_start, inner_end in _iter_boxes(data, box_start, box_end):
+                if inner_type == b"hdlr":
+                    handler = data[inner_start + 8:inner_start + 12]
+                elif inner_type == b"minf":
+                    codec = _sample_entry_format(data, inner_start, inner_end)
+    return handler, codec, width or None, height or None
+
+
+def _sample_entry_format(data: bytes, start: int, end: int) -> Optional[str]:
+    """Format of the first sample entry in minf/stbl/stsd (e.g. avc1, hvc1, mp4a)."""
+    for box_type, box_start, box_end in _iter_boxes(data, start, end):
+        if box_type == b"stbl":
+            for inner_type, inner_start, _ in _iter_boxes(data, box_start, box_end):
+                if inner_type == b"stsd":
+                    # version/flags and entry count, then the entry's size and format
+                    return data[inner_start + 12:inner_start + 16].decode("latin-1").strip()
+    return None
+
+# Matroska / WebM (EBML) ──────────────────────────────────────────────────────
+
+_EBML_HEADER, _DOC_TYPE = 0x1A45DFA3, 0x4282
+_SEGMENT, _CLUSTER = 0x18538067, 0x1F43B675
+_INFO, _TIMECODE_SCALE, _DURATION = 0x1549A966, 0x2AD7B1, 0x4489
+_TRACKS, _TRACK_ENTRY, _TRACK_TYPE, _CODEC_ID = 0x1654AE6B, 0xAE, 0x83, 0x86
+_VIDEO, _PIXEL_WIDTH, _PIXEL_HEIGHT = 0xE0, 0xB0, 0xBA
+_VIDEO_TRACK, _AUDIO_TRACK = 1, 2
+
+
+def _is_ebml(head: bytes) -> bool:
+    return head.startswith(b"\x1a\x45\xdf\xa3")
+
+
+def _read_vint(stream: BinaryIO, is_size: bool) -> int:
+    """An EBML variable-length integer: an element ID (marker kept) or a size (-1 when unknown)."""
+    first = _read(stream, 1)[0]
+    length = 1
+    while length <= 8 and not first & (0x80 >> (length - 1)):
+        length += 1
+    if length > 8:
+        raise ValueError("Invalid EBML variable-length integer")
+    value = first & (0xFF >> length) if is_size else first
+    for byte in _read(stream, length - 1):
+        value = (value << 8) | byte
+    if is_size and value == (1 << (7 * length)) - 1:
+        return -1
+    return value
+
+
+def _ebml_children(data: bytes) -> Dict[int, List[bytes]]:
+    """Payloads of the elements directly inside data, by element ID."""
+    children: Dict[int, List[bytes]] = {}
+    stream = io.BytesIO(data)
+    while stream.tell() < len(data):
+        element_id = _read_vint(stream, is_size=False)
+        size = _read_vint(stream, is_size=True)
+        if size < 0:
+            break
+        children.setdefault(element_id, []).append(_read(stream, size))
+    return children
+
+
+def _ebml_uint(children: Dict[int, List[bytes]], element_id: int, default: Optional[int] = None) -> Optional[int]:
+    return int.from_bytes(children[element_id][0], "big") if element_id in children else default
+
+
+def _probe_ebml(stream: BinaryIO, partial: bool) -> MediaInfo:
+    container = "matroska"
+    info: Optional[Dict[int, List[bytes]]] = None
+    tracks: Optional[List[Dict[int, List[bytes]]]] = None
+    # Info and Tracks precede the first Cluster (the media data) in practice
+    while info is None or tracks is None:
+        element_id = _read_vint(stream, is_size=False)
+        size = _read_vint(stream, is_size=True)
+        if element_id == _SEGMENT:
+            # Descend into the Segment rather than skipping it
+            continue
+        if element_id == _CLUSTER:
+            break
+        if size < 0 or size > MAX_HEADER_BYTES:
+            raise ValueError("Unsupported EBML element size")
+        if element_id == _EBML_HEADER:
+            doc_type = _ebml_children(_read(stream, size)).get(_DOC_TYPE)
+            container = doc_type[0].decode("ascii").rstrip("\x00") if doc_type else container
+        elif element_id == _INFO:
+            info = _ebml_children(_read(stream, size))
+        elif element_id == _TRACKS:
+            tracks = [_ebml_children(entry) for entry in _ebml_children(_read(stream, size)).get(_TRACK_ENTRY, [])]
+        else:
+            _skip(stream, stream.tell() + size)
+
+    duration = None
+    if info and _DURATION in info:
+        raw = info[_DURATION][0]
+        ticks = struct.unpack(">f" if len(raw) == 4 else ">d", raw)[0]
+        duration = ticks * _ebml_uint(info, _TIMECODE_SCALE, 1_000_000) / 1e9
+
+    by_type = {_ebml_uint(track, _TRACK_TYPE): track for track in reversed(tracks or [])}
+    video, audio = by_type.get(_VIDEO_TRACK), by_type.get(_AUDIO_TRACK)
+    if video is not None:
+        picture = _ebml_children(video[_VIDEO][0]) if _VIDEO in video else {}
+        return MediaInfo(
+            "video", container, _codec_id(video), duration,
+            _ebml_uint(picture, _PIXEL_WIDTH), _ebml_uint(picture, _PIXEL_HEIGHT),
+        )
+    if audio is not None:
+        return MediaInfo("audio", container, _codec_id(audio), duration, None, None)
+    return MediaInfo(None, container, None, duration, None, None)
+
+
+def _codec_id(track: Dict[int, List[bytes]]) -> Optional[str]:
+    return track[_CODEC_ID][0].decode("ascii").rstrip("\x00") if _CODEC_ID in track else None
+
+# Ogg ─────────────────────────────────────────────────────────────────────────
+
+# First-packet signatures of the codecs ffmpeg reads from Ogg
+_OGG_CODECS = {
+    b"\x80theora": ("video", "theora"),
+    b"\x01vorbis": ("audio", "vorbis"),
+    b"OpusHead": ("audio", "opus"),
+    b"\x7fFLAC": ("audio", "flac"),
+    b"Speex   ": ("audio", "speex"),
+}
+
+
+def _is_ogg(head: bytes) -> bool:
+    return head.startswith(b"OggS")
+
+
+def _probe_ogg(stream: BinaryIO, partial: bool) -> MediaInfo:
+    # Page header is 27 bytes ending in the segment count, then the segment table
+    header = _read(stream, 27)
+    packet = _read(stream, header[26] + 8)[header[26]:]
+    for signature, (kind, codec) in _OGG_CODECS.items():
+        if packet.startswith(signature):
+            return MediaInfo(kind, "ogg", codec, None, None, None)
+    return MediaInfo(None, "ogg", None, None, None, None)
+
+# MP3, ADTS/AAC and FLAC ──────────────────────────────────────────────────────
+
+def _is_mpeg_audio(head: bytes) -> bool:
+    return head.startswith(b"ID3") or head.startswith(b"fLaC") or _is_layer3_frame(head) or _is_adts_frame(head)
+
+
+def _is_layer3_frame(header: bytes) -> bool:
+    # 11 sync bits, then layer bits 01 = Layer III
+    return len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE0 == 0xE0 and (header[1] >> 1) & 0x3 == 1
+
+
+def _is_adts_frame(header: bytes) -> bool:
+    # ADTS shares the sync word with MPEG audio; its layer bits are always 00
+    return len(header) >= 2 and header[0] == 0xFF and header[1] & 0xF6 == 0xF0
+
+
+def _probe_mpeg_audio(stream: BinaryIO, partial: bool) -> MediaInfo:
+    header = _read(stream, 10)
+    if header.startswith(b"ID3"):
+        # Tag size is a 28-bit "syncsafe" integer, plus 10 bytes when a footer is present
+        size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+        _skip(stream, 10 + size + (10 if header[5] & 0x10 else 0))
+        # Some taggers pad past the tag's declared size; the padding is zero bytes
+        following = stream.read(MP3_PADDING_BYTES).lstrip(b"\0")
+        if len(following) < 2 and partial:
+            raise _Truncated()
+        header = following
+    if _is_layer3_frame(header):
+        return MediaInfo("audio", "mp3", "mp3", None, None, None)
+    if _is_adts_frame(header):
+        return MediaInfo("audio", "aac", "aac", None, None, None)
+    if header.startswith(b"fLaC"):
+        return MediaInfo("audio", "flac", "flac", None, None, None)
+    return UNKNOWN_MEDIA
+
+# WAV ─────────────────────────────────────────────────────────────────────────
+
+_WAV_CODECS = {1: "pcm", 3: "pcm_float", 6: "alaw", 7: "mulaw", 0xFFFE: "pcm"}
+
+
+def _is_wav(head: bytes) -> bool:
+    return head[:4] == b"RIFF" and head[8:12] == b"WAVE"
+
+
+def _probe_wav(stream: BinaryIO, partial: bool) -> MediaInfo:
+    stream.seek(12)
+    codec, byte_rate = None, 0
+    while True:
+        chunk_id, size = struct.unpack("<4sI", _read(stream, 8))
+        if chunk_id == b"fmt ":
+            format_tag, _, _, byte_rate = struct.unpack("<HHII", _read(stream, 12))
+            codec = _WAV_CODECS.get(format_tag, f"0x{format_tag:04x}")
+            _skip(stream, stream.tell() + size - 12 + (size & 1))
+        elif chunk_id == b"data":
+            duration = size / byte_rate if byte_rate else None
+            return MediaInfo("audio", "wav", codec, duration, None, None)
+        else:
+            _skip(stream, stream.tell() + size + (size & 1))
+
+
+_PROBES: List[Tuple[Callable[[bytes], bool], Callable[[BinaryIO, bool], MediaInfo]]] = [
+    (_is_image, _probe_image),
+    (_is_wav, _probe_wav),
+    (_is_ebml, _probe_ebml),
+    (_is_ogg, _probe_ogg),
+    (_is_iso_bmff, _probe_iso_bmff),
+    (_is_mpeg_audio, _probe_mpeg_audio),
+]
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Incremental Probe
+# ─────────────────────────────────────────────────────────────────────────────
+
+class MediaProbe:
+    """
+    Probe an upload as its chunks arrive; on_probed(info) runs once, as soon as the header is known.
+
+    on_probed may raise (e.g. HTTPException) to abort the upload.
+    """
+
+    def __init__(self, on_probed: Optional[Callable[[MediaInfo], None]] = None, limit: int = MEDIA_PROBE_BYTES):
+        self.on_probed = on_probed
+        self.limit = limit
+        self.info: Optional[MediaInfo] = None
+        self._head = bytearray()
+        self._received = 0
+        self._gave_up = False
+
+    def feed(self, chunk: bytes) -> None:
+        """Pass each chunk of the upload in order (spool_upload's on_chunk)."""
+        self._received += len(chunk)
+        if self.info is not None or self._gave_up:
+            return
+        self._head += chunk[:self.limit - len(self._head)]
+        info = probe_media(io.BytesIO(self._head), partial=True)
+        if info is not None:
+            self._resolve(info)
+        elif len(self._head) >= self.limit:
+            # The header lies further in; finish() reads it from the spooled file
+            self._gave_up = True
+            self._head = bytearray()
+
+    def finish(self, upload: SpooledFile) -> MediaInfo:
+        """The probe result, reading the spooled upload if its first chunks were not enough (use run_io)."""
+        if self.info is None:
+            if self._received and self._received == len(self._head):
+                # The whole upload fitted in the prefix
+                self._resolve(probe_media(io.BytesIO(self._head)))
+            else:
+                with upload.open() as stream:
+                    self._resolve(probe_media(stream))
+        return self.info
+
+    def _resolve(self, info: MediaInfo) -> None:
+        self.info = info
+        self._head = bytearray()
+        if self.on_probed is not None:
+            self.on_probed(info)
+
+
+def probe_upload(upload: SpooledFile) -> MediaInfo:
+    """Probe an upload that is already spooled (reads its header; use run_io)."""
+    with upload.open() as stream:
+        return probe_media(stream)
@@ -0,0 +1,312 @@
+"""
+Prometheus-style metrics without extra dependencies.
+
+- MetricsMiddleware records, per route template: request counts by status,
+  latency histograms, in-flight gauges and request/response body sizes; requests
+  are in flight as "pending" until the app-wide track_route() dependency has
+  seen their route
+- stage() times a named sub-stage (decode, fit, encode, serialize, ...) as a
+  context manager or decorator:
+
+      with stage("compress_image", "decode"):
+          image = load_image(stream)
+
+      @stage("palette", "fit")
+      def fit_palette(...): ...
+
+- render_metrics() returns the text exposition format served at /metrics
+- admission_* series are updated by admission.py (queue waits, 429s, slots, reserved memory)
+- decoded_image_cache_* gauges are refreshed by image_cache.py's stats() (the /metrics
+  handler calls it); its hits and misses are the decoded_image_cache stages
+
+Stages timed inside process-pool workers are buffered per task and shipped
+back with the task result by executor.run_cpu(), so they show up in the
+API process's registry like stages timed in-process.
+"""
+
+from contextlib import ContextDecorator, contextmanager
+from fastapi import Request
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import threading
+import bisect
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+BYTE_BUCKETS = tuple(1024 * 4 ** power for power in range(11))  # 1 KiB .. 1 GiB
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Metric Types
+# ─────────────────────────────────────────────────────────────────────────────
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.label_names, key)) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return super().render() + [f"{self.name}{self._format_labels(key)} {value:g}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (non-cumulative, +Inf last), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels) -> int:
+        """Observations recorded so far for one label set."""
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._values.items())
+        lines = super().render()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {total:g}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {count}")
+        return lines
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Registry
+# ─────────────────────────────────────────────────────────────────────────────
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route, method and status.", ["endpoint", "method", "status"])
+LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route.", ["endpoint", "method"])
+IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled by route.", ["endpoint"])
+REQUEST_BYTES = Histogram(
+    "http_request_size_bytes", "HTTP request body size by route.", ["endpoint"], buckets=BYTE_BUCKETS
+)
+RESPONSE_BYTES = Histogram(
+    "http_response_size_bytes", "HTTP response body size by route.", ["endpoint"], buckets=BYTE_BUCKETS
+)
+STAGES = Histogram("stage_duration_seconds", "Time spent in named processing stages.", ["operation", "stage"])
+
+# Admission control (see admission.py)
+ADMISSION_WAIT = Histogram(
+    "admission_queue_wait_seconds", "Time admitted or rejected requests waited for a slot.", ["endpoint_class"]
+)
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total", "Requests rejected with 429 by class and reason.", ["endpoint_class", "reason"]
+)
+ADMISSION_ACTIVE = Gauge("admission_active", "Requests holding an admission slot by class.", ["endpoint_class"])
+ADMISSION_QUEUED = Gauge("admission_queued", "Requests waiting for an admission slot by class.", ["endpoint_class"])
+ADMISSION_MEMORY = Gauge("admission_memory_reserved_bytes", "Estimated working memory of admitted requests.")
+DECODED_CACHE_ENTRIES = Gauge("decoded_image_cache_entries", "Images in the shared decoded-image cache.")
+DECODED_CACHE_SIZE = Gauge("decoded_image_cache_bytes", "Pixel data held by the shared decoded-image cache.")
+
+REGISTRY: List[_Metric] = [
+    REQUESTS, LATENCY, IN_FLIGHT, REQUEST_BYTES, RESPONSE_BYTES, STAGES,
+    ADMISSION_WAIT, ADMISSION_REJECTIONS, ADMISSION_ACTIVE, ADMISSION_QUEUED, ADMISSION_MEMORY,
+    DECODED_CACHE_ENTRIES, DECODED_CACHE_SIZE,
+]
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Stage Timing
+# ─────────────────────────────────────────────────────────────────────────────
+
+_collector = threading.local()
+
+
+def observe_stage(operation: str, name: str, seconds: float) -> None:
+    """Record a stage duration measured by the caller."""
+    samples = getattr(_collector, "samples", None)
+    if samples is not None:
+        samples.append((operation, name, seconds))
+    else:
+        STAGES.observe(seconds, operation=operation, stage=name)
+
+
+class stage(ContextDecorator):
+    """Time a block or function as stage `name` of `operation`."""
+
+    def __init__(self, operation: str, name: str):
+        self.operation = operation
+        self.name = name
+        self._start = 0.0
+
+    def _recreate_cm(self):
+        # A fresh timer per decorated call keeps concurrent calls from sharing a start time
+        return stage(self.operation, self.name)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe_stage(self.operation, self.name, time.perf_counter() - self._start)
+        return False
+
+
+@contextmanager
+def collect_stage_samples() -> Iterator[List[Tuple[str, str, float]]]:
+    """Buffer stage timings on this thread instead of recording them (used in pool workers)."""
+    previous = getattr(_collector, "samples", None)
+    _collector.samples = samples = []
+    try:
+        yield samples
+    finally:
+        _collector.samples = previous
+
+
+def record_stage_samples(samples: Sequence[Tuple[str, str, float]]) -> None:
+    """Record stage timings buffered by collect_stage_samples() (possibly in another process)."""
+    for operation, name, seconds in samples:
+        STAGES.observe(seconds, operation=operation, stage=name)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Middleware
+# ─────────────────────────────────────────────────────────────────────────────
+
+PENDING_ENDPOINT = "pending"
+_IN_FLIGHT_KEY = "metrics.in_flight"
+
+
+class _InFlight:
+    """A request's share of the in-flight gauge: "pending" until routed, then its route template."""
+
+    def __init__(self):
+        self.endpoint = PENDING_ENDPOINT
+        IN_FLIGHT.inc(endpoint=self.endpoint)
+
+    def relabel(self, scope) -> None:
+        if scope.get("route") is None:
+            return
+        endpoint = _endpoint(scope)
+        if endpoint != self.endpoint:
+            IN_FLIGHT.dec(endpoint=self.endpoint)
+            IN_FLIGHT.inc(endpoint=endpoint)
+            self.endpoint = endpoint
+
+    def finish(self) -> None:
+        IN_FLIGHT.dec(endpoint=self.endpoint)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts, latency, in-flight requests and body sizes."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        method = scope["method"]
+        request_bytes = response_bytes = 0
+        status = 500
+        # Counted from the start; the route is only known after routing, where track_route() re-labels it
+        in_flight = scope[_IN_FLIGHT_KEY] = _InFlight()
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal response_bytes, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                in_flight.relabel(scope)
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            endpoint = _endpoint(scope)
+            in_flight.finish()
+            REQUESTS.inc(endpoint=endpoint, method=method, status=str(status))
+            LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, method=method)
+            REQUEST_BYTES.observe(request_bytes, endpoint=endpoint)
+            RESPONSE_BYTES.observe(response_bytes, endpoint=endpoint)
+
+
+def track_route(request: Request) -> None:
+    """App-wide dependency moving the request's in-flight count onto its route once routing has run."""
+    in_flight = request.scope.get(_IN_FLIGHT_KEY)
+    if in_flight is not None:
+        in_flight.relabel(request.scope)
+
+
+def _endpoint(scope) -> str:
+    """Route template (e.g. /jobs/{job_id}) so label cardinality stays bounded."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
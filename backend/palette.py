@@ -0,0 +1,370 @@
+"""
+Palette quantization engine used by /compress_image/.
+
+Modes:
+- exact     - KMeans fitted on every pixel (original behaviour, kept for comparison)
+- sampled   - KMeans fitted on a bounded, spatially stratified pixel sample
+- minibatch - MiniBatchKMeans fitted on the same bounded sample
+
+The sampled modes assign every pixel to its nearest palette colour through
+a lookup table: palette_lut() maps every colour, truncated to
+PALETTE_LUT_BITS per channel (32x32x32 bins by default), to its nearest
+palette index once per palette, and apply_palette_lut() indexes it with
+shifted uint8 channels packed into uint16, so the per-pixel pass never
+leaves uint8/uint16. The cost of the fit no longer grows with the image
+size, and the cost of the assignment no longer grows with n_colors.
+
+palette_image() turns (palette, labels) into a P-mode image, so the PNG is
+written as indexed colour rather than RGB.
+
+sklearn is imported on first fit rather than at import time (see warmup.py).
+
+Environment variables:
+- PALETTE_MODE        - default mode (default: sampled)
+- PALETTE_SAMPLE_SIZE - most pixels a palette is fitted on (default: 65536)
+- PALETTE_LUT_BITS    - bits per channel of the lookup table, 1-8 (default: 5, i.e. 32x32x32);
+                        0 assigns with the exact nearest-centroid pass
+"""
+
+from PIL import Image, ImageMode
+from typing import Optional, Tuple
+import functools
+import numpy as np
+import os
+
+from metrics import stage
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Configuration & Constants
+# ─────────────────────────────────────────────────────────────────────────────
+
+PALETTE_MODES = ("exact", "sampled", "minibatch")
+DEFAULT_PALETTE_MODE = os.getenv("PALETTE_MODE", "sampled")
+
+# Upper bound on the number of pixels the palette is fitted on
+PALETTE_SAMPLE_SIZE = int(os.getenv("PALETTE_SAMPLE_SIZE", "65536"))
+
+# Pixels per chunk in the nearest-centroid pass (bounds the distance matrix)
+ASSIGN_CHUNK_SIZE = 1 << 14
+
+# Bits kept per channel when indexing the colour lookup table (5 -> 32x32x32 bins);
+# 0 assigns every pixel with the exact nearest-centroid pass instead
+PALETTE_LUT_BITS = int(os.getenv("PALETTE_LUT_BITS", "5"))
+
+# Pixels per chunk in the lookup pass (bounds the packed index buffer)
+LUT_CHUNK_SIZE = 1 << 18
+
+# Palettes whose lookup tables are kept per process
+LUT_CACHE_SIZE = 16
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Sampling & Fitting
+# ─────────────────────────────────────────────────────────────────────────────
+
+def sample_pixels(pixels: np.ndarray, sample_size: int, seed: Optional[int] = 0) -> np.ndarray:
+    """Pick one random pixel from each of `sample_size` equal, contiguous strata."""
+    total = pixels.shape[0]
+    if total <= sample_size:
+        return pixels
+
+    rng = np.random.default_rng(seed)
+    stride = total // sample_size
+    offsets = rng.integers(0, stride, size=sample_size)
+    indices = np.arange(sample_size, dtype=np.int64) * stride + offsets
+    return pixels[indices]
+
+
+@stage("palette", "fit")
+def fit_palette(
+    pixels: np.ndarray,
+    n_colors: int,
+    mode: str = DEFAULT_PALETTE_MODE,
+    sample_size: int = PALETTE_SAMPLE_SIZE,
+    weights: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Fit an (n_colors, channels) float32 palette on a bounded pixel sample.
+
+    With per-row weights (e.g. the distinct colours of a palette image and
+    their pixel counts) every row is fitted as given, in any mode.
+    """
+    if weights is None and mode not in ("sampled", "minibatch"):
+        raise ValueError(f"Unsupported palette mode for sampled fitting: {mode}")
+
+    from sklearn.cluster import KMeans, MiniBatchKMeans
+
+    sample = (pixels if weights is not None else sample_pixels(pixels, sample_size)).astype(np.float32)
+    n_clusters = max(1, min(n_colors, sample.shape[0]))
+
+    if mode == "minibatch":
+        model = MiniBatchKMeans(n_clusters=n_clusters, batch_size=4096, n_init=3, random_state=0)
+    elif mode == "exact":
+        model = KMeans(n_clusters=n_clusters)
+    else:
+        model = KMeans(n_clusters=n_clusters, n_init=1, random_state=0)
+    model.fit(sample, sample_weight=weights)
+    return model.cluster_centers_.astype(np.float32)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Assignment
+# ─────────────────────────────────────────────────────────────────────────────
+
+@stage("palette", "assign")
+def assign_palette(pixels: np.ndarray, centers: np.ndarray, chunk_size: int = ASSIGN_CHUNK_SIZE) -> np.ndarray:
+    """Return the index of the nearest palette colour for every pixel."""
+    centers = centers.astype(np.float32)
+    neg_two_centers_t = -2.0 * centers.T
+    center_norms = np.einsum("ij,ij->i", centers, centers)
+    index_dtype = np.uint8 if centers.shape[0] <= 256 else np.uint16
+    labels = np.empty(pixels.shape[0], dtype=index_dtype)
+    chunk_buffer = np.empty((min(chunk_size, pixels.shape[0]), pixels.shape[1]), dtype=np.float32)
+
+    for start in range(0, pixels.shape[0], chunk_size):
+        chunk = pixels[start:start + chunk_size]
+        buffer = chunk_buffer[:chunk.shape[0]]
+        buffer[...] = chunk
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2; |x|^2 is constant per row and can be dropped
+        distances = buffer @ neg_two_centers_t
+        distances += center_norms
+        labels[start:start + chunk.shape[0]] = distances.argmin(axis=1)
+
+    return labels
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Lookup Table
+# ─────────────────────────────────────────────────────────────────────────────
+
+def palette_lut(palette: np.ndarray, bits: int = PALETTE_LUT_BITS) -> np.ndarray:
+    """Lookup table of nearest palette indices, one entry per (bits per channel) colour bin."""
+    palette = np.ascontiguousarray(palette, dtype=np.uint8)
+    return _palette_lut(palette.tobytes(), palette.shape[1], bits)
+
+
+@functools.lru_cache(maxsize=LUT_CACHE_SIZE)
+def _palette_lut(palette_bytes: bytes, channels: int, bits: int) -> np.ndarray:
+    with stage("palette", "lut"):
+        palette = np.frombuffer(palette_bytes, dtype=np.uint8).reshape(-1, channels)
+        bins = 1 << bits
+        # Centre of every bin, in the same packed order apply_palette_lut() indexes with
+        centres = (np.arange(bins, dtype=np.uint16) << (8 - bits)) + (1 << (8 - bits) >> 1)
+        grid = np.stack(np.meshgrid(*([centres] * channels), indexing="ij"), axis=-1).reshape(-1, channels)
+        lut = assign_palette(grid.astype(np.uint8), palette.astype(np.float32))
+    lut.flags.writeable = False
+    return lut
+
+
+@stage("palette", "apply")
+def apply_palette_lut(
+    pixels: np.ndarray,
+    lut: np.ndarray,
+    bits: int = PALETTE_LUT_BITS,
+    chunk_size: int = LUT_CHUNK_SIZE,
+) -> np.ndarray:
+    """Map (N, channels) uint8 pixels to palette indices by packing their top `bits` bits into a LUT index."""
+    shift = 8 - bits
+    channels = pixels.shape[1]
+    index_dtype = np.uint16 if bits * channels <= 16 else np.uint32
+    labels = np.empty(pixels.shape[0], dtype=lut.dtype)
+    index_buffer = np.empty(min(chunk_size, pixels.shape[0]), dtype=index_dtype)
+    channel_buffer = np.empty_like(index_buffer, dtype=np.uint8)
+
+    for start in range(0, pixels.shape[0], chunk_size):
+        chunk = pixels[start:start + chunk_size]
+        index = index_buffer[:chunk.shape[0]]
+        shifted = channel_buffer[:chunk.shape[0]]
+        index[...] = 0
+        for channel in range(channels):
+            np.right_shift(chunk[:, channel], shift, out=shifted)
+            index <<= bits
+            index |= shifted
+        np.take(lut, index, out=labels[start:start + chunk.shape[0]])
+
+    return labels
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Quantization
+# ─────────────────────────────────────────────────────────────────────────────
+
+def quantize_pixels(
+    pixels: np.ndarray,
+    n_colors: int,
+    mode: str = DEFAULT_PALETTE_MODE,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantize an (N, channels) pixel array, returning (uint8 palette, per-pixel labels)."""
+    if mode not in PALETTE_MODES:
+        raise ValueError(f"Unknown palette mode '{mode}'. Expected one of: {', '.join(PALETTE_MODES)}")
+    if n_colors < 1:
+        raise ValueError("n_colors must be at least 1")
+
+    if mode == "exact":
+        from sklearn.cluster import KMeans
+
+        kmeans = KMeans(n_clusters=n_colors)
+        with stage("palette", "fit"):
+            kmeans.fit(pixels)
+        palette = np.clip(np.rint(kmeans.cluster_centers_), 0, 255).astype(np.uint8)
+        return palette, kmeans.labels_
+
+    centers = fit_palette(pixels, n_colors, mode)
+    palette = np.clip(np.rint(centers), 0, 255).astype(np.uint8)
+    # One channel fits a full-precision (exact) 256-entry table
+    bits = 8 if pixels.shape[1] == 1 else PALETTE_LUT_BITS
+    if 1 <= bits <= 8 and pixels.dtype == np.uint8:
+        labels = apply_palette_lut(pixels, palette_lut(palette, bits), bits)
+    else:
+        labels = assign_palette(pixels, centers)
+    return palette, labels
+
+
+def palette_image(palette: np.ndarray, labels: np.ndarray, size: Tuple[int, int]) -> Image.Image:
+    """
+    Build the quantized image from a uint8 palette and per-pixel labels.
+
+    Palettes of up to 256 RGB/RGBA colours give a P-mode image (one byte per
+    pixel, written as an indexed PNG); larger ones fall back to direct colour.
+    """
+    width, height = size
+    channels = palette.shape[1]
+    if channels == 1:
+        palette = np.repeat(palette, 3, axis=1)
+        channels = 3
+    if palette.shape[0] <= 256 and channels in (3, 4):
+        # putpalette() turns the L-mode index image into P without copying the indices
+        image = Image.fromarray(labels.astype(np.uint8, copy=False).reshape(height, width))
+        image.putpalette(palette.tobytes(), "RGB" if channels == 3 else "RGBA")
+        return image
+    return Image.fromarray(palette[labels].reshape(height, width, channels))
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Image Modes
+# ─────────────────────────────────────────────────────────────────────────────
+
+def quantize_image(image: Image.Image, n_colors: int, mode: str = DEFAULT_PALETTE_MODE) -> Image.Image:
+    """
+    Quantize an image of any Pillow mode to at most n_colors colours.
+
+    - L (and 1/I/F)  - grey-level histogram clustered in 1-D; P-mode output
+                       with a grey palette
+    - RGB            - clustered in 3-D; P-mode output
+    - LA / RGBA      - colour clustered as above, alpha kept aside and
+                       reattached unchanged (P-mode output when fully opaque)
+    - P              - the palette entries are clustered, weighted by their
+                       pixel counts, and the indices remapped; pixels are
+                       never expanded to RGB and entry transparency is kept
+    - anything else  - converted to RGB (or RGBA when it has alpha) first
+    """
+    if image.mode == "P" and image.getpalette():
+        return _quantize_palette_image(image, n_colors, mode)
+
+    working_mode = _working_mode(image.mode)
+    if working_mode != image.mode and working_mode != "L":
+        image = image.convert(working_mode)
+
+    alpha = None
+    if working_mode in ("LA", "RGBA"):
+        alpha = image.getchannel("A")
+        if alpha.getextrema() == (255, 255):
+            alpha = None
+
+    if working_mode in ("L", "LA"):
+        # 1-D clustering of the 256-level histogram: exact in every mode and independent of image size
+        gray = _gray_image(image)
+        counts = np.asarray(gray.histogram()[:256])
+        used = np.flatnonzero(counts)
+        palette, mapping = _quantize_weighted(used.astype(np.uint8)[:, None], counts[used], n_colors, mode)
+        lut = np.zeros(256, dtype=np.uint8)
+        lut[used] = mapping
+        if alpha is not None:
+            # Map grey levels straight to their quantized level; no index image needed
+            with stage("palette", "apply"):
+                quantized = gray.point(palette[lut, 0].tolist())
+            return Image.merge("LA", (quantized, alpha))
+        with stage("palette", "apply"):
+            quantized = gray.point(lut.tolist())
+        quantized.putpalette(np.repeat(palette, 3, axis=1).tobytes(), "RGB")
+    else:
+        array = np.asarray(image)
+        # For RGBA this is a strided view of the colour channels, not a copy
+        palette, labels = quantize_pixels(array[..., :3].reshape(-1, 3), n_colors, mode)
+        del array
+        quantized = palette_image(palette, labels, image.size)
+    if alpha is None:
+        return quantized
+    quantized = quantized.convert("RGBA")
+    quantized.putalpha(alpha)
+    return quantized
+
+
+def _working_mode(mode: str) -> str:
+    """The mode an image is clustered in: L, LA, RGB or RGBA."""
+    if mode in ("L", "LA", "RGB", "RGBA"):
+        return mode
+    if mode == "La":
+        return "LA"
+    if mode == "1" or mode == "F" or mode.startswith("I"):
+        return "L"
+    bands = ImageMode.getmode(mode).bands
+    return "RGBA" if "A" in bands or "a" in bands else "RGB"
+
+
+def _gray_image(image: Image.Image) -> Image.Image:
+    """L-mode grey levels; 16-bit images keep their top 8 bits instead of clipping."""
+    if image.mode == "L":
+        return image
+    if image.mode == "LA":
+        return image.getchannel("L")
+    if image.mode.startswith("I"):
+        array = np.asarray(image)
+        if image.getextrema()[1] > 255:
+            array = array >> 8
+        return Image.fromarray(np.clip(array, 0, 255).astype(np.uint8))
+    return image.convert("L")
+
+
+def _palette_entries(image: Image.Image) -> np.ndarray:
+    """(256, 4) uint8 RGBA palette entries of a P image, including tRNS transparency."""
+    entries = np.zeros((256, 4), dtype=np.uint8)
+    entries[:, 3] = 255
+    rgba = np.frombuffer(bytes(image.getpalette("RGBA")), dtype=np.uint8).reshape(-1, 4)[:256]
+    entries[:len(rgba)] = rgba
+    transparency = image.info.get("transparency")
+    if isinstance(transparency, int):
+        entries[transparency, 3] = 0
+    elif isinstance(transparency, bytes):
+        entries[:len(transparency), 3] = np.frombuffer(transparency, dtype=np.uint8)[:256]
+    return entries
+
+
+def _quantize_weighted(values: np.ndarray, counts: np.ndarray, n_colors: int, mode: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Cluster distinct (k, channels) values weighted by their pixel counts; returns (uint8 palette, index per value)."""
+    centers = fit_palette(values, n_colors, mode, weights=counts.astype(np.float64))
+    return np.clip(np.rint(centers), 0, 255).astype(np.uint8), assign_palette(values, centers)
+
+
+def _quantize_palette_image(image: Image.Image, n_colors: int, mode: str) -> Image.Image:
+    """Quantize a P image by clustering its palette entries rather than its pixels."""
+    counts = np.asarray(image.histogram()[:256])
+    used = np.flatnonzero(counts)
+    entries = _palette_entries(image)
+
+    palette, mapping = _quantize_weighted(entries[used, :3], counts[used], n_colors, mode)
+    colour = np.zeros(256, dtype=np.intp)
+    colour[used] = mapping
+
+    # New entries are (colour, original alpha) pairs, so transparency survives without being clustered
+    keys = colour[used] * 256 + entries[used, 3]
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    remap = np.zeros(256, dtype=np.uint8)
+    remap[used] = inverse
+    new_entries = np.column_stack((palette[unique_keys // 256], (unique_keys % 256).astype(np.uint8)))
+
+    # point() rewrites the index plane through the remap table, keeping P mode
+    with stage("palette", "apply"):
+        quantized = image.point(remap.tolist())
+    quantized.info.pop("transparency", None)
+    if (new_entries[:, 3] == 255).all():
+        quantized.putpalette(new_entries[:, :3].tobytes(), "RGB")
+    else:
+        quantized.putpalette(new_entries.tobytes(), "RGBA")
+    return quantized
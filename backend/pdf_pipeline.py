@@ -0,0 +1,204 @@
+"""
+Multi-step PDF editing over a single parsed document.
+
+run_pdf_pipeline() parses each upload once, applies an ordered list of
+operations to the working page list and serializes once at the end, instead
+of chaining /edit-pdf/ and /pdf-password/ (each of which re-parses and
+re-writes the whole file).
+
+Operations are JSON objects with an "op" key:
+- {"op": "decrypt", "password": "..."}                   - decrypt the base document
+- {"op": "merge", "files": [1, 2], "password": "..."}    - append other uploads (default: all
+                                                           not merged yet); password for encrypted ones
+- {"op": "remove", "pages": "1,3-5"}                     - drop pages
+- {"op": "reorder", "order": "3,1-2"}                    - new order; every page exactly once
+- {"op": "rotate", "degrees": 90, "pages": "1-2"}        - rotate clockwise (default: all pages)
+- {"op": "encrypt", "password": "...", "owner_password": "..."} - encrypt the output
+
+Page numbers always refer to the working document as it stands after the
+previous operations. The first upload is the base document.
+"""
+
+from fastapi import HTTPException
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from contextlib import ExitStack
+import json
+
+from metrics import stage
+from uploads import SpillingBuffer, SpooledFile
+
+if TYPE_CHECKING:
+    from PyPDF2 import PdfReader
+
+MAX_PIPELINE_OPERATIONS = 32
+
+# Required keys per operation
+PIPELINE_OPERATIONS = {
+    "decrypt": ("password",),
+    "merge": (),
+    "remove": ("pages",),
+    "reorder": ("order",),
+    "rotate": ("degrees",),
+    "encrypt": ("password",),
+}
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Page Ranges
+# ─────────────────────────────────────────────────────────────────────────────
+
+def parse_page_ranges(page_numbers: str, total_pages: int) -> List[int]:
+    """Parse page range string like '1,3-5,7' into list of page numbers."""
+    pages = set()
+    ranges = page_numbers.replace(" ", "").split(",")
+
+    for r in ranges:
+        if '-' in r:
+            start, end = map(int, r.split('-'))
+            if start < 1 or start > end or end > total_pages:
+                raise HTTPException(400, "Invalid page range")
+            pages.update(range(start, end + 1))
+        else:
+            page = int(r)
+            if page < 1 or page > total_pages:
+                raise HTTPException(400, f"Invalid page: {page}")
+            pages.add(page)
+
+    return sorted(pages)
+
+
+def parse_page_order(order: str, total_pages: int) -> List[int]:
+    """Parse an ordered page list like '3,1-2' and check it uses every page exactly once."""
+    pages: List[int] = []
+    try:
+        for r in order.replace(" ", "").split(","):
+            if '-' in r:
+                start, end = map(int, r.split('-'))
+                pages.extend(parse_page_ranges(f"{start}-{end}", total_pages))
+            else:
+                pages.extend(parse_page_ranges(r, total_pages))
+    except ValueError:
+        raise HTTPException(400, f"Invalid page order: {order}")
+
+    if sorted(pages) != list(range(1, total_pages + 1)):
+        raise HTTPException(400, f"Page order must list each of the {total_pages} pages exactly once")
+    return pages
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Operations
+# ─────────────────────────────────────────────────────────────────────────────
+
+def parse_operations(raw: str, file_count: int) -> List[Dict[str, Any]]:
+    """Decode and validate the operations JSON before any upload is parsed."""
+    try:
+        operations = json.loads(raw)
+    except (TypeError, ValueError):
+        raise HTTPException(400, "operations must be a JSON list")
+    if not isinstance(operations, list) or not operations:
+        raise HTTPException(400, "operations must be a non-empty JSON list")
+    if len(operations) > MAX_PIPELINE_OPERATIONS:
+        raise HTTPException(400, f"Maximum {MAX_PIPELINE_OPERATIONS} operations allowed")
+
+    merged = {0}
+    for index, operation in enumerate(operations, start=1):
+        name = operation.get("op") if isinstance(operation, dict) else None
+        if name not in PIPELINE_OPERATIONS:
+            raise HTTPException(
+                400, f"Operation {index}: op must be one of: {', '.join(PIPELINE_OPERATIONS)}"
+            )
+        missing = [key for key in PIPELINE_OPERATIONS[name] if operation.get(key) in (None, "")]
+        if missing:
+            raise HTTPException(400, f"Operation {index} ({name}): missing {', '.join(missing)}")
+
+        if name == "merge":
+            files = operation.get("files", [i for i in range(file_count) if i not in merged])
+            if not isinstance(files, list) or not files:
+                raise HTTPException(400, f"Operation {index} (merge): no uploads left to merge")
+            for file_index in files:
+                if not isinstance(file_index, int) or not 0 < file_index < file_count or file_index in merged:
+                    raise HTTPException(400, f"Operation {index} (merge): invalid or already merged upload {file_index}")
+                merged.add(file_index)
+            operation["files"] = files
+        elif name == "rotate":
+            if not isinstance(operation["degrees"], int) or operation["degrees"] % 90:
+                raise HTTPException(400, f"Operation {index} (rotate): degrees must be a multiple of 90")
+        elif name == "decrypt" and index != 1:
+            raise HTTPException(400, f"Operation {index}: decrypt must be the first operation")
+
+    if len(merged) != file_count:
+        raise HTTPException(400, "Every upload after the first must be used by a merge operation")
+    return operations
+
+
+def _page_ranges(spec, total_pages: int) -> List[int]:
+    try:
+        return parse_page_ranges(str(spec), total_pages)
+    except ValueError:
+        raise HTTPException(400, f"Invalid page selection: {spec}")
+
+
+@stage("pdf_pipeline", "parse")
+def _open_reader(upload: SpooledFile, stack: ExitStack, password: Optional[str], label: str) -> "PdfReader":
+    from PyPDF2 import PdfReader
+    from PyPDF2.errors import PdfReadError
+
+    try:
+        reader = PdfReader(stack.enter_context(upload.open()))
+    except PdfReadError as e:
+        raise HTTPException(400, f"{label} is not a valid PDF: {e}")
+    if reader.is_encrypted:
+        if password is None:
+            raise HTTPException(400, f"{label} is password protected; provide its password")
+        try:
+            decrypted = reader.decrypt(password)
+        except Exception as e:
+            raise HTTPException(400, f"Failed to decrypt {label}: {str(e)}")
+        if not decrypted:
+            raise HTTPException(400, f"Incorrect password for {label}")
+    return reader
+
+
+def run_pdf_pipeline(uploads: List[SpooledFile], operations: List[Dict[str, Any]]) -> SpooledFile:
+    """Apply operations to the uploads and write the result once (runs in a CPU worker)."""
+    from PyPDF2 import PdfWriter
+
+    with ExitStack() as stack:
+        decrypt_password = operations[0]["password"] if operations[0]["op"] == "decrypt" else None
+        reader = _open_reader(uploads[0], stack, decrypt_password, "PDF")
+        if decrypt_password is not None and not reader.is_encrypted:
+            raise HTTPException(400, "PDF is not password protected")
+        pages = list(reader.pages)
+        encryption: Optional[Dict[str, Any]] = None
+
+        for operation in operations:
+            name = operation["op"]
+            if name == "merge":
+                for file_index in operation["files"]:
+                    merged = _open_reader(uploads[file_index], stack, operation.get("password"), f"upload {file_index + 1}")
+                    pages.extend(merged.pages)
+            elif name == "remove":
+                removed = set(_page_ranges(operation["pages"], len(pages)))
+                pages = [page for number, page in enumerate(pages, start=1) if number not in removed]
+            elif name == "reorder":
+                pages = [pages[number - 1] for number in parse_page_order(str(operation["order"]), len(pages))]
+            elif name == "rotate":
+                selected = operation.get("pages")
+                numbers = _page_ranges(selected, len(pages)) if selected else range(1, len(pages) + 1)
+                for number in numbers:
+                    pages[number - 1].rotate(operation["degrees"])
+            elif name == "encrypt":
+                encryption = operation
+
+        if not pages:
+            raise HTTPException(400, "The operations removed every page")
+
+        writer = PdfWriter()
+        for page in pages:
+            writer.add_page(page)
+        if encryption is not None:
+            with stage("pdf_pipeline", "encrypt"):
+                writer.encrypt(encryption["password"], encryption.get("owner_password"))
+
+        buffer = SpillingBuffer(suffix=".pdf")
+        with stage("pdf_pipeline", "serialize"):
+            writer.write(buffer)
+    return buffer.to_spooled()
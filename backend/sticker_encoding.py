@@ -0,0 +1,278 @@
+"""
+WebP encoding for WhatsApp stickers.
+
+Presets pick lossy vs. lossless and the libwebp method/quality needed to land
+under WhatsApp's size limits:
+- fast     - lossy, method 0, short quality search
+- balanced - lossy, method 4 (default)
+- max      - lossless method 6 when it fits the budget, otherwise lossy method 6
+
+Quality is found by binary search that stops as soon as a result lands close
+under the byte budget. Animated stickers search on a short probe of the first
+frames and scale the result by the expected frame count.
+
+AnimatedWebPWriter feeds video frames into libwebp's animation encoder one
+at a time, so only the previous frame and the compressed output are held in
+memory regardless of clip length. Identical consecutive frames can be merged
+into a single longer frame.
+"""
+
+from PIL import Image
+from collections import namedtuple
+from typing import Callable, List, Optional, Sequence, Tuple
+import numpy as np
+import io
+
+try:
+    from PIL import _webp
+except ImportError:  # Pillow built without WebP support
+    _webp = None
+
+
+def _new_anim_encoder(size: Tuple[int, int], loop: int, lossless: bool):
+    """libwebp's animation encoder through Pillow's private _webp module (arguments as in WebPImagePlugin._save_all)."""
+    # background (transparent), loop, minimize_size, kmin, kmax, allow_mixed, verbose
+    kmin, kmax = (9, 17) if lossless else (3, 5)
+    return _webp.WebPAnimEncoder(size, 0, loop, False, kmin, kmax, False, False)
+
+
+def _streaming_webp_works() -> bool:
+    """
+    Whether this Pillow's private encoder takes the arguments used here.
+
+    _webp is not a public API, so its signature is checked by encoding a
+    two-frame animation once rather than by looking for attribute names;
+    any mismatch selects the buffered save_all() path instead.
+    """
+    if _webp is None or not hasattr(Image.Image, "getim"):
+        return False
+    try:
+        encoder = _new_anim_encoder((2, 2), 0, True)
+        frame = Image.new("RGBA", (2, 2))
+        encoder.add(frame.getim(), 0, True, 100, 100, 0)
+        encoder.add(frame.getim(), 100, True, 100, 100, 0)
+        encoder.add(None, 200, True, 100, 100, 0)
+        return bool(encoder.assemble(b"", b"", b""))
+    except (AttributeError, TypeError, ValueError, OSError):
+        return False
+
+
+# Pillow >= 11 passes frames to WebPAnimEncoder.add() as image cores (Image.getim)
+HAVE_STREAMING_WEBP = _streaming_webp_works()
+
+# WhatsApp sticker size limits
+STATIC_STICKER_MAX_BYTES = 100 * 1024
+ANIMATED_STICKER_MAX_BYTES = 500 * 1024
+
+# Frames buffered to pick animated encode settings before streaming the rest
+PROBE_FRAMES = 6
+
+# Stop searching once a result uses at least this share of the budget
+GOOD_ENOUGH_FILL = 0.85
+
+EncodePreset = namedtuple("EncodePreset", ["try_lossless", "method", "min_quality", "max_quality", "max_attempts"])
+EncodeSettings = namedtuple("EncodeSettings", ["lossless", "quality", "method"])
+EncodeResult = namedtuple("EncodeResult", ["data", "settings", "attempts"])
+
+STICKER_PRESETS = {
+    "fast": EncodePreset(try_lossless=False, method=0, min_quality=30, max_quality=90, max_attempts=3),
+    "balanced": EncodePreset(try_lossless=False, method=4, min_quality=30, max_quality=95, max_attempts=5),
+    "max": EncodePreset(try_lossless=True, method=6, min_quality=30, max_quality=100, max_attempts=7),
+}
+DEFAULT_STICKER_PRESET = "balanced"
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Size-Targeted Encoding
+# ─────────────────────────────────────────────────────────────────────────────
+
+def search_encode(
+    encode: Callable[[EncodeSettings], bytes],
+    preset: EncodePreset,
+    max_bytes: int,
+    scale: float = 1.0,
+) -> EncodeResult:
+    """
+    Find the best settings whose output (times scale) fits max_bytes.
+
+    Lossless is tried first for presets that allow it, after a cheap
+    low-effort lossless probe shows it can fit. Otherwise quality is binary
+    searched between the preset's bounds, exiting early once a result fills
+    GOOD_ENOUGH_FILL of the budget. If nothing fits, the smallest result is
+    returned.
+    """
+    attempts = 0
+
+    def attempt(settings: EncodeSettings) -> bytes:
+        nonlocal attempts
+        attempts += 1
+        return encode(settings)
+
+    def fits(data: bytes) -> bool:
+        return len(data) * scale <= max_bytes
+
+    if preset.try_lossless:
+        # Lossless size barely depends on effort, so a fast pass predicts the slow one
+        probe_settings = EncodeSettings(True, 0, 0)
+        probe = attempt(probe_settings)
+        if fits(probe):
+            settings = EncodeSettings(True, 100, preset.method)
+            data = attempt(settings)
+            if fits(data):
+                return EncodeResult(data, settings, attempts)
+            return EncodeResult(probe, probe_settings, attempts)
+
+    settings = EncodeSettings(False, preset.max_quality, preset.method)
+    data = attempt(settings)
+    if fits(data):
+        return EncodeResult(data, settings, attempts)
+
+    best: Optional[EncodeResult] = None
+    smallest = EncodeResult(data, settings, attempts)
+    low, high = preset.min_quality, preset.max_quality - 1
+    while low <= high and attempts < preset.max_attempts:
+        quality = (low + high) // 2
+        settings = EncodeSettings(False, quality, preset.method)
+        data = attempt(settings)
+        if fits(data):
+            best = EncodeResult(data, settings, attempts)
+            if len(data) * scale >= max_bytes * GOOD_ENOUGH_FILL:
+                break
+            low = quality + 1
+        else:
+            if len(data) < len(smallest.data):
+                smallest = EncodeResult(data, settings, attempts)
+            high = quality - 1
+
+    result = best or smallest
+    return EncodeResult(result.data, result.settings, attempts)
+
+
+def encode_static_webp(
+    image: Image.Image,
+    preset: str = DEFAULT_STICKER_PRESET,
+    max_bytes: int = STATIC_STICKER_MAX_BYTES,
+) -> EncodeResult:
+    """Encode a single image as WebP under max_bytes using the named preset."""
+    def encode(settings: EncodeSettings) -> bytes:
+        buffer = io.BytesIO()
+        image.save(buffer, format="WEBP", lossless=settings.lossless, quality=settings.quality, method=settings.method)
+        return buffer.getvalue()
+
+    return search_encode(encode, STICKER_PRESETS[preset], max_bytes)
+
+
+def choose_animated_settings(
+    probe_frames: Sequence,
+    frame_duration: int,
+    expected_frames: int,
+    preset: str = DEFAULT_STICKER_PRESET,
+    max_bytes: int = ANIMATED_STICKER_MAX_BYTES,
+) -> EncodeSettings:
+    """Pick animated encode settings by searching on a short probe of the clip."""
+    if not probe_frames:
+        return EncodeSettings(False, STICKER_PRESETS[preset].max_quality, STICKER_PRESETS[preset].method)
+    size = Image.fromarray(np.asarray(probe_frames[0])).size
+    scale = max(expected_frames, len(probe_frames)) / len(probe_frames)
+
+    def encode(settings: EncodeSettings) -> bytes:
+        writer = AnimatedWebPWriter(size, frame_duration, *settings, skip_duplicate_frames=False)
+        for frame in probe_frames:
+            writer.add_frame(frame)
+        return writer.finish()
+
+    return search_encode(encode, STICKER_PRESETS[preset], max_bytes, scale=scale).settings
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Animated WebP
+# ─────────────────────────────────────────────────────────────────────────────
+
+class AnimatedWebPWriter:
+    """Incrementally encode numpy or PIL frames into an animated WebP."""
+
+    def __init__(
+        self,
+        size: Tuple[int, int],
+        frame_duration: int,
+        lossless: bool = True,
+        quality: int = 100,
+        method: int = 6,
+        loop: int = 0,
+        skip_duplicate_frames: bool = True,
+    ):
+        self.size = size
+        self.frame_duration = frame_duration
+        self.lossless = lossless
+        self.quality = quality
+        self.method = method
+        self.loop = loop
+        self.skip_duplicate_frames = skip_duplicate_frames
+        self.frames_added = 0
+        self.frames_skipped = 0
+        self._timestamp = 0
+        self._previous: Optional[np.ndarray] = None
+        # Fallback for Pillow builds without the incremental encoder
+        self._buffered: List[Image.Image] = []
+        self._durations: List[int] = []
+
+        self._encoder = None
+        if HAVE_STREAMING_WEBP:
+            try:
+                self._encoder = _new_anim_encoder(size, loop, lossless)
+            except (AttributeError, TypeError):
+                pass
+
+    def add_frame(self, frame) -> None:
+        """Append one frame (H x W x 3/4 uint8 array or PIL image)."""
+        array = np.asarray(frame)
+        if self.skip_duplicate_frames and self._previous is not None and np.array_equal(array, self._previous):
+            self._extend_last_frame()
+            self.frames_skipped += 1
+            return
+        if self.skip_duplicate_frames:
+            self._previous = array.copy()
+
+        image = frame if isinstance(frame, Image.Image) else Image.fromarray(array)
+        if image.mode not in ("RGB", "RGBA", "RGBX"):
+            image = image.convert("RGBA")
+
+        if self._encoder is not None:
+            self._encoder.add(image.getim(), self._timestamp, self.lossless, self.quality, 100, self.method)
+        else:
+            # Image.fromarray() can share the caller's buffer, which frame decoders reuse
+            self._buffered.append(image if image is frame else image.copy())
+            self._durations.append(self.frame_duration)
+        self._timestamp += self.frame_duration
+        self.frames_added += 1
+
+    def _extend_last_frame(self) -> None:
+        self._timestamp += self.frame_duration
+        if self._encoder is None:
+            self._durations[-1] += self.frame_duration
+
+    def finish(self) -> bytes:
+        """Flush the encoder and return the assembled WebP bytes."""
+        if not self.frames_added:
+            raise ValueError("No frames were added to the animation.")
+
+        if self._encoder is not None:
+            self._encoder.add(None, self._timestamp, self.lossless, self.quality, 100, 0)
+            data = self._encoder.assemble(b"", b"", b"")
+            self._encoder = None
+            if data is None:
+                raise OSError("cannot write file as WebP (encoder returned None)")
+            return data
+
+        buffer = io.BytesIO()
+        self._buffered[0].save(
+            buffer,
+            format="WEBP",
+            save_all=True,
+            append_images=self._buffered[1:],
+            duration=self._durations,
+            loop=self.loop,
+            lossless=self.lossless,
+            quality=self.quality,
+            method=self.method,
+        )
+        self._buffered = []
+        return buffer.getvalue()
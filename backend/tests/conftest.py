@@ -0,0 +1,45 @@
+"""
+Shared test setup.
+
+The modules read their configuration from the environment at import time,
+so the defaults below are set before anything under test is imported: no
+Redis, CPU work on the thread pool, and staging directories under a
+throwaway temp dir.
+"""
+
+import tempfile
+import os
+
+import pytest
+
+TEST_TMP_DIR = tempfile.mkdtemp(prefix="toolkit-tests-")
+
+os.environ.setdefault("REDIS_URL", "")
+os.environ.setdefault("CPU_POOL_SIZE", "0")
+os.environ.setdefault("JOB_BACKEND", "memory")
+os.environ.setdefault("UPLOAD_SESSION_DIR", os.path.join(TEST_TMP_DIR, "uploads"))
+os.environ.setdefault("DECODED_CACHE_DIR", os.path.join(TEST_TMP_DIR, "decoded"))
+
+
+class FakeClock:
+    """Stands in for a module's `time` import so TTLs and backoffs can be stepped through."""
+
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,251 @@
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+import asyncio
+import io
+
+import pytest
+
+from admission import MAX_RETRY_AFTER, MIN_RETRY_AFTER, AdmissionController
+
+
+def controller(**options) -> AdmissionController:
+    options.setdefault("limits", {"image": (1, 3), "pdf": (1, 3)})
+    options.setdefault("memory_budget", 100)
+    options.setdefault("queue_timeout", 5)
+    options.setdefault("enabled", True)
+    return AdmissionController(**options)
+
+
+class Requests:
+    """Admitted requests held open until released, recording the order they got in."""
+
+    def __init__(self, admission: AdmissionController):
+        self.admission = admission
+        self.admitted = []
+        self.releases = {}
+        self.tasks = {}
+
+    def start(self, name: str, endpoint_class: str = "image", memory: int = 0) -> asyncio.Task:
+        self.releases[name] = asyncio.Event()
+
+        async def request():
+            async with self.admission.admit(endpoint_class, memory):
+                self.admitted.append(name)
+                await self.releases[name].wait()
+
+        self.tasks[name] = asyncio.create_task(request())
+        return self.tasks[name]
+
+    async def release(self, name: str) -> None:
+        self.releases[name].set()
+        await self.tasks[name]
+        await settle()
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def rejection(excinfo) -> HTTPException:
+    assert excinfo.value.status_code == 429
+    assert MIN_RETRY_AFTER <= int(excinfo.value.headers["Retry-After"]) <= MAX_RETRY_AFTER
+    return excinfo.value
+
+
+# Queueing ────────────────────────────────────────────────────────────────────
+
+def test_waiting_requests_are_admitted_in_arrival_order():
+    async def scenario():
+        admission = controller()
+        requests = Requests(admission)
+        for name in ("first", "second", "third", "fourth"):
+            requests.start(name)
+            await settle()
+        assert requests.admitted == ["first"]
+        assert admission.stats()["classes"]["image"]["queued"] == 3
+
+        for name in ("first", "second", "third"):
+            await requests.release(name)
+        assert requests.admitted == ["first", "second", "third", "fourth"]
+        await requests.release("fourth")
+        assert admission.stats()["classes"]["image"]["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        admission = controller(limits={"image": (1, 1)})
+        requests = Requests(admission)
+        requests.start("running")
+        requests.start("queued")
+        await settle()
+
+        with pytest.raises(HTTPException) as excinfo:
+            admission.reject_if_full("image")
+        rejection(excinfo)
+        with pytest.raises(HTTPException) as excinfo:
+            async with admission.admit("image"):
+                pass
+        rejection(excinfo)
+        assert admission.stats()["classes"]["image"]["rejected"] == {"queue_full": 2}
+
+        await requests.release("running")
+        await requests.release("queued")
+
+    asyncio.run(scenario())
+
+
+def test_waits_past_the_timeout_are_rejected():
+    async def scenario():
+        admission = controller(queue_timeout=0.05)
+        requests = Requests(admission)
+        requests.start("running")
+        await settle()
+        with pytest.raises(HTTPException) as excinfo:
+            async with admission.admit("image"):
+                pass
+        rejection(excinfo)
+        assert admission.stats()["classes"]["image"]["rejected"] == {"timeout": 1}
+        assert admission.stats()["classes"]["image"]["queued"] == 0
+        await requests.release("running")
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiters_give_up_their_place():
+    async def scenario():
+        admission = controller()
+        requests = Requests(admission)
+        requests.start("running")
+        gone = requests.start("gone")
+        requests.start("next")
+        await settle()
+        gone.cancel()
+        await settle()
+
+        await requests.release("running")
+        assert requests.admitted == ["running", "next"]
+        await requests.release("next")
+        assert admission.stats()["classes"]["image"]["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_classes_have_separate_slots():
+    async def scenario():
+        admission = controller()
+        requests = Requests(admission)
+        requests.start("image", "image")
+        requests.start("pdf", "pdf")
+        await settle()
+        assert requests.admitted == ["image", "pdf"]
+        await requests.release("image")
+        await requests.release("pdf")
+
+    asyncio.run(scenario())
+
+
+# Memory budget ───────────────────────────────────────────────────────────────
+
+def test_memory_budget_is_shared_across_classes():
+    async def scenario():
+        admission = controller(limits={"image": (2, 3), "pdf": (2, 3)})
+        requests = Requests(admission)
+        requests.start("big image", "image", 60)
+        requests.start("big pdf", "pdf", 50)
+        requests.start("small pdf", "pdf", 30)
+        await settle()
+        assert requests.admitted == ["big image"]
+        assert admission.memory_reserved == 60
+
+        await requests.release("big image")
+        assert requests.admitted == ["big image", "big pdf", "small pdf"]
+        assert admission.memory_reserved == 80
+        await requests.release("big pdf")
+        await requests.release("small pdf")
+        assert admission.memory_reserved == 0
+
+    asyncio.run(scenario())
+
+
+def test_head_of_queue_blocks_smaller_requests_behind_it():
+    async def scenario():
+        admission = controller(limits={"image": (3, 3)})
+        requests = Requests(admission)
+        requests.start("running", "image", 60)
+        requests.start("large", "image", 50)
+        requests.start("small", "image", 10)
+        await settle()
+        # "small" would fit, but it waits its turn
+        assert requests.admitted == ["running"]
+        await requests.release("running")
+        assert requests.admitted == ["running", "large", "small"]
+        await requests.release("large")
+        await requests.release("small")
+
+    asyncio.run(scenario())
+
+
+def test_requests_over_the_budget_run_alone():
+    async def scenario():
+        admission = controller(limits={"image": (3, 3)})
+        requests = Requests(admission)
+        requests.start("huge", "image", 10_000)
+        requests.start("tiny", "image", 1)
+        await settle()
+        assert requests.admitted == ["huge"]
+        assert admission.memory_reserved == 100
+        await requests.release("huge")
+        assert requests.admitted == ["huge", "tiny"]
+        await requests.release("tiny")
+
+    asyncio.run(scenario())
+
+
+def test_disabled_admission_admits_everything():
+    async def scenario():
+        admission = controller(enabled=False, limits={"image": (1, 0)})
+        requests = Requests(admission)
+        for name in ("a", "b", "c"):
+            requests.start(name, "image", 1000)
+        await settle()
+        admission.reject_if_full("image")
+        assert requests.admitted == ["a", "b", "c"]
+        for name in ("a", "b", "c"):
+            await requests.release(name)
+
+    asyncio.run(scenario())
+
+
+# Retry-After ─────────────────────────────────────────────────────────────────
+
+def test_retry_after_grows_with_the_queue_and_is_bounded():
+    admission = controller(limits={"image": (2, 100)})
+    state = admission.classes["image"]
+    state.service_seconds = 4.0
+    assert admission.retry_after("image") == 2
+    state.waiters.extend([None] * 5)
+    assert admission.retry_after("image") == 12
+    state.service_seconds = 1000.0
+    assert admission.retry_after("image") == MAX_RETRY_AFTER
+    state.service_seconds = 0.0
+    assert admission.retry_after("image") == MIN_RETRY_AFTER
+
+
+# HTTP ────────────────────────────────────────────────────────────────────────
+
+def test_busy_endpoints_answer_429(monkeypatch):
+    from api.common import admission
+    from server import app
+
+    state = admission.classes["image"]
+    monkeypatch.setattr(state, "active", state.concurrency)
+    monkeypatch.setattr(state, "max_queue", 0)
+    monkeypatch.setattr(admission, "enabled", True)
+
+    with TestClient(app) as client:
+        response = client.post("/convert-ico/", files={"file": ("icon.png", io.BytesIO(b"png"), "image/png")})
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= MIN_RETRY_AFTER
@@ -0,0 +1,198 @@
+import asyncio
+
+import pytest
+
+import cache_handler
+from cache_handler import REDIS_RETRY_AFTER_SECONDS, FakeRedis, ResultCache, _parse_ttls
+from uploads import SpooledFile
+
+
+class FailingRedis:
+    """Redis client whose every call fails, counting the attempts."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, key):
+        self.calls += 1
+        raise ConnectionError("Redis is down")
+
+    def setex(self, key, ttl, value):
+        self.calls += 1
+        raise ConnectionError("Redis is down")
+
+
+@pytest.fixture
+def fake_time(monkeypatch, clock):
+    monkeypatch.setattr(cache_handler, "time", clock)
+    return clock
+
+
+def make_cache(redis_client=None, **options) -> ResultCache:
+    options.setdefault("max_memory_bytes", 800)
+    options.setdefault("ttls", {})
+    return ResultCache(redis_client=redis_client, **options)
+
+
+# Keys ────────────────────────────────────────────────────────────────────────
+
+def test_make_key_depends_on_endpoint_params_and_content():
+    key = ResultCache.make_key("compress_image", b"data", n_colors=8)
+    assert key.startswith("result:compress_image:")
+    assert key == ResultCache.make_key("compress_image", b"data", n_colors=8)
+    assert key != ResultCache.make_key("compress_image", b"data", n_colors=16)
+    assert key != ResultCache.make_key("convert_ico", b"data", n_colors=8)
+    assert key != ResultCache.make_key("compress_image", b"other", n_colors=8)
+
+
+def test_make_key_length_prefixes_parts():
+    assert ResultCache.make_key("pdf", [b"ab", b"c"]) != ResultCache.make_key("pdf", [b"a", b"bc"])
+
+
+def test_make_key_hashes_spooled_files_like_bytes():
+    spooled = SpooledFile(data=b"payload")
+    assert ResultCache.make_key("pdf", spooled) == ResultCache.make_key("pdf", b"payload")
+
+
+# In-process LRU ──────────────────────────────────────────────────────────────
+
+def test_lru_evicts_least_recently_used_by_bytes(fake_time):
+    cache = make_cache()
+    for name in "abcd":
+        cache.set("ep", name, name.encode() * 100)
+    assert cache.stats()["memory_bytes"] == 400
+
+    cache.get("ep", "a")  # a becomes the most recently used
+    for name in "efghi":
+        cache.set("ep", name, name.encode() * 100)
+
+    assert cache.stats()["memory_bytes"] <= 800
+    assert cache.get("ep", "b") is None
+    assert cache.get("ep", "a") == b"a" * 100
+    assert cache.get("ep", "i") == b"i" * 100
+
+
+def test_lru_skips_items_over_an_eighth_of_the_budget(fake_time):
+    redis_client = FakeRedis()
+    cache = make_cache(redis_client)
+    cache.set("ep", "big", b"x" * 101)
+    assert cache.stats()["memory_entries"] == 0
+    # Still stored in Redis, and a Redis hit is not promoted either
+    assert cache.get("ep", "big") == b"x" * 101
+    assert cache.stats()["endpoints"]["ep"]["redis_hits"] == 1
+    assert cache.stats()["memory_entries"] == 0
+
+
+def test_items_over_max_item_bytes_are_not_cached(fake_time):
+    redis_client = FakeRedis()
+    cache = make_cache(redis_client, max_item_bytes=10)
+    cache.set("ep", "key", b"x" * 11)
+    assert cache.get("ep", "key") is None
+    assert redis_client.get("key") is None
+
+
+def test_replacing_a_key_keeps_the_byte_count(fake_time):
+    cache = make_cache()
+    cache.set("ep", "key", b"x" * 50)
+    cache.set("ep", "key", b"y" * 30)
+    assert cache.stats()["memory_bytes"] == 30
+    assert cache.get("ep", "key") == b"y" * 30
+
+
+# TTLs ────────────────────────────────────────────────────────────────────────
+
+def test_entries_expire_after_the_endpoint_ttl(fake_time):
+    redis_client = FakeRedis()
+    cache = make_cache(redis_client, default_ttl=60, ttls={"short": 5})
+    cache.set("short", "s", b"short-lived")
+    cache.set("long", "l", b"long-lived")
+
+    fake_time.advance(6)
+    assert cache.get("short", "s") is None
+    assert cache.get("long", "l") == b"long-lived"
+
+    fake_time.advance(60)
+    assert cache.get("long", "l") is None
+    assert cache.stats()["memory_entries"] == 0
+
+
+def test_zero_ttl_disables_caching_for_an_endpoint(fake_time):
+    cache = make_cache(FakeRedis(), ttls={"never": 0})
+    cache.set("never", "key", b"value")
+    assert cache.get("never", "key") is None
+
+
+def test_redis_hits_are_promoted_into_the_lru(fake_time):
+    redis_client = FakeRedis()
+    make_cache(redis_client).set("ep", "key", b"value")
+
+    cache = make_cache(redis_client)
+    assert cache.get("ep", "key") == b"value"
+    assert cache.get("ep", "key") == b"value"
+    counts = cache.stats()["endpoints"]["ep"]
+    assert (counts["redis_hits"], counts["memory_hits"]) == (1, 1)
+
+
+def test_parse_ttls_ignores_malformed_entries():
+    assert _parse_ttls("a=10, b = 20 ,c=x,=5,d,e=-1") == {"a": 10, "b": 20, "e": -1}
+
+
+# Redis failures ──────────────────────────────────────────────────────────────
+
+def test_redis_errors_are_misses_and_back_off(fake_time):
+    redis_client = FailingRedis()
+    cache = make_cache(redis_client)
+
+    assert cache.get("ep", "missing") is None
+    assert redis_client.calls == 1
+
+    # Within the backoff Redis is not tried at all, but the LRU still works
+    cache.set("ep", "key", b"value")
+    assert cache.get("ep", "key") == b"value"
+    assert cache.get("ep", "other") is None
+    assert redis_client.calls == 1
+
+    fake_time.advance(REDIS_RETRY_AFTER_SECONDS)
+    assert cache.get("ep", "other") is None
+    assert redis_client.calls == 2
+
+
+# get_or_compute ──────────────────────────────────────────────────────────────
+
+def test_get_or_compute_caches_bytes(monkeypatch):
+    monkeypatch.setattr(cache_handler, "RESULT_CACHE_ENABLED", True)
+    cache = make_cache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return b"result"
+
+    async def scenario():
+        return [await cache.get_or_compute("ep", "key", compute) for _ in range(3)]
+
+    assert asyncio.run(scenario()) == [b"result"] * 3
+    assert len(calls) == 1
+
+
+def test_get_or_compute_caches_in_memory_spooled_results(monkeypatch):
+    monkeypatch.setattr(cache_handler, "RESULT_CACHE_ENABLED", True)
+    cache = make_cache()
+
+    async def compute():
+        return SpooledFile(data=b"spooled")
+
+    result = asyncio.run(cache.get_or_compute("ep", "key", compute))
+    assert isinstance(result, SpooledFile)
+    assert cache.get("ep", "key") == b"spooled"
+
+
+def test_get_or_compute_bypasses_a_disabled_cache(monkeypatch):
+    monkeypatch.setattr(cache_handler, "RESULT_CACHE_ENABLED", False)
+    cache = make_cache()
+
+    async def compute():
+        return b"result"
+
+    asyncio.run(cache.get_or_compute("ep", "key", compute))
+    assert cache.get("ep", "key") is None
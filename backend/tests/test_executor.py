@@ -0,0 +1,84 @@
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
+import asyncio
+import threading
+
+import pytest
+
+import executor
+
+
+def blocked(gate: threading.Event) -> str:
+    gate.wait(5)
+    return "done"
+
+
+def test_result_is_returned_and_the_slot_released():
+    async def scenario():
+        result = await executor.run_cpu(str.upper, "abc")
+        await asyncio.sleep(0)
+        return result, executor.cpu_tasks_in_flight()
+
+    assert asyncio.run(scenario()) == ("ABC", 0)
+
+
+def test_timed_out_tasks_stay_counted_until_the_worker_finishes():
+    gate = threading.Event()
+
+    async def scenario():
+        with pytest.raises(HTTPException) as error:
+            await executor.run_cpu(blocked, gate, timeout=0.05)
+        assert error.value.status_code == 504
+        assert executor.cpu_tasks_in_flight() == 1
+
+        gate.set()
+        for _ in range(100):
+            if executor.cpu_tasks_in_flight() == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert executor.cpu_tasks_in_flight() == 0
+
+    asyncio.run(scenario())
+
+
+def test_abandoned_tasks_count_towards_the_queue_limit(monkeypatch):
+    monkeypatch.setattr(executor, "CPU_POOL_MAX_QUEUE", 1)
+    gate = threading.Event()
+
+    async def scenario():
+        with pytest.raises(HTTPException):
+            await executor.run_cpu(blocked, gate, timeout=0.05)
+        with pytest.raises(HTTPException) as error:
+            await executor.run_cpu(str.upper, "abc")
+        assert error.value.status_code == 503
+        gate.set()
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        gate.set()
+
+
+def test_broken_pool_is_shut_down_and_replaced(monkeypatch):
+    class BrokenPool:
+        shut_down = None
+
+        def submit(self, *args, **kwargs):
+            raise BrokenProcessPool("worker died")
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.shut_down = (wait, cancel_futures)
+
+    pool = BrokenPool()
+    monkeypatch.setattr(executor, "CPU_POOL_SIZE", 1)
+    monkeypatch.setattr(executor, "_cpu_pool", pool)
+
+    async def scenario():
+        with pytest.raises(HTTPException) as error:
+            await executor.run_cpu(str.upper, "abc")
+        assert error.value.status_code == 500
+
+    asyncio.run(scenario())
+    assert pool.shut_down == (False, True)
+    assert executor._cpu_pool is None
+    assert executor.cpu_tasks_in_flight() == 0
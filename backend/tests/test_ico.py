@@ -0,0 +1,114 @@
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from PIL import Image
+import zipfile
+import io
+
+import pytest
+
+from api.images import DEFAULT_ICO_SIZES, ICO_MAX_DIMENSION, _convert_to_ico_file, parse_ico_sizes
+from image_loader import downscale_pyramid
+from uploads import SpooledFile
+
+
+def png_bytes(size=(300, 200), mode: str = "RGBA") -> bytes:
+    buffer = io.BytesIO()
+    Image.new(mode, size, "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def ico_sizes(data: bytes):
+    return sorted(Image.open(io.BytesIO(data)).info["sizes"])
+
+
+# Size lists ──────────────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("spec", [None, "", "  "])
+def test_empty_size_list_means_the_defaults(spec):
+    assert parse_ico_sizes(spec) == DEFAULT_ICO_SIZES
+
+
+@pytest.mark.parametrize("spec, sizes", [
+    ("16", (16,)),
+    ("48,16,32", (16, 32, 48)),
+    (" 32 , 32,16, ", (16, 32)),
+    (f"1,{ICO_MAX_DIMENSION}", (1, ICO_MAX_DIMENSION)),
+])
+def test_parse_ico_sizes(spec, sizes):
+    assert parse_ico_sizes(spec) == sizes
+
+
+@pytest.mark.parametrize("spec, message", [
+    ("16,big", "comma-separated integers"),
+    ("16.5", "comma-separated integers"),
+    ("0,16", "between 1 and"),
+    (f"{ICO_MAX_DIMENSION + 1}", "between 1 and"),
+    (",", "between 1 and"),
+])
+def test_parse_ico_sizes_rejects_bad_lists(spec, message):
+    with pytest.raises(HTTPException) as excinfo:
+        parse_ico_sizes(spec)
+    assert excinfo.value.status_code == 400
+    assert message in excinfo.value.detail
+
+
+# Resampling pyramid ──────────────────────────────────────────────────────────
+
+def test_pyramid_levels_are_largest_first_and_never_upscaled():
+    levels = downscale_pyramid(Image.new("RGB", (300, 150)), [16, 256, 64, 512, 64])
+    assert [level.size for level in levels] == [(300, 150), (256, 128), (64, 32), (16, 8)]
+
+
+def test_limits_with_the_same_size_share_a_level():
+    levels = downscale_pyramid(Image.new("RGB", (10, 10)), [16, 32, 8])
+    assert [level.size for level in levels] == [(10, 10), (8, 8)]
+
+
+# Encoding ────────────────────────────────────────────────────────────────────
+
+def test_ico_has_one_frame_per_size():
+    ico = _convert_to_ico_file(SpooledFile(data=png_bytes((256, 256))), (16, 32, 48))
+    assert ico_sizes(ico.read_bytes()) == [(16, 16), (32, 32), (48, 48)]
+
+
+@pytest.mark.parametrize("mode", ["P", "CMYK", "1", "LA"])
+def test_any_source_mode_is_encoded(mode):
+    source = Image.new("RGB", (64, 64), "blue").convert(mode)
+    buffer = io.BytesIO()
+    source.save(buffer, "TIFF" if mode == "CMYK" else "PNG")
+    ico = _convert_to_ico_file(SpooledFile(data=buffer.getvalue()), (16, 32))
+    assert ico_sizes(ico.read_bytes()) == [(16, 16), (32, 32)]
+
+
+# Endpoints ───────────────────────────────────────────────────────────────────
+
+@pytest.fixture(scope="module")
+def client():
+    from server import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+def test_convert_ico_endpoint(client):
+    response = client.post(
+        "/convert-ico/", data={"sizes": "16,32"}, files={"file": ("logo.png", png_bytes((64, 64)), "image/png")},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/x-icon"
+    assert ico_sizes(response.content) == [(16, 16), (32, 32)]
+
+
+def test_convert_ico_batch_endpoint(client):
+    files = [("files", (f"logo{index}.png", png_bytes((64, 64)), "image/png")) for index in range(3)]
+    response = client.post("/convert-ico/batch", data={"sizes": "16"}, files=files)
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        names = archive.namelist()
+        assert len(names) == 3 and all(name.endswith(".ico") for name in names)
+        assert ico_sizes(archive.read(names[0])) == [(16, 16)]
+
+
+def test_convert_ico_rejects_other_formats(client):
+    response = client.post("/convert-ico/", files={"file": ("notes.txt", b"text", "text/plain")})
+    assert response.status_code == 400
@@ -0,0 +1,165 @@
+from PIL import Image
+from PyPDF2 import PdfReader
+import numpy as np
+import asyncio
+import io
+
+import pytest
+
+from image_pdf import (
+    JPEG_HEADER_PROBE_BYTES,
+    _jpeg_passthrough_page,
+    _jpeg_segments,
+    images_to_pdf,
+    parse_jpeg_header,
+    prepare_pdf_page,
+    strip_jpeg_metadata,
+)
+from uploads import SpooledFile
+
+
+def make_image(mode: str = "RGB", size=(64, 48)) -> Image.Image:
+    rng = np.random.default_rng(0)
+    channels = len(mode) if mode != "CMYK" else 4
+    pixels = rng.integers(0, 255, size=(size[1], size[0], channels), dtype=np.uint8)
+    return Image.fromarray(pixels[..., 0] if mode == "L" else pixels, mode)
+
+
+def jpeg_bytes(image: Image.Image, **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90, **options)
+    return buffer.getvalue()
+
+
+def with_segment(data: bytes, marker: int, payload: bytes) -> bytes:
+    """Insert a segment right after SOI."""
+    return data[:2] + bytes([0xFF, marker]) + (len(payload) + 2).to_bytes(2, "big") + payload + data[2:]
+
+
+def exif_jpeg() -> bytes:
+    exif = Image.Exif()
+    exif[0x010F] = "Camera maker"
+    return jpeg_bytes(make_image(), exif=exif.tobytes(), comment=b"a comment")
+
+
+# Segment parser ──────────────────────────────────────────────────────────────
+
+def test_segments_run_from_soi_to_the_start_of_scan():
+    data = exif_jpeg()
+    segments = list(_jpeg_segments(data))
+    markers = [marker for marker, _, _ in segments]
+    assert markers[0] == 0xE0 and 0xE1 in markers and 0xFE in markers
+    assert markers[-1] == 0xDA and segments[-1][2] == len(data)
+    assert segments[0][1] == 2
+    # Segments are contiguous
+    for (_, _, end), (_, start, _) in zip(segments, segments[1:]):
+        assert end == start
+
+
+def test_fill_bytes_between_segments_are_skipped():
+    data = jpeg_bytes(make_image())
+    padded = data[:2] + b"\xff\xff\xff" + data[2:]
+    assert [marker for marker, _, _ in _jpeg_segments(padded)] == [marker for marker, _, _ in _jpeg_segments(data)]
+
+
+@pytest.mark.parametrize("data", [b"", b"\x89PNG\r\n\x1a\n", b"\xff\xd8", b"\xff\xd8\x00\x00\x00\x00"])
+def test_non_jpeg_data_has_no_segments(data):
+    assert list(_jpeg_segments(data)) == []
+    assert parse_jpeg_header(data) is None
+
+
+def test_zero_length_segments_do_not_loop():
+    assert list(_jpeg_segments(b"\xff\xd8\xff\xe0\x00\x00\x00\x00"))[0] == (0xE0, 2, 4)
+
+
+# Frame header ────────────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("mode, options, components, frame_marker", [
+    ("RGB", {}, 3, 0xC0),
+    ("L", {}, 1, 0xC0),
+    ("CMYK", {}, 4, 0xC0),
+    ("RGB", {"progressive": True}, 3, 0xC2),
+])
+def test_parse_jpeg_header(mode, options, components, frame_marker):
+    info = parse_jpeg_header(jpeg_bytes(make_image(mode), **options))
+    assert (info.width, info.height, info.precision) == (64, 48, 8)
+    assert (info.components, info.frame_marker) == (components, frame_marker)
+    assert (info.adobe_transform is not None) == (mode == "CMYK")
+
+
+def test_header_is_found_in_a_truncated_probe():
+    data = jpeg_bytes(make_image())
+    assert parse_jpeg_header(data[:200]).width == 64
+
+
+# Metadata stripping ──────────────────────────────────────────────────────────
+
+def test_strip_keeps_jfif_and_drops_exif_and_comments():
+    data = exif_jpeg()
+    stripped = strip_jpeg_metadata(data)
+    markers = [marker for marker, _, _ in _jpeg_segments(stripped)]
+    assert 0xE0 in markers and 0xE1 not in markers and 0xFE not in markers
+    assert len(stripped) < len(data)
+    original, cleaned = Image.open(io.BytesIO(data)), Image.open(io.BytesIO(stripped))
+    assert "exif" not in cleaned.info
+    assert np.array_equal(np.asarray(original), np.asarray(cleaned))
+
+
+def test_strip_keeps_the_adobe_marker():
+    stripped = strip_jpeg_metadata(jpeg_bytes(make_image("CMYK")))
+    assert parse_jpeg_header(stripped).adobe_transform is not None
+
+
+# Passthrough ─────────────────────────────────────────────────────────────────
+
+def test_baseline_jpegs_are_embedded_without_metadata():
+    data = exif_jpeg()
+    page = _jpeg_passthrough_page(SpooledFile(data=data), "image", None)
+    assert page.image.data == strip_jpeg_metadata(data)
+    assert (page.image.width, page.image.height, page.image.color_space) == (64, 48, "DeviceRGB")
+    assert page.page_size == (64.0, 48.0)
+
+
+def test_frame_header_past_the_probe_is_still_found():
+    data = jpeg_bytes(make_image())
+    for _ in range(JPEG_HEADER_PROBE_BYTES // 65000 + 1):
+        data = with_segment(data, 0xE2, b"\0" * 65000)
+    page = _jpeg_passthrough_page(SpooledFile(data=data), "image", None)
+    assert page is not None and len(page.image.data) < len(data)
+
+
+def test_cmyk_jpegs_get_an_inverting_decode_array():
+    page = _jpeg_passthrough_page(SpooledFile(data=jpeg_bytes(make_image("CMYK"))), "image", None)
+    assert page.image.color_space == "DeviceCMYK"
+    assert page.image.decode == (1, 0) * 4
+
+
+@pytest.mark.parametrize("data, page_size, dpi", [
+    (jpeg_bytes(make_image(), progressive=True), "image", None),
+    (jpeg_bytes(make_image(size=(2000, 1500))), "a4", 10),
+])
+def test_jpegs_needing_a_decode_are_not_passed_through(data, page_size, dpi):
+    assert _jpeg_passthrough_page(SpooledFile(data=data), page_size, dpi) is None
+
+
+def test_other_formats_are_reencoded():
+    buffer = io.BytesIO()
+    make_image("RGB").save(buffer, "PNG")
+    page = prepare_pdf_page(SpooledFile(data=buffer.getvalue()), "a4")
+    assert page.image.filter == "DCTDecode"
+    assert Image.open(io.BytesIO(page.image.data)).format == "JPEG"
+    assert page.page_size == (595.28, 841.89)
+
+
+# Whole documents ─────────────────────────────────────────────────────────────
+
+def test_images_to_pdf_writes_pages_in_order_and_reports_progress():
+    png = io.BytesIO()
+    make_image("L", size=(30, 20)).save(png, "PNG")
+    uploads = [SpooledFile(data=exif_jpeg()), SpooledFile(data=png.getvalue()), SpooledFile(data=jpeg_bytes(make_image("CMYK")))]
+    reported = []
+
+    result = asyncio.run(images_to_pdf(uploads, window=2, progress=lambda done, total: reported.append((done, total))))
+    reader = PdfReader(io.BytesIO(result.read_bytes()))
+    assert [(float(page.mediabox.width), float(page.mediabox.height)) for page in reader.pages] == [(64, 48), (30, 20), (64, 48)]
+    assert reported == [(1, 3), (2, 3), (3, 3)]
@@ -0,0 +1,308 @@
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+import asyncio
+
+import pytest
+
+import cache_handler
+from api.background import router as jobs_router
+from jobs import JobOutput, JobQueue, JobStore
+from uploads import SpooledFile
+
+
+class Kinds:
+    """Job kinds for the tests: each run() records its name and waits for its gate, if any."""
+
+    def __init__(self, queue: JobQueue):
+        self.started = []
+        self.gates = {}
+        queue.register("work", self.run, self.prepare)
+        queue.register("quick", self.run, self.prepare, priority="high")
+        queue.register("heavy", self.run, self.prepare, priority="low")
+        queue.register("tracked", self.run_tracked, self.prepare, reports_progress=True)
+
+    def prepare(self, files, fields):
+        if fields.get("invalid"):
+            raise HTTPException(400, "invalid options")
+        return {"name": fields.get("name", "job"), "fail": fields.get("fail")}
+
+    async def run(self, files, name, fail):
+        self.started.append(name)
+        if name in self.gates:
+            await self.gates[name].wait()
+        if fail == "http":
+            raise HTTPException(422, "bad input")
+        if fail == "crash":
+            raise RuntimeError("worker crashed")
+        return JobOutput(f"{name} output".encode(), "text/plain", f"{name}.txt")
+
+    async def run_tracked(self, files, name, fail, progress):
+        progress(1, 4)
+        await self.gates[name].wait()
+        return JobOutput(b"tracked", "text/plain", "tracked.txt")
+
+    def gate(self, name: str) -> asyncio.Event:
+        self.gates[name] = asyncio.Event()
+        return self.gates[name]
+
+
+async def wait_for(queue: JobQueue, job_id: str, *statuses: str) -> dict:
+    for _ in range(500):
+        job = await queue.status(job_id)
+        if job["status"] in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} never reached {statuses}: {job}")
+
+
+async def wait_started(kinds: Kinds, name: str) -> None:
+    for _ in range(500):
+        if name in kinds.started:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"{name} never started")
+
+
+def run_queue(scenario, **options):
+    """Run scenario(queue, kinds) on a fresh queue and stop it afterwards."""
+    options.setdefault("workers", 1)
+    options.setdefault("reserved_workers", 0)
+
+    async def main():
+        queue = JobQueue(**options)
+        kinds = Kinds(queue)
+        try:
+            return await scenario(queue, kinds)
+        finally:
+            await queue.stop()
+
+    return asyncio.run(main())
+
+
+# Running jobs ────────────────────────────────────────────────────────────────
+
+def test_job_runs_and_keeps_its_result():
+    async def scenario(queue, kinds):
+        job = await queue.submit("work", [], {"name": "a"})
+        assert (job["status"], job["priority"], job["progress"]) == ("queued", "normal", 0.0)
+        done = await wait_for(queue, job["id"], "done")
+        assert (done["progress"], done["media_type"], done["filename"], done["size"]) == (1.0, "text/plain", "a.txt", 8)
+        record, data = await queue.result(job["id"])
+        assert data == b"a output"
+
+    run_queue(scenario)
+
+
+def test_inputs_are_cleaned_up_when_the_job_finishes():
+    async def scenario(queue, kinds):
+        upload = SpooledFile(data=b"input")
+        job = await queue.submit("work", [upload], {})
+        await wait_for(queue, job["id"], "done")
+        await asyncio.sleep(0.01)
+        assert upload.data is None
+
+    run_queue(scenario)
+
+
+@pytest.mark.parametrize("fail, error", [("http", "bad input"), ("crash", "Internal error while processing the job.")])
+def test_failed_jobs_report_an_error(fail, error):
+    async def scenario(queue, kinds):
+        job = await queue.submit("work", [], {"fail": fail})
+        failed = await wait_for(queue, job["id"], "failed")
+        assert failed["error"] == error
+        with pytest.raises(HTTPException) as excinfo:
+            await queue.result(job["id"])
+        assert excinfo.value.status_code == 409
+
+    run_queue(scenario)
+
+
+def test_oversized_results_fail_the_job():
+    async def scenario(queue, kinds):
+        job = await queue.submit("work", [], {"name": "a"})
+        failed = await wait_for(queue, job["id"], "failed")
+        assert "too large" in failed["error"]
+
+    run_queue(scenario, max_result_bytes=4)
+
+
+# Submission ──────────────────────────────────────────────────────────────────
+
+def test_invalid_submissions_fail_up_front_and_drop_their_inputs():
+    async def scenario(queue, kinds):
+        upload = SpooledFile(data=b"input")
+        with pytest.raises(HTTPException) as excinfo:
+            await queue.submit("work", [upload], {"invalid": "1"})
+        assert excinfo.value.status_code == 400
+        assert upload.data is None
+        with pytest.raises(HTTPException) as excinfo:
+            await queue.submit("missing", [], {})
+        assert excinfo.value.status_code == 404
+
+    run_queue(scenario)
+
+
+def test_full_queue_rejects_submissions():
+    async def scenario(queue, kinds):
+        kinds.gate("blocker")
+        await queue.submit("work", [], {"name": "blocker"})
+        await wait_started(kinds, "blocker")
+        await queue.submit("work", [], {"name": "queued"})
+        with pytest.raises(HTTPException) as excinfo:
+            await queue.submit("work", [], {"name": "rejected"})
+        assert excinfo.value.status_code == 503
+
+    run_queue(scenario, max_queued=1)
+
+
+# Priorities ──────────────────────────────────────────────────────────────────
+
+def test_higher_priority_jobs_run_first():
+    async def scenario(queue, kinds):
+        gate = kinds.gate("blocker")
+        await queue.submit("work", [], {"name": "blocker"})
+        await wait_started(kinds, "blocker")
+        low = await queue.submit("heavy", [], {"name": "low"})
+        normal = await queue.submit("work", [], {"name": "normal"})
+        high = await queue.submit("quick", [], {"name": "high"})
+
+        positions = [(await queue.status(job["id"]))["queue_position"] for job in (high, normal, low)]
+        assert positions == [0, 1, 2]
+
+        gate.set()
+        await wait_for(queue, low["id"], "done")
+        assert kinds.started == ["blocker", "high", "normal", "low"]
+
+    run_queue(scenario)
+
+
+def test_reserved_workers_only_take_high_priority_jobs():
+    async def scenario(queue, kinds):
+        gate = kinds.gate("heavy-1")
+        kinds.gate("heavy-2")
+        await queue.submit("heavy", [], {"name": "heavy-1"})
+        second = await queue.submit("heavy", [], {"name": "heavy-2"})
+        await wait_started(kinds, "heavy-1")
+
+        # The second low-priority job waits although a (reserved) worker is idle...
+        assert (await queue.status(second["id"]))["status"] == "queued"
+        # ...which a high-priority job gets straight away
+        quick = await queue.submit("quick", [], {"name": "quick"})
+        await wait_for(queue, quick["id"], "done")
+        assert queue.stats()["running"] == 1
+
+        gate.set()
+        await wait_started(kinds, "heavy-2")
+
+    run_queue(scenario, workers=2, reserved_workers=1)
+
+
+def test_at_least_one_worker_takes_every_priority():
+    assert JobQueue(workers=2, reserved_workers=5).reserved_workers == 1
+    assert JobQueue(workers=1, reserved_workers=1).reserved_workers == 0
+
+
+# Cancellation ────────────────────────────────────────────────────────────────
+
+def test_cancelled_queued_jobs_never_run():
+    async def scenario(queue, kinds):
+        gate = kinds.gate("blocker")
+        await queue.submit("work", [], {"name": "blocker"})
+        await wait_started(kinds, "blocker")
+        upload = SpooledFile(data=b"input")
+        job = await queue.submit("work", [upload], {"name": "cancelled"})
+
+        cancelled = await queue.cancel(job["id"])
+        assert cancelled["status"] == "cancelled"
+        assert upload.data is None
+        assert queue.stats()["queued"]["normal"] == 0
+
+        gate.set()
+        await asyncio.sleep(0.05)
+        assert "cancelled" not in kinds.started
+        assert (await queue.status(job["id"]))["status"] == "cancelled"
+
+    run_queue(scenario)
+
+
+def test_cancelled_running_jobs_drop_their_result():
+    async def scenario(queue, kinds):
+        kinds.gate("running")
+        job = await queue.submit("work", [], {"name": "running"})
+        await wait_for(queue, job["id"], "running")
+        await queue.cancel(job["id"])
+        await asyncio.sleep(0.05)
+        assert queue.stats()["running"] == 0
+        assert (await queue.status(job["id"]))["status"] == "cancelled"
+        with pytest.raises(HTTPException) as excinfo:
+            await queue.result(job["id"])
+        assert excinfo.value.status_code == 409
+        with pytest.raises(HTTPException) as excinfo:
+            await queue.cancel(job["id"])
+        assert excinfo.value.status_code == 409
+
+    run_queue(scenario)
+
+
+# Progress ────────────────────────────────────────────────────────────────────
+
+def test_running_jobs_report_progress():
+    async def scenario(queue, kinds):
+        gate = kinds.gate("tracked")
+        job = await queue.submit("tracked", [], {"name": "tracked"})
+        await wait_for(queue, job["id"], "running")
+        for _ in range(100):
+            if (await queue.status(job["id"]))["progress"]:
+                break
+            await asyncio.sleep(0.01)
+        assert (await queue.status(job["id"]))["progress"] == 0.25
+
+        gate.set()
+        assert (await wait_for(queue, job["id"], "done"))["progress"] == 1.0
+        assert queue._progress == {}
+
+    run_queue(scenario)
+
+
+# Expiry ──────────────────────────────────────────────────────────────────────
+
+def test_records_and_results_expire(monkeypatch, clock):
+    monkeypatch.setattr(cache_handler, "time", clock)
+
+    async def scenario(queue, kinds):
+        job = await queue.submit("work", [], {"name": "a"})
+        await wait_for(queue, job["id"], "done")
+        clock.advance(59)
+        assert (await queue.result(job["id"]))[1] == b"a output"
+        clock.advance(1)
+        with pytest.raises(HTTPException) as excinfo:
+            await queue.status(job["id"])
+        assert excinfo.value.status_code == 404
+
+    run_queue(scenario, store=JobStore(), result_ttl=60)
+
+
+# HTTP API ────────────────────────────────────────────────────────────────────
+
+def test_jobs_endpoints():
+    app = FastAPI()
+    app.include_router(jobs_router)
+    app.state.job_queue = JobQueue(workers=1, reserved_workers=0)
+    Kinds(app.state.job_queue)
+
+    with TestClient(app) as client:
+        response = client.post("/jobs/work", data={"name": "api"}, files={"file": ("in.txt", b"input", "text/plain")})
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+        assert response.headers["Location"] == f"/jobs/{job_id}"
+
+        for _ in range(500):
+            if client.get(f"/jobs/{job_id}").json()["status"] == "done":
+                break
+        result = client.get(f"/jobs/{job_id}/result")
+        assert result.content == b"api output"
+        assert result.headers["Content-Disposition"] == 'attachment; filename="api.txt"'
+
+        assert client.post("/jobs/missing").status_code == 404
+        assert client.get("/jobs/unknown").status_code == 404
+        assert client.get("/jobs/stats").json()["workers"] == 1
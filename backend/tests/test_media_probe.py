@@ -0,0 +1,240 @@
+from PIL import Image
+import struct
+import io
+
+import pytest
+
+from media_probe import UNKNOWN_MEDIA, MediaInfo, MediaProbe, probe_media, probe_upload
+from uploads import SpooledFile
+
+
+def probe(data: bytes, partial: bool = False):
+    return probe_media(io.BytesIO(data), partial=partial)
+
+
+# Container builders ──────────────────────────────────────────────────────────
+
+def box(box_type: bytes, payload: bytes = b"") -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def mvhd(timescale: int, duration: int, version: int = 0) -> bytes:
+    if version == 1:
+        return box(b"mvhd", b"\x01\0\0\0" + b"\0" * 16 + struct.pack(">IQ", timescale, duration) + b"\0" * 80)
+    return box(b"mvhd", b"\0" * 12 + struct.pack(">II", timescale, duration) + b"\0" * 80)
+
+
+def trak(handler: bytes, codec: bytes, width: int = 0, height: int = 0) -> bytes:
+    tkhd = box(b"tkhd", b"\0" * 76 + struct.pack(">II", width << 16, height << 16))
+    stsd = box(b"stsd", b"\0" * 4 + struct.pack(">II", 1, 16) + codec + b"\0" * 8)
+    hdlr = box(b"hdlr", b"\0" * 8 + handler + b"\0" * 12)
+    return box(b"trak", tkhd + box(b"mdia", hdlr + box(b"minf", box(b"stbl", stsd))))
+
+
+def mp4(*tracks: bytes, brand: bytes = b"isom", moov_first: bool = True, mdat_bytes: int = 1000, version: int = 0) -> bytes:
+    ftyp = box(b"ftyp", brand + b"\0\0\0\0" + brand)
+    moov = box(b"moov", mvhd(1000, 2500, version) + b"".join(tracks))
+    mdat = box(b"mdat", b"\0" * mdat_bytes)
+    return ftyp + (moov + mdat if moov_first else mdat + moov)
+
+
+def vint_size(size: int) -> bytes:
+    return bytes([0x80 | size]) if size < 0x7F else (0x4000 | size).to_bytes(2, "big")
+
+
+def element(element_id: int, payload: bytes) -> bytes:
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, "big") + vint_size(len(payload)) + payload
+
+
+def uint(element_id: int, value: int) -> bytes:
+    return element(element_id, value.to_bytes(max((value.bit_length() + 7) // 8, 1), "big"))
+
+
+def matroska(doc_type: bytes = b"webm", video: bool = True, audio: bool = True) -> bytes:
+    header = element(0x1A45DFA3, element(0x4282, doc_type))
+    info = element(0x1549A966, uint(0x2AD7B1, 1_000_000) + element(0x4489, struct.pack(">f", 3200.0)))
+    entries = b""
+    if audio:
+        entries += element(0xAE, uint(0x83, 2) + element(0x86, b"A_OPUS"))
+    if video:
+        picture = element(0xE0, uint(0xB0, 512) + uint(0xBA, 288))
+        entries += element(0xAE, uint(0x83, 1) + element(0x86, b"V_VP9") + picture)
+    # Segment of unknown size, so the parser has to descend into it
+    segment = bytes.fromhex("18538067") + b"\x01\xff\xff\xff\xff\xff\xff\xff"
+    cluster = element(0x1F43B675, b"\0" * 100)
+    return header + segment + element(0x1654AE6B, entries) + element(0x114D9B74, b"\0" * 10) + info + cluster
+
+
+def ogg(packet: bytes) -> bytes:
+    return b"OggS" + b"\0" * 22 + bytes([1, len(packet)]) + packet
+
+
+def id3(size: int = 300, padding: int = 0) -> bytes:
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x04\x00\x00" + syncsafe + b"T" * size + b"\0" * padding
+
+
+MP3_FRAME = b"\xff\xfb\x90\x00" + b"\0" * 100
+ADTS_FRAME = b"\xff\xf1\x50\x80" + b"\0" * 100
+
+
+def wav(seconds: float = 2.0, format_tag: int = 1) -> bytes:
+    fmt = struct.pack("<HHIIHH", format_tag, 2, 44100, 176400, 4, 16)
+    data_size = int(176400 * seconds)
+    chunks = b"fmt " + struct.pack("<I", 16) + fmt
+    chunks += b"LIST" + struct.pack("<I", 3) + b"abc\0"  # odd size, padded
+    chunks += b"data" + struct.pack("<I", data_size) + b"\0" * 64
+    return b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WAVE" + chunks
+
+
+def image_bytes(image_format: str) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (120, 80), "green").save(buffer, image_format)
+    return buffer.getvalue()
+
+
+# Whole files ─────────────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("image_format, container", [("PNG", "png"), ("JPEG", "jpeg"), ("WEBP", "webp")])
+def test_images(image_format, container):
+    assert probe(image_bytes(image_format)) == MediaInfo("image", container, container, None, 120, 80)
+
+
+@pytest.mark.parametrize("version", [0, 1])
+def test_mp4_video(version):
+    data = mp4(trak(b"soun", b"mp4a"), trak(b"vide", b"avc1", 640, 360), version=version)
+    assert probe(data) == MediaInfo("video", "mp4", "avc1", 2.5, 640, 360)
+
+
+def test_mp4_with_moov_after_the_media_data():
+    data = mp4(trak(b"vide", b"hvc1", 320, 240), moov_first=False)
+    assert probe(data) == MediaInfo("video", "mp4", "hvc1", 2.5, 320, 240)
+
+
+def test_m4a_is_audio():
+    assert probe(mp4(trak(b"soun", b"mp4a"), brand=b"M4A ")) == MediaInfo("audio", "mp4", "mp4a", 2.5, None, None)
+    # Without a moov box only the brand is known
+    ftyp = box(b"ftyp", b"M4A \0\0\0\0")
+    assert probe(ftyp + box(b"mdat", b"\0" * 10)).kind == "audio"
+
+
+def test_mp4_large_size_boxes():
+    ftyp = box(b"ftyp", b"isom\0\0\0\0")
+    mdat = struct.pack(">I4sQ", 1, b"mdat", 16 + 50) + b"\0" * 50
+    moov = box(b"moov", mvhd(1000, 2500) + trak(b"vide", b"avc1", 64, 64))
+    assert probe(ftyp + mdat + moov).kind == "video"
+
+
+@pytest.mark.parametrize("doc_type, video, audio, expected", [
+    (b"webm", True, True, MediaInfo("video", "webm", "V_VP9", 3.2, 512, 288)),
+    (b"matroska", False, True, MediaInfo("audio", "matroska", "A_OPUS", 3.2, None, None)),
+    (b"webm", False, False, MediaInfo(None, "webm", None, 3.2, None, None)),
+])
+def test_matroska(doc_type, video, audio, expected):
+    info = probe(matroska(doc_type, video, audio))
+    assert info._replace(duration=round(info.duration, 3)) == expected
+
+
+@pytest.mark.parametrize("packet, kind, codec", [
+    (b"\x80theora\0\0", "video", "theora"),
+    (b"\x01vorbis\0\0", "audio", "vorbis"),
+    (b"OpusHead\0\0", "audio", "opus"),
+    (b"unknown!\0\0", None, None),
+])
+def test_ogg(packet, kind, codec):
+    assert probe(ogg(packet)) == MediaInfo(kind, "ogg", codec, None, None, None)
+
+
+@pytest.mark.parametrize("data, container", [
+    (MP3_FRAME, "mp3"),
+    (id3() + MP3_FRAME, "mp3"),
+    (id3(padding=500) + MP3_FRAME, "mp3"),
+    (ADTS_FRAME, "aac"),
+    (id3() + ADTS_FRAME, "aac"),
+    (b"fLaC" + b"\0" * 40, "flac"),
+])
+def test_mpeg_audio_and_flac(data, container):
+    assert probe(data) == MediaInfo("audio", container, container, None, None, None)
+
+
+@pytest.mark.parametrize("format_tag, codec", [(1, "pcm"), (3, "pcm_float"), (0x55, "0x0055")])
+def test_wav(format_tag, codec):
+    assert probe(wav(2.0, format_tag)) == MediaInfo("audio", "wav", codec, 2.0, None, None)
+
+
+@pytest.mark.parametrize("data", [
+    b"",
+    b"plain text, not media at all",
+    b"%PDF-1.7\n" + b"\0" * 100,
+    id3() + b"not a frame",
+])
+def test_unrecognised_data(data):
+    assert probe(data) == UNKNOWN_MEDIA
+
+
+@pytest.mark.parametrize("data", [
+    box(b"ftyp", b"isom") + struct.pack(">I4s", 4, b"moov"),
+    bytes.fromhex("1a45dfa3") + b"\x00" + b"\0" * 20,
+])
+def test_malformed_headers_are_unknown(data):
+    assert probe(data).kind is None
+
+
+def test_real_mp4_from_ffmpeg(tmp_path):
+    pytest.importorskip("imageio_ffmpeg")
+    from benchmarks.fixtures import write_video
+
+    path = str(tmp_path / "clip.mp4")
+    write_video(path, 1.0, width=160, height=96, fps=10)
+    info = probe_upload(SpooledFile(path=path))
+    assert (info.kind, info.container, info.width, info.height) == ("video", "mp4", 160, 96)
+    assert info.duration == pytest.approx(1.0, abs=0.15)
+
+
+# Partial prefixes ────────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("data", [
+    image_bytes("PNG"),
+    mp4(trak(b"vide", b"avc1", 640, 360)),
+    matroska(),
+    ogg(b"OpusHead\0\0"),
+    id3() + MP3_FRAME,
+    wav(),
+])
+def test_prefixes_need_more_bytes_until_the_header_is_complete(data):
+    complete = probe(data)
+    results = [probe(data[:length], partial=True) for length in range(len(data) + 1)]
+    first = next(length for length, info in enumerate(results) if info is not None)
+    assert all(info is None for info in results[:first])
+    assert results[first] == complete
+    assert first < len(data)
+
+
+def test_media_probe_reports_once_as_soon_as_the_header_arrives():
+    data = mp4(trak(b"vide", b"avc1", 640, 360), mdat_bytes=10_000)
+    reported = []
+    media_probe = MediaProbe(reported.append)
+    for start in range(0, len(data), 64):
+        media_probe.feed(data[start:start + 64])
+        if start < 512:
+            first_report = len(reported)
+    assert reported == [MediaInfo("video", "mp4", "avc1", 2.5, 640, 360)]
+    assert first_report == 1
+    assert media_probe.finish(SpooledFile(data=data)) == reported[0]
+
+
+def test_media_probe_reads_the_spooled_file_when_the_header_is_far_in():
+    data = mp4(trak(b"vide", b"avc1", 640, 360), moov_first=False, mdat_bytes=10_000)
+    reported = []
+    media_probe = MediaProbe(reported.append, limit=1024)
+    for start in range(0, len(data), 256):
+        media_probe.feed(data[start:start + 256])
+    assert reported == []
+    assert media_probe.finish(SpooledFile(data=data)).width == 640
+    assert len(reported) == 1
+
+
+def test_media_probe_short_uploads_are_probed_from_the_prefix():
+    media_probe = MediaProbe()
+    media_probe.feed(b"ID3")
+    assert media_probe.finish(SpooledFile(data=b"ID3")) == UNKNOWN_MEDIA
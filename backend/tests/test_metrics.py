@@ -0,0 +1,40 @@
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+import metrics
+from metrics import IN_FLIGHT, PENDING_ENDPOINT, MetricsMiddleware, track_route
+
+
+def in_flight(endpoint: str) -> float:
+    return IN_FLIGHT._values.get((endpoint,), 0.0)
+
+
+def test_requests_are_in_flight_under_their_route_while_handled():
+    app = FastAPI(dependencies=[Depends(track_route)])
+    app.add_middleware(MetricsMiddleware)
+    seen = {}
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: str):
+        # Never reads the body, so only the middleware and track_route() can count it
+        seen["route"] = in_flight("/items/{item_id}")
+        seen["pending"] = in_flight(PENDING_ENDPOINT)
+        return {}
+
+    before_pending = in_flight(PENDING_ENDPOINT)
+    assert TestClient(app).get("/items/1").status_code == 200
+    assert seen == {"route": 1.0, "pending": before_pending}
+    assert in_flight("/items/{item_id}") == 0
+    assert in_flight(PENDING_ENDPOINT) == before_pending
+
+
+def test_unmatched_requests_leave_the_gauge_balanced():
+    app = FastAPI(dependencies=[Depends(track_route)])
+    app.add_middleware(MetricsMiddleware)
+
+    before = dict(IN_FLIGHT._values)
+    assert TestClient(app).get("/missing").status_code == 404
+    assert {key: value for key, value in IN_FLIGHT._values.items() if value} == {
+        key: value for key, value in before.items() if value
+    }
+    assert 'endpoint="unmatched"' in metrics.render_metrics()
@@ -0,0 +1,207 @@
+from fastapi import HTTPException
+from PIL import Image
+import numpy as np
+
+import pytest
+
+from api.images import MAX_COMPRESS_COLORS, _check_compress_options
+from palette import (
+    _gray_image,
+    apply_palette_lut,
+    assign_palette,
+    palette_image,
+    palette_lut,
+    quantize_image,
+    quantize_pixels,
+    sample_pixels,
+)
+
+
+def random_pixels(count: int, channels: int = 3, seed: int = 0) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, 256, size=(count, channels), dtype=np.uint8)
+
+
+def packed(pixels: np.ndarray, bits: int) -> np.ndarray:
+    """LUT index of each pixel, computed the slow way."""
+    index = np.zeros(pixels.shape[0], dtype=np.int64)
+    for channel in range(pixels.shape[1]):
+        index = (index << bits) | (pixels[:, channel].astype(np.int64) >> (8 - bits))
+    return index
+
+
+# Sampling ────────────────────────────────────────────────────────────────────
+
+def test_small_inputs_are_not_sampled():
+    pixels = random_pixels(100)
+    assert sample_pixels(pixels, 100) is pixels
+
+
+def test_sample_takes_one_pixel_per_stratum():
+    pixels = np.arange(1000)[:, None]
+    sample = sample_pixels(pixels, 10)
+    assert sample.shape == (10, 1)
+    assert list(sample[:, 0] // 100) == list(range(10))
+    assert np.array_equal(sample, sample_pixels(pixels, 10))
+
+
+# Lookup table packing ────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("channels, bits", [(1, 8), (3, 5), (3, 3), (4, 4), (4, 5)])
+def test_lut_index_packs_the_top_bits_of_each_channel(channels, bits):
+    pixels = random_pixels(1000, channels)
+    identity = np.arange(1 << (bits * channels), dtype=np.uint32)
+    labels = apply_palette_lut(pixels, identity, bits, chunk_size=97)
+    assert np.array_equal(labels, packed(pixels, bits))
+
+
+def test_lut_holds_the_nearest_colour_of_every_bin_centre():
+    palette = random_pixels(6, seed=1)
+    bits = 3
+    lut = palette_lut(palette, bits)
+    assert lut.shape == (1 << (3 * bits),)
+
+    bins = np.arange(1 << bits)
+    centres = np.stack(np.meshgrid(bins, bins, bins, indexing="ij"), axis=-1).reshape(-1, 3) * 32 + 16
+    distances = ((centres[:, None, :] - palette[None, :, :].astype(np.int64)) ** 2).sum(axis=2)
+    assert np.array_equal(distances[np.arange(len(lut)), lut], distances.min(axis=1))
+
+
+def test_lut_is_cached_and_read_only():
+    palette = random_pixels(4, seed=2)
+    lut = palette_lut(palette, 4)
+    assert palette_lut(palette.copy(), 4) is lut
+    assert not lut.flags.writeable
+
+
+def test_lut_assignment_stays_close_to_exact_assignment():
+    palette = random_pixels(16, seed=3)
+    pixels = random_pixels(20000)
+    exact = assign_palette(pixels, palette.astype(np.float32))
+    approximate = apply_palette_lut(pixels, palette_lut(palette, 5), 5)
+
+    def error(labels):
+        return np.sqrt(((pixels.astype(np.float64) - palette[labels]) ** 2).sum(axis=1))
+
+    assert (exact == approximate).mean() > 0.9
+    # A 5-bit bin is 8 levels wide per channel, so no pixel lands far from its best colour
+    assert (error(approximate) - error(exact)).max() < 8 * np.sqrt(3)
+
+
+def test_eight_bit_single_channel_lut_is_exact():
+    palette = np.array([[10], [100], [200]], dtype=np.uint8)
+    pixels = np.arange(256, dtype=np.uint8)[:, None]
+    labels = apply_palette_lut(pixels, palette_lut(palette, 8), 8)
+    assert np.array_equal(labels, assign_palette(pixels, palette.astype(np.float32)))
+
+
+# Quantization ────────────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("mode", ["sampled", "minibatch"])
+def test_quantize_pixels_uses_at_most_n_colors(mode):
+    pixels = random_pixels(5000)
+    palette, labels = quantize_pixels(pixels, 8, mode)
+    assert palette.shape == (8, 3) and palette.dtype == np.uint8
+    assert labels.shape == (5000,) and labels.max() < 8
+
+
+def test_quantize_pixels_keeps_exact_colours_when_there_are_few():
+    colours = np.array([[255, 0, 0], [0, 255, 0], [0, 0, 255]], dtype=np.uint8)
+    pixels = np.repeat(colours, 100, axis=0)
+    palette, labels = quantize_pixels(pixels, 3, "sampled")
+    assert np.array_equal(palette[labels], pixels)
+
+
+@pytest.mark.parametrize("mode, n_colors", [("median", 8), ("sampled", 0)])
+def test_quantize_pixels_rejects_bad_options(mode, n_colors):
+    with pytest.raises(ValueError):
+        quantize_pixels(random_pixels(10), n_colors, mode)
+
+
+def test_palette_image_is_indexed_up_to_256_colours():
+    palette = random_pixels(4)
+    labels = np.array([0, 1, 2, 3, 3, 2], dtype=np.uint8)
+    image = palette_image(palette, labels, (3, 2))
+    assert image.mode == "P"
+    assert np.array_equal(np.asarray(image.convert("RGB")).reshape(-1, 3), palette[labels])
+
+
+def test_palette_image_falls_back_to_direct_colour():
+    palette = random_pixels(300)
+    labels = np.arange(300, dtype=np.uint16)
+    image = palette_image(palette, labels, (30, 10))
+    assert image.mode == "RGB"
+    assert np.array_equal(np.asarray(image).reshape(-1, 3), palette)
+
+
+# Image modes ─────────────────────────────────────────────────────────────────
+
+def gradient(mode: str, size=(40, 30)) -> Image.Image:
+    rng = np.random.default_rng(4)
+    return Image.fromarray(rng.integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8)).convert(mode)
+
+
+def colour_count(image: Image.Image) -> int:
+    return len(image.convert("RGB").getcolors(1 << 24))
+
+
+@pytest.mark.parametrize("mode", ["RGB", "CMYK", "YCbCr", "HSV"])
+def test_colour_images_become_indexed(mode):
+    quantized = quantize_image(gradient(mode), 8, "sampled")
+    assert quantized.mode == "P"
+    assert colour_count(quantized) <= 8
+
+
+@pytest.mark.parametrize("mode", ["L", "1"])
+def test_grey_images_get_a_grey_palette(mode):
+    quantized = quantize_image(gradient(mode), 4, "sampled")
+    assert quantized.mode == "P"
+    rgb = np.asarray(quantized.convert("RGB"))
+    assert (rgb[..., 0] == rgb[..., 1]).all() and (rgb[..., 1] == rgb[..., 2]).all()
+    assert colour_count(quantized) <= 4
+
+
+def test_sixteen_bit_grey_keeps_its_top_bits():
+    array = np.linspace(0, 65535, 40 * 30).astype(np.uint16).reshape(30, 40)
+    image = Image.fromarray(array, "I;16")
+    grey = _gray_image(image)
+    assert np.array_equal(np.asarray(grey), (array >> 8).astype(np.uint8))
+    assert quantize_image(image, 4, "sampled").mode == "P"
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "LA"])
+def test_alpha_is_kept_unchanged(mode):
+    image = gradient(mode)
+    alpha = np.tile(np.arange(40, dtype=np.uint8) * 6, (30, 1))
+    image.putalpha(Image.fromarray(alpha))
+    quantized = quantize_image(image, 4, "sampled")
+    assert quantized.mode == mode
+    assert np.array_equal(np.asarray(quantized.getchannel("A")), alpha)
+    assert len(set(map(tuple, np.asarray(quantized)[..., :-1].reshape(-1, len(mode) - 1)))) <= 4
+
+
+def test_opaque_alpha_is_dropped():
+    assert quantize_image(gradient("RGBA"), 4, "sampled").mode == "P"
+
+
+def test_palette_images_stay_indexed_and_keep_transparency():
+    image = gradient("RGB").quantize(64)
+    image.info["transparency"] = 0
+    quantized = quantize_image(image, 8, "sampled")
+    assert quantized.mode == "P"
+
+    before = np.asarray(image.convert("RGBA"))[..., 3]
+    after = np.asarray(quantized.convert("RGBA"))[..., 3]
+    assert np.array_equal(before, after)
+    assert (before == 0).any()
+    assert colour_count(quantized) <= 9
+
+
+@pytest.mark.parametrize("n_colors", ["x", None, 0, MAX_COMPRESS_COLORS + 1])
+def test_compress_options_reject_bad_palette_sizes(n_colors):
+    with pytest.raises(HTTPException) as error:
+        _check_compress_options(n_colors, "sampled", None)
+    assert error.value.status_code == 400
+
+
+def test_compress_options_accept_up_to_256_colours():
+    assert _check_compress_options(str(MAX_COMPRESS_COLORS), "sampled", None) == 256
@@ -0,0 +1,147 @@
+from fastapi import HTTPException
+from PyPDF2 import PdfReader, PdfWriter
+import json
+import io
+
+import pytest
+
+from pdf_pipeline import MAX_PIPELINE_OPERATIONS, parse_operations, parse_page_order, parse_page_ranges, run_pdf_pipeline
+from uploads import SpooledFile
+
+
+def make_pdf(widths, password=None) -> SpooledFile:
+    """A PDF of blank pages whose widths identify them."""
+    writer = PdfWriter()
+    for width in widths:
+        writer.add_blank_page(width=width, height=100)
+    if password:
+        writer.encrypt(password)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return SpooledFile(data=buffer.getvalue(), content_type="application/pdf")
+
+
+def page_widths(result: SpooledFile, password=None):
+    reader = PdfReader(io.BytesIO(result.read_bytes()))
+    if password:
+        reader.decrypt(password)
+    return [int(page.mediabox.width) for page in reader.pages]
+
+
+def bad_request(callable_, *args) -> str:
+    with pytest.raises(HTTPException) as excinfo:
+        callable_(*args)
+    assert excinfo.value.status_code == 400
+    return excinfo.value.detail
+
+
+# Page ranges ─────────────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("spec, pages", [
+    ("1", [1]),
+    ("1,3-5,7", [1, 3, 4, 5, 7]),
+    (" 2 - 3 , 1 ", [1, 2, 3]),
+    ("3-4,4,1-2", [1, 2, 3, 4]),
+    ("7-7", [7]),
+])
+def test_parse_page_ranges(spec, pages):
+    assert parse_page_ranges(spec, 7) == pages
+
+
+@pytest.mark.parametrize("spec", ["0", "8", "5-3", "6-8", "0-2"])
+def test_parse_page_ranges_rejects_pages_outside_the_document(spec):
+    bad_request(parse_page_ranges, spec, 7)
+
+
+@pytest.mark.parametrize("spec", ["a", "1-", "1,,2", "-1"])
+def test_parse_page_ranges_leaves_malformed_input_to_the_caller(spec):
+    with pytest.raises(ValueError):
+        parse_page_ranges(spec, 7)
+
+
+def test_parse_page_order():
+    assert parse_page_order("3,1-2", 3) == [3, 1, 2]
+    assert "exactly once" in bad_request(parse_page_order, "1,1-2", 3)
+    assert "exactly once" in bad_request(parse_page_order, "1,2", 3)
+    assert "Invalid page order" in bad_request(parse_page_order, "1,x", 3)
+
+
+# Operations ──────────────────────────────────────────────────────────────────
+
+def test_parse_operations_fills_in_merge_files():
+    operations = parse_operations(json.dumps([{"op": "merge"}, {"op": "remove", "pages": "1"}]), 3)
+    assert operations[0]["files"] == [1, 2]
+
+
+@pytest.mark.parametrize("raw, message", [
+    (None, "JSON list"),
+    ("not json", "JSON list"),
+    ("{}", "non-empty JSON list"),
+    ("[]", "non-empty JSON list"),
+    (json.dumps([{"op": "remove", "pages": "1"}] * (MAX_PIPELINE_OPERATIONS + 1)), "Maximum"),
+    (json.dumps([{"op": "explode"}]), "op must be one of"),
+    (json.dumps(["remove"]), "op must be one of"),
+    (json.dumps([{"op": "remove"}]), "missing pages"),
+    (json.dumps([{"op": "encrypt", "password": ""}]), "missing password"),
+    (json.dumps([{"op": "rotate", "degrees": 45}]), "multiple of 90"),
+    (json.dumps([{"op": "rotate", "degrees": "90"}]), "multiple of 90"),
+    (json.dumps([{"op": "remove", "pages": "1"}, {"op": "decrypt", "password": "x"}]), "must be the first"),
+])
+def test_parse_operations_rejects_invalid_lists(raw, message):
+    assert message in bad_request(parse_operations, raw, 1)
+
+
+@pytest.mark.parametrize("operations, message", [
+    ([{"op": "remove", "pages": "1"}], "Every upload"),
+    ([{"op": "merge", "files": [1]}], "Every upload"),
+    ([{"op": "merge", "files": [0, 1, 2]}], "invalid or already merged upload 0"),
+    ([{"op": "merge", "files": [3]}], "invalid or already merged upload 3"),
+    ([{"op": "merge", "files": [1]}, {"op": "merge", "files": [1, 2]}], "already merged upload 1"),
+    ([{"op": "merge"}, {"op": "merge"}], "no uploads left"),
+    ([{"op": "merge", "files": "1,2"}], "no uploads left"),
+])
+def test_parse_operations_checks_merges(operations, message):
+    assert message in bad_request(parse_operations, json.dumps(operations), 3)
+
+
+# Running ─────────────────────────────────────────────────────────────────────
+
+def run(uploads, operations):
+    return run_pdf_pipeline(uploads, parse_operations(json.dumps(operations), len(uploads)))
+
+
+def test_operations_apply_to_the_working_document_in_order():
+    uploads = [make_pdf([101, 102, 103]), make_pdf([201, 202])]
+    result = run(uploads, [
+        {"op": "merge"},
+        {"op": "remove", "pages": "2"},
+        {"op": "reorder", "order": "4,1-3"},
+        {"op": "rotate", "degrees": 90, "pages": "1"},
+    ])
+    assert page_widths(result) == [202, 101, 103, 201]
+    assert PdfReader(io.BytesIO(result.read_bytes())).pages[0].get("/Rotate") == 90
+
+
+def test_decrypt_merge_and_encrypt():
+    uploads = [make_pdf([101], password="base"), make_pdf([201], password="other")]
+    result = run(uploads, [
+        {"op": "decrypt", "password": "base"},
+        {"op": "merge", "password": "other"},
+        {"op": "encrypt", "password": "new"},
+    ])
+    assert PdfReader(io.BytesIO(result.read_bytes())).is_encrypted
+    assert page_widths(result, password="new") == [101, 201]
+
+
+@pytest.mark.parametrize("operations, message", [
+    ([{"op": "remove", "pages": "1-2"}], "removed every page"),
+    ([{"op": "remove", "pages": "x"}], "Invalid page selection"),
+    ([{"op": "decrypt", "password": "x"}], "not password protected"),
+])
+def test_run_errors(operations, message):
+    assert message in bad_request(run, [make_pdf([101, 102])], operations)
+
+
+def test_encrypted_uploads_need_their_password():
+    assert "password protected" in bad_request(run, [make_pdf([101], password="secret")], [{"op": "remove", "pages": "1"}])
+    assert "Incorrect password" in bad_request(run, [make_pdf([101], password="secret")], [{"op": "decrypt", "password": "wrong"}])
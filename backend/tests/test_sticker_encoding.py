@@ -0,0 +1,140 @@
+from PIL import Image
+import numpy as np
+import io
+
+import pytest
+
+import sticker_encoding
+from sticker_encoding import STICKER_PRESETS, AnimatedWebPWriter, EncodeSettings, search_encode
+
+
+def frame(value: int, size: int = 16) -> np.ndarray:
+    array = np.zeros((size, size, 4), dtype=np.uint8)
+    array[..., 0] = value
+    array[..., 3] = 255
+    return array
+
+
+def decode(data: bytes):
+    """(frame count, per-frame durations, first pixel of each frame) of an animated WebP."""
+    image = Image.open(io.BytesIO(data))
+    durations, pixels = [], []
+    for index in range(image.n_frames):
+        image.seek(index)
+        image.load()
+        durations.append(image.info["duration"])
+        pixels.append(image.convert("RGBA").getpixel((0, 0))[0])
+    return image.n_frames, durations, pixels
+
+
+def encode(frames, **options) -> AnimatedWebPWriter:
+    writer = AnimatedWebPWriter((16, 16), frame_duration=40, **options)
+    for array in frames:
+        writer.add_frame(array)
+    return writer
+
+
+# Streaming encoder ───────────────────────────────────────────────────────────
+
+@pytest.mark.skipif(sticker_encoding._webp is None, reason="Pillow built without WebP")
+def test_private_webp_encoder_matches_this_pillow():
+    # Fails loudly if a Pillow upgrade changes _webp.WebPAnimEncoder's signature
+    assert sticker_encoding.HAVE_STREAMING_WEBP
+    assert encode([frame(0)])._encoder is not None
+
+
+def test_writer_encodes_every_frame():
+    writer = encode([frame(0), frame(100), frame(200)])
+    assert writer.frames_added == 3
+    assert decode(writer.finish()) == (3, [40, 40, 40], [0, 100, 200])
+
+
+def test_duplicate_frames_are_merged_into_longer_ones():
+    writer = encode([frame(0), frame(0), frame(0), frame(200)])
+    assert (writer.frames_added, writer.frames_skipped) == (2, 2)
+    assert decode(writer.finish()) == (2, [120, 40], [0, 200])
+
+
+def test_duplicates_are_kept_when_skipping_is_off():
+    writer = encode([frame(0), frame(0)], skip_duplicate_frames=False)
+    assert writer.frames_added == 2
+
+
+def test_finish_without_frames_fails():
+    with pytest.raises(ValueError):
+        AnimatedWebPWriter((16, 16), frame_duration=40).finish()
+
+
+# Buffered fallback ───────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("error", [TypeError, AttributeError])
+def test_signature_mismatch_disables_streaming(monkeypatch, error):
+    def incompatible(*args):
+        raise error("unexpected arguments")
+
+    monkeypatch.setattr(sticker_encoding, "_new_anim_encoder", incompatible)
+    assert not sticker_encoding._streaming_webp_works()
+
+
+@pytest.mark.parametrize("error", [TypeError, AttributeError])
+def test_writer_falls_back_to_save_all(monkeypatch, error):
+    def incompatible(*args):
+        raise error("unexpected arguments")
+
+    monkeypatch.setattr(sticker_encoding, "_new_anim_encoder", incompatible)
+    writer = encode([frame(0), frame(0), frame(200)])
+    assert writer._encoder is None
+    assert decode(writer.finish()) == (2, [80, 40], [0, 200])
+
+
+def test_fallback_copies_frames_from_reused_buffers(monkeypatch):
+    monkeypatch.setattr(sticker_encoding, "HAVE_STREAMING_WEBP", False)
+    buffer = frame(0)
+    writer = AnimatedWebPWriter((16, 16), frame_duration=40, skip_duplicate_frames=False)
+    writer.add_frame(buffer)
+    buffer[..., 0] = 200  # a decoder overwriting its frame buffer in place
+    writer.add_frame(buffer)
+    assert decode(writer.finish())[2] == [0, 200]
+
+
+# Size-targeted search ────────────────────────────────────────────────────────
+
+def fake_encoder(sizes):
+    """Encode stand-in whose output size is sizes(settings)."""
+    calls = []
+
+    def encode(settings: EncodeSettings) -> bytes:
+        calls.append(settings)
+        return b"x" * sizes(settings)
+
+    return encode, calls
+
+
+def test_search_returns_max_quality_when_it_fits():
+    encode, calls = fake_encoder(lambda settings: 10)
+    result = search_encode(encode, STICKER_PRESETS["balanced"], max_bytes=100)
+    assert result.settings == EncodeSettings(False, 95, 4)
+    assert len(calls) == 1
+
+
+def test_search_takes_lossless_when_the_probe_fits():
+    encode, calls = fake_encoder(lambda settings: 50 if settings.lossless else 10)
+    result = search_encode(encode, STICKER_PRESETS["max"], max_bytes=100)
+    assert result.settings == EncodeSettings(True, 100, 6)
+    assert len(calls) == 2
+
+
+def test_search_stays_within_budget_and_attempts():
+    encode, calls = fake_encoder(lambda settings: settings.quality * 2)
+    preset = STICKER_PRESETS["balanced"]
+    result = search_encode(encode, preset, max_bytes=100)
+    assert len(result.data) <= 100
+    assert result.attempts == len(calls) <= preset.max_attempts
+
+
+def test_search_returns_smallest_result_when_nothing_fits():
+    encode, _ = fake_encoder(lambda settings: 1000 - settings.quality)
+    result = search_encode(encode, STICKER_PRESETS["fast"], max_bytes=10)
+    # Tried 90, then 59 and 44 while searching down; 90 gave the smallest output
+    assert result.settings.quality == 90
+    assert result.attempts == 3
@@ -0,0 +1,318 @@
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from PyPDF2 import PdfReader, PdfWriter
+import hashlib
+import time
+import io
+import os
+
+import pytest
+
+from upload_sessions import MAX_CHUNK_SIZE, MIN_CHUNK_SIZE, UploadSessionStore
+
+CHUNK = MIN_CHUNK_SIZE
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def payload(size: int = 2 * CHUNK + 1000) -> bytes:
+    return os.urandom(size)
+
+
+def make_pdf(pages: int = 3) -> bytes:
+    writer = PdfWriter()
+    for index in range(pages):
+        writer.add_blank_page(width=100 + index, height=100)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadSessionStore(directory=str(tmp_path / "sessions"), ttl=60, max_bytes=10 * CHUNK)
+
+
+def send(store: UploadSessionStore, upload_id: str, index: int, data: bytes, digest=None, pieces: int = 3) -> None:
+    writer = store.begin_chunk(upload_id, index)
+    try:
+        step = -(-len(data) // pieces)
+        for start in range(0, len(data), step):
+            writer.write(data[start:start + step])
+        writer.commit(digest)
+    finally:
+        writer.close()
+
+
+def chunk_of(data: bytes, index: int) -> bytes:
+    return data[index * CHUNK:(index + 1) * CHUNK]
+
+
+def error(excinfo) -> tuple:
+    return excinfo.value.status_code, excinfo.value.detail
+
+
+# Sessions ────────────────────────────────────────────────────────────────────
+
+def test_create_splits_the_file_into_chunks(store):
+    session = store.create("video.mp4", "video/mp4", 2 * CHUNK + 1, CHUNK)
+    assert (session.chunks, session.complete) == (3, False)
+    assert store.get(session.upload_id) == session
+    assert store.status(session.upload_id)["missing"] == [0, 1, 2]
+
+
+@pytest.mark.parametrize("size, chunk_size, status", [
+    (0, None, 400),
+    (10 * CHUNK + 1, None, 413),
+    (1000, MIN_CHUNK_SIZE - 1, 400),
+    (1000, MAX_CHUNK_SIZE + 1, 400),
+])
+def test_create_validates_sizes(store, size, chunk_size, status):
+    with pytest.raises(HTTPException) as excinfo:
+        store.create("file.bin", None, size, chunk_size)
+    assert excinfo.value.status_code == status
+
+
+@pytest.mark.parametrize("upload_id", ["0" * 32, "../../etc/passwd", "ABC"])
+def test_unknown_sessions_are_404(store, upload_id):
+    with pytest.raises(HTTPException) as excinfo:
+        store.get(upload_id)
+    assert excinfo.value.status_code == 404
+
+
+# Chunks ──────────────────────────────────────────────────────────────────────
+
+def test_chunks_arrive_in_any_order(store):
+    data = payload()
+    session = store.create("data.bin", None, len(data), CHUNK)
+    for index in (2, 0):
+        send(store, session.upload_id, index, chunk_of(data, index), sha256(chunk_of(data, index)))
+    assert store.status(session.upload_id)["missing"] == [1]
+    send(store, session.upload_id, 1, chunk_of(data, 1))
+    status = store.status(session.upload_id)
+    assert (status["received"], status["missing"]) == (3, [])
+
+
+def test_chunk_with_the_wrong_sha256_stays_missing(store):
+    data = payload()
+    session = store.create("data.bin", None, len(data), CHUNK)
+    with pytest.raises(HTTPException) as excinfo:
+        send(store, session.upload_id, 0, chunk_of(data, 0), sha256(b"something else"))
+    assert excinfo.value.status_code == 400
+    assert 0 in store.status(session.upload_id)["missing"]
+
+
+def test_resent_chunk_is_missing_until_verified_again(store):
+    data = payload()
+    session = store.create("data.bin", None, len(data), CHUNK)
+    send(store, session.upload_id, 0, chunk_of(data, 0))
+    writer = store.begin_chunk(session.upload_id, 0)
+    writer.write(chunk_of(data, 0)[:100])
+    writer.close()  # the connection dropped
+    assert 0 in store.status(session.upload_id)["missing"]
+
+
+def test_short_and_long_chunks_are_rejected(store):
+    data = payload()
+    session = store.create("data.bin", None, len(data), CHUNK)
+    with pytest.raises(HTTPException) as excinfo:
+        send(store, session.upload_id, 0, chunk_of(data, 0)[:-1])
+    assert error(excinfo) == (400, f"Chunk 0 has {CHUNK - 1} bytes, expected {CHUNK}.")
+    with pytest.raises(HTTPException) as excinfo:
+        send(store, session.upload_id, 2, data[2 * CHUNK:] + b"extra", pieces=1)
+    assert excinfo.value.status_code == 413
+
+
+@pytest.mark.parametrize("index", [-1, 3])
+def test_chunk_index_must_exist(store, index):
+    session = store.create("data.bin", None, 2 * CHUNK + 1000, CHUNK)
+    with pytest.raises(HTTPException) as excinfo:
+        store.begin_chunk(session.upload_id, index)
+    assert excinfo.value.status_code == 400
+
+
+def test_pdf_sessions_check_the_header_of_the_first_chunk(store):
+    session = store.create("doc.pdf", "application/pdf", 1000, CHUNK)
+    with pytest.raises(HTTPException) as excinfo:
+        send(store, session.upload_id, 0, b"not a pdf".ljust(1000, b"\0"))
+    assert error(excinfo) == (400, "Only PDF files allowed")
+
+
+# Completion ──────────────────────────────────────────────────────────────────
+
+def filled(store: UploadSessionStore, data: bytes, **options):
+    session = store.create("data.bin", options.get("content_type"), len(data), CHUNK)
+    for index in range(session.chunks):
+        send(store, session.upload_id, index, chunk_of(data, index))
+    return session
+
+
+def test_complete_needs_every_chunk(store):
+    data = payload()
+    session = store.create("data.bin", None, len(data), CHUNK)
+    send(store, session.upload_id, 0, chunk_of(data, 0))
+    with pytest.raises(HTTPException) as excinfo:
+        store.complete(session.upload_id)
+    assert error(excinfo) == (409, "2 chunk(s) still missing, starting with chunk 1.")
+    with pytest.raises(HTTPException) as excinfo:
+        store.completed(session.upload_id)
+    assert excinfo.value.status_code == 409
+
+
+def test_complete_checks_the_whole_file_every_time(store):
+    data = payload()
+    session = filled(store, data)
+    with pytest.raises(HTTPException) as excinfo:
+        store.complete(session.upload_id, sha256(data + b"x"))
+    assert excinfo.value.status_code == 400
+    assert not store.get(session.upload_id).complete
+
+    assert store.complete(session.upload_id, sha256(data).upper()).complete
+    # Repeating it is harmless, but a wrong checksum is still reported
+    assert store.complete(session.upload_id).complete
+    with pytest.raises(HTTPException):
+        store.complete(session.upload_id, sha256(b"x"))
+
+
+def test_completed_sessions_take_no_more_chunks(store):
+    session = filled(store, payload())
+    store.complete(session.upload_id)
+    with pytest.raises(HTTPException) as excinfo:
+        store.begin_chunk(session.upload_id, 0)
+    assert excinfo.value.status_code == 409
+
+
+def test_open_links_the_file_and_outlives_the_session(store):
+    data = payload()
+    session = filled(store, data)
+    store.complete(session.upload_id)
+    upload = store.open(session.upload_id)
+    assert (upload.filename, upload.suffix) == ("data.bin", ".bin")
+    store.delete(session.upload_id)
+    assert upload.read_bytes() == data
+    upload.cleanup()
+    with pytest.raises(HTTPException):
+        store.get(session.upload_id)
+
+
+# Expiry ──────────────────────────────────────────────────────────────────────
+
+def age(store: UploadSessionStore, upload_id: str, seconds: float) -> None:
+    path = os.path.join(store.directory, f"{upload_id}.json")
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_sessions_expire_after_the_ttl_since_their_last_use(store):
+    session = store.create("data.bin", None, 1000, CHUNK)
+    age(store, session.upload_id, 50)
+    store.get(session.upload_id)  # a use renews it
+    age(store, session.upload_id, 59)
+    store.get(session.upload_id)
+
+    age(store, session.upload_id, 61)
+    with pytest.raises(HTTPException) as excinfo:
+        store.get(session.upload_id)
+    assert excinfo.value.status_code == 404
+    assert os.listdir(store.directory) == []
+
+
+def test_creating_a_session_sweeps_expired_ones(store):
+    old = store.create("old.bin", None, 1000, CHUNK)
+    age(store, old.upload_id, 61)
+    new = store.create("new.bin", None, 1000, CHUNK)
+    assert sorted(os.listdir(store.directory)) == sorted(f"{new.upload_id}.{ext}" for ext in ("json", "map", "part"))
+
+
+# HTTP ────────────────────────────────────────────────────────────────────────
+
+@pytest.fixture(scope="module")
+def client():
+    from server import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+def upload(client: TestClient, data: bytes, filename: str, content_type: str, complete: bool = True) -> str:
+    response = client.post(
+        "/uploads", data={"filename": filename, "size": str(len(data)), "content_type": content_type, "chunk_size": str(CHUNK)},
+    )
+    assert response.status_code == 201
+    session = response.json()
+    assert response.headers["Location"] == f"/uploads/{session['upload_id']}"
+    for index in reversed(range(session["chunks"])):
+        chunk = chunk_of(data, index)
+        response = client.put(
+            f"/uploads/{session['upload_id']}/chunks/{index}", content=chunk, headers={"X-Chunk-SHA256": sha256(chunk)},
+        )
+        assert response.json() == {"upload_id": session["upload_id"], "index": index, "size": len(chunk)}
+    if complete:
+        response = client.post(f"/uploads/{session['upload_id']}/complete", data={"sha256": sha256(data)})
+        assert response.json()["complete"]
+    return session["upload_id"]
+
+
+def test_upload_endpoints(client):
+    data = payload()
+    upload_id = upload(client, data, "data.bin", "application/octet-stream", complete=False)
+    status = client.get(f"/uploads/{upload_id}").json()
+    assert (status["received"], status["missing"], status["complete"]) == (3, [], False)
+
+    bad = client.put(f"/uploads/{upload_id}/chunks/0", content=chunk_of(data, 0), headers={"X-Chunk-SHA256": "0" * 64})
+    assert bad.status_code == 400
+    assert client.get(f"/uploads/{upload_id}").json()["missing"] == [0]
+    assert client.post(f"/uploads/{upload_id}/complete").status_code == 409
+
+    assert client.delete(f"/uploads/{upload_id}").json() == {"upload_id": upload_id, "deleted": True}
+    assert client.get(f"/uploads/{upload_id}").status_code == 404
+
+
+def test_processing_endpoints_take_an_upload_id(client):
+    pdf = make_pdf(3)
+    upload_id = upload(client, pdf, "doc.pdf", "application/pdf")
+    response = client.post("/edit-pdf/", params={"page_numbers": "2"}, data={"upload_id": upload_id})
+    assert response.status_code == 200
+    assert len(PdfReader(io.BytesIO(response.content)).pages) == 2
+    # The session can be used again until it expires
+    response = client.post("/edit-pdf/", params={"page_numbers": "1"}, data={"upload_id": upload_id})
+    assert len(PdfReader(io.BytesIO(response.content)).pages) == 2
+
+
+def test_upload_id_and_file_are_exclusive(client):
+    pdf = make_pdf(2)
+    upload_id = upload(client, pdf, "doc.pdf", "application/pdf")
+    response = client.post(
+        "/edit-pdf/", params={"page_numbers": "1"}, data={"upload_id": upload_id},
+        files={"file": ("doc.pdf", pdf, "application/pdf")},
+    )
+    assert response.status_code == 400
+    assert client.post("/edit-pdf/", params={"page_numbers": "1"}).status_code == 400
+
+
+@pytest.mark.parametrize("path", ["/edit-pdf/?page_numbers=1", "/stickers/whatsapp", "/convert-ico/"])
+def test_endpoints_without_a_file_or_upload_id_say_so(client, path):
+    response = client.post(path)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "A file or an upload_id is required."
+
+
+def test_incomplete_sessions_cannot_be_processed(client):
+    upload_id = upload(client, make_pdf(2), "doc.pdf", "application/pdf", complete=False)
+    response = client.post("/edit-pdf/", params={"page_numbers": "1"}, data={"upload_id": upload_id})
+    assert response.status_code == 409
+
+
+def test_jobs_take_an_upload_id(client):
+    upload_id = upload(client, make_pdf(3), "doc.pdf", "application/pdf")
+    job = client.post("/jobs/edit_pdf", data={"upload_id": upload_id, "page_numbers": "1-2"}).json()
+    for _ in range(500):
+        status = client.get(f"/jobs/{job['id']}").json()
+        if status["status"] in ("done", "failed"):
+            break
+        time.sleep(0.01)
+    assert status["status"] == "done"
+    result = client.get(f"/jobs/{job['id']}/result")
+    assert len(PdfReader(io.BytesIO(result.content)).pages) == 1
@@ -0,0 +1,343 @@
+"""
+Resumable upload sessions: large files sent as numbered chunks, then used by any endpoint.
+
+A single multipart request has to be sent again from the start when the
+connection drops, and the whole body is parsed and spooled before the
+handler runs. An upload session splits the transfer instead:
+- POST /uploads creates a session for a file of known size and returns its
+  upload_id and chunk size; the staging file is created sparse at full size
+- PUT /uploads/{id}/chunks/{n} streams chunk n straight to its offset in the
+  staging file; with an X-Chunk-SHA256 header the chunk only counts as
+  received if its digest matches. Chunks may be sent in any order, in
+  parallel, and sent again.
+- GET /uploads/{id} lists the chunks still missing, so a client can resume
+  after a dropped connection
+- POST /uploads/{id}/complete checks that every chunk arrived (and the whole
+  file's sha256, if given) and seals the session
+Every processing endpoint then takes upload_id in place of the file. The
+sealed staging file is hard-linked to a temp file the request owns and
+deletes as usual, so nothing is copied and one session can serve several
+requests until it expires.
+
+Sessions live only in UPLOAD_SESSION_DIR (metadata JSON, staging file and a
+one-byte-per-chunk received map), so any API process on the host can take
+any chunk. A session expires UPLOAD_SESSION_TTL seconds after its last use.
+
+Sessions declared as PDFs have their header checked when chunk 0 arrives,
+so a file that is not a PDF is turned away before the rest of it is sent.
+PDF parsing itself needs the trailer at the end of the file, so it still
+starts once the upload is complete.
+
+Environment variables:
+- UPLOAD_SESSION_DIR - staging files and session metadata (default: <temp dir>/toolkit-uploads)
+- UPLOAD_SESSION_TTL - seconds an unused session is kept (default: 3600)
+- UPLOAD_MAX_BYTES   - largest file accepted through a session (default: 2 GiB)
+- UPLOAD_CHUNK_SIZE  - chunk size when the client does not choose one (default: 8 MiB)
+"""
+
+from collections import namedtuple
+from fastapi import HTTPException, UploadFile
+from typing import Callable, List, Optional, Union
+import tempfile
+import hashlib
+import shutil
+import json
+import time
+import uuid
+import re
+import os
+
+from executor import run_io
+from uploads import SPOOL_CHUNK_SIZE, SpooledFile, spool_upload
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Configuration & Constants
+# ─────────────────────────────────────────────────────────────────────────────
+
+UPLOAD_SESSION_DIR = os.getenv("UPLOAD_SESSION_DIR") or os.path.join(tempfile.gettempdir(), "toolkit-uploads")
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", "3600"))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+
+# Chunk sizes a client may choose
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+# PDF readers accept the %PDF- header anywhere in the first kilobyte
+PDF_HEADER_WINDOW = 1024
+
+UPLOAD_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+UPLOAD_ID_DESCRIPTION = "Completed upload session (POST /uploads) to use instead of sending the file"
+UPLOAD_IDS_DESCRIPTION = "Completed upload sessions (POST /uploads) to use instead of sending the files, in order"
+
+UploadSession = namedtuple(
+    "UploadSession", ["upload_id", "filename", "content_type", "size", "chunk_size", "chunks", "complete"]
+)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Session Store
+# ─────────────────────────────────────────────────────────────────────────────
+
+class ChunkWriter:
+    """Writes one chunk at its offset in the staging file; it counts as received once commit() verifies it."""
+
+    def __init__(self, session: UploadSession, index: int, staging_path: str, received_path: str):
+        self.session = session
+        self.index = index
+        self.offset = index * session.chunk_size
+        self.length = min(session.chunk_size, session.size - self.offset)
+        self.written = 0
+        self._digest = hashlib.sha256()
+        self._received_path = received_path
+        # A chunk sent again is not received until it has been verified again
+        self._mark(0)
+        self._fd = os.open(staging_path, os.O_WRONLY)
+
+    def write(self, data: bytes) -> None:
+        """Store the next bytes of the chunk (use run_io)."""
+        if self.written + len(data) > self.length:
+            raise HTTPException(413, f"Chunk {self.index} is larger than {self.length} bytes.")
+        if self.index == 0 and self.written == 0 and self.session.content_type == "application/pdf":
+            if b"%PDF-" not in data[:PDF_HEADER_WINDOW]:
+                raise HTTPException(400, "Only PDF files allowed")
+        os.pwrite(self._fd, data, self.offset + self.written)
+        self._digest.update(data)
+        self.written += len(data)
+
+    def commit(self, sha256: Optional[str] = None) -> None:
+        """Mark the chunk received if it is complete and matches sha256 (hex), when given."""
+        if self.written != self.length:
+            raise HTTPException(400, f"Chunk {self.index} has {self.written} bytes, expected {self.length}.")
+        if sha256 and self._digest.hexdigest() != sha256.strip().lower():
+            raise HTTPException(400, f"Chunk {self.index} does not match its X-Chunk-SHA256; send it again.")
+        self._mark(1)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+    def _mark(self, received: int) -> None:
+        fd = os.open(self._received_path, os.O_WRONLY)
+        try:
+            os.pwrite(fd, bytes([received]), self.index)
+        finally:
+            os.close(fd)
+
+
+class UploadSessionStore:
+    """Upload sessions kept as files in one directory shared by all API processes (methods do file I/O; use run_io)."""
+
+    def __init__(self, directory: str = UPLOAD_SESSION_DIR, ttl: float = UPLOAD_SESSION_TTL, max_bytes: int = UPLOAD_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def _path(self, upload_id: str, extension: str) -> str:
+        return os.path.join(self.directory, f"{upload_id}.{extension}")
+
+    # Sessions ────────────────────────────────────────────────────────────────
+
+    def create(self, filename: str, content_type: Optional[str], size: int, chunk_size: Optional[int] = None) -> UploadSession:
+        if size < 1:
+            raise HTTPException(400, "size must be at least 1 byte")
+        if size > self.max_bytes:
+            raise HTTPException(413, f"Upload is too large. Maximum is {self.max_bytes} bytes.")
+        chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+        if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise HTTPException(400, f"chunk_size must be between {MIN_CHUNK_SIZE} and {MAX_CHUNK_SIZE} bytes")
+        self.expire()
+
+        os.makedirs(self.directory, exist_ok=True)
+        session = UploadSession(
+            upload_id=uuid.uuid4().hex,
+            filename=filename,
+            content_type=content_type,
+            size=size,
+            chunk_size=chunk_size,
+            chunks=-(-size // chunk_size),
+            complete=False,
+        )
+        # Metadata first: expire() finds a session through it, so nothing is ever orphaned
+        self._save(session)
+        with open(self._path(session.upload_id, "part"), "wb") as staging:
+            # Sparse: disk blocks are only allocated as chunks arrive
+            staging.truncate(size)
+        with open(self._path(session.upload_id, "map"), "wb") as received:
+            received.truncate(session.chunks)
+        return session
+
+    def get(self, upload_id: str) -> UploadSession:
+        """The session (which counts as a use), or 404 if it does not exist or has expired."""
+        path = self._path(upload_id, "json")
+        try:
+            if not UPLOAD_ID_PATTERN.fullmatch(upload_id):
+                raise FileNotFoundError(upload_id)
+            if os.stat(path).st_mtime + self.ttl <= time.time():
+                self._remove(upload_id)
+                raise FileNotFoundError(upload_id)
+            with open(path) as handle:
+                session = UploadSession(**json.load(handle))
+            # mtime is the session's last use, for expiry
+            os.utime(path)
+        except (OSError, ValueError, TypeError):
+            raise HTTPException(404, f"Upload session '{upload_id}' not found or expired")
+        return session
+
+    def completed(self, upload_id: str) -> UploadSession:
+        """The session if it has been completed, else 409."""
+        session = self.get(upload_id)
+        if not session.complete:
+            raise HTTPException(409, f"Upload session '{upload_id}' is not complete; POST /uploads/{upload_id}/complete first.")
+        return session
+
+    def _save(self, session: UploadSession) -> None:
+        # Written under a temporary name and renamed, so other processes never read a partial file
+        handle, temporary = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(handle, "w") as target:
+            json.dump(session._asdict(), target)
+        os.replace(temporary, self._path(session.upload_id, "json"))
+
+    def missing_chunks(self, session: UploadSession) -> List[int]:
+        try:
+            with open(self._path(session.upload_id, "map"), "rb") as handle:
+                received = handle.read()
+        except OSError:
+            raise HTTPException(404, f"Upload session '{session.upload_id}' not found or expired")
+        return [index for index in range(session.chunks) if index >= len(received) or not received[index]]
+
+    def status(self, upload_id: str) -> dict:
+        session = self.get(upload_id)
+        missing = self.missing_chunks(session)
+        return {
+            **session._asdict(),
+            "received": session.chunks - len(missing),
+            "missing": missing,
+            "expires_in": self.ttl,
+        }
+
+    # Chunks ──────────────────────────────────────────────────────────────────
+
+    def begin_chunk(self, upload_id: str, index: int) -> ChunkWriter:
+        session = self.get(upload_id)
+        if session.complete:
+            raise HTTPException(409, f"Upload session '{upload_id}' is already complete.")
+        if not 0 <= index < session.chunks:
+            raise HTTPException(400, f"Chunk index must be between 0 and {session.chunks - 1}.")
+        try:
+            return ChunkWriter(session, index, self._path(upload_id, "part"), self._path(upload_id, "map"))
+        except OSError:
+            raise HTTPException(404, f"Upload session '{upload_id}' not found or expired")
+
+    def complete(self, upload_id: str, sha256: Optional[str] = None) -> UploadSession:
+        """Seal the session once every chunk is in, checking the whole file against sha256 (hex) if given."""
+        session = self.get(upload_id)
+        missing = [] if session.complete else self.missing_chunks(session)
+        if missing:
+            raise HTTPException(409, f"{len(missing)} chunk(s) still missing, starting with chunk {missing[0]}.")
+        if sha256:
+            digest = hashlib.sha256()
+            with open(self._path(upload_id, "part"), "rb") as handle:
+                for chunk in iter(lambda: handle.read(SPOOL_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            if digest.hexdigest() != sha256.strip().lower():
+                raise HTTPException(400, "Upload does not match its sha256.")
+        if not session.complete:
+            session = session._replace(complete=True)
+            self._save(session)
+        return session
+
+    def open(self, upload_id: str) -> SpooledFile:
+        """
+        A completed upload as a temp file owned by the caller, who deletes it with cleanup().
+
+        The temp file is a hard link to the staging file, so nothing is
+        copied and it outlives the session's expiry; it must only be read.
+        """
+        session = self.completed(upload_id)
+        suffix = os.path.splitext(session.filename or "")[1]
+        path = os.path.join(tempfile.gettempdir(), f"upload-{uuid.uuid4().hex}{suffix}")
+        staging = self._path(upload_id, "part")
+        try:
+            os.link(staging, path)
+        except FileNotFoundError:
+            raise HTTPException(404, f"Upload session '{upload_id}' not found or expired")
+        except OSError:
+            # UPLOAD_SESSION_DIR on another filesystem, or one without hard links
+            shutil.copyfile(staging, path)
+        return SpooledFile(path=path, suffix=suffix, filename=session.filename, content_type=session.content_type)
+
+    # Expiry ──────────────────────────────────────────────────────────────────
+
+    def delete(self, upload_id: str) -> None:
+        self.get(upload_id)
+        self._remove(upload_id)
+
+    def expire(self) -> None:
+        """Remove every session unused for longer than the TTL."""
+        cutoff = time.time() - self.ttl
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            upload_id, _, extension = name.partition(".")
+            if extension != "json":
+                continue
+            try:
+                if os.stat(os.path.join(self.directory, name)).st_mtime <= cutoff:
+                    self._remove(upload_id)
+            except OSError:
+                continue
+
+    def _remove(self, upload_id: str) -> None:
+        # Requests holding a hard link to the staging file keep their copy
+        for extension in ("json", "map", "part"):
+            try:
+                os.remove(self._path(upload_id, extension))
+            except OSError:
+                pass
+
+
+upload_sessions = UploadSessionStore()
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Endpoint Inputs
+# ─────────────────────────────────────────────────────────────────────────────
+
+UploadSource = Union[UploadFile, UploadSession]
+
+
+async def upload_source(file: Optional[UploadFile], upload_id: Optional[str]) -> UploadSource:
+    """
+    The file an endpoint was sent, or the completed session named by upload_id.
+
+    Both have filename and content_type, so endpoints validate either one
+    before receive_upload() spools or links its contents.
+    """
+    if file is not None and upload_id:
+        raise HTTPException(400, "Send either a file or an upload_id, not both.")
+    if upload_id:
+        return await run_io(upload_sessions.completed, upload_id)
+    if file is None:
+        raise HTTPException(400, "A file or an upload_id is required.")
+    return file
+
+
+async def upload_sources(files: Optional[List[UploadFile]], upload_ids: Optional[List[str]]) -> List[UploadSource]:
+    """upload_source() for multi-file endpoints; the files or the sessions are taken in the order sent."""
+    if files and upload_ids:
+        raise HTTPException(400, "Send either files or upload_ids, not both.")
+    if files:
+        return list(files)
+    return [await run_io(upload_sessions.completed, upload_id) for upload_id in upload_ids or []]
+
+
+async def receive_upload(source: UploadSource, on_chunk: Optional[Callable[[bytes], None]] = None) -> SpooledFile:
+    """
+    Spool a sent file (see spool_upload()), or link a completed session's file without copying it.
+
+    on_chunk only sees the chunks of a sent file; a session's file is
+    already complete, so callers inspect it directly.
+    """
+    if isinstance(source, UploadSession):
+        return await run_io(upload_sessions.open, source.upload_id)
+    return await spool_upload(source, on_chunk=on_chunk)
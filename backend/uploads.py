@@ -0,0 +1,262 @@
+"""
+Spooled upload/output layer that keeps large files out of process memory.
+
+- spool_upload() copies an UploadFile into a SpooledFile: bytes in memory up
+  to SPOOL_MEMORY_THRESHOLD, a named temp file above it; an on_chunk hook
+  can inspect the stream as it is copied and abort it (see media_probe.py)
+- SpillingBuffer is a seekable write target that rolls over to a named temp
+  file once it grows past the threshold (PdfWriter/Pillow write into it)
+- StreamingZip builds a zip entry by entry for a streamed response, never
+  holding more than the entry being added
+- spooled_response() streams a result from memory or disk in chunks and
+  deletes any temp file once the response has been sent
+
+SpooledFile only carries bytes or a path, so it can be handed to process-pool
+workers without copying file contents through the pipe for large inputs.
+
+Environment variables:
+- SPOOL_MEMORY_THRESHOLD - bytes kept in memory before spilling to disk (default: 8 MiB)
+"""
+
+from fastapi import UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Union
+import tempfile
+import zipfile
+import io
+import os
+
+from executor import run_io
+
+SPOOL_MEMORY_THRESHOLD = int(os.getenv("SPOOL_MEMORY_THRESHOLD", str(8 * 1024 * 1024)))
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Spooled Files
+# ─────────────────────────────────────────────────────────────────────────────
+
+class SpooledFile:
+    """File contents held either in memory (data) or in a named temp file (path)."""
+
+    def __init__(
+        self,
+        data: Optional[bytes] = None,
+        path: Optional[str] = None,
+        suffix: str = "",
+        filename: Optional[str] = None,
+        content_type: Optional[str] = None,
+    ):
+        self.data = data
+        self.path = path
+        self.suffix = suffix
+        # Client-supplied upload metadata, kept for handlers that sniff the media type
+        self.filename = filename
+        self.content_type = content_type
+
+    @property
+    def size(self) -> int:
+        if self.data is not None:
+            return len(self.data)
+        return os.path.getsize(self.path) if self.path and os.path.exists(self.path) else 0
+
+    @property
+    def in_memory(self) -> bool:
+        return self.data is not None
+
+    def open(self) -> BinaryIO:
+        """Open a seekable, file-backed stream over the contents."""
+        if self.data is not None:
+            return io.BytesIO(self.data)
+        return open(self.path, "rb")
+
+    def read_bytes(self) -> bytes:
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as handle:
+            return handle.read()
+
+    def iter_chunks(self, chunk_size: int = SPOOL_CHUNK_SIZE) -> Iterator[bytes]:
+        if self.data is not None:
+            for start in range(0, len(self.data), chunk_size):
+                yield self.data[start:start + chunk_size]
+            return
+        with open(self.path, "rb") as handle:
+            while True:
+                chunk = handle.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def spill(self) -> str:
+        """Move in-memory contents to a named temp file (for tools that need a path) and return it."""
+        if self.data is not None:
+            with tempfile.NamedTemporaryFile(delete=False, suffix=self.suffix) as tmp_file:
+                tmp_file.write(self.data)
+            self.path = tmp_file.name
+            self.data = None
+        return self.path
+
+    def cleanup(self) -> None:
+        """Drop the in-memory copy and delete the temp file, if any."""
+        self.data = None
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+
+async def spool_upload(
+    upload: UploadFile,
+    threshold: int = SPOOL_MEMORY_THRESHOLD,
+    on_chunk: Optional[Callable[[bytes], None]] = None,
+) -> SpooledFile:
+    """
+    Copy an upload chunk by chunk, spilling to a named temp file past the threshold.
+
+    on_chunk(chunk) sees every chunk before it is stored; if it raises, the
+    copy stops there and anything spooled so far is deleted.
+    """
+    suffix = os.path.splitext(upload.filename or "")[1]
+    buffer = bytearray()
+    tmp_file = None
+    try:
+        while True:
+            chunk = await upload.read(SPOOL_CHUNK_SIZE)
+            if not chunk:
+                break
+            if on_chunk is not None:
+                on_chunk(chunk)
+            if tmp_file is None and len(buffer) + len(chunk) <= threshold:
+                buffer.extend(chunk)
+                continue
+            if tmp_file is None:
+                tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+                await run_io(tmp_file.write, bytes(buffer))
+                buffer = bytearray()
+            await run_io(tmp_file.write, chunk)
+    except BaseException:
+        if tmp_file is not None:
+            tmp_file.close()
+            os.remove(tmp_file.name)
+        raise
+
+    if tmp_file is None:
+        return SpooledFile(data=bytes(buffer), suffix=suffix, filename=upload.filename, content_type=upload.content_type)
+    tmp_file.close()
+    return SpooledFile(path=tmp_file.name, suffix=suffix, filename=upload.filename, content_type=upload.content_type)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Spilling Output Buffer
+# ─────────────────────────────────────────────────────────────────────────────
+
+class SpillingBuffer(io.RawIOBase):
+    """Seekable write buffer that moves to a named temp file once it exceeds the threshold."""
+
+    def __init__(self, threshold: int = SPOOL_MEMORY_THRESHOLD, suffix: str = ""):
+        super().__init__()
+        self._threshold = threshold
+        self._suffix = suffix
+        self._target: Union[io.BytesIO, BinaryIO] = io.BytesIO()
+        self._path: Optional[str] = None
+
+    def writable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self._path is None and self._target.tell() + len(data) > self._threshold:
+            self._rollover()
+        return self._target.write(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self._target.read(size)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        return self._target.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._target.tell()
+
+    def flush(self) -> None:
+        self._target.flush()
+
+    def _rollover(self) -> None:
+        position = self._target.tell()
+        tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=self._suffix)
+        tmp_file.write(self._target.getbuffer())
+        tmp_file.seek(position)
+        self._target = tmp_file
+        self._path = tmp_file.name
+
+    def to_spooled(self) -> SpooledFile:
+        """Finish writing and hand the contents over as a SpooledFile."""
+        if self._path is None:
+            return SpooledFile(data=self._target.getvalue(), suffix=self._suffix)
+        self._target.close()
+        return SpooledFile(path=self._path, suffix=self._suffix)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Streamed Zip Output
+# ─────────────────────────────────────────────────────────────────────────────
+
+class StreamingZip(io.RawIOBase):
+    """
+    Zip archive written as a stream: each add() returns the archive bytes it produced.
+
+    The target is not seekable, so zipfile puts each entry's sizes in a data
+    descriptor after its data instead of going back to patch the header; the
+    bytes handed out are final and can be sent to a client straight away.
+    """
+
+    def __init__(self, compression: int = zipfile.ZIP_STORED):
+        super().__init__()
+        self._pending = bytearray()
+        self._position = 0
+        self._archive = zipfile.ZipFile(self, "w", compression=compression)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._pending += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def add(self, name: str, data: bytes) -> bytes:
+        self._archive.writestr(name, data)
+        return self._take()
+
+    def finish(self) -> bytes:
+        """Write the central directory; returns the last bytes of the archive."""
+        self._archive.close()
+        return self._take()
+
+    def _take(self) -> bytes:
+        data, self._pending = bytes(self._pending), bytearray()
+        return data
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Responses
+# ─────────────────────────────────────────────────────────────────────────────
+
+def spooled_response(
+    result: Union[bytes, SpooledFile],
+    media_type: str,
+    headers: Optional[Dict[str, str]] = None,
+) -> StreamingResponse:
+    """Stream a result in chunks and remove its temp file after the response is sent."""
+    spooled = result if isinstance(result, SpooledFile) else SpooledFile(data=result)
+    return StreamingResponse(
+        spooled.iter_chunks(),
+        media_type=media_type,
+        headers={"Content-Length": str(spooled.size), **(headers or {})},
+        background=BackgroundTask(spooled.cleanup),
+    )
@@ -0,0 +1,238 @@
+"""
+Video frame sources for animated stickers.
+
+Both sources trim a clip to its first max_duration seconds, centre-crop it
+to a square, scale it to size x size and cap its frame rate; they differ in
+where that work happens:
+- FfmpegVideoSource  - one ffmpeg process does the trim, crop, scale and fps
+                       cap in its filter graph and writes raw RGBA frames to
+                       a pipe, which are read straight into one reused numpy
+                       buffer. Only size x size frames ever reach Python.
+- MoviepyVideoSource - moviepy's subclip -> crop -> resize chain, which pipes
+                       full-resolution frames into Python and resizes each
+                       one with PIL. Kept as the fallback when the ffmpeg
+                       source cannot be used.
+
+open_video_source() picks the source; a VideoDecodeError from the ffmpeg
+source means the caller should retry with moviepy.
+
+FfmpegVideoSource.frames() yields the same array every time, overwritten by
+the next frame: copy any frame that must outlive the loop iteration.
+
+Environment variables:
+- VIDEO_DECODER          - 'ffmpeg' (default) or 'moviepy' to always use the fallback
+- VIDEO_DECODE_THREADS   - decoder threads per ffmpeg process, 0 = ffmpeg's choice (default: 0)
+- FFMPEG_BINARY          - ffmpeg executable (default: the imageio-ffmpeg binary, as moviepy uses)
+"""
+
+from PIL import Image
+from collections import namedtuple
+from typing import Iterator, Optional
+import numpy as np
+import subprocess
+import tempfile
+import logging
+import re
+import os
+
+logger = logging.getLogger(__name__)
+
+# Pillow dropped legacy resampling constants; restore them for moviepy's resize
+if not hasattr(Image, "ANTIALIAS"):
+    Image.ANTIALIAS = Image.Resampling.LANCZOS
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Configuration & Constants
+# ─────────────────────────────────────────────────────────────────────────────
+
+VIDEO_DECODERS = ("ffmpeg", "moviepy")
+VIDEO_DECODER = os.getenv("VIDEO_DECODER", "ffmpeg").strip().lower()
+if VIDEO_DECODER not in VIDEO_DECODERS:
+    raise ValueError(f"VIDEO_DECODER must be one of {', '.join(VIDEO_DECODERS)}, got {VIDEO_DECODER!r}")
+VIDEO_DECODE_THREADS = int(os.getenv("VIDEO_DECODE_THREADS", "0"))
+
+# Seconds allowed for reading a clip's header
+PROBE_TIMEOUT = 30
+# Matches moviepy's PIL resize so both sources produce the same stickers
+SCALE_FLAGS = "lanczos"
+
+VideoInfo = namedtuple("VideoInfo", ["width", "height", "duration", "fps"])
+
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+_VIDEO_STREAM_RE = re.compile(r"Stream #\d+:\d+.*?: Video: (.*)")
+_FRAME_SIZE_RE = re.compile(r"\b(\d{2,5})x(\d{2,5})\b")
+_FPS_RE = re.compile(r"(\d+(?:\.\d+)?)(k?) (?:fps|tbr)\b")
+
+
+class VideoDecodeError(Exception):
+    """ffmpeg could not probe or decode the clip (or could not be run at all)."""
+
+
+def ffmpeg_binary() -> str:
+    binary = os.getenv("FFMPEG_BINARY", "")
+    if binary and binary not in ("ffmpeg-imageio", "auto-detect"):
+        return binary
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Probing
+# ─────────────────────────────────────────────────────────────────────────────
+
+def probe_video(path: str) -> VideoInfo:
+    """Dimensions, duration (0 if unknown) and frame rate of a clip's first video stream, from its header."""
+    try:
+        result = subprocess.run(
+            [ffmpeg_binary(), "-hide_banner", "-nostdin", "-i", path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=PROBE_TIMEOUT,
+        )
+    except (OSError, subprocess.TimeoutExpired) as exc:
+        raise VideoDecodeError(f"Could not run ffmpeg: {exc}") from exc
+    # Without an output file ffmpeg exits non-zero after printing the input's description
+    info = result.stderr.decode("utf-8", "replace")
+
+    stream = _VIDEO_STREAM_RE.search(info)
+    size = _FRAME_SIZE_RE.search(stream.group(1)) if stream else None
+    if not size:
+        raise VideoDecodeError(f"No video stream found: {info.strip().splitlines()[-1:] or 'no output'}")
+    fps = _FPS_RE.search(stream.group(1))
+    duration = _DURATION_RE.search(info)
+    return VideoInfo(
+        width=int(size.group(1)),
+        height=int(size.group(2)),
+        duration=(int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3)))
+        if duration else 0.0,
+        fps=float(fps.group(1)) * (1000 if fps.group(2) else 1) if fps else 0.0,
+    )
+
+
+def sticker_fps(source_fps: float, max_fps: int) -> int:
+    """Output frame rate: the source's, whole frames per second, capped at max_fps."""
+    return min(int(source_fps or max_fps), max_fps) or max_fps
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Frame Sources
+# ─────────────────────────────────────────────────────────────────────────────
+
+class FfmpegVideoSource:
+    """Square, scaled, frame-rate-capped RGBA frames decoded by one ffmpeg process."""
+
+    def __init__(self, path: str, size: int, max_fps: int, max_duration: float):
+        self.path = path
+        self.size = size
+        self.info = probe_video(path)
+        self.duration = self.info.duration
+        self.end_time = min(self.duration, max_duration)
+        self.fps = sticker_fps(self.info.fps, max_fps)
+        self._process: Optional[subprocess.Popen] = None
+
+    def command(self) -> list:
+        square = "'min(iw,ih)'"
+        # Drop frames first so crop and scale only run on frames that are kept
+        filters = f"fps={self.fps},crop={square}:{square},scale={self.size}:{self.size}:flags={SCALE_FLAGS}"
+        return [
+            ffmpeg_binary(), "-v", "error", "-nostdin",
+            "-threads", str(VIDEO_DECODE_THREADS),
+            # As an input option -t stops demuxing at the trim point instead of decoding past it
+            "-t", f"{self.end_time:.3f}", "-i", self.path,
+            "-an", "-sn", "-dn", "-vf", filters,
+            "-pix_fmt", "rgba", "-f", "rawvideo", "pipe:1",
+        ]
+
+    def frames(self) -> Iterator[np.ndarray]:
+        """Yield each frame in one reused size x size x 4 buffer."""
+        frame = np.empty((self.size, self.size, 4), dtype=np.uint8)
+        view = memoryview(frame).cast("B")
+        frame_bytes = len(view)
+        frames_read = 0
+        # stderr goes to a file so a chatty decoder can never block on a full pipe
+        with tempfile.TemporaryFile() as errors:
+            try:
+                self._process = subprocess.Popen(
+                    self.command(), stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=errors, bufsize=0,
+                )
+            except OSError as exc:
+                raise VideoDecodeError(f"Could not run ffmpeg: {exc}") from exc
+            try:
+                while True:
+                    filled = 0
+                    while filled < frame_bytes:
+                        read = self._process.stdout.readinto(view[filled:])
+                        if not read:
+                            break
+                        filled += read
+                    if filled < frame_bytes:
+                        break
+                    frames_read += 1
+                    yield frame
+                returncode = self._process.wait()
+            finally:
+                self.close()
+            if returncode != 0:
+                errors.seek(0)
+                message = errors.read().decode("utf-8", "replace").strip()[-500:]
+                if not frames_read:
+                    raise VideoDecodeError(f"ffmpeg exited with {returncode}: {message}")
+                # Like moviepy, keep what decoded cleanly before the damage
+                logger.warning("ffmpeg stopped after %d frames of %s: %s", frames_read, self.path, message)
+
+    def close(self) -> None:
+        process, self._process = self._process, None
+        if process is None:
+            return
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        process.wait()
+
+    def __enter__(self) -> "FfmpegVideoSource":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class MoviepyVideoSource:
+    """The same frames (RGB, a new array each) through moviepy's subclip -> crop -> resize chain."""
+
+    def __init__(self, path: str, size: int, max_fps: int, max_duration: float):
+        from moviepy.editor import VideoFileClip
+
+        self.size = size
+        self._clips = [VideoFileClip(path)]
+        self.duration = self._clips[0].duration or 0
+        self.end_time = min(self.duration, max_duration)
+        self.fps = sticker_fps(self._clips[0].fps, max_fps)
+
+    def frames(self) -> Iterator[np.ndarray]:
+        clip = self._clips[0].subclip(0, self.end_time)
+        self._clips.append(clip)
+        min_edge = min(clip.w, clip.h)
+        clip = clip.crop(
+            x1=(clip.w - min_edge) / 2,
+            y1=(clip.h - min_edge) / 2,
+            width=min_edge,
+            height=min_edge,
+        )
+        self._clips.append(clip)
+        clip = clip.resize(newsize=(self.size, self.size))
+        self._clips.append(clip)
+        return clip.iter_frames(fps=self.fps, dtype="uint8")
+
+    def close(self) -> None:
+        # Derived clips first; the source clip owns the reader process
+        for clip in reversed(self._clips):
+            clip.close()
+        self._clips = []
+
+    def __enter__(self) -> "MoviepyVideoSource":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def open_video_source(path: str, size: int, max_fps: int, max_duration: float, decoder: str = VIDEO_DECODER):
+    """The configured frame source for a clip; raises VideoDecodeError if ffmpeg cannot read its header."""
+    source = FfmpegVideoSource if decoder == "ffmpeg" else MoviepyVideoSource
+    return source(path, size, max_fps, max_duration)
@@ -0,0 +1,60 @@
+"""
+Deferred heavy imports and an optional start-up warm-up.
+
+Each feature's heavy dependencies are imported inside the functions that
+use them, so a worker that only serves /convert-ico/ never loads sklearn or
+moviepy:
+- compress - sklearn.cluster (KMeans / MiniBatchKMeans palette fits)
+- pdf      - PyPDF2 (/edit-pdf/, /pdf-password/, /pdf/pipeline)
+- media    - moviepy.editor (the fallback video decoder; probes ffmpeg)
+
+Setting WARMUP preloads the listed features at start-up instead, before the
+first request and in every CPU pool worker, trading a slower start for no
+first-request penalty.
+
+Environment variables:
+- WARMUP - comma-separated features to preload, or "all" (default: none)
+"""
+
+from typing import Dict, List
+import importlib
+import logging
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+FEATURE_MODULES = {
+    "compress": ("sklearn.cluster",),
+    "pdf": ("PyPDF2",),
+    "media": ("moviepy.editor",),
+}
+
+
+def parse_features(spec: str) -> List[str]:
+    """Turn a WARMUP value into feature names; "all" selects every feature."""
+    features = [feature.strip() for feature in spec.split(",") if feature.strip()]
+    if "all" in features:
+        return list(FEATURE_MODULES)
+    unknown = [feature for feature in features if feature not in FEATURE_MODULES]
+    if unknown:
+        raise ValueError(f"Unknown WARMUP feature(s) {', '.join(unknown)}; expected: all, {', '.join(FEATURE_MODULES)}")
+    return features
+
+
+WARMUP_FEATURES = parse_features(os.getenv("WARMUP", ""))
+
+
+def warm_up(features: List[str] = WARMUP_FEATURES) -> Dict[str, float]:
+    """Import every module the features need and return seconds spent per module."""
+    timings: Dict[str, float] = {}
+    for feature in features:
+        for module in FEATURE_MODULES[feature]:
+            start = time.perf_counter()
+            importlib.import_module(module)
+            timings[module] = time.perf_counter() - start
+    if timings:
+        logger.info(
+            "Warm-up loaded %s in %.2fs (pid %s)", ", ".join(timings), sum(timings.values()), os.getpid()
+        )
+    return timings